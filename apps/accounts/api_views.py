@@ -65,6 +65,23 @@ def api_logout(request):
     except:
         return Response({'message': 'Logged out'})
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def api_ws_token(request):
+    """
+    Short-lived WebSocket connection token
+    POST /api/v1/ws-token/
+    Returns: {"token": "...", "expires_in": 300}
+    Connect with ?token=<token> to skip the session lookup on (re)connect.
+    """
+    from django.conf import settings
+    from .services import ConnectionAuthService
+
+    return Response({
+        'token': ConnectionAuthService.issue_token(request.user),
+        'expires_in': getattr(settings, 'WS_TOKEN_MAX_AGE', 300),
+    })
+
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
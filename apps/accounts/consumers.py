@@ -1,12 +1,13 @@
-import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.utils import timezone
 from django.contrib.auth import get_user_model
+from apps.chat_channels.outbound import OutboundQueueMixin
+from apps.chat_channels.wire import WireProtocolMixin, encode_all
+from .services import PresenceService
 
 User = get_user_model()
 
-class NotificationConsumer(AsyncWebsocketConsumer):
+class NotificationConsumer(WireProtocolMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.user = self.scope["user"]
         if not self.user.is_authenticated:
@@ -31,7 +32,7 @@ class NotificationConsumer(AsyncWebsocketConsumer):
 
     async def send_notification(self, event):
         # Send notification to WebSocket
-        await self.send(text_data=json.dumps({
+        await self.send_message({
             'type': 'notification',
             'id': event['id'],
             'title': event['title'],
@@ -39,12 +40,15 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             'notification_type': event['notification_type'],
             'link': event['link'],
             'created_at': event['created_at']
-        }))
+        })
 
 
-class PresenceConsumer(AsyncWebsocketConsumer):
+class PresenceConsumer(OutboundQueueMixin, WireProtocolMixin, AsyncWebsocketConsumer):
     """
     Global presence tracking - maintains user online status across all pages.
+
+    Connections are refcounted by ``PresenceService``; only real transitions
+    are broadcast and database writes are batched.
     """
     async def connect(self):
         self.user = self.scope["user"]
@@ -58,81 +62,59 @@ class PresenceConsumer(AsyncWebsocketConsumer):
             self.org_group = f'presence_org_{self.user.organization_id}'
             await self.channel_layer.group_add(self.org_group, self.channel_name)
         
-        # Set user ONLINE
-        await self.set_status('ONLINE')
-        
-        # Broadcast to organization
-        if hasattr(self, 'org_group'):
-            await self.channel_layer.group_send(
-                self.org_group,
-                {
-                    'type': 'user_status_update',
-                    'user_id': self.user.id,
-                    'status': 'ONLINE'
-                }
-            )
-        
         await self.accept()
+
+        # Broadcast only if this is the user's first live connection
+        transition = await self.presence('connect', self.user.organization_id, self.channel_name)
+        await self.broadcast_status(transition)
     
     async def disconnect(self, close_code):
+        if not getattr(self, 'user', None) or not self.user.is_authenticated:
+            return
+
+        transition = await self.presence('disconnect', self.channel_name)
+        await self.broadcast_status(transition)
+
         if hasattr(self, 'org_group'):
-            # Set user OFFLINE
-            await self.set_status('OFFLINE')
-            
-            # Broadcast to organization
-            await self.channel_layer.group_send(
-                self.org_group,
-                {
-                    'type': 'user_status_update',
-                    'user_id': self.user.id,
-                    'status': 'OFFLINE'
-                }
-            )
-            
             await self.channel_layer.group_discard(self.org_group, self.channel_name)
     
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """Handle heartbeat pings and status changes."""
         try:
-            data = json.loads(text_data)
-        except json.JSONDecodeError:
+            data = self.decode_frame(text_data, bytes_data)
+        except ValueError:
             return
         
         if data.get('type') == 'heartbeat':
-            # Update last_seen on heartbeat
-            await self.update_activity()
-            await self.send(text_data=json.dumps({'type': 'pong'}))
+            transition = await self.presence('heartbeat', self.user.organization_id, self.channel_name)
+            await self.broadcast_status(transition)
+            await self.send_message({'type': 'pong'})
         
         elif data.get('type') == 'status_change':
             # Manual status change (AWAY, BUSY, ONLINE)
             new_status = data.get('status', '').upper()
-            if new_status in ['ONLINE', 'AWAY', 'BUSY']:
-                await self.set_status(new_status)
-                if hasattr(self, 'org_group'):
-                    await self.channel_layer.group_send(
-                        self.org_group,
-                        {
-                            'type': 'user_status_update',
-                            'user_id': self.user.id,
-                            'status': new_status
-                        }
-                    )
+            transition = await self.presence('set_status', new_status)
+            await self.broadcast_status(transition)
     
     async def user_status_update(self, event):
-        """Broadcast status changes to all connected clients."""
-        await self.send(text_data=json.dumps({
+        """Queue status changes for the client (pre-serialized by ``PresenceService.payload``)."""
+        frames = event.get('frames') or encode_all({
             'type': 'presence',
             'user_id': event['user_id'],
             'status': event['status']
-        }))
-    
-    @database_sync_to_async
-    def set_status(self, status):
-        User.objects.filter(id=self.user.id).update(
-            status=status,
-            last_seen=timezone.now()
-        )
+        })
+        self.queue_frames(event['type'], event, frames)
+
+    async def broadcast_status(self, status):
+        if status and hasattr(self, 'org_group'):
+            await self.channel_layer.group_send(
+                self.org_group,
+                PresenceService.payload(self.user.id, status)
+            )
     
     @database_sync_to_async
-    def update_activity(self):
-        User.objects.filter(id=self.user.id).update(last_seen=timezone.now())
+    def presence(self, action, *args):
+        """Run a PresenceService action and opportunistically flush to the DB."""
+        result = getattr(PresenceService, action)(self.user.id, *args)
+        PresenceService.maybe_flush()
+        return result
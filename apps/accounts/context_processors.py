@@ -1,11 +1,36 @@
-from .models import Notification
+from django.utils.functional import SimpleLazyObject, cached_property
+
+from .services import UnreadNotificationCounter
+
+
+class NotificationSummary:
+    """
+    Lazy notification data for templates.
+
+    Nothing is queried until a template actually reads ``unread_count`` or
+    iterates ``recent``, so pages without the bell cost no queries.
+    """
+
+    RECENT_LIMIT = 5
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def unread_count(self):
+        return UnreadNotificationCounter.count(self.user)
+
+    @cached_property
+    def recent(self):
+        return list(self.user.notifications.all()[:self.RECENT_LIMIT])
+
 
 def notifications_processor(request):
     if request.user.is_authenticated:
-        unread_count = request.user.notifications.filter(is_read=False).count()
-        latest_notifications = request.user.notifications.all()[:5]
+        summary = NotificationSummary(request.user)
         return {
-            'unread_notifications_count': unread_count,
-            'recent_notifications': latest_notifications
+            'notification_summary': summary,
+            'unread_notifications_count': SimpleLazyObject(lambda: summary.unread_count),
+            'recent_notifications': SimpleLazyObject(lambda: summary.recent)
         }
     return {}
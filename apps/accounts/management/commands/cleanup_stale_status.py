@@ -1,13 +1,29 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
 from apps.accounts.models import User
+from apps.accounts.services import PresenceService
+from apps.organizations.models import Organization
 
 
 class Command(BaseCommand):
-    help = 'Reset status to OFFLINE for users who haven\'t been seen in 30+ minutes'
+    help = 'Expire presence connections that stopped heartbeating, flush presence to the DB and reset stale ONLINE statuses'
 
     def handle(self, *args, **options):
+        # Users whose every connection missed its heartbeat
+        expired = PresenceService.sweep(Organization.objects.values_list('id', flat=True))
+        channel_layer = get_channel_layer()
+        if channel_layer is not None:
+            for user_id, org_id in expired:
+                async_to_sync(channel_layer.group_send)(
+                    f'presence_org_{org_id}',
+                    PresenceService.payload(user_id, 'OFFLINE')
+                )
+
+        flushed = PresenceService.flush()
+
         cutoff_time = timezone.now() - timedelta(minutes=30)
         
         stale_users = User.objects.filter(
@@ -18,5 +34,8 @@ class Command(BaseCommand):
         count = stale_users.update(status=User.Status.OFFLINE)
         
         self.stdout.write(
-            self.style.SUCCESS(f'✓ Reset {count} stale ONLINE statuses to OFFLINE')
+            self.style.SUCCESS(
+                f'✓ Expired {len(expired)} presence session(s), flushed {flushed} status update(s), '
+                f'reset {count} stale ONLINE statuses to OFFLINE'
+            )
         )
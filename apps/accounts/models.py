@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.signals import post_save
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 import uuid
@@ -255,3 +256,36 @@ class Notification(models.Model):
             notification_type=notification_type,
             link=link
         )
+
+
+@receiver(post_save, sender=User)
+def reset_unread_counter_for_new_user(sender, instance, created, **kwargs):
+    # Counters outlive the database: after a test database resets its
+    # sequences a new user can get the id of one whose count is still cached
+    if created:
+        from apps.accounts.services import UnreadNotificationCounter
+        UnreadNotificationCounter.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_connection_auth_cache(sender, instance, **kwargs):
+    # Sockets must not keep authenticating a changed or deleted user
+    from apps.accounts.services import ConnectionAuthService
+    ConnectionAuthService.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_counter_on_save(sender, instance, created, **kwargs):
+    from apps.accounts.services import UnreadNotificationCounter
+    if created:
+        if not instance.is_read:
+            UnreadNotificationCounter.incr(instance.recipient_id)
+    else:
+        UnreadNotificationCounter.invalidate(instance.recipient_id)
+
+
+@receiver(post_delete, sender=Notification)
+def update_unread_counter_on_delete(sender, instance, **kwargs):
+    from apps.accounts.services import UnreadNotificationCounter
+    UnreadNotificationCounter.invalidate(instance.recipient_id)
@@ -1,4 +1,5 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.db.models import Count, Q, Sum
@@ -48,6 +49,13 @@ def platform_plan_delete(request, pk):
         messages.success(request, f"Plan '{name}' deleted successfully.")
     return redirect('accounts:platform_plan_list')
 
+@login_required
+@user_passes_test(super_admin_check)
+def platform_realtime_metrics(request):
+    """Frames shed by slow WebSocket clients, per consumer type and reason."""
+    from apps.chat_channels.outbound import OutboundMetrics
+    return JsonResponse({'dropped_frames': OutboundMetrics.snapshot()})
+
 @login_required
 @user_passes_test(super_admin_check)
 def platform_dashboard(request):
@@ -92,15 +100,10 @@ def platform_dashboard(request):
         subscription_plan__isnull=False
     ).aggregate(total=Sum('subscription_plan__price_monthly'))['total'] or 0
 
-    # Calculate Total Storage Usage (approximate)
-    from apps.organizations.models import ProjectFile
-    total_files_size = 0
-    # Note: iterating through all files might be heavy, but for now it's okay for dashboard
-    for pf in ProjectFile.objects.all():
-        try:
-            total_files_size += pf.file.size
-        except Exception:
-            continue
+    # Calculate Total Storage Usage from the per-organization counters
+    total_files_size = Organization.objects.aggregate(
+        total=Sum('storage_used_bytes')
+    )['total'] or 0
     total_storage_mb = round(total_files_size / (1024 * 1024), 2)
 
     stats = {
@@ -0,0 +1,8 @@
+"""Service layer for accounts (notifications, presence, ...)."""
+
+from .connection_auth import ConnectionAuthService
+from .notification_fanout import NotificationFanoutService
+from .presence import PresenceService
+from .unread_counter import UnreadNotificationCounter
+
+__all__ = ['ConnectionAuthService', 'NotificationFanoutService', 'PresenceService', 'UnreadNotificationCounter']
@@ -0,0 +1,96 @@
+"""
+WebSocket connection authentication.
+
+Every (re)connect used to cost a session lookup plus a user query before the
+consumer even ran, and mobile clients reconnect constantly. This service keeps
+the resolved user in the cache for ``WS_USER_CACHE_TIMEOUT`` seconds (dropped
+whenever the user is saved or deleted) and issues signed, short-lived
+connection tokens:
+- ``issue_token(user)`` returns a token valid for ``WS_TOKEN_MAX_AGE`` seconds
+- ``user_from_token(token)`` resolves it without touching the session store,
+  so a reconnect storm after a deploy is served from the cache
+
+Tokens embed the first characters of the user's session auth hash, so
+changing the password invalidates outstanding tokens just like sessions.
+Channel access is cached separately (see ``apps.chat_channels.access``).
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+
+KEY_PREFIX = 'ws_auth:user:'
+TOKEN_SALT = 'connectflow.ws-connection'
+HASH_PREFIX_LENGTH = 12
+
+
+class ConnectionAuthService:
+    """Cached user resolution and signed connection tokens for sockets."""
+
+    @classmethod
+    def _key(cls, user_id):
+        return f"{KEY_PREFIX}{user_id}"
+
+    @classmethod
+    def get_user(cls, user_id):
+        """Active user with this id, from the cache when possible, else None."""
+        User = get_user_model()
+        try:
+            user_id = User._meta.pk.to_python(user_id)
+        except Exception:
+            return None
+        user = cache.get(cls._key(user_id))
+        if user is None:
+            user = User.objects.filter(pk=user_id).first()
+            if user is None:
+                return None
+            cache.set(cls._key(user_id), user, getattr(settings, 'WS_USER_CACHE_TIMEOUT', 60))
+        return user if user.is_active else None
+
+    @classmethod
+    def invalidate(cls, user_id):
+        cache.delete(cls._key(user_id))
+
+    @classmethod
+    def issue_token(cls, user):
+        return signing.dumps(
+            {'uid': str(user.pk), 'h': user.get_session_auth_hash()[:HASH_PREFIX_LENGTH]},
+            salt=TOKEN_SALT, compress=True
+        )
+
+    @classmethod
+    def user_from_token(cls, token):
+        """The user a connection token was issued to, or None if invalid/expired."""
+        try:
+            data = signing.loads(token, salt=TOKEN_SALT, max_age=getattr(settings, 'WS_TOKEN_MAX_AGE', 300))
+        except signing.BadSignature:
+            return None
+        user = cls.get_user(data.get('uid'))
+        if user is None or not constant_time_compare(
+            data.get('h', ''), user.get_session_auth_hash()[:HASH_PREFIX_LENGTH]
+        ):
+            return None
+        return user
+
+    @classmethod
+    def user_from_session(cls, session):
+        """
+        Resolve a logged-in session to its user through the cache.
+
+        Returns None when the session has no user or its auth hash does not
+        match, in which case the caller falls back to Django's full check.
+        """
+        from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+
+        user_id = session.get(SESSION_KEY)
+        if user_id is None or session.get(BACKEND_SESSION_KEY) not in settings.AUTHENTICATION_BACKENDS:
+            return None
+        user = cls.get_user(user_id)
+        session_hash = session.get(HASH_SESSION_KEY)
+        if user is None or not session_hash or not constant_time_compare(
+            session_hash, user.get_session_auth_hash()
+        ):
+            return None
+        return user
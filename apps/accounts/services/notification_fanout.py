@@ -0,0 +1,206 @@
+"""
+Notification fan-out service.
+
+One place to deliver the same alert to many users:
+- Recipients are resolved to ids with at most one query
+- Notification rows are written with a single ``bulk_create``
+- WebSocket pushes are pipelined on one event loop instead of one
+  ``async_to_sync`` round trip per recipient
+- ``background=True`` moves the whole delivery off the request thread,
+  after the surrounding transaction commits
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections, models, transaction
+
+from apps.accounts.models import Notification
+
+from .unread_counter import UnreadNotificationCounter
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'NOTIFICATION_FANOUT_WORKERS', 2),
+            thread_name_prefix='notification-fanout'
+        )
+    return _executor
+
+
+class NotificationFanoutService:
+    """Create and push notifications for a whole audience in batches."""
+
+    # Rows per INSERT and concurrent group_send calls per batch
+    BATCH_SIZE = 500
+
+    @staticmethod
+    def resolve_recipient_ids(recipients, exclude=None):
+        """
+        Turn users, ids or a User queryset into a de-duplicated list of ids.
+
+        Querysets are resolved with a single ``values_list`` query; plain
+        users and ids cost nothing.
+        """
+        if isinstance(recipients, models.QuerySet):
+            ids = list(recipients.values_list('id', flat=True).distinct())
+        else:
+            ids = [getattr(r, 'pk', r) for r in recipients if r is not None]
+
+        excluded = set()
+        if exclude is not None:
+            if isinstance(exclude, (list, tuple, set, frozenset)):
+                excluded = {getattr(e, 'pk', e) for e in exclude if e is not None}
+            else:
+                excluded = {getattr(exclude, 'pk', exclude)}
+
+        seen = set()
+        result = []
+        for user_id in ids:
+            if user_id in excluded or user_id in seen:
+                continue
+            seen.add(user_id)
+            result.append(user_id)
+        return result
+
+    @staticmethod
+    def build(recipient_ids, title, content, notification_type='SYSTEM', sender=None, link=None):
+        """Build unsaved Notification instances, one per recipient id."""
+        sender_id = getattr(sender, 'pk', sender)
+        return [
+            Notification(
+                recipient_id=recipient_id,
+                sender_id=sender_id,
+                title=title,
+                content=content,
+                notification_type=notification_type,
+                link=link
+            )
+            for recipient_id in recipient_ids
+        ]
+
+    @staticmethod
+    def payload(notification, extra=None):
+        """WebSocket event consumed by ``NotificationConsumer.send_notification``."""
+        event = {
+            'type': 'send_notification',
+            'id': str(notification.id),
+            'title': notification.title,
+            'content': notification.content,
+            'notification_type': notification.notification_type,
+            'link': notification.link,
+            'created_at': "Just now",
+        }
+        if extra:
+            event.update(extra)
+        return event
+
+    @classmethod
+    async def apush(cls, notifications, extra=None):
+        """Send every notification to its recipient's group, batched concurrently."""
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        for start in range(0, len(notifications), cls.BATCH_SIZE):
+            batch = notifications[start:start + cls.BATCH_SIZE]
+            results = await asyncio.gather(
+                *[
+                    channel_layer.group_send(
+                        f"notifications_{n.recipient_id}",
+                        cls.payload(n, extra)
+                    )
+                    for n in batch
+                ],
+                return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.warning("Notification push failed: %s", result)
+
+    @classmethod
+    def push(cls, notifications, extra=None):
+        if notifications:
+            async_to_sync(cls.apush)(notifications, extra)
+
+    @classmethod
+    def save(cls, notifications):
+        """Insert notifications with as few INSERT statements as possible."""
+        if notifications:
+            Notification.objects.bulk_create(notifications, batch_size=cls.BATCH_SIZE)
+            # bulk_create skips post_save, so keep unread counters in step here
+            UnreadNotificationCounter.incr_many(
+                Counter(n.recipient_id for n in notifications if not n.is_read)
+            )
+        return notifications
+
+    @classmethod
+    def deliver(cls, notifications, extra=None, background=None):
+        """
+        Persist and push pre-built notifications.
+
+        When ``background`` is true (default: ``settings.NOTIFICATION_FANOUT_BACKGROUND``)
+        the work is queued on a small thread pool once the current transaction
+        commits, so request latency does not depend on audience size.
+        """
+        if not notifications:
+            return []
+        if background is None:
+            background = getattr(settings, 'NOTIFICATION_FANOUT_BACKGROUND', False)
+
+        if background:
+            transaction.on_commit(
+                lambda: _get_executor().submit(cls._deliver_in_background, notifications, extra)
+            )
+            return notifications
+
+        cls.save(notifications)
+        cls.push(notifications, extra)
+        return notifications
+
+    @classmethod
+    def _deliver_in_background(cls, notifications, extra):
+        try:
+            cls.save(notifications)
+            cls.push(notifications, extra)
+        except Exception:
+            logger.exception("Background notification fan-out failed")
+        finally:
+            close_old_connections()
+
+    @classmethod
+    def notify_users(cls, recipients, title, content, notification_type='SYSTEM',
+                     sender=None, link=None, exclude=None, extra=None, background=None):
+        """
+        Notify every user in ``recipients`` (users, ids or a User queryset).
+
+        Returns the list of Notification instances (unsaved until delivery
+        completes when running in background mode).
+        """
+        recipient_ids = cls.resolve_recipient_ids(recipients, exclude=exclude)
+        notifications = cls.build(
+            recipient_ids, title, content,
+            notification_type=notification_type, sender=sender, link=link
+        )
+        return cls.deliver(notifications, extra=extra, background=background)
+
+    @classmethod
+    async def adeliver(cls, notifications, extra=None):
+        """Async variant of :meth:`deliver` for use inside consumers."""
+        from channels.db import database_sync_to_async
+
+        if not notifications:
+            return []
+        await database_sync_to_async(cls.save)(notifications)
+        await cls.apush(notifications, extra)
+        return notifications
@@ -0,0 +1,415 @@
+"""
+Presence service.
+
+Tracks who is online without touching the database on every socket event:
+- Each WebSocket connection is registered under its user with a last
+  heartbeat timestamp; a user is online while at least one connection is
+  younger than ``PRESENCE_TTL`` seconds (the refcount)
+- Only transitions (offline -> online, online -> offline, manual status
+  changes) are reported back to consumers for broadcasting, so five tabs do
+  not produce five ONLINE/OFFLINE events
+- Status changes and heartbeats mark the user dirty; dirty users are written
+  to ``User.status``/``last_seen`` in bulk at most once per
+  ``PRESENCE_FLUSH_INTERVAL`` seconds
+- ``online_users(org_id)`` answers "who is online in this organization" from
+  a per-organization index
+
+The organization index and the dirty set are hashes with one field per user,
+so a heartbeat writes its own field instead of rewriting a shared dict under
+a deployment-wide lock; only a user's own state is locked.
+
+State lives in the Django cache (Redis in production, where the hashes are
+Redis hashes) or, with ``PRESENCE_BACKEND = 'memory'``, in process memory
+(tests, single process dev).
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+ONLINE = 'ONLINE'
+OFFLINE = 'OFFLINE'
+MANUAL_STATUSES = ('ONLINE', 'AWAY', 'BUSY')
+
+KEY_PREFIX = 'presence'
+
+
+class CachePresenceStore:
+    """Presence state in the default Django cache."""
+
+    def __init__(self):
+        self._local_lock = threading.RLock()
+
+    @staticmethod
+    def _redis():
+        # django-redis exposes its client; other caches keep hashes as cached dicts
+        client = getattr(cache, 'client', None)
+        return client.get_client(write=True) if hasattr(client, 'get_client') else None
+
+    def get(self, key, default=None):
+        return cache.get(key, default)
+
+    def set(self, key, value, timeout=None):
+        cache.set(key, value, timeout)
+
+    def add(self, key, value, timeout=None):
+        return cache.add(key, value, timeout)
+
+    def delete(self, key):
+        cache.delete(key)
+
+    @contextmanager
+    def lock(self, name):
+        # django-redis exposes a distributed lock; other caches are per process
+        if hasattr(cache, 'lock'):
+            with cache.lock(f"{KEY_PREFIX}:lock:{name}", timeout=5):
+                yield
+        else:
+            with self._local_lock:
+                yield
+
+    def hset(self, key, field, value):
+        redis = self._redis()
+        if redis is not None:
+            redis.hset(cache.make_key(key), json.dumps(field), json.dumps(value))
+            return
+        with self._local_lock:
+            fields = cache.get(key) or {}
+            fields[field] = value
+            cache.set(key, fields, None)
+
+    def hdel(self, key, field):
+        redis = self._redis()
+        if redis is not None:
+            redis.hdel(cache.make_key(key), json.dumps(field))
+            return
+        with self._local_lock:
+            fields = cache.get(key) or {}
+            if fields.pop(field, None) is not None:
+                cache.set(key, fields, None)
+
+    def hgetall(self, key):
+        redis = self._redis()
+        if redis is not None:
+            return self._decode(redis.hgetall(cache.make_key(key)))
+        return dict(cache.get(key) or {})
+
+    def hdrain(self, key):
+        """Return a hash and delete it, atomically."""
+        redis = self._redis()
+        if redis is not None:
+            pipeline = redis.pipeline(transaction=True)
+            pipeline.hgetall(cache.make_key(key))
+            pipeline.delete(cache.make_key(key))
+            return self._decode(pipeline.execute()[0])
+        with self._local_lock:
+            fields = cache.get(key) or {}
+            cache.delete(key)
+        return fields
+
+    @staticmethod
+    def _decode(fields):
+        return {json.loads(field): json.loads(value) for field, value in fields.items()}
+
+    def clear(self):
+        pass
+
+
+class MemoryPresenceStore:
+    """Process-local presence state."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.RLock()
+
+    def _expired(self, key):
+        entry = self._data.get(key)
+        return entry is not None and entry[1] is not None and entry[1] < time.time()
+
+    def get(self, key, default=None):
+        if key not in self._data or self._expired(key):
+            self._data.pop(key, None)
+            return default
+        return self._data[key][0]
+
+    def set(self, key, value, timeout=None):
+        self._data[key] = (value, time.time() + timeout if timeout else None)
+
+    def add(self, key, value, timeout=None):
+        with self._lock:
+            if self.get(key) is not None:
+                return False
+            self.set(key, value, timeout)
+            return True
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    @contextmanager
+    def lock(self, name):
+        with self._lock:
+            yield
+
+    def hset(self, key, field, value):
+        with self._lock:
+            self._data.setdefault(key, ({}, None))[0][field] = value
+
+    def hdel(self, key, field):
+        with self._lock:
+            self._data.get(key, ({}, None))[0].pop(field, None)
+
+    def hgetall(self, key):
+        with self._lock:
+            return dict(self._data.get(key, ({}, None))[0])
+
+    def hdrain(self, key):
+        with self._lock:
+            return self._data.pop(key, ({}, None))[0]
+
+    def clear(self):
+        self._data.clear()
+
+
+_store = None
+
+
+def get_presence_store():
+    global _store
+    if _store is None:
+        if getattr(settings, 'PRESENCE_BACKEND', 'cache') == 'memory':
+            _store = MemoryPresenceStore()
+        else:
+            _store = CachePresenceStore()
+    return _store
+
+
+def _user_key(user_id):
+    return f"{KEY_PREFIX}:user:{user_id}"
+
+
+def _org_key(org_id):
+    return f"{KEY_PREFIX}:org:{org_id}"
+
+
+DIRTY_KEY = f"{KEY_PREFIX}:dirty"
+FLUSH_KEY = f"{KEY_PREFIX}:flushed"
+
+
+class PresenceService:
+    """Connection refcounting, transition detection and batched persistence."""
+
+    @staticmethod
+    def ttl():
+        return getattr(settings, 'PRESENCE_TTL', 90)
+
+    @staticmethod
+    def flush_interval():
+        return getattr(settings, 'PRESENCE_FLUSH_INTERVAL', 60)
+
+    @classmethod
+    def _live(cls, connections, now):
+        cutoff = now - cls.ttl()
+        return {conn: ts for conn, ts in connections.items() if ts >= cutoff}
+
+    @classmethod
+    def _save_user(cls, store, user_id, state):
+        store.set(_user_key(user_id), state, cls.ttl() * 4)
+
+    @staticmethod
+    def _index(store, org_id, user_id, status):
+        if not org_id:
+            return
+        if status == OFFLINE:
+            store.hdel(_org_key(org_id), user_id)
+        else:
+            store.hset(_org_key(org_id), user_id, status)
+
+    @staticmethod
+    def _mark_dirty(store, user_id, status, now):
+        store.hset(DIRTY_KEY, user_id, [status, now])
+
+    @classmethod
+    def connect(cls, user_id, org_id, connection_id):
+        """
+        Register a connection. Returns the new status when the user just came
+        online, otherwise ``None``.
+        """
+        store = get_presence_store()
+        now = time.time()
+        with store.lock(f"user:{user_id}"):
+            state = store.get(_user_key(user_id)) or {'org': org_id, 'status': ONLINE, 'conns': {}}
+            live = cls._live(state['conns'], now)
+            was_online = bool(live)
+            live[connection_id] = now
+            state.update(org=org_id, conns=live)
+            if not was_online:
+                state['status'] = ONLINE
+            cls._save_user(store, user_id, state)
+
+        if was_online:
+            return None
+        cls._index(store, org_id, user_id, state['status'])
+        cls._mark_dirty(store, user_id, state['status'], now)
+        return state['status']
+
+    @classmethod
+    def disconnect(cls, user_id, connection_id):
+        """
+        Drop a connection. Returns ``OFFLINE`` when it was the user's last live
+        connection, otherwise ``None``.
+        """
+        store = get_presence_store()
+        now = time.time()
+        with store.lock(f"user:{user_id}"):
+            state = store.get(_user_key(user_id))
+            if not state:
+                return None
+            live = cls._live(state['conns'], now)
+            live.pop(connection_id, None)
+            state['conns'] = live
+            if live:
+                cls._save_user(store, user_id, state)
+                return None
+            store.delete(_user_key(user_id))
+
+        cls._index(store, state.get('org'), user_id, OFFLINE)
+        cls._mark_dirty(store, user_id, OFFLINE, now)
+        return OFFLINE
+
+    @classmethod
+    def heartbeat(cls, user_id, org_id, connection_id):
+        """
+        Refresh a connection's TTL; ``last_seen`` is persisted on the next
+        flush. A connection that had already expired is registered again, in
+        which case the transition is returned like :meth:`connect`.
+        """
+        store = get_presence_store()
+        now = time.time()
+        with store.lock(f"user:{user_id}"):
+            state = store.get(_user_key(user_id))
+            if state and cls._live(state['conns'], now):
+                state['conns'][connection_id] = now
+                cls._save_user(store, user_id, state)
+            else:
+                state = None
+        if state is None:
+            return cls.connect(user_id, org_id, connection_id)
+        cls._mark_dirty(store, user_id, state['status'], now)
+        return None
+
+    @classmethod
+    def set_status(cls, user_id, status):
+        """Manual status change. Returns ``status`` if it changed, else ``None``."""
+        if status not in MANUAL_STATUSES:
+            return None
+        store = get_presence_store()
+        now = time.time()
+        with store.lock(f"user:{user_id}"):
+            state = store.get(_user_key(user_id))
+            if not state or state['status'] == status:
+                return None
+            state['status'] = status
+            cls._save_user(store, user_id, state)
+        cls._index(store, state.get('org'), user_id, status)
+        cls._mark_dirty(store, user_id, status, now)
+        return status
+
+    @classmethod
+    def get_status(cls, user_id):
+        state = get_presence_store().get(_user_key(user_id))
+        if not state or not cls._live(state['conns'], time.time()):
+            return OFFLINE
+        return state['status']
+
+    @classmethod
+    def online_users(cls, org_id):
+        """Return ``{user_id: status}`` for everyone online in ``org_id``."""
+        return get_presence_store().hgetall(_org_key(org_id))
+
+    @classmethod
+    def apply_live_status(cls, users, org_id):
+        """
+        Overlay live statuses from the presence index onto ``users`` (which
+        may be stale until the next flush). Returns the users as a list.
+        """
+        online = cls.online_users(org_id)
+        users = list(users)
+        for user in users:
+            user.status = online.get(user.pk, OFFLINE)
+        return users
+
+    @classmethod
+    def sweep(cls, org_ids):
+        """
+        Expire users whose connections all missed their heartbeat (e.g. the
+        server died before ``disconnect`` ran). Returns ``[(user_id, org_id)]``
+        that went offline.
+        """
+        store = get_presence_store()
+        now = time.time()
+        expired = []
+        for org_id in org_ids:
+            for user_id in list(cls.online_users(org_id)):
+                if cls.get_status(user_id) == OFFLINE:
+                    store.delete(_user_key(user_id))
+                    expired.append((user_id, org_id))
+        for user_id, org_id in expired:
+            cls._index(store, org_id, user_id, OFFLINE)
+            cls._mark_dirty(store, user_id, OFFLINE, now)
+        return expired
+
+    @classmethod
+    def flush(cls):
+        """Persist dirty statuses, each user with their own last heartbeat, in one UPDATE. Returns users written."""
+        from datetime import datetime, timezone as dt_timezone
+        from django.db.models import Case, CharField, DateTimeField, Value, When
+        from apps.accounts.models import User
+
+        dirty = get_presence_store().hdrain(DIRTY_KEY)
+        if not dirty:
+            return 0
+
+        statuses, last_seen = [], []
+        for user_id, (status, seen) in dirty.items():
+            statuses.append(When(id=user_id, then=Value(status)))
+            last_seen.append(When(id=user_id, then=Value(datetime.fromtimestamp(seen, tz=dt_timezone.utc))))
+        User.objects.filter(id__in=list(dirty)).update(
+            status=Case(*statuses, output_field=CharField()),
+            last_seen=Case(*last_seen, output_field=DateTimeField())
+        )
+        return len(dirty)
+
+    @classmethod
+    def maybe_flush(cls):
+        """Flush if no process has flushed within ``PRESENCE_FLUSH_INTERVAL``."""
+        if get_presence_store().add(FLUSH_KEY, 1, cls.flush_interval()):
+            return cls.flush()
+        return 0
+
+    @staticmethod
+    def reset():
+        """Forget all presence state (tests)."""
+        global _store
+        if _store is not None:
+            _store.clear()
+        _store = None
+
+    @staticmethod
+    def payload(user_id, status, event_type='user_status_update'):
+        """
+        Group event for ``PresenceConsumer.user_status_update`` (or
+        ``ChatConsumer.user_status_change``). ``frames`` is the client message,
+        serialized once here rather than by every socket in the group.
+        """
+        from apps.chat_channels.wire import encode_all
+
+        return {
+            'type': event_type,
+            'user_id': user_id,
+            'status': status,
+            'frames': encode_all({'type': 'presence', 'user_id': user_id, 'status': status}),
+        }
@@ -0,0 +1,156 @@
+"""
+Per-user unread notification counters.
+
+The navbar bell needs the unread count on every page. Instead of a COUNT
+query per render the value is kept in a counter store:
+- Creating a notification increments the recipient's counter
+- Marking notifications read decrements or resets it
+- Any other change drops the counter so the next read recounts once
+
+The default store is the Django cache (Redis in production via
+django-redis). ``NOTIFICATION_COUNTER_BACKEND = 'redis'`` talks to Redis
+directly using ``NOTIFICATION_COUNTER_REDIS_URL`` so counters survive cache
+flushes and increments stay atomic without a cache round trip on miss.
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'notifications:unread:'
+
+
+def _key(user_id):
+    return f"{KEY_PREFIX}{user_id}"
+
+
+class CacheCounterStore:
+    """Counter store backed by the default Django cache."""
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+
+    def get(self, user_id):
+        return cache.get(_key(user_id))
+
+    def set(self, user_id, value):
+        cache.set(_key(user_id), value, self.timeout)
+
+    def incr(self, user_id, delta):
+        # Only adjust counters that already exist: a missing key means the
+        # next read recounts from the database anyway.
+        try:
+            cache.incr(_key(user_id), delta)
+        except ValueError:
+            pass
+
+    def delete(self, user_id):
+        cache.delete(_key(user_id))
+
+
+class RedisCounterStore:
+    """Counter store talking to Redis directly (requires the ``redis`` package)."""
+
+    # INCRBY only when the key is present so a missing counter is never
+    # initialised from a partial delta.
+    INCR_IF_EXISTS = """
+    if redis.call('exists', KEYS[1]) == 1 then
+        return redis.call('incrby', KEYS[1], ARGV[1])
+    end
+    return nil
+    """
+
+    def __init__(self, url, timeout=None):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.timeout = timeout
+        self._incr = self.client.register_script(self.INCR_IF_EXISTS)
+
+    def get(self, user_id):
+        value = self.client.get(_key(user_id))
+        return int(value) if value is not None else None
+
+    def set(self, user_id, value):
+        self.client.set(_key(user_id), value, ex=self.timeout)
+
+    def incr(self, user_id, delta):
+        self._incr(keys=[_key(user_id)], args=[delta])
+
+    def delete(self, user_id):
+        self.client.delete(_key(user_id))
+
+
+_store = None
+
+
+def get_counter_store():
+    """Return the configured counter store, created on first use."""
+    global _store
+    if _store is None:
+        timeout = getattr(settings, 'NOTIFICATION_COUNTER_TIMEOUT', 60 * 60 * 24)
+        backend = getattr(settings, 'NOTIFICATION_COUNTER_BACKEND', 'cache')
+        if backend == 'redis':
+            _store = RedisCounterStore(settings.NOTIFICATION_COUNTER_REDIS_URL, timeout=timeout)
+        else:
+            _store = CacheCounterStore(timeout=timeout)
+    return _store
+
+
+class UnreadNotificationCounter:
+    """Read and maintain unread notification counts per user."""
+
+    @staticmethod
+    def count(user):
+        """Return the unread count for ``user``, recounting once on a miss."""
+        from apps.accounts.models import Notification
+
+        user_id = getattr(user, 'pk', user)
+        store = get_counter_store()
+        try:
+            value = store.get(user_id)
+        except Exception as e:
+            logger.warning("Unread counter read failed: %s", e)
+            value = None
+
+        if value is None:
+            value = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+            try:
+                store.set(user_id, value)
+            except Exception as e:
+                logger.warning("Unread counter write failed: %s", e)
+        return max(int(value), 0)
+
+    @staticmethod
+    def incr(user, delta=1):
+        user_id = getattr(user, 'pk', user)
+        try:
+            get_counter_store().incr(user_id, delta)
+        except Exception as e:
+            logger.warning("Unread counter update failed: %s", e)
+
+    @classmethod
+    def incr_many(cls, counts):
+        """Apply ``{user_id: delta}`` increments, e.g. after a bulk insert."""
+        for user_id, delta in counts.items():
+            if delta:
+                cls.incr(user_id, delta)
+
+    @staticmethod
+    def reset(user, value=0):
+        user_id = getattr(user, 'pk', user)
+        try:
+            get_counter_store().set(user_id, value)
+        except Exception as e:
+            logger.warning("Unread counter reset failed: %s", e)
+
+    @staticmethod
+    def invalidate(user):
+        user_id = getattr(user, 'pk', user)
+        try:
+            get_counter_store().delete(user_id)
+        except Exception as e:
+            logger.warning("Unread counter invalidation failed: %s", e)
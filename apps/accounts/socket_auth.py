@@ -0,0 +1,46 @@
+"""
+ASGI authentication for WebSocket routes.
+
+Drop-in replacement for ``channels.auth.AuthMiddlewareStack``:
+- ``?token=<connection token>`` (see ``POST /api/v1/ws-token/``) resolves the
+  user from the signed token and the user cache, no session lookup
+- Otherwise the session is read as before, but the user comes from the
+  cache; only a missing or mismatched entry takes Django's full path
+"""
+
+from urllib.parse import parse_qs
+
+from channels.auth import AuthMiddleware, get_user
+from channels.db import database_sync_to_async
+from channels.sessions import CookieMiddleware, SessionMiddleware
+
+from .services.connection_auth import ConnectionAuthService
+
+
+@database_sync_to_async
+def _token_user(token):
+    return ConnectionAuthService.user_from_token(token)
+
+
+@database_sync_to_async
+def _session_user(session):
+    return ConnectionAuthService.user_from_session(session)
+
+
+class CachedAuthMiddleware(AuthMiddleware):
+    """Populate ``scope['user']`` from a connection token or the session."""
+
+    async def resolve_scope(self, scope):
+        user = None
+        token = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('token')
+        if token:
+            user = await _token_user(token[0])
+        if user is None:
+            user = await _session_user(scope['session'])
+        if user is None:
+            user = await get_user(scope)
+        scope['user']._wrapped = user
+
+
+def SocketAuthMiddlewareStack(inner):
+    return CookieMiddleware(SessionMiddleware(CachedAuthMiddleware(inner)))
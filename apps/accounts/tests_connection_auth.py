@@ -0,0 +1,96 @@
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.accounts.services import ConnectionAuthService
+from apps.accounts.socket_auth import CachedAuthMiddleware, SocketAuthMiddlewareStack
+from apps.organizations.models import Organization
+
+User = get_user_model()
+
+
+class WhoAmIConsumer(AsyncJsonWebsocketConsumer):
+    async def connect(self):
+        await self.accept()
+        user = self.scope['user']
+        await self.send_json({'user_id': str(user.pk) if user.is_authenticated else None})
+
+
+class ConnectionAuthTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='testuser', password='password', email='test@test.com',
+            email_verified=True, organization=self.org
+        )
+
+    def _resolve(self, **scope):
+        middleware = CachedAuthMiddleware(None)
+        middleware.populate_scope(scope)
+        async_to_sync(middleware.resolve_scope)(scope)
+        return scope['user']._wrapped
+
+    def test_token_round_trip(self):
+        token = ConnectionAuthService.issue_token(self.user)
+        self.assertEqual(ConnectionAuthService.user_from_token(token), self.user)
+        self.assertIsNone(ConnectionAuthService.user_from_token(token[:-2] + 'xx'))
+        with override_settings(WS_TOKEN_MAX_AGE=-1):
+            self.assertIsNone(ConnectionAuthService.user_from_token(token))
+
+        # A password change revokes outstanding tokens, deactivation too
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertIsNone(ConnectionAuthService.user_from_token(token))
+        token = ConnectionAuthService.issue_token(self.user)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        ConnectionAuthService.invalidate(self.user.pk)
+        self.assertIsNone(ConnectionAuthService.user_from_token(token))
+
+    def test_reconnects_are_served_from_the_cache(self):
+        # Logging in saves last_login, which drops the cached user
+        self.client.force_login(self.user)
+        session = self.client.session
+        token = ConnectionAuthService.issue_token(self.user)
+        query_string = f'token={token}'.encode()
+        with self.assertNumQueries(1):
+            self.assertEqual(self._resolve(query_string=query_string, session={}), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._resolve(query_string=query_string, session={}), self.user)
+        with self.assertNumQueries(1):
+            # The session read itself; the user comes from the cache
+            self.assertEqual(self._resolve(session=session), self.user)
+
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        self.assertEqual(self._resolve(query_string=query_string, session={}).first_name, 'Renamed')
+
+    def test_session_fallback(self):
+        self.client.force_login(self.user)
+        session = self.client.session
+        self.assertEqual(self._resolve(session=session), self.user)
+        # Expired tokens fall back to the session rather than rejecting
+        self.assertEqual(self._resolve(query_string=b'token=bogus', session=session), self.user)
+        self.assertFalse(self._resolve(query_string=b'token=bogus', session={}).is_authenticated)
+
+    def test_token_endpoint_and_connect(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/v1/ws-token/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['expires_in'], 300)
+
+        async def connect(path):
+            communicator = WebsocketCommunicator(SocketAuthMiddlewareStack(WhoAmIConsumer.as_asgi()), path)
+            await communicator.connect()
+            frame = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return frame['user_id']
+
+        self.assertEqual(async_to_sync(connect)(f"/ws/?token={response.json()['token']}"), str(self.user.pk))
+        self.assertIsNone(async_to_sync(connect)('/ws/'))
+        self.assertEqual(APIClient().post('/api/v1/ws-token/').status_code, 401)
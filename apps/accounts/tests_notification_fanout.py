@@ -0,0 +1,89 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from apps.accounts.models import Notification
+from apps.accounts.services import NotificationFanoutService
+from apps.accounts.services import notification_fanout
+from apps.organizations.models import Organization, SharedProject
+
+User = get_user_model()
+
+
+class ImmediateExecutor:
+    def submit(self, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+
+class NotificationFanoutTest(TestCase):
+    def setUp(self):
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.sender = User.objects.create_user(
+            username='sender', password='password', email='sender@test.com', organization=self.org
+        )
+        self.users = [
+            User.objects.create_user(
+                username=f'member{i}', password='password', email=f'member{i}@test.com', organization=self.org
+            )
+            for i in range(20)
+        ]
+
+    def _notify(self, recipients):
+        return NotificationFanoutService.notify_users(
+            recipients,
+            exclude=self.sender,
+            sender=self.sender,
+            title='Hello',
+            content='World',
+            notification_type='PROJECT',
+            link='/somewhere/'
+        )
+
+    def test_query_count_does_not_grow_with_audience(self):
+        with CaptureQueriesContext(connection) as small:
+            self._notify(User.objects.filter(pk__in=[u.pk for u in self.users[:3]]))
+        with CaptureQueriesContext(connection) as large:
+            self._notify(User.objects.filter(pk__in=[u.pk for u in self.users]))
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Notification.objects.count(), 23)
+
+    def test_excludes_sender_and_duplicates(self):
+        notifications = self._notify([self.sender, self.users[0], self.users[0].pk, self.users[1]])
+        self.assertEqual(len(notifications), 2)
+        self.assertFalse(Notification.objects.filter(recipient=self.sender).exists())
+
+    def test_pushes_to_recipient_group(self):
+        channel_layer = get_channel_layer()
+        channel_name = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f"notifications_{self.users[0].id}", channel_name)
+
+        notification = self._notify([self.users[0]])[0]
+
+        event = async_to_sync(channel_layer.receive)(channel_name)
+        self.assertEqual(event['type'], 'send_notification')
+        self.assertEqual(event['id'], str(notification.id))
+        self.assertEqual(event['created_at'], 'Just now')
+
+    def test_background_mode_runs_after_commit(self):
+        with mock.patch.object(notification_fanout, '_get_executor', return_value=ImmediateExecutor()):
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                NotificationFanoutService.notify_users(
+                    self.users, title='Later', content='Deferred', background=True
+                )
+            self.assertEqual(Notification.objects.filter(title='Later').count(), 0)
+            for callback in callbacks:
+                callback()
+        self.assertEqual(Notification.objects.filter(title='Later').count(), 20)
+
+    def test_project_membership_signal_uses_fanout(self):
+        project = SharedProject.objects.create(name='Apollo', host_organization=self.org, created_by=self.sender)
+        project.members.add(*self.users[:5])
+        self.assertEqual(
+            Notification.objects.filter(notification_type='PROJECT', title='Joined Project: Apollo').count(),
+            5
+        )
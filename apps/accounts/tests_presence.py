@@ -0,0 +1,161 @@
+from unittest import mock
+
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from apps.accounts.consumers import PresenceConsumer
+from apps.accounts.services import PresenceService
+from apps.accounts.services import presence
+from apps.organizations.models import Organization
+
+User = get_user_model()
+
+
+@override_settings(PRESENCE_BACKEND='memory', PRESENCE_TTL=90, PRESENCE_FLUSH_INTERVAL=60)
+class PresenceServiceTest(TestCase):
+    def setUp(self):
+        PresenceService.reset()
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='testuser', password='password', email='test@test.com',
+            email_verified=True, organization=self.org
+        )
+
+    def tearDown(self):
+        PresenceService.reset()
+
+    def test_only_transitions_are_reported(self):
+        self.assertEqual(PresenceService.connect(self.user.id, self.org.id, 'tab-1'), 'ONLINE')
+        self.assertIsNone(PresenceService.connect(self.user.id, self.org.id, 'tab-2'))
+        self.assertIsNone(PresenceService.connect(self.user.id, self.org.id, 'tab-3'))
+
+        self.assertIsNone(PresenceService.disconnect(self.user.id, 'tab-1'))
+        self.assertIsNone(PresenceService.disconnect(self.user.id, 'tab-3'))
+        self.assertEqual(PresenceService.get_status(self.user.id), 'ONLINE')
+        self.assertEqual(PresenceService.disconnect(self.user.id, 'tab-2'), 'OFFLINE')
+        self.assertEqual(PresenceService.get_status(self.user.id), 'OFFLINE')
+
+    def test_database_writes_are_batched(self):
+        PresenceService.maybe_flush()  # claim the current flush window
+
+        with self.assertNumQueries(0):
+            PresenceService.connect(self.user.id, self.org.id, 'tab-1')
+            PresenceService.connect(self.user.id, self.org.id, 'tab-2')
+            PresenceService.heartbeat(self.user.id, self.org.id, 'tab-1')
+            PresenceService.maybe_flush()
+
+        self.assertEqual(PresenceService.flush(), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.status, 'ONLINE')
+        self.assertEqual(PresenceService.flush(), 0)
+
+    def test_each_user_keeps_their_own_last_seen(self):
+        other = User.objects.create_user(
+            username='other', password='password', email='other@test.com', organization=self.org
+        )
+        with mock.patch.object(presence.time, 'time', return_value=1700000000):
+            PresenceService.connect(self.user.id, self.org.id, 'a')
+        with mock.patch.object(presence.time, 'time', return_value=1700000300):
+            PresenceService.connect(other.id, self.org.id, 'b')
+
+        with self.assertNumQueries(1):
+            self.assertEqual(PresenceService.flush(), 2)
+        self.user.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.user.last_seen.timestamp(), 1700000000)
+        self.assertEqual(other.last_seen.timestamp(), 1700000300)
+        self.assertEqual((self.user.status, other.status), ('ONLINE', 'ONLINE'))
+
+    def test_online_users_in_org(self):
+        other = User.objects.create_user(
+            username='other', password='password', email='other@test.com', organization=self.org
+        )
+        PresenceService.connect(self.user.id, self.org.id, 'a')
+        PresenceService.connect(other.id, self.org.id, 'b')
+        self.assertEqual(PresenceService.set_status(other.id, 'AWAY'), 'AWAY')
+        self.assertIsNone(PresenceService.set_status(other.id, 'AWAY'))
+
+        self.assertEqual(PresenceService.online_users(self.org.id), {self.user.id: 'ONLINE', other.id: 'AWAY'})
+        PresenceService.disconnect(other.id, 'b')
+        self.assertEqual(PresenceService.online_users(self.org.id), {self.user.id: 'ONLINE'})
+
+    def test_missed_heartbeats_expire(self):
+        with mock.patch.object(presence.time, 'time', return_value=1000.0):
+            PresenceService.connect(self.user.id, self.org.id, 'tab-1')
+        with mock.patch.object(presence.time, 'time', return_value=1000.0 + 91):
+            self.assertEqual(PresenceService.get_status(self.user.id), 'OFFLINE')
+            self.assertEqual(PresenceService.sweep([self.org.id]), [(self.user.id, self.org.id)])
+        self.assertEqual(PresenceService.online_users(self.org.id), {})
+
+    def test_only_the_users_own_state_is_locked(self):
+        store = presence.get_presence_store()
+        with mock.patch.object(store, 'lock', wraps=store.lock) as lock:
+            PresenceService.connect(self.user.id, self.org.id, 'tab-1')
+            PresenceService.heartbeat(self.user.id, self.org.id, 'tab-1')
+            PresenceService.set_status(self.user.id, 'AWAY')
+            PresenceService.disconnect(self.user.id, 'tab-1')
+        self.assertEqual({call.args[0] for call in lock.call_args_list}, {f'user:{self.user.id}'})
+
+
+@override_settings(PRESENCE_BACKEND='cache')
+class CachePresenceStoreTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        PresenceService.reset()
+
+    def tearDown(self):
+        PresenceService.reset()
+
+    def test_hashes_in_the_cache(self):
+        PresenceService.connect(1, 7, 'a')
+        PresenceService.connect(2, 7, 'b')
+        PresenceService.set_status(2, 'BUSY')
+        self.assertEqual(PresenceService.online_users(7), {1: 'ONLINE', 2: 'BUSY'})
+        PresenceService.disconnect(1, 'a')
+        self.assertEqual(PresenceService.online_users(7), {2: 'BUSY'})
+
+        dirty = presence.get_presence_store().hdrain(presence.DIRTY_KEY)
+        self.assertEqual({user_id: status for user_id, (status, _) in dirty.items()}, {1: 'OFFLINE', 2: 'BUSY'})
+        self.assertEqual(presence.get_presence_store().hdrain(presence.DIRTY_KEY), {})
+
+
+@override_settings(PRESENCE_BACKEND='memory')
+class PresenceConsumerTest(TestCase):
+    def setUp(self):
+        PresenceService.reset()
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='testuser', password='password', email='test@test.com',
+            email_verified=True, organization=self.org
+        )
+
+    def tearDown(self):
+        PresenceService.reset()
+
+    def _communicator(self):
+        communicator = WebsocketCommunicator(PresenceConsumer.as_asgi(), '/ws/presence/')
+        communicator.scope['user'] = self.user
+        return communicator
+
+    async def test_second_tab_does_not_broadcast(self):
+        channel_layer = get_channel_layer()
+        observer = await channel_layer.new_channel()
+        await channel_layer.group_add(f'presence_org_{self.org.id}', observer)
+
+        first = self._communicator()
+        self.assertTrue((await first.connect())[0])
+        event = await channel_layer.receive(observer)
+        self.assertEqual((event['user_id'], event['status']), (self.user.id, 'ONLINE'))
+
+        second = self._communicator()
+        await second.connect()
+        await second.disconnect()
+        await first.disconnect()
+        # The second tab's connect and disconnect were not transitions, so
+        # the next event is the final OFFLINE
+        event = await channel_layer.receive(observer)
+        self.assertEqual(event['status'], 'OFFLINE')
+        self.assertEqual(PresenceService.get_status(self.user.id), 'OFFLINE')
@@ -0,0 +1,90 @@
+from unittest import mock
+
+from django.db.models import QuerySet
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from apps.accounts.context_processors import notifications_processor
+from apps.accounts.models import Notification
+from apps.accounts.services import NotificationFanoutService, UnreadNotificationCounter
+from apps.organizations.models import Organization
+
+User = get_user_model()
+
+
+class UnreadCounterTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='password',
+            email='test@test.com',
+            email_verified=True,
+            organization=self.org
+        )
+        self.client.force_login(self.user)
+
+    def _notify(self, title="Hello"):
+        return Notification.notify(recipient=self.user, title=title, content="Body")
+
+    def test_counter_is_maintained_without_counting(self):
+        UnreadNotificationCounter.count(self.user)  # warm the counter
+        self._notify()
+        NotificationFanoutService.notify_users([self.user, self.user.pk], title="Bulk", content="Body")
+
+        with self.assertNumQueries(0):
+            self.assertEqual(UnreadNotificationCounter.count(self.user), 2)
+
+    def test_mark_single_read_updates_counter(self):
+        first = self._notify("First")
+        self._notify("Second")
+        self.assertEqual(UnreadNotificationCounter.count(self.user), 2)
+
+        url = reverse('accounts:mark_notification_read', kwargs={'notification_id': first.id})
+        response = self.client.post(url)
+        self.assertEqual(response.json()['unread_count'], 1)
+
+        # Marking again must not decrement twice
+        response = self.client.post(url)
+        self.assertEqual(response.json()['unread_count'], 1)
+        self.assertEqual(Notification.objects.filter(recipient=self.user, is_read=False).count(), 1)
+
+    def test_mark_all_read_resets_counter(self):
+        self._notify()
+        self._notify()
+        self.assertEqual(UnreadNotificationCounter.count(self.user), 2)
+        self.client.post(reverse('accounts:mark_notifications_read'))
+        with self.assertNumQueries(0):
+            self.assertEqual(UnreadNotificationCounter.count(self.user), 0)
+
+    def test_mark_all_read_keeps_notifications_counted_meanwhile(self):
+        self._notify()
+        self.assertEqual(UnreadNotificationCounter.count(self.user), 1)
+        update = QuerySet.update
+
+        def update_then_notify(queryset, **kwargs):
+            updated = update(queryset, **kwargs)
+            # A fan-out lands between the UPDATE and the counter adjustment
+            self._notify("Meanwhile")
+            return updated
+
+        with mock.patch.object(QuerySet, 'update', update_then_notify):
+            self.client.post(reverse('accounts:mark_notifications_read'))
+        self.assertEqual(UnreadNotificationCounter.count(self.user), 1)
+
+    def test_delete_invalidates_counter(self):
+        notification = self._notify()
+        self.assertEqual(UnreadNotificationCounter.count(self.user), 1)
+        notification.delete()
+        self.assertEqual(UnreadNotificationCounter.count(self.user), 0)
+
+    def test_context_processor_is_lazy(self):
+        class MockRequest:
+            user = self.user
+
+        self._notify()
+        with self.assertNumQueries(0):
+            context = notifications_processor(MockRequest())
+        self.assertEqual(context['notification_summary'].unread_count, 1)
+        self.assertEqual(len(context['recent_notifications']), 1)
@@ -29,6 +29,7 @@ urlpatterns = [
     path('platform/users/', platform_admin_views.platform_user_list, name='platform_user_list'),
     path('platform/users/<str:pk>/permissions/', platform_admin_views.platform_user_permissions, name='platform_user_permissions'),
     path('platform/payments/', platform_admin_views.platform_payment_list, name='platform_payment_list'),
+    path('platform/realtime/metrics/', platform_admin_views.platform_realtime_metrics, name='platform_realtime_metrics'),
     
     # Subscription Tiers
     path('platform/plans/', platform_admin_views.platform_plan_list, name='platform_plan_list'),
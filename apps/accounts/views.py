@@ -13,6 +13,7 @@ import os
 from django.contrib.auth import get_user_model
 from .forms import ProfileSettingsForm
 from .models import Notification
+from .services import UnreadNotificationCounter
 from apps.organizations.models import Organization
 from django.db.models import Q
 from django.urls import reverse
@@ -80,17 +81,16 @@ class GlobalSearchView(View):
 
         # 3. Search Channels
         from apps.chat_channels.models import Channel
+        from apps.chat_channels.access import viewable_channels
         channels = Channel.objects.filter(
             organization=user_org,
             is_archived=False
         ).filter(
             Q(name__icontains=clean_query) |
             Q(description__icontains=clean_query)
-        ).distinct()
-        
-        viewable_channels = [c for c in channels if c.can_user_view(request.user)][:5]
+        )
         
-        for c in viewable_channels:
+        for c in viewable_channels(request.user, channels)[:5]:
             results.append({
                 'type': 'Channel',
                 'title': f"#{c.name}",
@@ -394,7 +394,11 @@ class UserProfileView(View):
 @login_required
 @require_POST
 def mark_notifications_as_read(request):
-    request.user.notifications.filter(is_read=False).update(is_read=True)
+    # Subtract what was marked rather than resetting to 0, so notifications
+    # counted in between (incr_many from a fan-out) are not lost.
+    updated = request.user.notifications.filter(is_read=False).update(is_read=True)
+    if updated:
+        UnreadNotificationCounter.incr(request.user, -updated)
     return JsonResponse({'success': True})
 
 
@@ -404,11 +408,17 @@ def mark_notification_as_read(request, notification_id):
     """Mark a single notification as read."""
     try:
         notification = request.user.notifications.get(id=notification_id)
-        notification.is_read = True
-        notification.save()
+        if not notification.is_read:
+            # Queryset update skips post_save, so adjust the counter directly
+            # instead of dropping it and recounting.
+            updated = request.user.notifications.filter(
+                id=notification.id, is_read=False
+            ).update(is_read=True)
+            if updated:
+                UnreadNotificationCounter.incr(request.user, -updated)
         
         # Get updated count
-        unread_count = request.user.notifications.filter(is_read=False).count()
+        unread_count = UnreadNotificationCounter.count(request.user)
         
         return JsonResponse({
             'success': True,
@@ -1,13 +1,13 @@
-import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
 from apps.chat_channels.models import Call, CallParticipant, Channel
+from apps.chat_channels.wire import WireProtocolMixin
 
 User = get_user_model()
 
 
-class CallConsumer(AsyncWebsocketConsumer):
+class CallConsumer(WireProtocolMixin, AsyncWebsocketConsumer):
     """
     WebRTC signaling consumer for voice/video calls.
     Handles WebRTC signaling (SDP offer/answer, ICE candidates).
@@ -56,9 +56,12 @@ class CallConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
     
-    async def receive(self, text_data):
-        """Receive message from WebSocket."""
-        data = json.loads(text_data)
+    async def receive(self, text_data=None, bytes_data=None):
+        """Receive message from WebSocket (JSON text or msgpack binary)."""
+        try:
+            data = self.decode_frame(text_data, bytes_data)
+        except ValueError:
+            return
         message_type = data.get('type')
         
         # Handle different signaling messages
@@ -177,78 +180,78 @@ class CallConsumer(AsyncWebsocketConsumer):
     # Handlers for group messages
     async def user_joined(self, event):
         """Send user_joined message to WebSocket."""
-        await self.send(text_data=json.dumps({
+        await self.send_message({
             'type': 'user_joined',
             'user_id': event['user_id'],
             'username': event['username'],
             'full_name': event['full_name'],
-        }))
+        })
     
     async def user_left(self, event):
         """Send user_left message to WebSocket."""
-        await self.send(text_data=json.dumps({
+        await self.send_message({
             'type': 'user_left',
             'user_id': event['user_id'],
             'username': event['username'],
-        }))
+        })
     
     async def webrtc_offer(self, event):
         """Send WebRTC offer to specific user."""
         if str(self.user.id) == event['to_user_id']:
-            await self.send(text_data=json.dumps({
+            await self.send_message({
                 'type': 'offer',
                 'offer': event['offer'],
                 'from_user_id': event['from_user_id'],
-            }))
+            })
     
     async def webrtc_answer(self, event):
         """Send WebRTC answer to specific user."""
         if str(self.user.id) == event['to_user_id']:
-            await self.send(text_data=json.dumps({
+            await self.send_message({
                 'type': 'answer',
                 'answer': event['answer'],
                 'from_user_id': event['from_user_id'],
-            }))
+            })
     
     async def ice_candidate(self, event):
         """Send ICE candidate to specific user."""
         if str(self.user.id) == event['to_user_id']:
-            await self.send(text_data=json.dumps({
+            await self.send_message({
                 'type': 'ice_candidate',
                 'candidate': event['candidate'],
                 'from_user_id': event['from_user_id'],
-            }))
+            })
     
     async def audio_toggled(self, event):
         """Broadcast audio toggle."""
-        await self.send(text_data=json.dumps({
+        await self.send_message({
             'type': 'audio_toggled',
             'user_id': event['user_id'],
             'enabled': event['enabled'],
-        }))
+        })
     
     async def video_toggled(self, event):
         """Broadcast video toggle."""
-        await self.send(text_data=json.dumps({
+        await self.send_message({
             'type': 'video_toggled',
             'user_id': event['user_id'],
             'enabled': event['enabled'],
-        }))
+        })
     
     async def screen_share_toggled(self, event):
         """Broadcast screen share toggle."""
-        await self.send(text_data=json.dumps({
+        await self.send_message({
             'type': 'screen_share_toggled',
             'user_id': event['user_id'],
             'is_sharing': event['is_sharing'],
-        }))
+        })
     
     async def call_ended(self, event):
         """Broadcast call ended."""
-        await self.send(text_data=json.dumps({
+        await self.send_message({
             'type': 'call_ended',
             'user_id': event['user_id'],
-        }))
+        })
     
     # Database operations
     @database_sync_to_async
@@ -41,21 +41,25 @@ def initiate_call(request):
             call.save()
             
             # Add all channel members as participants
-            for member in channel.members.all():
-                CallParticipant.objects.create(
+            CallParticipant.objects.bulk_create([
+                CallParticipant(
                     call=call,
-                    user=member,
+                    user_id=member_id,
                     status=CallParticipant.ParticipantStatus.INVITED
                 )
+                for member_id in channel.members.values_list('id', flat=True)
+            ])
         else:
             # Direct call with specific users
-            participants = User.objects.filter(id__in=user_ids)
-            for user in participants:
-                CallParticipant.objects.create(
+            participant_ids = list(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+            CallParticipant.objects.bulk_create([
+                CallParticipant(
                     call=call,
-                    user=user,
+                    user_id=user_id,
                     status=CallParticipant.ParticipantStatus.INVITED
                 )
+                for user_id in participant_ids
+            ])
             
             # Add initiator
             CallParticipant.objects.get_or_create(
@@ -69,42 +73,26 @@ def initiate_call(request):
         call.save()
         
         # Send notifications to all participants (except initiator)
-        from apps.accounts.models import Notification
-        from asgiref.sync import async_to_sync
-        from channels.layers import get_channel_layer
+        from apps.accounts.services import NotificationFanoutService
         from django.urls import reverse
         
-        channel_layer = get_channel_layer()
         call_url = reverse('calls:call_room', kwargs={'call_id': str(call.id)})
         
-        # Get all invited participants except the initiator
-        invited_participants = call.participants.exclude(id=request.user.id)
-        
-        for participant in invited_participants:
-            # Create notification in database
-            notification = Notification.notify(
-                recipient=participant,
-                sender=request.user,
-                title=f"Incoming {call.get_call_type_display()}",
-                content=f"{request.user.get_full_name() or request.user.username} is calling you",
-                notification_type='CALL',
-                link=call_url
-            )
-            
-            # Send real-time notification via WebSocket
-            async_to_sync(channel_layer.group_send)(
-                f"notifications_{participant.id}",
-                {
-                    'type': 'send_notification',
-                    'id': str(notification.id),
-                    'title': notification.title,
-                    'content': notification.content,
-                    'notification_type': notification.notification_type,
-                    'link': notification.link,
-                    'call_id': str(call.id),
-                    'call_type': call.call_type,
-                }
-            )
+        NotificationFanoutService.notify_users(
+            call.participants.all(),
+            exclude=request.user,
+            sender=request.user,
+            title=f"Incoming {call.get_call_type_display()}",
+            content=f"{request.user.get_full_name() or request.user.username} is calling you",
+            notification_type='CALL',
+            link=call_url,
+            extra={
+                'call_id': str(call.id),
+                'call_type': call.call_type,
+            },
+            # Ringing must reach callees before the caller's UI times out
+            background=False
+        )
         
         return JsonResponse({
             'success': True,
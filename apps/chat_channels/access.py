@@ -0,0 +1,154 @@
+"""
+Channel access resolution.
+
+Answers "which channels can this user see / post in" without loading member
+lists into Python:
+- :func:`viewable_channels` narrows any Channel queryset in SQL
+- :func:`get_viewable_channel_ids` caches the viewable id set per user, so
+  repeated checks (page renders, WebSocket connects) cost one cache read
+- Membership and structure signals in ``models.py`` invalidate the cache
+
+Rules mirror the original ``Channel.can_user_view``:
+- Shared project channels: project members only
+- Org admins: every channel in their organization
+- Official channels: everyone in the organization
+- Department channels: members of the department's teams
+- Team channels: team members
+- Everything else: explicit channel members
+"""
+
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+ACCESS_CACHE_PREFIX = 'channel_access'
+
+
+def _generation():
+    """Global generation bumped whenever channel structure changes."""
+    return cache.get_or_set(f"{ACCESS_CACHE_PREFIX}:generation", 1, None)
+
+
+def _cache_key(user_id):
+    return f"{ACCESS_CACHE_PREFIX}:{_generation()}:{user_id}"
+
+
+def _timeout():
+    return getattr(settings, 'CHANNEL_ACCESS_CACHE_TIMEOUT', 300)
+
+
+def viewable_channels_q(user):
+    """Return a ``Q`` matching every channel ``user`` may view."""
+    from apps.organizations.models import SharedProject, Team
+    from .models import Channel
+
+    project_ids = SharedProject.members.through.objects.filter(
+        user_id=user.pk
+    ).values('sharedproject_id')
+    team_ids = Team.members.through.objects.filter(user_id=user.pk).values('team_id')
+    department_ids = Team.objects.filter(members=user.pk).values('department_id')
+    member_channel_ids = Channel.members.through.objects.filter(
+        user_id=user.pk
+    ).values('channel_id')
+
+    if user.is_admin and user.organization_id:
+        org_rules = Q(organization_id=user.organization_id)
+    else:
+        org_rules = (
+            Q(channel_type=Channel.ChannelType.OFFICIAL, organization_id=user.organization_id)
+            | Q(channel_type=Channel.ChannelType.DEPARTMENT, department_id__in=department_ids)
+            | Q(channel_type=Channel.ChannelType.TEAM, team_id__in=team_ids)
+            | (
+                ~Q(channel_type=Channel.ChannelType.OFFICIAL)
+                & ~Q(channel_type=Channel.ChannelType.DEPARTMENT, department__isnull=False)
+                & ~Q(channel_type=Channel.ChannelType.TEAM, team__isnull=False)
+                & Q(pk__in=member_channel_ids)
+            )
+        )
+
+    return (
+        Q(shared_project__isnull=False, shared_project_id__in=project_ids)
+        | (Q(shared_project__isnull=True) & org_rules)
+    )
+
+
+def viewable_channels(user, queryset=None):
+    """Filter ``queryset`` (default: all channels) to those ``user`` can view."""
+    from .models import Channel
+
+    if queryset is None:
+        queryset = Channel.objects.all()
+    if not user or not user.is_authenticated:
+        return queryset.none()
+    return queryset.filter(viewable_channels_q(user))
+
+
+def get_viewable_channel_ids(user):
+    """Return a cached ``frozenset`` of channel ids ``user`` can view."""
+    key = _cache_key(user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(viewable_channels(user).values_list('id', flat=True))
+        cache.set(key, ids, _timeout())
+    return ids
+
+
+def can_view_channel(user, channel):
+    """``channel`` may be a Channel instance or a channel id."""
+    if not user or not user.is_authenticated:
+        return False
+    channel_id = getattr(channel, 'pk', channel)
+    try:
+        channel_id = channel_id if isinstance(channel_id, uuid.UUID) else uuid.UUID(str(channel_id))
+    except ValueError:
+        return False
+    return channel_id in get_viewable_channel_ids(user)
+
+
+def can_post_in_channel(user, channel):
+    if channel.read_only:
+        # Only admins and the channel creator can post in read-only channels
+        return user.is_admin or channel.created_by_id == user.pk
+
+    # In Shared Projects, all project members can usually post unless restricted
+    if channel.shared_project_id:
+        from apps.organizations.models import SharedProject
+        return SharedProject.members.through.objects.filter(
+            sharedproject_id=channel.shared_project_id, user_id=user.pk
+        ).exists()
+
+    return channel.members.filter(pk=user.pk).exists()
+
+
+def invalidate_user(user_ids):
+    """Drop cached access for one user id or an iterable of ids."""
+    if isinstance(user_ids, (list, tuple, set, frozenset)):
+        keys = [_cache_key(user_id) for user_id in user_ids]
+    else:
+        keys = [_cache_key(user_ids)]
+    if keys:
+        cache.delete_many(keys)
+
+
+def invalidate_all():
+    """Invalidate every user's cached access (channel created/moved/deleted)."""
+    key = f"{ACCESS_CACHE_PREFIX}:generation"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+
+
+def invalidate_for_membership_change(instance, action, pk_set, reverse):
+    """``m2m_changed`` handler body shared by channel, team and project members."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # user.<relation>.add(...): only that user's access changed
+        invalidate_user(instance.pk)
+    elif action == 'post_clear' or pk_set is None:
+        invalidate_all()
+    else:
+        invalidate_user(set(pk_set))
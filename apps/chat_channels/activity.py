@@ -0,0 +1,55 @@
+"""
+Channel activity markers.
+
+Every change that alters what the message API returns for a channel (new,
+edited or deleted messages, reactions, stars, attachments) replaces the
+channel's marker in the cache once the transaction commits. API responses
+derive their ``ETag`` from the marker, so polling an unchanged channel is
+answered with 304 without querying or serializing any messages.
+
+A missing marker (evicted, cold cache) is simply regenerated, which only
+costs clients one full response.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+ACTIVITY_CACHE_PREFIX = 'channel_activity'
+
+
+def _cache_key(channel_id):
+    return f"{ACTIVITY_CACHE_PREFIX}:{channel_id}"
+
+
+def _timeout():
+    return getattr(settings, 'CHANNEL_ACTIVITY_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def get_activity_marker(channel_id):
+    """Return the opaque marker for the channel's current state."""
+    key = _cache_key(channel_id)
+    marker = cache.get(key)
+    if marker is None:
+        marker = uuid.uuid4().hex
+        if not cache.add(key, marker, _timeout()):
+            marker = cache.get(key, marker)
+    return marker
+
+
+def touch_channels(channel_ids):
+    """Replace the markers of ``channel_ids`` after the current transaction commits."""
+    channel_ids = {channel_id for channel_id in channel_ids if channel_id}
+    if not channel_ids:
+        return
+
+    def replace_markers():
+        cache.set_many({_cache_key(channel_id): uuid.uuid4().hex for channel_id in channel_ids}, _timeout())
+
+    transaction.on_commit(replace_markers)
+
+
+def touch_channel(channel_id):
+    touch_channels([channel_id])
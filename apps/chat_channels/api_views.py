@@ -1,12 +1,42 @@
+import hashlib
+import uuid
+
+from django.utils.http import parse_etags, quote_etag
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from .models import Channel, Message
 from .serializers import ChannelSerializer, MessageSerializer
+from .activity import get_activity_marker
+from . import broadcast
+from .pagination import MessageCursorPagination
 
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from .models import Channel, Message, Attachment
+from apps.organizations.services import BlobService
+
+def requested_fields(request):
+    """``?fields=a,b`` as a set (always including ``id``), or None for every field."""
+    value = request.query_params.get('fields')
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()} | {'id'}
+
+
+def message_list_etag(request, channel_id):
+    """ETag for a message listing of one channel: its activity marker, the user and the query."""
+    raw = f"{get_activity_marker(channel_id)}:{request.user.pk}:{request.get_full_path()}"
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def not_modified(request, etag):
+    """Return a 304 response if the client's If-None-Match already has ``etag``."""
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    return None
+
 
 class ChannelViewSet(viewsets.ModelViewSet):
     serializer_class = ChannelSerializer
@@ -27,19 +57,72 @@ class ChannelViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def messages(self, request, pk=None):
+        """
+        Top-level messages, newest page first. Supports ``?before=``/``?since=``
+        cursors, ``?limit=``, ``?fields=`` and ``If-None-Match``.
+        """
         channel = self.get_object()
-        messages = Message.objects.filter(channel=channel, parent_message__isnull=True).order_by('-is_pinned', 'created_at')
-        serializer = MessageSerializer(messages, many=True)
-        return Response(serializer.data)
+        etag = message_list_etag(request, channel.pk)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+
+        fields = requested_fields(request)
+        messages = MessageSerializer.setup_eager_loading(
+            Message.objects.filter(channel=channel, parent_message__isnull=True), fields
+        )
+        paginator = MessageCursorPagination()
+        page = paginator.paginate_queryset(messages, request, view=self)
+        serializer = MessageSerializer(page, many=True, context={'request': request}, fields=fields)
+        response = paginator.get_paginated_response(serializer.data)
+        response['ETag'] = etag
+        return response
 
 class MessageViewSet(viewsets.ModelViewSet):
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MessageCursorPagination
 
     def get_queryset(self):
         # Use all_objects to include deleted messages for permission checks
         # The soft delete filter is in the default manager, but we need access to all for delete
-        return Message.all_objects.filter(channel__members=self.request.user)
+        queryset = Message.all_objects.filter(channel__members=self.request.user).exclude(
+            # Still uploading attachments (see uploads.py)
+            status=Message.MessageStatus.SENDING
+        )
+        if self.action == 'list' and self.channel_filter():
+            queryset = queryset.filter(channel_id=self.channel_filter())
+        if self.action in ('list', 'retrieve'):
+            queryset = MessageSerializer.setup_eager_loading(queryset, requested_fields(self.request))
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in ('list', 'retrieve'):
+            kwargs.setdefault('fields', requested_fields(self.request))
+        return super().get_serializer(*args, **kwargs)
+
+    def channel_filter(self):
+        """The ``?channel=<uuid>`` filter of the list action, if any."""
+        value = self.request.query_params.get('channel')
+        if not value:
+            return None
+        try:
+            return uuid.UUID(value)
+        except ValueError:
+            raise ValidationError({'channel': 'Invalid channel id.'})
+
+    def list(self, request, *args, **kwargs):
+        channel_id = self.channel_filter()
+        if not channel_id:
+            return super().list(request, *args, **kwargs)
+
+        etag = message_list_etag(request, channel_id)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        return response
 
     def perform_create(self, serializer):
         serializer.save(sender=self.request.user)
@@ -96,8 +179,11 @@ class MessageViewSet(viewsets.ModelViewSet):
             new_message.voice_duration = message.voice_duration
             new_message.save()
             
+        # Same stored files, one more reference each
         for att in message.attachments.all():
-            Attachment.objects.create(message=new_message, file=att.file)
+            Attachment.objects.create(
+                message=new_message, file=att.file, file_size=att.file_size, blob=BlobService.share(att)
+            )
 
         self._broadcast(new_message, 'chat_message')
 
@@ -232,7 +318,9 @@ class MessageViewSet(viewsets.ModelViewSet):
                     project=channel.shared_project,
                     uploader=request.user,
                     file=attachment.file,
-                    name=attachment.file.name or f"File from message"
+                    file_size=attachment.file_size,
+                    blob=BlobService.share(attachment),
+                    name=str(attachment.file).split('/')[-1] or f"File from message"
                 )
                 files_added += 1
             
@@ -319,5 +407,5 @@ class MessageViewSet(viewsets.ModelViewSet):
             
         async_to_sync(channel_layer.group_send)(
             f'chat_{channel_id}',
-            data
+            broadcast.encode(data)
         )
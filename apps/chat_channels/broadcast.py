@@ -0,0 +1,114 @@
+"""
+Chat group events with pre-serialized client frames.
+
+A group event is delivered to every consumer in ``chat_<channel_id>``; if
+each one built and ``json.dumps``-ed its own copy of the client frame, one
+message would be encoded once per subscriber on the event loop. Instead the
+producer (``ChatConsumer.receive``, ``MessageViewSet._broadcast``, the
+message views) calls :func:`encode`, which serializes the frame once per
+wire protocol (see ``wire.py``) and carries the results through the channel
+layer under ``frames``; consumers forward the one their client speaks. Anything a consumer would need to decide whether to
+forward goes next to it as plain metadata, so no consumer decodes a frame.
+
+Events without ``frames`` (e.g. from a producer that predates this) are
+still rendered by the consumer with :func:`render`.
+"""
+
+from .wire import encode_all
+
+
+def _chat_message(event):
+    return {
+        'type': 'chat_message',
+        'message': event.get('message', ''),
+        'message_type': event.get('message_type', 'TEXT'),
+        'emoji_count': event.get('emoji_count'),
+        'status': event.get('status', 'SENT'),
+        'sender_id': event['sender_id'],
+        'sender_name': event['sender_name'],
+        'sender_avatar': event['sender_avatar'],
+        'message_id': event['message_id'],
+        'timestamp': event['timestamp'],
+        'voice_message_url': event.get('voice_message_url'),
+        'voice_duration': event.get('voice_duration'),
+        'attachments': event.get('attachments', []),
+        'is_pinned': event.get('is_pinned', False),
+        'is_starred': event.get('is_starred', False),
+        'parent_details': event.get('parent_details')
+    }
+
+
+# Group event type -> client frame
+FRAME_BUILDERS = {
+    'chat_message': _chat_message,
+    'typing_state': lambda event: {
+        'type': 'typing',
+        'typers': event['typers']
+    },
+    'message_update': lambda event: {
+        'type': 'message_update',
+        'message_id': event['message_id'],
+        'message': event['message']
+    },
+    'message_deleted': lambda event: {
+        'type': 'message_delete',
+        'message_id': event['message_id'],
+        'deleted_at': event.get('deleted_at'),
+        'deleted_by': event.get('deleted_by')
+    },
+    'message_read_receipt': lambda event: {
+        'type': 'read_receipt',
+        'message_id': event['message_id'],
+        'read_up_to': event.get('read_up_to'),
+        'user_id': event['user_id']
+    },
+    'message_reaction_delta': lambda event: {
+        'type': 'reaction_delta',
+        'message_id': event['message_id'],
+        'emoji': event['emoji'],
+        'delta': event['delta'],
+        'user_id': event['user_id'],
+        'count': event['count']
+    },
+    'attachment_progress': lambda event: {
+        'type': 'upload_progress',
+        'message_id': event['message_id'],
+        'user_id': event['user_id'],
+        'index': event['index'],
+        'name': event['name'],
+        'state': event['state'],
+        'done': event['done'],
+        'total': event['total']
+    },
+    'message_pinned': lambda event: {
+        'type': 'message_pinned',
+        'message_id': event['message_id'],
+        'is_pinned': True
+    },
+    'message_unpinned': lambda event: {
+        'type': 'message_unpinned',
+        'message_id': event['message_id'],
+        'is_pinned': False
+    },
+    'user_status_change': lambda event: {
+        'type': 'presence',
+        'user_id': event['user_id'],
+        'status': event['status']
+    },
+}
+
+
+def render(event):
+    """The client frame for a group event, serialized per wire protocol."""
+    frames = event.get('frames')
+    if frames is None:
+        frames = encode_all(FRAME_BUILDERS[event['type']](event))
+    return frames
+
+
+def encode(event, **metadata):
+    """
+    Return a group event carrying the serialized frame plus the dispatch
+    ``type`` and any ``metadata``, ready for ``group_send``.
+    """
+    return {**metadata, 'type': event['type'], 'frames': render(event)}
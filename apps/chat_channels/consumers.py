@@ -1,17 +1,28 @@
-import json
+import asyncio
+import uuid
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 from .models import Channel, Message
+from . import broadcast, reactions, read_state
+from .outbound import OutboundQueueMixin
+from .wire import WireProtocolMixin
+from .typing_state import TypingTracker
+from .access import can_view_channel
+from apps.accounts.services import PresenceService
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
-class ChatConsumer(AsyncWebsocketConsumer):
+class ChatConsumer(OutboundQueueMixin, WireProtocolMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.channel_id = self.scope['url_route']['kwargs']['channel_id']
         self.room_group_name = f'chat_{self.channel_id}'
         self.user = self.scope["user"]
+        self.pending_reads = set()
+        self.read_flush_task = None
 
         if not self.user.is_authenticated:
             await self.close()
@@ -30,20 +41,15 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
         await self.accept()
 
-        # Update user status to ONLINE
-        await self.update_user_status('ONLINE')
-        
-        # Broadcast presence
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'user_status_change',
-                'user_id': self.user.id,
-                'status': 'ONLINE'
-            }
-        )
+        # Register with the presence service; broadcast only a real transition
+        status = await self.update_user_status('connect')
+        await self.broadcast_presence(status)
 
     async def disconnect(self, close_code):
+        await self.flush_read_state()
+        if hasattr(self, 'room_group_name') and self.user.is_authenticated:
+            await self.set_typing(False)
+
         # Leave room group
         if hasattr(self, 'room_group_name'):
             await self.channel_layer.group_discard(
@@ -51,32 +57,38 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
 
-            # Update user status to OFFLINE
-            await self.update_user_status('OFFLINE')
-            
-            # Broadcast presence
+            if self.user.is_authenticated:
+                status = await self.update_user_status('disconnect')
+                await self.broadcast_presence(status)
+
+    async def broadcast_presence(self, status):
+        if not status:
+            return
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            broadcast.encode(PresenceService.payload(self.user.id, status, event_type='user_status_change'))
+        )
+        if self.user.organization_id:
             await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'user_status_change',
-                    'user_id': self.user.id,
-                    'status': 'OFFLINE'
-                }
+                f'presence_org_{self.user.organization_id}',
+                PresenceService.payload(self.user.id, status)
             )
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         try:
-            data = json.loads(text_data)
-        except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({
+            data = self.decode_frame(text_data, bytes_data)
+        except ValueError:
+            await self.send_message({
                 'type': 'error',
                 'message': 'Invalid message format'
-            }))
+            })
             return
         
         message_type = data.get('type', 'chat_message')
 
         if message_type == 'chat_message':
+            # Sending a message ends the sender's typing
+            await self.set_typing(False)
             message_id = data.get('message_id')
             content = data.get('message', '')
             voice_url = data.get('voice_message_url')
@@ -85,10 +97,10 @@ class ChatConsumer(AsyncWebsocketConsumer):
             
             # Validate message content
             if not content and not voice_url and not attachments:
-                await self.send(text_data=json.dumps({
+                await self.send_message({
                     'type': 'error',
                     'message': 'Message cannot be empty'
-                }))
+                })
                 return
             
             # Get org name safely
@@ -122,12 +134,14 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 # Update status if needed
                 await self.update_message_type_status(message_id, broadcast_data['message_type'], 'SENT')
                 
-                await self.channel_layer.group_send(self.room_group_name, broadcast_data)
+                await self.channel_layer.group_send(self.room_group_name, broadcast.encode(broadcast_data))
             elif content or voice_url:
                 # New message to save
                 msg_type = broadcast_data['message_type']
                 saved_message = await self.save_message(content, parent_id, msg_type)
                 broadcast_data['message_id'] = str(saved_message.id)
+                broadcast_data['message_type'] = saved_message.message_type
+                broadcast_data['emoji_count'] = saved_message.emoji_count
                 broadcast_data['timestamp'] = saved_message.created_at.strftime('%b %d, %I:%M %p')
                 if parent_id:
                     broadcast_data['parent_details'] = await self.get_message_summary(parent_id)
@@ -136,7 +150,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 await self.trigger_notifications(saved_message)
                 
                 # Send to room
-                await self.channel_layer.group_send(self.room_group_name, broadcast_data)
+                await self.channel_layer.group_send(self.room_group_name, broadcast.encode(broadcast_data))
 
         elif message_type == 'message_edit':
             message_id = data.get('message_id')
@@ -148,11 +162,11 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     # Send updated message to room group
                     await self.channel_layer.group_send(
                         self.room_group_name,
-                        {
+                        broadcast.encode({
                             'type': 'message_update',
                             'message_id': message_id,
                             'message': content
-                        }
+                        })
                     )
         elif message_type == 'message_delete':
             message_id = data.get('message_id')
@@ -161,49 +175,33 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 if success:
                     await self.channel_layer.group_send(
                         self.room_group_name,
-                        {
+                        broadcast.encode({
                             'type': 'message_deleted',
                             'message_id': message_id,
                             'deleted_at': deleted_at.isoformat() if deleted_at else None,
                             'deleted_by': self.user.id
-                        }
+                        })
                     )
-        elif message_type == 'message_read':
-            message_id = data.get('message_id')
-            if message_id:
-                await self.mark_message_read(message_id)
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'message_read_receipt',
-                        'message_id': message_id,
-                        'user_id': self.user.id
-                    }
-                )
+        elif message_type in ('message_read', 'read_up_to'):
+            # "I have read up to this message"; writes and receipts are
+            # debounced so scrolling past many messages costs one of each
+            self.queue_read(data.get('message_id'))
         elif message_type == 'message_reaction':
             message_id = data.get('message_id')
             emoji = data.get('emoji')
             if message_id and emoji:
-                reaction_data = await self.toggle_reaction(message_id, emoji)
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'message_reaction_update',
-                        'message_id': message_id,
-                        'reactions': reaction_data
-                    }
-                )
+                delta = await self.toggle_reaction(message_id, emoji)
+                if delta:
+                    await self.channel_layer.group_send(self.room_group_name, broadcast.encode(delta))
         elif message_type == 'typing':
-            # Send typing indicator to room group (excluding the sender)
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'user_typing',
-                    'sender_id': self.user.id,
-                    'sender_name': self.user.get_full_name(),
-                    'is_typing': data.get('is_typing', False)
-                }
-            )
+            # Coalesced: at most one aggregated frame per interval (see typing_state.py)
+            await self.set_typing(bool(data.get('is_typing', False)))
+        elif message_type == 'heartbeat':
+            # Keeps this connection live in PresenceService for clients that
+            # only hold a chat socket (no presence topic)
+            status = await self.update_user_status('heartbeat')
+            await self.broadcast_presence(status)
+            await self.send_message({'type': 'pong'})
         elif message_type == 'forward_message':
             # Handle message forwarding
             message_id = data.get('message_id')
@@ -213,177 +211,93 @@ class ChatConsumer(AsyncWebsocketConsumer):
             if message_id and target_channel:
                 forwarded_msg = await self.forward_message(message_id, target_channel, content)
                 if forwarded_msg:
-                    await self.send(text_data=json.dumps({
+                    await self.send_message({
                         'type': 'forward_success',
                         'message': 'Message forwarded successfully'
-                    }))
-
-    async def chat_message(self, event):
-        # Send message to WebSocket
-        await self.send(text_data=json.dumps({
-            'type': 'chat_message',
-            'message': event.get('message', ''),
-            'message_type': event.get('message_type', 'TEXT'),
-            'status': event.get('status', 'SENT'),
-            'sender_id': event['sender_id'],
-            'sender_name': event['sender_name'],
-            'sender_avatar': event['sender_avatar'],
-            'message_id': event['message_id'],
-            'timestamp': event['timestamp'],
-            'voice_message_url': event.get('voice_message_url'),
-            'voice_duration': event.get('voice_duration'),
-            'attachments': event.get('attachments', []),
-            'is_pinned': event.get('is_pinned', False),
-            'is_starred': event.get('is_starred', False),
-            'parent_details': event.get('parent_details')
-        }))
-
-    async def user_typing(self, event):
-        # Send typing indicator to WebSocket (only if it's not the sender themselves)
-        if event['sender_id'] != self.user.id:
-            await self.send(text_data=json.dumps({
-                'type': 'typing',
-                'sender_id': event['sender_id'],
-                'sender_name': event['sender_name'],
-                'is_typing': event['is_typing']
-            }))
-
-    async def message_update(self, event):
-        # Send message update to WebSocket
-        await self.send(text_data=json.dumps({
-            'type': 'message_update',
-            'message_id': event['message_id'],
-            'message': event['message']
-        }))
-
-    async def message_deleted(self, event):
-        # Send message deletion to WebSocket
-        await self.send(text_data=json.dumps({
-            'type': 'message_delete',
-            'message_id': event['message_id'],
-            'deleted_at': event.get('deleted_at'),
-            'deleted_by': event.get('deleted_by')
-        }))
-
-    async def message_read_receipt(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'read_receipt',
-            'message_id': event['message_id'],
-            'user_id': event['user_id']
-        }))
-
-    async def message_reaction_update(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'reaction_update',
-            'message_id': event['message_id'],
-            'reactions': event['reactions']
-        }))
-
-    async def message_pinned(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'message_pinned',
-            'message_id': event['message_id'],
-            'is_pinned': True
-        }))
-
-    async def message_unpinned(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'message_unpinned',
-            'message_id': event['message_id'],
-            'is_pinned': False
-        }))
-
-    async def user_status_change(self, event):
-        # Send status change to WebSocket
-        await self.send(text_data=json.dumps({
-            'type': 'presence',
-            'user_id': event['user_id'],
-            'status': event['status']
-        }))
+                    })
+
+    # Group event handlers: the frame was serialized once by the producer
+    # (see broadcast.py) and is forwarded as is
+
+    async def send_frame(self, event):
+        # Queued, not sent inline: a slow reader must not stall this consumer
+        await self.queue_event(event)
+
+    chat_message = send_frame
+    typing_state = send_frame
+    message_update = send_frame
+    message_deleted = send_frame
+    message_read_receipt = send_frame
+    message_reaction_delta = send_frame
+    attachment_progress = send_frame
+    message_pinned = send_frame
+    message_unpinned = send_frame
+    user_status_change = send_frame
 
     async def trigger_notifications(self, message):
         """Logic to determine who needs a notification for this new message."""
-        from apps.accounts.models import Notification, User
+        from apps.accounts.services import NotificationFanoutService
+        
+        notifications = await self.build_notifications(message)
+        await NotificationFanoutService.adeliver(notifications)
+
+    @database_sync_to_async
+    def build_notifications(self, message):
+        """Collect mention, reply and DM notifications for one message, resolving each audience in a single query."""
+        from apps.accounts.models import User
+        from apps.accounts.services import NotificationFanoutService
         from django.urls import reverse
         import re
         
-        channel = await database_sync_to_async(lambda: message.channel)()
-        channel_type = await database_sync_to_async(lambda: channel.channel_type)()
+        channel = message.channel
         channel_url = reverse('chat_channels:channel_detail', kwargs={'pk': str(channel.id)})
+        sender_name = self.user.get_full_name()
+        notifications = []
+        recipient_ids = {self.user.id} # Track who we've notified to avoid duplicates
         
-        # 1. Handle Mentions (@username)
-        mentions = re.findall(r'@(\w+)', message.content)
-        recipient_ids = set() # Track who we've notified to avoid duplicates
+        def add(ids, title, content, notification_type):
+            ids = [i for i in ids if i not in recipient_ids]
+            recipient_ids.update(ids)
+            notifications.extend(NotificationFanoutService.build(
+                ids, title, content,
+                notification_type=notification_type,
+                sender=self.user,
+                link=channel_url
+            ))
         
+        # 1. Handle Mentions (@username)
+        mentions = set(re.findall(r'@(\w+)', message.content))
         if mentions:
-            for username in set(mentions):
-                try:
-                    recipient = await database_sync_to_async(User.objects.get)(username=username)
-                    if recipient.id != self.user.id:
-                        notification = await database_sync_to_async(Notification.notify)(
-                            recipient=recipient,
-                            sender=self.user,
-                            title=f"Mentioned in #{channel.name}",
-                            content=f"{self.user.get_full_name()} mentioned you: {message.content[:50]}...",
-                            notification_type='MENTION',
-                            link=channel_url
-                        )
-                        await self.broadcast_notification(recipient.id, notification)
-                        recipient_ids.add(recipient.id)
-                except User.DoesNotExist:
-                    continue
-                except Exception: # nosec
-                    # Log unexpected errors if needed, but continue to next mention
-                    continue
+            add(
+                User.objects.filter(username__in=mentions).values_list('id', flat=True),
+                f"Mentioned in #{channel.name}",
+                f"{sender_name} mentioned you: {message.content[:50]}...",
+                'MENTION'
+            )
         
         # 2. Handle Replies (Notify original sender)
-        parent = await database_sync_to_async(lambda: message.parent_message)()
-        if parent:
-            parent_sender = await database_sync_to_async(lambda: parent.sender)()
-            if parent_sender.id != self.user.id and parent_sender.id not in recipient_ids:
-                notification = await database_sync_to_async(Notification.notify)(
-                    recipient=parent_sender,
-                    sender=self.user,
-                    title=f"New reply in #{channel.name}",
-                    content=f"{self.user.get_full_name()} replied to your message: {message.content[:50]}...",
-                    notification_type='MESSAGE',
-                    link=channel_url
+        if message.parent_message_id:
+            parent_sender_id = Message.all_objects.filter(
+                pk=message.parent_message_id
+            ).values_list('sender_id', flat=True).first()
+            if parent_sender_id:
+                add(
+                    [parent_sender_id],
+                    f"New reply in #{channel.name}",
+                    f"{sender_name} replied to your message: {message.content[:50]}...",
+                    'MESSAGE'
                 )
-                await self.broadcast_notification(parent_sender.id, notification)
-                recipient_ids.add(parent_sender.id)
 
         # 3. Handle Direct Messages (Notify the other person if not already notified)
-        if channel_type == 'DIRECT':
-            other_members = await database_sync_to_async(
-                lambda: list(channel.members.exclude(id=self.user.id))
-            )()
-            
-            for recipient in other_members:
-                if recipient.id not in recipient_ids:
-                    notification = await database_sync_to_async(Notification.notify)(
-                        recipient=recipient,
-                        sender=self.user,
-                        title=f"New message from {self.user.get_full_name()}",
-                        content=message.content[:100],
-                        notification_type='MESSAGE',
-                        link=channel_url
-                    )
-                    await self.broadcast_notification(recipient.id, notification)
-
-    async def broadcast_notification(self, recipient_id, notification):
-        """Send a notification message to a specific user's notification group."""
-        await self.channel_layer.group_send(
-            f"notifications_{recipient_id}",
-            {
-                'type': 'send_notification',
-                'id': str(notification.id),
-                'title': notification.title,
-                'content': notification.content,
-                'notification_type': notification.notification_type,
-                'link': notification.link,
-                'created_at': "Just now"
-            }
-        )
+        if channel.channel_type == 'DIRECT':
+            add(
+                channel.members.values_list('id', flat=True),
+                f"New message from {sender_name}",
+                message.content[:100],
+                'MESSAGE'
+            )
+        
+        return notifications
 
     @database_sync_to_async
     def get_user_org_name(self):
@@ -393,11 +307,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def check_channel_access(self):
-        try:
-            channel = Channel.objects.get(id=self.channel_id)
-            return channel.can_user_view(self.user)
-        except Channel.DoesNotExist:
-            return False
+        # Cached id-set lookup: no Channel fetch or member scan per connect
+        return can_view_channel(self.user, self.channel_id)
 
     @database_sync_to_async
     def get_message_summary(self, message_id):
@@ -421,32 +332,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
             except Message.DoesNotExist:
                 pass
         
-        # Auto-detect emoji-only messages if type is TEXT
-        if message_type == 'TEXT' and content:
-            import re
-            emoji_pattern = re.compile(
-                "["
-                "\U0001F600-\U0001F64F"  # emoticons
-                "\U0001F300-\U0001F5FF"  # symbols & pictographs
-                "\U0001F680-\U0001F6FF"  # transport & map symbols
-                "\U0001F1E0-\U0001F1FF"  # flags (iOS)
-                "\U00002702-\U000027B0"  # dingbats
-                "\U000024C2-\U0001F251"
-                "\U0001F900-\U0001F9FF"  # supplemental symbols
-                "\U0001FA00-\U0001FA6F"  # extended symbols
-                "\U00002600-\U000026FF"  # miscellaneous symbols
-                "\U00002700-\U000027BF"  # dingbats
-                "\U0001F191-\U0001F19A"  # enclosed characters
-                "]+", 
-                flags=re.UNICODE
-            )
-            text_without_emoji = emoji_pattern.sub('', content.strip()).strip()
-            has_emojis = bool(emoji_pattern.search(content))
-            
-            # If only emojis and no other text, mark as EMOJI type
-            if has_emojis and not text_without_emoji:
-                message_type = 'EMOJI'
-                
+        # Message.save() turns emoji-only TEXT into EMOJI
         return Message.objects.create(
             channel=channel,
             sender=self.user,
@@ -500,18 +386,79 @@ class ChatConsumer(AsyncWebsocketConsumer):
         except Message.DoesNotExist:
             return False, None
 
-    @database_sync_to_async
-    def mark_message_read(self, message_id):
-        from .models import MessageReadReceipt
+    def queue_read(self, message_id):
         try:
-            message = Message.objects.get(id=message_id)
-            MessageReadReceipt.objects.get_or_create(
-                message=message,
-                user=self.user
+            message_id = uuid.UUID(str(message_id))
+        except ValueError:
+            return
+        self.pending_reads.add(message_id)
+        if self.read_flush_task is None:
+            self.read_flush_task = asyncio.ensure_future(self.flush_read_state_later())
+
+    async def flush_read_state_later(self):
+        await asyncio.sleep(getattr(settings, 'READ_RECEIPT_DEBOUNCE', 1.0))
+        self.read_flush_task = None
+        await self.flush_read_state()
+
+    async def flush_read_state(self):
+        pending = self.pending_reads
+        if not pending:
+            return
+        if self.read_flush_task is not None:
+            self.read_flush_task.cancel()
+            self.read_flush_task = None
+        self.pending_reads = set()
+
+        watermark = await self.mark_read_up_to(pending)
+        if watermark:
+            created_at, message_id = watermark
+            await self.channel_layer.group_send(
+                self.room_group_name,
+                broadcast.encode({
+                    'type': 'message_read_receipt',
+                    'message_id': str(message_id),
+                    'read_up_to': created_at.isoformat(),
+                    'user_id': self.user.id
+                })
             )
-            return True
-        except Message.DoesNotExist:
-            return False
+
+    async def set_typing(self, is_typing):
+        if await self.update_typing(is_typing) and await self.claim_typing_broadcast():
+            asyncio.ensure_future(self.broadcast_typing())
+
+    async def broadcast_typing(self):
+        """Send the channel's typer list once per interval while anyone is typing."""
+        while True:
+            await asyncio.sleep(TypingTracker.interval())
+            typers, changed = await self.typing_snapshot()
+            if changed:
+                await self.channel_layer.group_send(self.room_group_name, broadcast.encode(TypingTracker.payload(typers)))
+            if not typers and not await self.finish_typing_broadcast():
+                return
+
+    @database_sync_to_async
+    def update_typing(self, is_typing):
+        return TypingTracker.update(self.channel_id, self.user.id, self.user.get_full_name(), is_typing)
+
+    @database_sync_to_async
+    def claim_typing_broadcast(self):
+        return TypingTracker.claim_broadcast(self.channel_id)
+
+    @database_sync_to_async
+    def typing_snapshot(self):
+        return TypingTracker.snapshot(self.channel_id)
+
+    @database_sync_to_async
+    def finish_typing_broadcast(self):
+        return TypingTracker.finish(self.channel_id)
+
+    @database_sync_to_async
+    def mark_read_up_to(self, message_ids):
+        """Advance the read watermark to the newest of ``message_ids``; returns it if it moved."""
+        watermark = read_state.latest_message(self.channel_id, message_ids)
+        if watermark and read_state.mark_read(self.user.id, self.channel_id, *watermark):
+            return watermark
+        return None
 
     @database_sync_to_async
     def forward_message(self, message_id, target_channel_id, content):
@@ -546,22 +493,18 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def toggle_reaction(self, message_id, emoji):
-        from .models import MessageReaction
         try:
-            message = Message.objects.get(id=message_id)
-            reaction, created = MessageReaction.objects.get_or_create(
-                message=message,
-                user=self.user,
-                emoji=emoji
-            )
-            if not created:
-                reaction.delete()
-            
-            # Return fresh summary
-            return message.reaction_summary
-        except Message.DoesNotExist:
-            return {}
+            return reactions.toggle_reaction(message_id, self.user, emoji, channel_id=self.channel_id)
+        except ValidationError:
+            return None
 
     @database_sync_to_async
-    def update_user_status(self, status):
-        User.objects.filter(id=self.user.id).update(status=status, last_seen=timezone.now())
+    def update_user_status(self, action):
+        if action == 'connect':
+            status = PresenceService.connect(self.user.id, self.user.organization_id, self.channel_name)
+        elif action == 'heartbeat':
+            status = PresenceService.heartbeat(self.user.id, self.user.organization_id, self.channel_name)
+        else:
+            status = PresenceService.disconnect(self.user.id, self.channel_name)
+        PresenceService.maybe_flush()
+        return status
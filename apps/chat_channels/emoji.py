@@ -0,0 +1,44 @@
+"""
+Emoji classification for message text.
+
+One precompiled pattern shared by the consumer, views and template filters.
+``Message.save`` classifies the text whenever it changes and stores the
+result (``message_type`` EMOJI/TEXT, ``emoji_count``), so rendering a page of
+messages reads fields instead of running the pattern per message.
+"""
+
+import re
+from collections import namedtuple
+
+EMOJI_RANGES = (
+    "\U0001F600-\U0001F64F"  # emoticons
+    "\U0001F300-\U0001F5FF"  # symbols & pictographs
+    "\U0001F680-\U0001F6FF"  # transport & map symbols
+    "\U0001F1E0-\U0001F1FF"  # flags (iOS)
+    "\U00002702-\U000027B0"  # dingbats
+    "\U000024C2-\U0001F251"
+    "\U0001F900-\U0001F9FF"  # supplemental symbols
+    "\U0001FA00-\U0001FA6F"  # extended symbols
+    "\U00002600-\U000026FF"  # miscellaneous symbols
+    "\U00002700-\U000027BF"  # dingbats
+    "\U0001F191-\U0001F19A"  # enclosed characters
+)
+
+EMOJI_PATTERN = re.compile(f"[{EMOJI_RANGES}]", flags=re.UNICODE)
+
+# Everything that is neither an emoji nor whitespace
+NON_EMOJI_PATTERN = re.compile(f"[^{EMOJI_RANGES}\\s]", flags=re.UNICODE)
+
+EmojiClassification = namedtuple('EmojiClassification', ['is_emoji_only', 'emoji_count', 'message_type'])
+
+
+def classify_text(text):
+    """
+    Classify message text. ``message_type`` is ``'EMOJI'`` for emoji-only
+    text (like WhatsApp's large emoji bubbles), otherwise ``'TEXT'``.
+    """
+    if not text or not isinstance(text, str):
+        return EmojiClassification(False, 0, 'TEXT')
+    emoji_count = len(EMOJI_PATTERN.findall(text))
+    is_emoji_only = emoji_count > 0 and NON_EMOJI_PATTERN.search(text) is None
+    return EmojiClassification(is_emoji_only, emoji_count, 'EMOJI' if is_emoji_only else 'TEXT')
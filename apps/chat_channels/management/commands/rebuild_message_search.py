@@ -0,0 +1,48 @@
+"""
+Management command to (re)build the message full-text search index.
+
+Usage:
+    python manage.py rebuild_message_search [--batch-size 1000]
+"""
+
+from django.core.management.base import BaseCommand
+from apps.chat_channels.models import Message
+from apps.chat_channels.search import get_search_backend, index_messages
+
+
+class Command(BaseCommand):
+    help = 'Index every message for full-text search (backfill after migrating, or after renaming users)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Messages indexed per batch'
+        )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend.vendor is None:
+            self.stdout.write(self.style.ERROR(
+                'No full-text index is available on this database; searches use the unindexed fallback'
+            ))
+            return
+
+        batch_size = max(1, options['batch_size'])
+        queryset = Message.objects.select_related('sender').order_by('pk')
+        total = 0
+        last_pk = None
+        while True:
+            batch = queryset.filter(pk__gt=last_pk) if last_pk else queryset
+            batch = list(batch[:batch_size])
+            if not batch:
+                break
+            index_messages(batch)
+            total += len(batch)
+            last_pk = batch[-1].pk
+            self.stdout.write(f'  ✓ {total} message(s) indexed')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\nCompleted: {total} message(s) indexed with the {backend.vendor} backend'
+        ))
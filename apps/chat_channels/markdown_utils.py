@@ -1,10 +1,18 @@
 """
 Markdown to HTML conversion utilities for messages.
 Supports basic markdown with XSS protection.
+
+Rendering is a single pass over the (escaped) text with patterns compiled
+once at import. Every tag in the output is produced here from escaped input,
+so the result only ever contains ALLOWED_TAGS/ALLOWED_ATTRIBUTES and link
+targets are limited to ALLOWED_PROTOCOLS without a separate sanitizer pass.
+Repeated content (forwards, copy-paste) is served from a bounded LRU.
 """
 
 import re
-import bleach
+from functools import lru_cache
+
+from django.conf import settings
 from django.utils.html import escape
 
 
@@ -21,6 +29,105 @@ ALLOWED_ATTRIBUTES = {
     'span': ['class']
 }
 
+ALLOWED_PROTOCOLS = ('http', 'https', 'mailto')
+
+# ```lang\n...``` blocks; their contents are not formatted further
+CODE_BLOCK = re.compile(r'```(\w+)?\n(.*?)```', re.DOTALL)
+
+# Block-level prefixes (# heading, > quote, - item), matched on escaped lines
+LINE = re.compile(
+    r'^(?:(?P<heading>#{1,5}) (?P<heading_text>.+)'
+    r'|&gt; (?P<quote>.+)'
+    r'|[*\-] (?P<item>.*))$'
+)
+
+# Inline spans, tried left to right at each position
+INLINE = re.compile(
+    r'`(?P<code>[^`]+)`'
+    r'|\*\*(?P<strong>.+?)\*\*'
+    r'|__(?P<strong_alt>.+?)__'
+    r'|\*(?P<em>.+?)\*'
+    r'|(?<!_)_(?P<em_alt>.+?)_(?!_)'
+    r'|~~(?P<del>.+?)~~'
+    r'|\[(?P<link_text>[^\]]+)\]\((?P<href>[^\)]+)\)'
+    r'|(?P<url>https?://[^\s<>"]+)'
+)
+
+SCHEME = re.compile(r'^([a-zA-Z][a-zA-Z0-9+.\-]*):')
+
+FORMATTING = re.compile(
+    r'\*\*(.+?)\*\*'    # Bold
+    r'|__(.+?)__'       # Bold
+    r'|\*(.+?)\*'       # Italic
+    r'|_(.+?)_'         # Italic
+    r'|`(.+?)`'         # Code
+    r'|```'             # Code block
+    r'|\[.+?\]\(.+?\)'  # Link
+    r'|^#{1,6} '        # Headers
+    r'|^(?:&gt;|>) '    # Blockquote
+    r'|^[\*\-] '        # List
+    r'|~~(.+?)~~',      # Strikethrough
+    re.MULTILINE
+)
+
+LINK_ATTRS = 'target="_blank" rel="noopener noreferrer"'
+
+
+def _safe_href(href):
+    """Return ``href`` if it is relative or uses an allowed protocol, else None."""
+    if ':' not in href:
+        return href
+    match = SCHEME.match(href)
+    if match and match.group(1).lower() in ALLOWED_PROTOCOLS:
+        return href
+    return None
+
+
+def _render_span(match):
+    kind = match.lastgroup
+    if kind == 'href':
+        text = _render_inline(match.group('link_text'))
+        href = _safe_href(match.group('href'))
+        return f'<a href="{href}" {LINK_ATTRS}>{text}</a>' if href else text
+    value = match.group(kind)
+    if kind == 'code':
+        return f'<code>{value}</code>'
+    if kind == 'url':
+        return f'<a href="{value}" {LINK_ATTRS}>{value}</a>'
+    tag = {'strong': 'strong', 'strong_alt': 'strong', 'em': 'em', 'em_alt': 'em', 'del': 'del'}[kind]
+    return f'<{tag}>{_render_inline(value)}</{tag}>'
+
+
+def _render_inline(text):
+    return INLINE.sub(_render_span, text)
+
+
+def _render_lines(text):
+    lines = []
+    in_list = False
+    for line in text.split('\n'):
+        match = LINE.match(line)
+        item = match.group('item') if match else None
+        if item is not None:
+            if not in_list:
+                lines.append('<ul>')
+                in_list = True
+            lines.append(f'<li>{_render_inline(item)}</li>')
+            continue
+        if in_list:
+            lines.append('</ul>')
+            in_list = False
+        if not match:
+            lines.append(_render_inline(line))
+        elif match.group('heading'):
+            level = len(match.group('heading'))
+            lines.append(f'<h{level}>{_render_inline(match.group("heading_text"))}</h{level}>')
+        else:
+            lines.append(f'<blockquote>{_render_inline(match.group("quote"))}</blockquote>')
+    if in_list:
+        lines.append('</ul>')
+    return '<br>'.join(lines)
+
 
 def convert_markdown_to_html(text):
     """
@@ -29,91 +136,19 @@ def convert_markdown_to_html(text):
     """
     if not text or not isinstance(text, str):
         return text
-    
+
     # Start with escaped HTML to prevent XSS
     html = escape(text)
-    
-    # Code blocks (must be done first, before inline code)
-    html = re.sub(
-        r'```(\w+)?\n(.*?)```',
-        lambda m: f'<pre><code class="language-{m.group(1) or "text"}">{m.group(2)}</code></pre>',
-        html,
-        flags=re.DOTALL
-    )
-    
-    # Inline code
-    html = re.sub(r'`([^`]+)`', r'<code>\1</code>', html)
-    
-    # Bold (**text** or __text__)
-    html = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', html)
-    html = re.sub(r'__(.+?)__', r'<strong>\1</strong>', html)
-    
-    # Italic (*text* or _text_)
-    html = re.sub(r'\*(.+?)\*', r'<em>\1</em>', html)
-    html = re.sub(r'(?<!_)_(.+?)_(?!_)', r'<em>\1</em>', html)
-    
-    # Strikethrough (~~text~~)
-    html = re.sub(r'~~(.+?)~~', r'<del>\1</del>', html)
-    
-    # Links [text](url)
-    html = re.sub(
-        r'\[([^\]]+)\]\(([^\)]+)\)',
-        r'<a href="\2" target="_blank" rel="noopener noreferrer">\1</a>',
-        html
-    )
-    
-    # Auto-link URLs (only if not already in <a> tag)
-    html = re.sub(
-        r'(?<!href=")(https?://[^\s<>"]+)',
-        r'<a href="\1" target="_blank" rel="noopener noreferrer">\1</a>',
-        html
-    )
-    
-    # Headers (# H1, ## H2, etc.)
-    html = re.sub(r'^##### (.+)$', r'<h5>\1</h5>', html, flags=re.MULTILINE)
-    html = re.sub(r'^#### (.+)$', r'<h4>\1</h4>', html, flags=re.MULTILINE)
-    html = re.sub(r'^### (.+)$', r'<h3>\1</h3>', html, flags=re.MULTILINE)
-    html = re.sub(r'^## (.+)$', r'<h2>\1</h2>', html, flags=re.MULTILINE)
-    html = re.sub(r'^# (.+)$', r'<h1>\1</h1>', html, flags=re.MULTILINE)
-    
-    # Blockquotes (> text)
-    html = re.sub(r'^&gt; (.+)$', r'<blockquote>\1</blockquote>', html, flags=re.MULTILINE)
-    
-    # Unordered lists (- item or * item)
-    lines = html.split('\n')
-    in_list = False
-    result_lines = []
-    
-    for line in lines:
-        if re.match(r'^[\*\-] ', line):
-            if not in_list:
-                result_lines.append('<ul>')
-                in_list = True
-            item = re.sub(r'^[\*\-] ', '', line)
-            result_lines.append(f'<li>{item}</li>')
-        else:
-            if in_list:
-                result_lines.append('</ul>')
-                in_list = False
-            result_lines.append(line)
-    
-    if in_list:
-        result_lines.append('</ul>')
-    
-    html = '\n'.join(result_lines)
-    
-    # Line breaks
-    html = html.replace('\n', '<br>')
-    
-    # Clean up HTML with bleach for security
-    html = bleach.clean(
-        html,
-        tags=ALLOWED_TAGS,
-        attributes=ALLOWED_ATTRIBUTES,
-        strip=True
-    )
-    
-    return html
+
+    parts = []
+    position = 0
+    for block in CODE_BLOCK.finditer(html):
+        parts.append(_render_lines(html[position:block.start()]))
+        code = block.group(2).replace('\n', '<br>')
+        parts.append(f'<pre><code class="language-{block.group(1) or "text"}">{code}</code></pre>')
+        position = block.end()
+    parts.append(_render_lines(html[position:]))
+    return ''.join(parts)
 
 
 def has_markdown_formatting(text):
@@ -122,26 +157,18 @@ def has_markdown_formatting(text):
     """
     if not text or not isinstance(text, str):
         return False
-    
-    markdown_patterns = [
-        r'\*\*(.+?)\*\*',  # Bold
-        r'__(.+?)__',      # Bold
-        r'\*(.+?)\*',      # Italic
-        r'_(.+?)_',        # Italic
-        r'`(.+?)`',        # Code
-        r'```',            # Code block
-        r'\[.+?\]\(.+?\)', # Link
-        r'^#{1,6} ',       # Headers
-        r'^&gt; ',         # Blockquote
-        r'^[\*\-] ',       # List
-        r'~~(.+?)~~',      # Strikethrough
-    ]
-    
-    for pattern in markdown_patterns:
-        if re.search(pattern, text, re.MULTILINE):
-            return True
-    
-    return False
+    return FORMATTING.search(text) is not None
+
+
+@lru_cache(maxsize=getattr(settings, 'MARKDOWN_RENDER_CACHE_SIZE', 1024))
+def render_markdown(text):
+    """
+    Return ``(has_formatting, formatted_content)`` for message text, as stored
+    on ``Message``. Cached per distinct text.
+    """
+    if not has_markdown_formatting(text):
+        return False, None
+    return True, convert_markdown_to_html(text)
 
 
 def extract_links(text):
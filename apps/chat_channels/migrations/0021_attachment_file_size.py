@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-17 01:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat_channels', '0020_call_callparticipant_call_participants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachment',
+            name='file_size',
+            field=models.BigIntegerField(default=0, help_text='Size in bytes'),
+        ),
+    ]
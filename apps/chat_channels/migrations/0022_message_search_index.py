@@ -0,0 +1,44 @@
+# Full-text search storage for messages (see apps/chat_channels/search.py).
+# PostgreSQL gets a tsvector column with a GIN index, SQLite an FTS5 table.
+# Run ``manage.py rebuild_message_search`` afterwards to index existing rows.
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_document tsvector")
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS messages_search_document_gin "
+            "ON messages USING gin (search_document)"
+        )
+    elif vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS message_search USING fts5("
+                "message_id UNINDEXED, body, tokenize='unicode61 remove_diacritics 2')"
+            )
+        except Exception:
+            # SQLite built without FTS5: search falls back to icontains
+            pass
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS messages_search_document_gin")
+        schema_editor.execute("ALTER TABLE messages DROP COLUMN IF EXISTS search_document")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS message_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat_channels', '0021_attachment_file_size'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+def backfill_emoji_count(apps, schema_editor):
+    from apps.chat_channels.emoji import classify_text
+
+    Message = apps.get_model('chat_channels', 'Message')
+    batch = []
+    for message in Message.objects.filter(message_type='EMOJI').only('id', 'content').iterator(chunk_size=1000):
+        message.emoji_count = classify_text(message.content).emoji_count
+        batch.append(message)
+        if len(batch) >= 1000:
+            Message.objects.bulk_update(batch, ['emoji_count'])
+            batch = []
+    if batch:
+        Message.objects.bulk_update(batch, ['emoji_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat_channels', '0022_message_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='emoji_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of emojis in the content, stored when the content is saved'),
+        ),
+        migrations.RunPython(backfill_emoji_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.9 on 2026-10-17 01:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def watermarks_from_receipts(apps, schema_editor):
+    # The newest message each user has a receipt for becomes their watermark
+    MessageReadReceipt = apps.get_model('chat_channels', 'MessageReadReceipt')
+    ChannelReadState = apps.get_model('chat_channels', 'ChannelReadState')
+    rows = MessageReadReceipt.objects.order_by(
+        'user_id', 'message__channel_id', '-message__created_at', '-message_id'
+    ).values_list('user_id', 'message__channel_id', 'message__created_at', 'message_id')
+    states = {}
+    for user_id, channel_id, created_at, message_id in rows.iterator(chunk_size=2000):
+        states.setdefault((user_id, channel_id), (created_at, message_id))
+
+    # Members (and posters) without receipts start caught up at the newest
+    # message, rather than with the whole history unread
+    Channel = apps.get_model('chat_channels', 'Channel')
+    Message = apps.get_model('chat_channels', 'Message')
+    readers = {}
+    for user_id, channel_id in Channel.members.through.objects.values_list('user_id', 'channel_id').iterator():
+        readers.setdefault(channel_id, set()).add(user_id)
+    for user_id, channel_id in Message.objects.values_list('sender_id', 'channel_id').distinct().iterator():
+        readers.setdefault(channel_id, set()).add(user_id)
+    for channel_id, user_ids in readers.items():
+        latest = Message.objects.filter(channel_id=channel_id).order_by(
+            '-created_at', '-id'
+        ).values_list('created_at', 'id').first()
+        if latest is None:
+            continue
+        for user_id in user_ids:
+            if user_id is not None:
+                states.setdefault((user_id, channel_id), latest)
+    ChannelReadState.objects.bulk_create([
+        ChannelReadState(user_id=user_id, channel_id=channel_id, last_read_at=created_at, last_read_message_id=message_id)
+        for (user_id, channel_id), (created_at, message_id) in states.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat_channels', '0023_message_emoji_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChannelReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_at', models.DateTimeField(help_text='created_at of the newest message read')),
+                ('last_read_message_id', models.UUIDField(help_text='ID of the newest message read (tie-breaker for equal timestamps)')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('channel', models.ForeignKey(help_text='Channel being read', on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to='chat_channels.channel')),
+                ('user', models.ForeignKey(help_text='User who read the channel', on_delete=django.db.models.deletion.CASCADE, related_name='channel_read_states', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Channel Read State',
+                'verbose_name_plural': 'Channel Read States',
+                'db_table': 'channel_read_states',
+                'unique_together': {('user', 'channel')},
+            },
+        ),
+        migrations.RunPython(watermarks_from_receipts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.9 on 2026-10-17 02:03
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_counters(apps, schema_editor):
+    Channel = apps.get_model('chat_channels', 'Channel')
+    Message = apps.get_model('chat_channels', 'Message')
+    ChannelReadState = apps.get_model('chat_channels', 'ChannelReadState')
+
+    counts = dict(
+        Message.objects.values('channel_id').annotate(n=Count('id')).values_list('channel_id', 'n')
+    )
+    for channel in Channel.objects.filter(pk__in=counts).iterator():
+        latest = Message.objects.filter(channel_id=channel.pk).order_by(
+            '-created_at', '-id'
+        ).values_list('created_at', 'id').first()
+        channel.message_count = counts[channel.pk]
+        channel.last_message_at, channel.last_message_id = latest
+        channel.save(update_fields=['message_count', 'last_message_at', 'last_message_id'])
+
+    for state in ChannelReadState.objects.iterator():
+        state.read_count = Message.objects.filter(channel_id=state.channel_id).filter(
+            Q(created_at__lt=state.last_read_at) |
+            Q(created_at=state.last_read_at, id__lte=state.last_read_message_id)
+        ).count()
+        state.save(update_fields=['read_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat_channels', '0024_channelreadstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, help_text='When the newest message was posted', null=True),
+        ),
+        migrations.AddField(
+            model_name='channel',
+            name='last_message_id',
+            field=models.UUIDField(blank=True, help_text='ID of the newest message', null=True),
+        ),
+        migrations.AddField(
+            model_name='channel',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0, help_text="Messages ever posted; unread counts are this minus the reader's read_count"),
+        ),
+        migrations.AddField(
+            model_name='channelreadstate',
+            name='read_count',
+            field=models.PositiveIntegerField(default=0, help_text='Channel messages at or before the watermark (see Channel.message_count)'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
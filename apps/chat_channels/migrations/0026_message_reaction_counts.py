@@ -0,0 +1,34 @@
+# Generated by Django 5.2.9 on 2026-10-17 02:36
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_reaction_counts(apps, schema_editor):
+    Message = apps.get_model('chat_channels', 'Message')
+    MessageReaction = apps.get_model('chat_channels', 'MessageReaction')
+
+    counts = {}
+    for message_id, emoji, n in MessageReaction.objects.values('message_id', 'emoji').annotate(
+        n=Count('id')
+    ).values_list('message_id', 'emoji', 'n'):
+        counts.setdefault(message_id, {})[emoji] = n
+    for message in Message.objects.filter(pk__in=counts).only('id').iterator():
+        message.reaction_counts = counts[message.pk]
+        message.save(update_fields=['reaction_counts'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat_channels', '0025_channel_activity_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='reaction_counts',
+            field=models.JSONField(blank=True, default=dict, help_text='Emoji -> reaction count, maintained by reactions.toggle_reaction'),
+        ),
+        migrations.RunPython(backfill_reaction_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.9 on 2026-10-17 03:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat_channels', '0026_message_reaction_counts'),
+        ('organizations', '0021_fileblob_projectfile_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachment',
+            name='blob',
+            field=models.ForeignKey(blank=True, help_text='Stored file, shared with identical uploads and forwards', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='organizations.fileblob'),
+        ),
+    ]
@@ -126,6 +126,24 @@ class Channel(models.Model):
         help_text=_("Is this channel read-only? (only admins can post)")
     )
     
+    # Activity (maintained on message create, see read_state.record_message)
+    last_message_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text=_("When the newest message was posted")
+    )
+    
+    last_message_id = models.UUIDField(
+        null=True,
+        blank=True,
+        help_text=_("ID of the newest message")
+    )
+    
+    message_count = models.PositiveIntegerField(
+        default=0,
+        help_text=_("Messages ever posted; unread counts are this minus the reader's read_count")
+    )
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -143,49 +161,28 @@ class Channel(models.Model):
     @property
     def member_count(self):
         """Return number of members in this channel."""
+        if hasattr(self, 'num_members'):
+            return self.num_members
         return self.members.count()
     
     def can_user_post(self, user):
         """Check if user can post in this channel."""
-        if self.read_only:
-            # Only super admins and channel creator can post in read-only channels
-            return user.is_admin or self.created_by == user
-        
-        # In Shared Projects, all project members can usually post unless restricted
-        if self.shared_project:
-            return user in self.shared_project.members.all()
-            
-        return user in self.members.all()
+        from .access import can_post_in_channel
+        return can_post_in_channel(user, self)
     
     def can_user_view(self, user):
         """Check if user can view this channel."""
-        # If it's a shared project channel, only project members can view
-        if self.shared_project:
-            return user in self.shared_project.members.all()
-
-        # Super admins can view everything in their organization
-        if user.is_admin and user.organization == self.organization:
-            return True
-        
-        # Official channels - everyone in org can view
-        if self.channel_type == self.ChannelType.OFFICIAL:
-            return user.organization == self.organization
-        
-        # Department channels - department members can view
-        if self.channel_type == self.ChannelType.DEPARTMENT and self.department:
-            return user in self.department.teams.all().values_list('members', flat=True)
-        
-        # Team channels - team members can view
-        if self.channel_type == self.ChannelType.TEAM and self.team:
-            return user in self.team.members.all()
-        
-        # Private/Project/Direct/Breakout - only members can view
-        return user in self.members.all()
+        from .access import can_view_channel
+        return can_view_channel(user, self)
 
 
 class MessageManager(models.Manager):
     def get_queryset(self):
-        return super().get_queryset().filter(is_deleted=False)
+        # Messages still uploading attachments (see uploads.py) are not listed
+        # anywhere until they are finalized
+        return super().get_queryset().filter(is_deleted=False).exclude(
+            status=self.model.MessageStatus.SENDING
+        )
 
 
 class Message(models.Model):
@@ -250,6 +247,17 @@ class Message(models.Model):
         help_text=_("Whether message contains markdown formatting")
     )
 
+    emoji_count = models.PositiveIntegerField(
+        default=0,
+        help_text=_("Number of emojis in the content, stored when the content is saved")
+    )
+
+    reaction_counts = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text=_("Emoji -> reaction count, maintained by reactions.toggle_reaction")
+    )
+
     channel = models.ForeignKey(
         Channel,
         on_delete=models.CASCADE,
@@ -362,21 +370,35 @@ class Message(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_content = instance.__dict__.get('content')
+        return instance
+
     def save(self, *args, **kwargs):
-        """Override save to process markdown formatting."""
-        if self.content and self.message_type == 'TEXT':
-            from .markdown_utils import convert_markdown_to_html, has_markdown_formatting
-            
-            # Check if content has markdown
-            self.has_formatting = has_markdown_formatting(self.content)
-            
-            # Convert markdown to HTML if present
-            if self.has_formatting:
-                self.formatted_content = convert_markdown_to_html(self.content)
-            else:
-                self.formatted_content = None
-        
+        """Override save to classify and render the content when it changed."""
+        content = self.__dict__.get('content')
+        if content and content != getattr(self, '_saved_content', None):
+            from .emoji import classify_text
+            from .markdown_utils import render_markdown
+
+            derived = {'emoji_count'}
+            classification = classify_text(content)
+            self.emoji_count = classification.emoji_count
+            if self.message_type in (self.MessageType.TEXT, self.MessageType.EMOJI):
+                self.message_type = classification.message_type
+                derived.add('message_type')
+            if self.message_type == self.MessageType.TEXT:
+                self.has_formatting, self.formatted_content = render_markdown(content)
+                derived.update(('has_formatting', 'formatted_content'))
+
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *derived}
+
         super().save(*args, **kwargs)
+        self._saved_content = content
     
     class Meta:
         db_table = 'messages'
@@ -414,22 +436,14 @@ class Message(models.Model):
     
     @property
     def reaction_summary(self):
-        """Return summary of reactions."""
-        reactions = self.reactions.values('emoji').annotate(count=models.Count('id'))
-        return {r['emoji']: r['count'] for r in reactions}
+        """Return summary of reactions (emoji -> count), from the stored counters."""
+        return self.reaction_counts or {}
     
     @property
     def reaction_details(self):
-        """Return detailed reactions with users who reacted."""
-        from collections import defaultdict
-        reactions_dict = defaultdict(list)
-        for reaction in self.reactions.select_related('user').all():
-            reactions_dict[reaction.emoji].append({
-                'user_id': reaction.user.id,
-                'username': reaction.user.get_full_name(),
-                'avatar': reaction.user.avatar.url if reaction.user.avatar else None
-            })
-        return dict(reactions_dict)
+        """Return detailed reactions with users who reacted (one query; prefer ``reactions.reactors``)."""
+        from .reactions import reactors
+        return reactors(self)
 
 
 class Attachment(models.Model):
@@ -453,6 +467,18 @@ class Attachment(models.Model):
         resource_type='auto',
         help_text=_("Attached file")
     )
+    file_size = models.BigIntegerField(
+        default=0,
+        help_text=_("Size in bytes")
+    )
+    blob = models.ForeignKey(
+        'organizations.FileBlob',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        help_text=_("Stored file, shared with identical uploads and forwards")
+    )
     uploaded_at = models.DateTimeField(
         auto_now_add=True
     )
@@ -585,8 +611,58 @@ class MessageReadReceipt(models.Model):
         return f"{self.user.username} read message at {self.read_at}"
 
 
+class ChannelReadState(models.Model):
+    """
+    ChannelReadState model - how far a user has read in a channel.
+
+    Stores a high-water mark ``(last_read_at, last_read_message_id)`` matching
+    the ``(created_at, id)`` order of messages, so everything at or before it
+    counts as read. ``read_count`` is how many channel messages that covers,
+    so the unread count is ``channel.message_count - read_count`` without
+    touching messages. See ``read_state.py``.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='channel_read_states',
+        help_text=_("User who read the channel")
+    )
+
+    channel = models.ForeignKey(
+        Channel,
+        on_delete=models.CASCADE,
+        related_name='read_states',
+        help_text=_("Channel being read")
+    )
+
+    last_read_at = models.DateTimeField(
+        help_text=_("created_at of the newest message read")
+    )
+
+    last_read_message_id = models.UUIDField(
+        help_text=_("ID of the newest message read (tie-breaker for equal timestamps)")
+    )
+
+    read_count = models.PositiveIntegerField(
+        default=0,
+        help_text=_("Channel messages at or before the watermark (see Channel.message_count)")
+    )
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'channel_read_states'
+        verbose_name = _('Channel Read State')
+        verbose_name_plural = _('Channel Read States')
+        unique_together = [['user', 'channel']]
+
+    def __str__(self):
+        return f"{self.user.username} read #{self.channel.name} up to {self.last_read_at}"
+
+
 # SIGNALS (Placed at the bottom to avoid NameErrors)
-from django.db.models.signals import m2m_changed, post_delete
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 from django.urls import reverse
 import cloudinary.uploader
@@ -602,9 +678,30 @@ def delete_message_voice_from_cloudinary(sender, instance, **kwargs):
             except:
                 print(f"Cloudinary deletion error: {e}")
 
+SEARCH_INDEXED_FIELDS = {'content', 'is_deleted', 'sender'}
+
+@receiver(post_save, sender=Message)
+def update_message_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not SEARCH_INDEXED_FIELDS & set(update_fields):
+        return
+    from .search import index_messages
+    try:
+        index_messages([instance])
+    except Exception as e:
+        print(f"Search index error: {e}")
+
+@receiver(post_delete, sender=Message)
+def remove_message_from_search_index(sender, instance, **kwargs):
+    from .search import remove_messages
+    try:
+        remove_messages([instance.pk])
+    except Exception as e:
+        print(f"Search index error: {e}")
+
 @receiver(post_delete, sender=Attachment)
 def delete_attachment_from_cloudinary(sender, instance, **kwargs):
-    if instance.file:
+    # Files with a blob go when its last reference does (see organizations.services.blobs)
+    if instance.file and not instance.blob_id:
         try:
             cloudinary.uploader.destroy(instance.file.public_id)
         except Exception as e:
@@ -612,43 +709,96 @@ def delete_attachment_from_cloudinary(sender, instance, **kwargs):
 
 @receiver(m2m_changed, sender=Channel.members.through)
 def notify_members_added_to_channel(sender, instance, action, pk_set, **kwargs):
-    if action == "post_add":
-        from apps.accounts.models import Notification, User
-        from asgiref.sync import async_to_sync
-        from channels.layers import get_channel_layer
+    if action == "post_add" and pk_set and not kwargs.get('reverse'):
+        from apps.accounts.services import NotificationFanoutService
         
-        channel_layer = get_channel_layer()
-        
-        for user_id in pk_set:
-            try:
-                user = User.objects.get(pk=user_id)
-                if user == instance.created_by:
-                    continue
-                
-                link = reverse('chat_channels:channel_detail', kwargs={'pk': instance.pk})
-                notification = Notification.notify(
-                    recipient=user,
-                    sender=instance.created_by,
-                    title=f"New Channel: #{instance.name}",
-                    content=f"You have been added to the channel #{instance.name}.",
-                    notification_type='CHANNEL',
-                    link=link
-                )
-                
-                # Broadcast via WebSocket
-                async_to_sync(channel_layer.group_send)(
-                    f"notifications_{user.id}",
-                    {
-                        'type': 'send_notification',
-                        'id': str(notification.id),
-                        'title': notification.title,
-                        'content': notification.content,
-                        'notification_type': notification.notification_type,
-                        'link': notification.link,
-                    }
-                )
-            except Exception as e:
-                print(f"Error sending notification: {e}")
+        try:
+            NotificationFanoutService.notify_users(
+                pk_set,
+                exclude=instance.created_by_id,
+                sender=instance.created_by,
+                title=f"New Channel: #{instance.name}",
+                content=f"You have been added to the channel #{instance.name}.",
+                notification_type='CHANNEL',
+                link=reverse('chat_channels:channel_detail', kwargs={'pk': instance.pk})
+            )
+        except Exception as e:
+            print(f"Error sending notification: {e}")
+
+
+# Channel access cache invalidation (see access.py)
+from apps.organizations.models import SharedProject, Team
+from . import access as channel_access
+
+CHANNEL_ACCESS_FIELDS = {'channel_type', 'organization', 'department', 'team', 'shared_project'}
+USER_ACCESS_FIELDS = {'role', 'organization'}
+
+@receiver(m2m_changed, sender=Channel.members.through)
+@receiver(m2m_changed, sender=Team.members.through)
+@receiver(m2m_changed, sender=SharedProject.members.through)
+def invalidate_channel_access_on_membership(sender, instance, action, pk_set, **kwargs):
+    channel_access.invalidate_for_membership_change(instance, action, pk_set, kwargs.get('reverse'))
+
+@receiver(post_save, sender=Channel)
+@receiver(post_save, sender=Team)
+def invalidate_channel_access_on_structure_change(sender, instance, created, update_fields=None, **kwargs):
+    if sender is Channel and update_fields and not CHANNEL_ACCESS_FIELDS & set(update_fields):
+        return
+    if sender is Team and (created or (update_fields and 'department' not in update_fields)):
+        return
+    channel_access.invalidate_all()
+
+@receiver(post_delete, sender=Channel)
+@receiver(post_delete, sender=Team)
+def invalidate_channel_access_on_delete(sender, instance, **kwargs):
+    channel_access.invalidate_all()
+
+@receiver(post_save, sender=User)
+def invalidate_channel_access_on_user_change(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields and not USER_ACCESS_FIELDS & set(update_fields):
+        return
+    channel_access.invalidate_user(instance.pk)
+
+@receiver(post_save, sender=Message)
+def record_channel_activity(sender, instance, created, **kwargs):
+    # A pending upload counts once finalized (uploads.upload_attachments)
+    if not created or instance.status == Message.MessageStatus.SENDING:
+        return
+    from .read_state import record_message
+    try:
+        record_message(instance)
+    except Exception as e:
+        print(f"Channel activity error: {e}")
+
+# Channel activity markers for API ETags (see activity.py)
+from . import activity as channel_activity
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+@receiver(post_save, sender=MessageReaction)
+@receiver(post_delete, sender=MessageReaction)
+@receiver(post_save, sender=Attachment)
+@receiver(post_delete, sender=Attachment)
+def touch_channel_activity(sender, instance, **kwargs):
+    if sender is Message:
+        channel_activity.touch_channel(instance.channel_id)
+    elif sender.message.is_cached(instance):
+        channel_activity.touch_channel(instance.message.channel_id)
+    else:
+        channel_activity.touch_channels(
+            Message.all_objects.filter(pk=instance.message_id).values_list('channel_id', flat=True)
+        )
+
+@receiver(m2m_changed, sender=Message.starred_by.through)
+def touch_channel_activity_on_star(sender, instance, action, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if isinstance(instance, Message):
+        channel_activity.touch_channel(instance.channel_id)
+    elif pk_set:
+        channel_activity.touch_channels(
+            Message.all_objects.filter(pk__in=pk_set).values_list('channel_id', flat=True)
+        )
 
 class ChannelNotificationSettings(models.Model):
     """User-specific notification settings for a channel."""
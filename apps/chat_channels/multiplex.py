@@ -0,0 +1,191 @@
+"""
+One WebSocket per client for every realtime topic.
+
+``MultiplexConsumer`` (``/ws/stream/``) authenticates once and lets the
+client subscribe to topics over the same connection:
+
+- ``chat:<channel id>``  -> ``ChatConsumer``
+- ``call:<call id>``     -> ``CallConsumer``
+- ``notifications``      -> ``NotificationConsumer``
+- ``presence:org``       -> ``PresenceConsumer``
+
+Each subscription runs an instance of the existing consumer with its own
+channel layer name, so its group memberships, handlers and lifecycle
+(``connect``/``receive``/``disconnect``) are exactly those of a dedicated
+socket; only its ``accept``/``send``/``close`` are routed through the shared
+connection.
+
+Client frames:
+    {"type": "subscribe", "topic": "chat:<id>"}
+    {"type": "unsubscribe", "topic": "chat:<id>"}
+    {"topic": "chat:<id>", "data": {...}}   (what the dedicated socket would receive)
+
+Server frames:
+    {"type": "subscribed", "topic": ...}
+    {"type": "unsubscribed", "topic": ..., "reason": "denied" | "closed" | "unsubscribed"}
+    {"type": "error", "message": ...}
+    {"topic": ..., "data": {...}}           (what the dedicated socket would send)
+
+The topic envelope is spliced around the frame the topic's consumer already
+serialized (``[topic, frame]`` on msgpack connections), so multiplexing adds
+no re-encoding.
+"""
+
+import asyncio
+import json
+import re
+
+import msgpack
+from channels.exceptions import StopConsumer
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+
+from .wire import JSONCodec, WireProtocolMixin
+
+TOPIC_PATTERN = re.compile(
+    r'^(?:(?P<kind>chat|call):(?P<id>[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12})'
+    r'|(?P<name>notifications|presence:org))$'
+)
+
+
+def resolve_topic(topic):
+    """Return ``(consumer class, url kwargs)`` for a topic, or None if unknown."""
+    from apps.accounts.consumers import NotificationConsumer, PresenceConsumer
+    from apps.calls.consumers import CallConsumer
+    from .consumers import ChatConsumer
+
+    match = TOPIC_PATTERN.match(topic or '')
+    if not match:
+        return None
+    if match['kind'] == 'chat':
+        return ChatConsumer, {'channel_id': match['id']}
+    if match['kind'] == 'call':
+        return CallConsumer, {'call_id': match['id']}
+    if match['name'] == 'notifications':
+        return NotificationConsumer, {}
+    return PresenceConsumer, {}
+
+
+class TopicStream:
+    """One subscription: a topic consumer instance running inside the shared connection."""
+
+    def __init__(self, parent, topic, consumer_class, url_kwargs):
+        self.parent = parent
+        self.topic = topic
+        self.accepted = False
+        self.closed = False
+        self.reader = None
+
+        scope = dict(parent.scope)
+        scope['url_route'] = {'args': (), 'kwargs': url_kwargs}
+        scope['wire_codec'] = parent.codec.name
+        self.consumer = consumer_class()
+        self.consumer.scope = scope
+        self.consumer.channel_layer = parent.channel_layer
+        self.consumer.base_send = self.base_send
+
+    async def start(self):
+        self.consumer.channel_name = await self.parent.channel_layer.new_channel()
+        self.reader = asyncio.ensure_future(self.read_channel_layer())
+        await self.consumer.websocket_connect({'type': 'websocket.connect'})
+
+    async def read_channel_layer(self):
+        while not self.closed:
+            message = await self.parent.channel_layer.receive(self.consumer.channel_name)
+            try:
+                await self.consumer.dispatch(message)
+            except Exception as e:
+                print(f"Multiplex {self.topic} handler error: {e}")
+
+    async def receive(self, data):
+        await self.consumer.receive(text_data=json.dumps(data))
+
+    async def base_send(self, message):
+        """What the topic consumer would have sent down its own socket."""
+        if message['type'] == 'websocket.accept':
+            self.accepted = True
+            await self.parent.send_message({'type': 'subscribed', 'topic': self.topic})
+        elif message['type'] == 'websocket.close':
+            await self.parent.end_stream(self, 'closed' if self.accepted else 'denied')
+        elif message['type'] == 'websocket.send':
+            await self.parent.send_topic_frame(self.topic, message.get('text'), message.get('bytes'))
+
+    async def stop(self, code=1000):
+        """Run the consumer's disconnect logic (group discards, presence, flushes)."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await self.consumer.websocket_disconnect({'type': 'websocket.disconnect', 'code': code})
+        except StopConsumer:
+            pass
+        if self.reader is not None and self.reader is not asyncio.current_task():
+            self.reader.cancel()
+
+
+class MultiplexConsumer(WireProtocolMixin, AsyncWebsocketConsumer):
+    """Authenticate once, then subscribe/unsubscribe to topics (see module docstring)."""
+
+    async def connect(self):
+        self.user = self.scope['user']
+        self.streams = {}
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        for stream in list(getattr(self, 'streams', {}).values()):
+            await stream.stop(close_code)
+        self.streams = {}
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = self.decode_frame(text_data, bytes_data)
+        except ValueError:
+            await self.send_message({'type': 'error', 'message': 'Invalid message format'})
+            return
+
+        topic = data.get('topic')
+        frame_type = data.get('type')
+        if frame_type == 'subscribe':
+            await self.subscribe(topic)
+        elif frame_type == 'unsubscribe':
+            stream = self.streams.get(topic)
+            if stream:
+                await self.end_stream(stream, 'unsubscribed')
+        elif topic in self.streams and isinstance(data.get('data'), dict):
+            await self.streams[topic].receive(data['data'])
+        else:
+            await self.send_message({'type': 'error', 'message': f'Not subscribed to {topic}'})
+
+    async def subscribe(self, topic):
+        if topic in self.streams:
+            if self.streams[topic].accepted:
+                await self.send_message({'type': 'subscribed', 'topic': topic})
+            return
+        resolved = resolve_topic(topic)
+        if resolved is None:
+            await self.send_message({'type': 'error', 'message': f'Unknown topic {topic}'})
+            return
+        if len(self.streams) >= getattr(settings, 'MULTIPLEX_MAX_TOPICS', 50):
+            await self.send_message({'type': 'error', 'message': 'Too many subscriptions'})
+            return
+        stream = TopicStream(self, topic, *resolved)
+        self.streams[topic] = stream
+        await stream.start()
+
+    async def end_stream(self, stream, reason):
+        if self.streams.get(stream.topic) is stream:
+            del self.streams[stream.topic]
+        await stream.stop()
+        await self.send_message({'type': 'unsubscribed', 'topic': stream.topic, 'reason': reason})
+
+    async def send_topic_frame(self, topic, text=None, data=None):
+        """Wrap an already serialized frame in the topic envelope."""
+        if text is not None and self.codec.name == JSONCodec.name:
+            await self.send(text_data=f'{{"topic": {json.dumps(topic)}, "data": {text}}}')
+        elif data is not None:
+            await self.send(bytes_data=b'\x92' + msgpack.packb(topic) + data)
+        else:
+            await self.send_message({'topic': topic, 'data': json.loads(text)})
@@ -0,0 +1,191 @@
+"""
+Bounded outbound queues for realtime sockets.
+
+Group events used to be written to the socket from the handler that received
+them, so a client reading slowly held up its consumer while the channel layer
+buffered on its behalf until it hit capacity. ``OutboundQueueMixin`` puts
+broadcast frames on a per-connection queue drained by a writer task, so
+handlers return immediately, and sheds load as that queue grows:
+- Reaction deltas, read receipts and upload progress replace the queued
+  frame they supersede (same message and emoji / same reader / same file),
+  whatever the queue length
+- Past ``WS_OUTBOUND_SHED_THRESHOLD`` queued frames, ephemeral frames (typing,
+  presence) are dropped
+- Past ``WS_OUTBOUND_MAX_QUEUE`` the queue is discarded and the connection is
+  closed after a ``{"type": "resync"}`` frame telling the client to reload
+  state before reconnecting
+- If writing fails, the connection is closed (1011) rather than left open
+  without broadcasts; the client reconnects and reloads state
+
+Shed frames are tallied per connection and added to ``OutboundMetrics``
+(per consumer type and reason) when the connection ends.
+"""
+
+import asyncio
+from collections import Counter, deque
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import broadcast
+
+# Frames a client can do without: the next one carries the current state
+EPHEMERAL_EVENTS = frozenset({'typing_state', 'user_status_change', 'user_status_update'})
+
+# Event type -> fields identifying the state a newer event supersedes
+# (reaction deltas carry the resulting count, so the newest one is enough)
+COLLAPSIBLE_EVENTS = {
+    'message_reaction_delta': ('message_id', 'emoji'),
+    'message_read_receipt': ('user_id',),
+    'attachment_progress': ('message_id', 'index'),
+}
+
+SLOW_CONSUMER_CLOSE_CODE = 4008
+WRITER_ERROR_CLOSE_CODE = 1011
+
+_RESYNC = object()
+
+
+class OutboundMetrics:
+    """Shed frame counters per consumer type and reason, shared through the cache."""
+
+    KEY_PREFIX = 'ws_outbound:dropped'
+    REASONS = ('ephemeral', 'collapsed', 'overflow')
+    consumer_types = set()
+
+    @classmethod
+    def _key(cls, consumer_type, reason):
+        return f"{cls.KEY_PREFIX}:{consumer_type}:{reason}"
+
+    @classmethod
+    def record(cls, consumer_type, counts):
+        for reason, count in counts.items():
+            if not count:
+                continue
+            key = cls._key(consumer_type, reason)
+            cache.add(key, 0, None)
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                cache.set(key, count, None)
+
+    @classmethod
+    def snapshot(cls):
+        """``{consumer type: {reason: count}}`` for every consumer using the queue."""
+        keys = {
+            cls._key(consumer_type, reason): (consumer_type, reason)
+            for consumer_type in cls.consumer_types
+            for reason in cls.REASONS
+        }
+        values = cache.get_many(list(keys))
+        stats = {consumer_type: dict.fromkeys(cls.REASONS, 0) for consumer_type in cls.consumer_types}
+        for key, count in values.items():
+            consumer_type, reason = keys[key]
+            stats[consumer_type][reason] = count
+        return stats
+
+    @classmethod
+    def reset(cls):
+        cache.delete_many([
+            cls._key(consumer_type, reason)
+            for consumer_type in cls.consumer_types
+            for reason in cls.REASONS
+        ])
+
+
+class OutboundQueueMixin:
+    """
+    Queue group events for a ``WireProtocolMixin`` consumer: point handlers
+    at ``queue_event`` (or ``queue_frames`` for pre-encoded frames) instead
+    of sending directly. Replies to the client's own frames still use
+    ``send_message``.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        OutboundMetrics.consumer_types.add(cls.__name__)
+
+    def _outbound_state(self):
+        if not hasattr(self, '_outbound'):
+            self._outbound = deque()
+            self._outbound_index = {}
+            self._outbound_ready = asyncio.Event()
+            self._outbound_writer = None
+            self._outbound_closing = False
+            self.outbound_dropped = Counter()
+        return self._outbound
+
+    async def queue_event(self, event):
+        self.queue_frames(event['type'], event, broadcast.render(event))
+
+    def queue_frames(self, event_type, event, frames):
+        queue = self._outbound_state()
+        if self._outbound_closing:
+            self.outbound_dropped['overflow'] += 1
+            return
+
+        collapse_fields = COLLAPSIBLE_EVENTS.get(event_type)
+        index_key = (event_type, *(event.get(field) for field in collapse_fields)) if collapse_fields else None
+        queued = self._outbound_index.get(index_key) if index_key else None
+        if queued is not None:
+            queued[1] = frames
+            self.outbound_dropped['collapsed'] += 1
+            return
+
+        if event_type in EPHEMERAL_EVENTS and len(queue) >= getattr(settings, 'WS_OUTBOUND_SHED_THRESHOLD', 100):
+            self.outbound_dropped['ephemeral'] += 1
+            return
+
+        if len(queue) >= getattr(settings, 'WS_OUTBOUND_MAX_QUEUE', 500):
+            self.outbound_dropped['overflow'] += len(queue) + 1
+            queue.clear()
+            self._outbound_index.clear()
+            self._outbound_closing = True
+            queue.append(_RESYNC)
+        else:
+            entry = [index_key, frames]
+            queue.append(entry)
+            if index_key:
+                self._outbound_index[index_key] = entry
+
+        self._outbound_ready.set()
+        if self._outbound_writer is None:
+            self._outbound_writer = asyncio.ensure_future(self.drain_outbound())
+
+    async def drain_outbound(self):
+        queue = self._outbound
+        try:
+            while True:
+                while not queue:
+                    self._outbound_ready.clear()
+                    await self._outbound_ready.wait()
+                entry = queue.popleft()
+                if entry is _RESYNC:
+                    await self.send_message({'type': 'resync', 'reason': 'slow_consumer'})
+                    await self.close(code=SLOW_CONSUMER_CLOSE_CODE)
+                    return
+                index_key, frames = entry
+                if index_key and self._outbound_index.get(index_key) is entry:
+                    del self._outbound_index[index_key]
+                await self.send_encoded(frames)
+        except Exception as e:
+            print(f"Outbound writer error: {e}")
+            # Nothing would write this socket's broadcasts any more
+            self.outbound_dropped['overflow'] += len(queue)
+            queue.clear()
+            self._outbound_index.clear()
+            self._outbound_closing = True
+            try:
+                await self.close(code=WRITER_ERROR_CLOSE_CODE)
+            except Exception as e:
+                print(f"Outbound writer error: {e}")
+        finally:
+            self._outbound_writer = None
+
+    async def websocket_disconnect(self, message):
+        if hasattr(self, '_outbound'):
+            if self._outbound_writer is not None and self._outbound_writer is not asyncio.current_task():
+                self._outbound_writer.cancel()
+            OutboundMetrics.record(type(self).__name__, self.outbound_dropped)
+            self.outbound_dropped.clear()
+        await super().websocket_disconnect(message)
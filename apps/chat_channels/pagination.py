@@ -0,0 +1,188 @@
+"""
+Keyset (cursor) pagination helpers for channel message history.
+
+Messages are windowed by ``(created_at, id)`` so every page is an index range
+scan on ``Index(fields=['channel', 'created_at'])`` instead of an OFFSET or a
+full history load. :class:`MessageCursorPagination` exposes the same windows
+to the REST API.
+"""
+
+import base64
+import uuid
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor string cannot be decoded."""
+
+
+def encode_cursor(message):
+    """Return an opaque cursor pointing at ``message``."""
+    raw = f"{message.created_at.isoformat()}|{message.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor into a ``(created_at, message_id)`` tuple."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        created_at, pk = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(pk)
+    except (ValueError, TypeError, UnicodeDecodeError) as e:
+        raise InvalidCursor(str(e))
+
+
+def clamp_page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Parse a user supplied page size, falling back to ``default``."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def before_cursor(queryset, cursor):
+    """Filter ``queryset`` to rows strictly older than ``cursor``."""
+    created_at, pk = decode_cursor(cursor)
+    return queryset.filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+    )
+
+
+def after_cursor(queryset, cursor):
+    """Filter ``queryset`` to rows strictly newer than ``cursor``."""
+    created_at, pk = decode_cursor(cursor)
+    return queryset.filter(
+        Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+    )
+
+
+class MessageWindow:
+    """A page of messages in chronological order plus its navigation cursors."""
+
+    def __init__(self, messages, has_older, has_newer):
+        self.messages = messages
+        self.has_older = has_older
+        self.has_newer = has_newer
+
+    @property
+    def older_cursor(self):
+        if self.has_older and self.messages:
+            return encode_cursor(self.messages[0])
+        return None
+
+    @property
+    def newer_cursor(self):
+        if self.messages:
+            return encode_cursor(self.messages[-1])
+        return None
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def __len__(self):
+        return len(self.messages)
+
+
+def get_message_window(queryset, before=None, after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Return a :class:`MessageWindow` of at most ``limit`` messages.
+
+    With no cursor the latest messages are returned. ``before`` pages towards
+    older history, ``after`` towards newer messages. One extra row is fetched
+    to know whether another page exists, so no COUNT query is needed.
+    """
+    if after:
+        rows = list(
+            after_cursor(queryset, after).order_by('created_at', 'id')[:limit + 1]
+        )
+        has_newer = len(rows) > limit
+        return MessageWindow(rows[:limit], has_older=True, has_newer=has_newer)
+
+    if before:
+        queryset = before_cursor(queryset, before)
+
+    rows = list(queryset.order_by('-created_at', '-id')[:limit + 1])
+    has_older = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    return MessageWindow(rows, has_older=has_older, has_newer=bool(before))
+
+
+class MessageCursorPagination(BasePagination):
+    """
+    DRF pagination over :func:`get_message_window`.
+
+    - no cursor: the latest ``limit`` messages
+    - ``?before=<cursor>``: older history
+    - ``?since=<cursor>``: messages created after the cursor (delta polling);
+      keep polling with the returned ``newer_cursor``
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        params = request.query_params
+        self.since = params.get('since') or params.get('after')
+        try:
+            self.window = get_message_window(
+                queryset,
+                before=params.get('before'),
+                after=self.since,
+                limit=clamp_page_size(params.get('limit'))
+            )
+        except InvalidCursor:
+            raise ValidationError({'cursor': 'Invalid cursor.'})
+        return self.window.messages
+
+    def _link(self, param, cursor):
+        if not cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        for other in ('before', 'since', 'after'):
+            url = remove_query_param(url, other)
+        return replace_query_param(url, param, cursor)
+
+    def get_paginated_response(self, data):
+        # An empty delta keeps the client's cursor so it can poll again
+        newer_cursor = self.window.newer_cursor or self.since
+        older_cursor = self.window.older_cursor
+        return Response({
+            'results': data,
+            'has_older': self.window.has_older,
+            'has_newer': self.window.has_newer,
+            'older_cursor': older_cursor,
+            'newer_cursor': newer_cursor,
+            'older': self._link('before', older_cursor),
+            'newer': self._link('since', newer_cursor),
+        })
+
+
+def annotate_date_separators(messages, previous_date=None):
+    """
+    Mark the first message of each calendar day in ``messages``.
+
+    ``previous_date`` is the date of the message rendered immediately before
+    this page (if any) so that appending a newer page does not repeat the day
+    header.
+    """
+    prev_date = previous_date
+    for msg in messages:
+        msg_date = msg.created_at.date()
+        if prev_date is None or msg_date != prev_date:
+            msg.show_date_separator = True
+            msg.date_label = msg.created_at
+        else:
+            msg.show_date_separator = False
+        prev_date = msg_date
+    return messages
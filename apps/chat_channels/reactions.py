@@ -0,0 +1,94 @@
+"""
+Message reactions.
+
+Each message stores ``reaction_counts`` (emoji -> count) next to its content,
+so rendering a page of messages needs no reaction rows at all. Toggling a
+reaction locks the message row, inserts or deletes the ``MessageReaction``
+and adjusts the count in the same transaction, so concurrent reactions to a
+popular message never lose an update.
+
+Sockets receive deltas instead of full summaries::
+
+    {"type": "reaction_delta", "message_id": ..., "emoji": "👍",
+     "delta": 1, "user_id": 7, "count": 42}
+
+``count`` is the resulting total, so a client can apply a delta without
+trusting its own arithmetic (and a slow client can be sent only the newest
+delta per emoji). Who reacted is loaded on demand through :func:`reactors`.
+"""
+
+from django.db import transaction
+
+REACTORS_PAGE_SIZE = 50
+
+
+def toggle_reaction(message_id, user, emoji, channel_id=None):
+    """
+    Add ``user``'s ``emoji`` reaction to the message, or remove it if present.
+
+    Returns the delta event (see module docstring), or None if the message
+    does not exist (in ``channel_id``, when given) or the emoji is invalid.
+    """
+    from .models import Message, MessageReaction
+
+    if not emoji or len(emoji) > MessageReaction._meta.get_field('emoji').max_length:
+        return None
+    messages = Message.objects.select_for_update().only('id', 'reaction_counts')
+    if channel_id is not None:
+        messages = messages.filter(channel_id=channel_id)
+
+    with transaction.atomic():
+        message = messages.filter(pk=message_id).first()
+        if message is None:
+            return None
+        removed, _ = MessageReaction.objects.filter(message=message, user=user, emoji=emoji).delete()
+        if not removed:
+            MessageReaction.objects.create(message=message, user=user, emoji=emoji)
+        delta = -1 if removed else 1
+
+        counts = dict(message.reaction_counts or {})
+        count = max(counts.get(emoji, 0) + delta, 0)
+        if count:
+            counts[emoji] = count
+        else:
+            counts.pop(emoji, None)
+        message.reaction_counts = counts
+        message.save(update_fields=['reaction_counts'])
+
+    return {
+        'type': 'message_reaction_delta',
+        'message_id': str(message.pk),
+        'emoji': emoji,
+        'delta': delta,
+        'user_id': user.pk,
+        'count': count,
+    }
+
+
+def recount(message):
+    """Rebuild ``reaction_counts`` from the reaction rows (repairs drift)."""
+    from django.db.models import Count
+
+    message.reaction_counts = dict(
+        message.reactions.values('emoji').annotate(n=Count('id')).values_list('emoji', 'n')
+    )
+    message.save(update_fields=['reaction_counts'])
+    return message.reaction_counts
+
+
+def reactors(message, emoji=None, limit=None):
+    """``{emoji: [{user_id, username, avatar}, ...]}`` in reaction order, optionally for one emoji."""
+    queryset = message.reactions.select_related('user').order_by('created_at')
+    if emoji is not None:
+        queryset = queryset.filter(emoji=emoji)
+    if limit is not None:
+        queryset = queryset[:limit]
+
+    result = {}
+    for reaction in queryset:
+        result.setdefault(reaction.emoji, []).append({
+            'user_id': reaction.user.id,
+            'username': reaction.user.get_full_name() or reaction.user.username,
+            'avatar': reaction.user.avatar.url if reaction.user.avatar else None
+        })
+    return result
@@ -0,0 +1,137 @@
+"""
+Per-user, per-channel read state.
+
+A user's position in a channel is a single high-water mark (see
+``ChannelReadState``): reading a message marks everything up to it as read.
+Marking costs one UPDATE (plus an INSERT the first time) regardless of how
+many messages scrolled past.
+
+Unread counts are a difference of two counters rather than a count of
+messages: ``Channel.message_count`` is bumped once per new message and each
+read state stores ``read_count``, the number of channel messages at or before
+its watermark. Posting a message therefore costs one channel UPDATE and no
+per-member writes, and a sidebar of N channels is answered from N channel rows
+and N read-state rows. Posting also marks the sender's watermark, so their own
+messages never count as unread. Counters include soft-deleted messages.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DateTimeField, F, IntegerField, OuterRef, Q, Subquery, UUIDField, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+
+def _newer_than(created_at, message_id):
+    """Q for messages strictly after ``(created_at, message_id)`` in (created_at, id) order."""
+    return Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=message_id)
+
+
+def latest_message(channel_id, message_ids):
+    """Return ``(created_at, id)`` of the newest of ``message_ids`` in the channel, or None."""
+    from .models import Message
+
+    return Message.all_objects.filter(
+        channel_id=channel_id, id__in=message_ids
+    ).order_by('-created_at', '-id').values_list('created_at', 'id').first()
+
+
+def _read_count(channel_id, created_at, message_id):
+    """Channel messages at or before the watermark: the total minus the (short) unread tail."""
+    from .models import Channel, Message
+
+    total = Channel.objects.filter(pk=channel_id).values_list('message_count', flat=True).first() or 0
+    newer = Message.all_objects.filter(channel_id=channel_id).filter(_newer_than(created_at, message_id)).count()
+    return max(total - newer, 0)
+
+
+def mark_read(user_id, channel_id, created_at, message_id, read_count=None):
+    """
+    Move the user's watermark forward to ``(created_at, message_id)``.
+    Returns True if it moved, False if it was already at or past it.
+
+    ``read_count`` is computed from the channel counter unless the caller
+    already knows it (see :func:`record_message`).
+    """
+    from .models import ChannelReadState
+
+    if read_count is None:
+        read_count = _read_count(channel_id, created_at, message_id)
+    behind = ChannelReadState.objects.filter(user_id=user_id, channel_id=channel_id).filter(
+        Q(last_read_at__lt=created_at) |
+        Q(last_read_at=created_at, last_read_message_id__lt=message_id)
+    )
+    if behind.update(last_read_at=created_at, last_read_message_id=message_id, read_count=read_count):
+        return True
+    try:
+        with transaction.atomic():
+            _, created = ChannelReadState.objects.get_or_create(
+                user_id=user_id, channel_id=channel_id,
+                defaults={
+                    'last_read_at': created_at,
+                    'last_read_message_id': message_id,
+                    'read_count': read_count,
+                }
+            )
+    except IntegrityError:
+        # Another connection created it concurrently; retry the forward-only update
+        return mark_read(user_id, channel_id, created_at, message_id, read_count)
+    return created
+
+
+def record_message(message):
+    """
+    Account for a newly created message: bump the channel's counter and
+    last-message pointer, then advance the sender's watermark past it.
+    """
+    from .models import Channel
+
+    is_newest = Q(last_message_at__isnull=True) | Q(last_message_at__lte=message.created_at)
+    Channel.objects.filter(pk=message.channel_id).update(
+        message_count=F('message_count') + 1,
+        last_message_at=Case(
+            When(is_newest, then=Value(message.created_at, output_field=DateTimeField())),
+            default=F('last_message_at'),
+        ),
+        last_message_id=Case(
+            When(is_newest, then=Value(message.pk, output_field=UUIDField())),
+            default=F('last_message_id'),
+        ),
+    )
+    if message.sender_id:
+        mark_read(message.sender_id, message.channel_id, message.created_at, message.pk)
+
+
+def annotate_unread_counts(queryset, user):
+    """Annotate a Channel queryset with the user's ``unread_count`` (no message scans)."""
+    from .models import ChannelReadState
+
+    read_count = ChannelReadState.objects.filter(
+        user_id=user.pk, channel_id=OuterRef('pk')
+    ).values('read_count')[:1]
+    return queryset.annotate(unread_count=Greatest(
+        F('message_count') - Coalesce(Subquery(read_count, output_field=IntegerField()), 0),
+        0,
+        output_field=IntegerField(),
+    ))
+
+
+def unread_messages(user, channel_id):
+    """Messages in the channel after the user's watermark, excluding their own (for listing them)."""
+    from .models import ChannelReadState, Message
+
+    messages = Message.objects.filter(channel_id=channel_id).exclude(sender_id=user.pk)
+    state = ChannelReadState.objects.filter(
+        user_id=user.pk, channel_id=channel_id
+    ).values_list('last_read_at', 'last_read_message_id').first()
+    if state:
+        messages = messages.filter(_newer_than(*state))
+    return messages
+
+
+def unread_count(user, channel_id):
+    """Number of unread messages in one channel, from the counters."""
+    from .models import Channel
+
+    return annotate_unread_counts(
+        Channel.objects.filter(pk=channel_id), user
+    ).values_list('unread_count', flat=True).first() or 0
+
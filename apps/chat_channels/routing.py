@@ -1,6 +1,8 @@
 from django.urls import re_path
 from . import consumers
+from .multiplex import MultiplexConsumer
 
 websocket_urlpatterns = [
     re_path(r'ws/chat/(?P<channel_id>[^/]+)/$', consumers.ChatConsumer.as_asgi()),
+    re_path(r'ws/stream/$', MultiplexConsumer.as_asgi()),
 ]
@@ -0,0 +1,224 @@
+"""
+Message full-text search.
+
+Every message has a stored search document (content plus sender names) that
+is updated when the message is saved, so searching is an index lookup rather
+than a scan of ``messages``:
+- PostgreSQL: ``messages.search_document`` tsvector column with a GIN index
+- SQLite: ``message_search`` FTS5 virtual table keyed by message id
+- Anything else (or SQLite without FTS5): ``icontains`` fallback
+
+Both storage layouts are created by migration ``0022_message_search_index``;
+``manage.py rebuild_message_search`` backfills or refreshes them.
+
+The query syntax supports ``from:<user>`` and ``has:file|attachment|link|image|video``
+filters in addition to free text. Free text is split into word tokens that
+must all match, each as a prefix (``conn`` finds ``connectflow``), on every
+backend.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'message_search'
+PG_COLUMN = 'search_document'
+PG_CONFIG = 'english'
+
+FROM_FILTER = re.compile(r'from:(\S+)')
+HAS_FILTER = re.compile(r'has:(file|link|attachment|image|video)')
+
+
+def parse_search_query(search_query):
+    """Split ``search_query`` into ``(free_text, filters)``."""
+    filters = {}
+    clean_query = search_query
+    from_user = FROM_FILTER.search(search_query)
+    has_filter = HAS_FILTER.search(search_query)
+    if from_user:
+        filters['from_user'] = from_user.group(1)
+        clean_query = clean_query.replace(from_user.group(0), '')
+    if has_filter:
+        filters['has'] = has_filter.group(1)
+        clean_query = clean_query.replace(has_filter.group(0), '')
+    return clean_query.strip(), filters
+
+
+def search_document_text(message):
+    """Plain text indexed for ``message``: its content, then sender names."""
+    sender = message.sender
+    names = ' '.join(filter(None, [sender.first_name, sender.last_name, sender.username])) if sender else ''
+    return message.content or '', names
+
+
+class BasicMessageSearch:
+    """Unindexed fallback: ``icontains`` over content and sender names."""
+
+    vendor = None
+
+    def filter(self, queryset, text):
+        return queryset.filter(
+            Q(content__icontains=text) |
+            Q(sender__first_name__icontains=text) |
+            Q(sender__last_name__icontains=text) |
+            Q(sender__username__icontains=text)
+        )
+
+    def index(self, messages):
+        pass
+
+    def remove(self, message_ids):
+        pass
+
+
+def search_tokens(text):
+    """Word tokens of free text; anything else (query syntax) is dropped."""
+    return re.findall(r'\w+', text)
+
+
+class SQLiteMessageSearch(BasicMessageSearch):
+    """FTS5 shadow table; rows are ``(message_id, body)``."""
+
+    vendor = 'sqlite'
+
+    @staticmethod
+    def match_expression(text):
+        # Quote every token (FTS5 syntax characters become literals) and use
+        # prefix matching so partial words still match like icontains did
+        return ' '.join(f'"{token}"*' for token in search_tokens(text))
+
+    def filter(self, queryset, text):
+        expression = self.match_expression(text)
+        if not expression:
+            return queryset.none()
+        return queryset.filter(id__in=RawSQL(
+            f"SELECT message_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+            [expression]
+        ))
+
+    def index(self, messages):
+        rows = [(m.pk.hex, ' '.join(search_document_text(m))) for m in messages]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE message_id = %s", [(r[0],) for r in rows])
+            cursor.executemany(f"INSERT INTO {FTS_TABLE} (message_id, body) VALUES (%s, %s)", rows)
+
+    def remove(self, message_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {FTS_TABLE} WHERE message_id = %s",
+                [(getattr(pk, 'hex', pk),) for pk in message_ids]
+            )
+
+
+class PostgresMessageSearch(BasicMessageSearch):
+    """Weighted tsvector column on ``messages`` (content A, sender names B)."""
+
+    vendor = 'postgresql'
+
+    @staticmethod
+    def match_expression(text):
+        # Same tokens as SQLite: quoted lexemes (tokens hold no quotes), all
+        # required, each a prefix (:*) so partial words still match
+        return ' & '.join(f"'{token}':*" for token in search_tokens(text))
+
+    def filter(self, queryset, text):
+        expression = self.match_expression(text)
+        if not expression:
+            return queryset.none()
+        return queryset.filter(RawSQL(
+            f'"messages"."{PG_COLUMN}" @@ to_tsquery(%s, %s)',
+            [PG_CONFIG, expression],
+            output_field=BooleanField()
+        ))
+
+    def index(self, messages):
+        rows = [(str(m.pk), *search_document_text(m)) for m in messages]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE messages SET {PG_COLUMN} = "
+                f"setweight(to_tsvector(%s, %s), 'A') || setweight(to_tsvector('simple', %s), 'B') "
+                f"WHERE id = %s::uuid",
+                [(PG_CONFIG, content, names, pk) for pk, content, names in rows]
+            )
+
+    def remove(self, message_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE messages SET {PG_COLUMN} = NULL WHERE id = ANY(%s::uuid[])",
+                [[str(pk) for pk in message_ids]]
+            )
+
+
+_backend = None
+
+
+def _fts_table_exists():
+    with connection.cursor() as cursor:
+        return FTS_TABLE in connection.introspection.table_names(cursor)
+
+
+def get_search_backend():
+    """Return the search backend for the default database."""
+    global _backend
+    if _backend is None or _backend.vendor not in (None, connection.vendor):
+        if connection.vendor == 'postgresql':
+            _backend = PostgresMessageSearch()
+        elif connection.vendor == 'sqlite' and _fts_table_exists():
+            _backend = SQLiteMessageSearch()
+        else:
+            _backend = BasicMessageSearch()
+    return _backend
+
+
+def index_messages(messages):
+    """(Re)index saved messages; soft-deleted ones are dropped from the index."""
+    backend = get_search_backend()
+    live = [m for m in messages if not m.is_deleted]
+    deleted = [m.pk for m in messages if m.is_deleted]
+    if live:
+        backend.index(live)
+    if deleted:
+        backend.remove(deleted)
+
+
+def remove_messages(message_ids):
+    get_search_backend().remove(list(message_ids))
+
+
+def apply_message_search(queryset, search_query):
+    """Filter a Message queryset by free text plus ``from:``/``has:`` filters."""
+    clean_query, filters = parse_search_query(search_query)
+
+    if clean_query:
+        queryset = get_search_backend().filter(queryset, clean_query)
+
+    if 'from_user' in filters:
+        from_username = filters['from_user']
+        queryset = queryset.filter(
+            Q(sender__username__iexact=from_username) |
+            Q(sender__first_name__icontains=from_username) |
+            Q(sender__last_name__icontains=from_username)
+        )
+
+    if 'has' in filters:
+        has_type = filters['has']
+        if has_type in ['file', 'attachment']:
+            queryset = queryset.filter(attachments__isnull=False).distinct()
+        elif has_type == 'link':
+            # Messages containing URLs
+            queryset = queryset.filter(
+                Q(content__icontains='http://') |
+                Q(content__icontains='https://')
+            )
+        elif has_type == 'image':
+            queryset = queryset.filter(message_type='IMAGE')
+        elif has_type == 'video':
+            queryset = queryset.filter(message_type='VIDEO')
+
+    return queryset
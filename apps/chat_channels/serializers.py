@@ -1,3 +1,4 @@
+from django.db.models import Count, Manager
 from rest_framework import serializers
 from .models import Channel, Message, Attachment, MessageReaction
 from apps.accounts.serializers import UserSerializer
@@ -19,13 +20,36 @@ class MessageReactionSerializer(serializers.ModelSerializer):
         model = MessageReaction
         fields = ['emoji', 'user', 'username']
 
+class MessageListSerializer(serializers.ListSerializer):
+    """Looks up the requesting user's starred messages for the whole list in one query."""
+
+    def to_representation(self, data):
+        messages = list(data.all() if isinstance(data, Manager) else data)
+        request = self.context.get('request')
+        if request and request.user.is_authenticated and 'is_starred' in self.child.fields:
+            self.context['starred_ids'] = set(request.user.starred_messages.filter(
+                pk__in=[message.pk for message in messages]
+            ).values_list('pk', flat=True))
+        return super().to_representation(messages)
+
 class MessageSerializer(serializers.ModelSerializer):
+    """
+    Pass ``fields=[...]`` to return only those fields (sparse fieldsets);
+    unknown names are ignored.
+    """
     sender_details = UserSerializer(source='sender', read_only=True)
     attachments = AttachmentSerializer(many=True, read_only=True)
     reactions = MessageReactionSerializer(many=True, read_only=True)
     star_count = serializers.SerializerMethodField()
     is_starred = serializers.SerializerMethodField()
     parent_details = serializers.SerializerMethodField()
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
     
     class Meta:
         model = Message
@@ -37,6 +61,28 @@ class MessageSerializer(serializers.ModelSerializer):
             'created_at', 'attachments', 'reactions'
         ]
         read_only_fields = ['sender', 'is_edited', 'is_deleted', 'created_at', 'is_pinned']
+        list_serializer_class = MessageListSerializer
+
+    @staticmethod
+    def setup_eager_loading(queryset, fields=None):
+        """
+        Fetch everything the serializer reads (only what ``fields`` needs when
+        given), so a page costs a constant number of queries.
+        """
+        def wanted(name):
+            return fields is None or name in fields
+
+        if wanted('sender_details'):
+            queryset = queryset.select_related('sender')
+        if wanted('parent_details'):
+            queryset = queryset.select_related('parent_message__sender')
+        if wanted('attachments'):
+            queryset = queryset.prefetch_related('attachments')
+        if wanted('reactions'):
+            queryset = queryset.prefetch_related('reactions__user')
+        if wanted('star_count'):
+            queryset = queryset.annotate(star_count_annotated=Count('starred_by'))
+        return queryset
 
     def get_parent_details(self, obj):
         if obj.parent_message:
@@ -48,11 +94,16 @@ class MessageSerializer(serializers.ModelSerializer):
         return None
 
     def get_star_count(self, obj):
+        # Prefer annotated value if available (see setup_eager_loading)
+        if hasattr(obj, 'star_count_annotated'):
+            return obj.star_count_annotated
         return obj.starred_by.count()
 
     def get_is_starred(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            if 'starred_ids' in self.context:
+                return obj.pk in self.context['starred_ids']
             return obj.starred_by.filter(id=request.user.id).exists()
         return False
 
@@ -1,8 +1,8 @@
 import os
-import re
 from django import template
 from datetime import datetime, timedelta
 from django.utils import timezone
+from apps.chat_channels.emoji import classify_text
 
 register = template.Library()
 
@@ -31,64 +31,12 @@ def is_image(value):
 @register.filter
 def is_emoji_only(value):
     """Check if message contains only emojis (like WhatsApp)."""
-    if not value or not isinstance(value, str):
-        return False
-    
-    # Remove whitespace
-    text = value.strip()
-    if not text:
-        return False
-    
-    # Emoji regex pattern - matches most Unicode emoji ranges
-    emoji_pattern = re.compile(
-        "["
-        "\U0001F600-\U0001F64F"  # emoticons
-        "\U0001F300-\U0001F5FF"  # symbols & pictographs
-        "\U0001F680-\U0001F6FF"  # transport & map symbols
-        "\U0001F1E0-\U0001F1FF"  # flags (iOS)
-        "\U00002702-\U000027B0"  # dingbats
-        "\U000024C2-\U0001F251"
-        "\U0001F900-\U0001F9FF"  # supplemental symbols
-        "\U0001FA00-\U0001FA6F"  # extended symbols
-        "\U00002600-\U000026FF"  # miscellaneous symbols
-        "\U00002700-\U000027BF"  # dingbats
-        "\U0001F191-\U0001F19A"  # enclosed characters
-        "]+", 
-        flags=re.UNICODE
-    )
-    
-    # Remove all emojis and whitespace
-    text_without_emoji = emoji_pattern.sub('', text).strip()
-    
-    # If nothing remains and we had emojis, it's emoji-only
-    has_emojis = bool(emoji_pattern.search(text))
-    return has_emojis and not text_without_emoji
+    return classify_text(value).is_emoji_only
 
 @register.filter
 def emoji_count(value):
-    """Count number of emojis in text."""
-    if not value or not isinstance(value, str):
-        return 0
-    
-    # Use the same logic as is_emoji_only but count matches
-    emoji_pattern = re.compile(
-        "["
-        "\U0001F600-\U0001F64F"  # emoticons
-        "\U0001F300-\U0001F5FF"  # symbols & pictographs
-        "\U0001F680-\U0001F6FF"  # transport & map symbols
-        "\U0001F1E0-\U0001F1FF"  # flags (iOS)
-        "\U00002702-\U000027B0"  # dingbats
-        "\U000024C2-\U0001F251"
-        "\U0001F900-\U0001F9FF"  # supplemental symbols
-        "\U0001FA00-\U0001FA6F"  # extended symbols
-        "\U00002600-\U000026FF"  # miscellaneous symbols
-        "\U00002700-\U000027BF"  # dingbats
-        "\U0001F191-\U0001F19A"  # enclosed characters
-        "]", 
-        flags=re.UNICODE
-    )
-    
-    return len(emoji_pattern.findall(value))
+    """Count number of emojis in text (messages store this as ``emoji_count``)."""
+    return classify_text(value).emoji_count
 
 @register.filter
 def format_date_separator(value):
@@ -0,0 +1,97 @@
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from apps.organizations.models import Organization, Department, Team, SharedProject
+from apps.chat_channels.models import Channel
+from apps.chat_channels.access import viewable_channels, get_viewable_channel_ids
+
+User = get_user_model()
+
+
+class ChannelAccessTest(TestCase):
+    def setUp(self):
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.other_org = Organization.objects.create(name='Other Org', code='OTHER')
+        self.user = User.objects.create_user(
+            username='member', password='password', email='member@test.com',
+            email_verified=True, organization=self.org
+        )
+        self.outsider = User.objects.create_user(
+            username='outsider', password='password', email='outsider@test.com',
+            email_verified=True, organization=self.org
+        )
+        self.admin = User.objects.create_user(
+            username='admin', password='password', email='admin@test.com',
+            email_verified=True, organization=self.org, role=User.Role.ORG_ADMIN
+        )
+
+        self.department = Department.objects.create(name='Engineering', organization=self.org)
+        self.team = Team.objects.create(name='Backend', department=self.department)
+        self.team.members.add(self.user)
+
+        def channel(name, channel_type, **kwargs):
+            return Channel.objects.create(
+                name=name, channel_type=channel_type, organization=kwargs.pop('organization', self.org), **kwargs
+            )
+
+        self.official = channel('news', Channel.ChannelType.OFFICIAL)
+        self.department_channel = channel('eng', Channel.ChannelType.DEPARTMENT, department=self.department)
+        self.team_channel = channel('backend', Channel.ChannelType.TEAM, team=self.team)
+        self.private = channel('secret', Channel.ChannelType.PRIVATE)
+        self.private.members.add(self.outsider)
+        self.foreign = channel('elsewhere', Channel.ChannelType.OFFICIAL, organization=self.other_org)
+
+    def test_department_members_can_view_department_channel(self):
+        self.assertTrue(self.department_channel.can_user_view(self.user))
+        self.assertFalse(self.department_channel.can_user_view(self.outsider))
+
+    def test_viewable_channels_matches_can_user_view(self):
+        channels = Channel.objects.all()
+        for user in (self.user, self.outsider, self.admin):
+            expected = {c.pk for c in channels if c.can_user_view(user)}
+            self.assertEqual(set(viewable_channels(user, channels).values_list('pk', flat=True)), expected)
+
+        self.assertEqual(
+            set(viewable_channels(self.user).values_list('pk', flat=True)),
+            {self.official.pk, self.department_channel.pk, self.team_channel.pk}
+        )
+        self.assertIn(self.private.pk, get_viewable_channel_ids(self.admin))
+        self.assertNotIn(self.foreign.pk, get_viewable_channel_ids(self.admin))
+
+    def test_cached_checks_and_invalidation(self):
+        self.assertFalse(self.private.can_user_view(self.user))
+        with self.assertNumQueries(0):
+            self.assertTrue(self.team_channel.can_user_view(self.user))
+
+        self.private.members.add(self.user)
+        self.assertTrue(self.private.can_user_view(self.user))
+
+        self.team.members.remove(self.user)
+        self.assertFalse(self.team_channel.can_user_view(self.user))
+
+        new_channel = Channel.objects.create(
+            name='fresh', channel_type=Channel.ChannelType.OFFICIAL, organization=self.org
+        )
+        self.assertTrue(new_channel.can_user_view(self.user))
+
+    def test_shared_project_channel(self):
+        project = SharedProject.objects.create(name='Apollo', host_organization=self.org, created_by=self.admin)
+        project_channel = Channel.objects.create(
+            name='apollo', channel_type=Channel.ChannelType.PROJECT,
+            organization=self.org, shared_project=project
+        )
+        self.assertFalse(project_channel.can_user_view(self.user))
+        self.assertFalse(project_channel.can_user_post(self.user))
+        project.members.add(self.user)
+        self.assertTrue(project_channel.can_user_view(self.user))
+        self.assertTrue(project_channel.can_user_post(self.user))
+
+    def test_global_search_uses_viewable_channels(self):
+        client = Client()
+        client.force_login(self.outsider)
+        response = client.get(reverse('accounts:global_search'), {'q': 'e'})
+        titles = {r['title'] for r in response.json()['results'] if r['type'] == 'Channel'}
+        self.assertIn('#secret', titles)
+        self.assertIn('#news', titles)
+        self.assertNotIn('#eng', titles)
+        self.assertNotIn('#elsewhere', titles)
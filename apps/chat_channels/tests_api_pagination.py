@@ -0,0 +1,78 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from apps.organizations.models import Organization
+from apps.chat_channels.models import Channel, Message, MessageReaction
+
+User = get_user_model()
+
+
+class MessageApiPaginationTest(TestCase):
+    def setUp(self):
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='testuser', password='password', email='test@test.com',
+            email_verified=True, organization=self.org
+        )
+        self.channel = Channel.objects.create(
+            name='general', organization=self.org, channel_type=Channel.ChannelType.TEAM, created_by=self.user
+        )
+        self.channel.members.add(self.user)
+        self.messages = [
+            Message.objects.create(channel=self.channel, sender=self.user, content=f'message {i}')
+            for i in range(7)
+        ]
+        self.url = reverse('channel-messages', args=[self.channel.pk])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _contents(self, data):
+        return [item['content'] for item in data['results']]
+
+    def test_cursor_pages_and_since_delta(self):
+        latest = self.client.get(self.url, {'limit': 3}).json()
+        self.assertEqual(self._contents(latest), ['message 4', 'message 5', 'message 6'])
+        self.assertTrue(latest['has_older'])
+
+        older = self.client.get(self.url, {'limit': 3, 'before': latest['older_cursor']}).json()
+        self.assertEqual(self._contents(older), ['message 1', 'message 2', 'message 3'])
+
+        empty = self.client.get(self.url, {'since': latest['newer_cursor']}).json()
+        self.assertEqual(empty['results'], [])
+        self.assertEqual(empty['newer_cursor'], latest['newer_cursor'])
+
+        Message.objects.create(channel=self.channel, sender=self.user, content='message 7')
+        delta = self.client.get(self.url, {'since': latest['newer_cursor']}).json()
+        self.assertEqual(self._contents(delta), ['message 7'])
+
+        self.assertEqual(self.client.get(self.url, {'since': 'garbage'}).status_code, 400)
+
+    def test_sparse_fieldsets(self):
+        data = self.client.get(self.url, {'fields': 'content,sender'}).json()
+        self.assertEqual(set(data['results'][0]), {'id', 'content', 'sender'})
+
+        data = self.client.get(reverse('message-list'), {'channel': self.channel.pk, 'fields': 'content'}).json()
+        self.assertEqual(len(data['results']), 7)
+        self.assertEqual(set(data['results'][0]), {'id', 'content'})
+
+    def test_etag_revalidation(self):
+        etag = self.client.get(self.url)['ETag']
+
+        with self.assertNumQueries(2):  # channel lookup and its members prefetch only
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MessageReaction.objects.create(message=self.messages[0], user=self.user, emoji='👍')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.messages[1].starred_by.add(self.user)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Different query strings have different ETags
+        self.assertNotEqual(self.client.get(self.url, {'limit': 2})['ETag'], self.client.get(self.url)['ETag'])
@@ -0,0 +1,82 @@
+import asyncio
+import json
+from unittest import mock
+
+import msgpack
+
+from django.test import SimpleTestCase, override_settings
+from apps.accounts.services import PresenceService
+from apps.chat_channels import broadcast, wire
+from apps.chat_channels.consumers import ChatConsumer
+
+CHAT_EVENT = {
+    'type': 'chat_message',
+    'message': 'Shipping the release notes now, see the **changelog** for details',
+    'message_type': 'TEXT',
+    'emoji_count': 0,
+    'status': 'SENT',
+    'sender_id': 7,
+    'sender_name': 'Ada Lovelace',
+    'sender_organization': 'Test Org',
+    'sender_avatar': 'https://res.cloudinary.com/demo/image/upload/avatars/ada.png',
+    'message_id': '0b7e2f7e-3c1a-4c55-9d43-5b0f6c1e9a10',
+    'timestamp': 'Oct 17, 09:30 AM',
+    'voice_message_url': None,
+    'voice_duration': None,
+    'attachments': [{'id': 1, 'url': 'https://example.com/a.pdf', 'name': 'a.pdf', 'size': 1024}],
+    'parent_message_id': None,
+    'parent_details': None,
+}
+
+
+class Subscriber(ChatConsumer):
+    """A ChatConsumer that records what it would write to its socket."""
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        self.sent.append(text_data)
+
+
+class BroadcastTest(SimpleTestCase):
+    def test_frames_match_the_client_protocol(self):
+        frame = json.loads(broadcast.render(CHAT_EVENT)['json'])
+        self.assertEqual(frame['type'], 'chat_message')
+        self.assertEqual(frame['message_id'], CHAT_EVENT['message_id'])
+        self.assertEqual(frame['attachments'], CHAT_EVENT['attachments'])
+        self.assertNotIn('sender_organization', frame)
+
+        encoded = broadcast.encode({'type': 'message_pinned', 'message_id': 'm'})
+        self.assertEqual(set(encoded), {'type', 'frames'})
+        self.assertEqual(json.loads(encoded['frames']['json']), {'type': 'message_pinned', 'message_id': 'm', 'is_pinned': True})
+        self.assertEqual(broadcast.encode(encoded), encoded)
+
+        presence = PresenceService.payload(3, 'AWAY', event_type='user_status_change')
+        self.assertEqual(broadcast.render(presence)['json'], json.dumps({'type': 'presence', 'user_id': 3, 'status': 'AWAY'}))
+
+    async def test_subscribers_forward_the_same_text(self):
+        subscribers = [Subscriber() for _ in range(3)]
+        event = broadcast.encode(CHAT_EVENT)
+        for subscriber in subscribers:
+            await subscriber.chat_message(event)
+        await asyncio.sleep(0)  # let the outbound writers run
+        frames = [subscriber.sent[0] for subscriber in subscribers]
+        self.assertIs(frames[0], event['frames']['json'])
+        self.assertTrue(all(frame is frames[0] for frame in frames))
+
+    async def test_event_is_serialized_once_whatever_the_group_size(self):
+        # msgpack only costs an encoding when it is enabled
+        for msgpack_enabled, packs in ((False, 0), (True, 1)):
+            for group_size in (1, 100):
+                subscribers = [Subscriber() for _ in range(group_size)]
+                with override_settings(WS_MSGPACK_ENABLED=msgpack_enabled), \
+                        mock.patch.object(wire.json, 'dumps', wraps=json.dumps) as dumps, \
+                        mock.patch.object(wire.msgpack, 'packb', wraps=msgpack.packb) as packb:
+                    event = broadcast.encode(CHAT_EVENT)
+                    for subscriber in subscribers:
+                        await subscriber.chat_message(event)
+                    await asyncio.sleep(0)  # let the outbound writers run
+                self.assertEqual((dumps.call_count, packb.call_count), (1, packs), group_size)
+                self.assertTrue(all(subscriber.sent == [event['frames']['json']] for subscriber in subscribers))
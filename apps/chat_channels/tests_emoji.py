@@ -0,0 +1,51 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from apps.organizations.models import Organization
+from apps.chat_channels.emoji import classify_text
+from apps.chat_channels.models import Channel, Message
+
+User = get_user_model()
+
+
+class EmojiClassificationTest(TestCase):
+    def setUp(self):
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='testuser', password='password', email='test@test.com',
+            email_verified=True, organization=self.org
+        )
+        self.channel = Channel.objects.create(
+            name='general', channel_type=Channel.ChannelType.OFFICIAL, organization=self.org
+        )
+
+    def test_classify_text(self):
+        self.assertEqual(tuple(classify_text('😀 👍')), (True, 2, 'EMOJI'))
+        self.assertEqual(tuple(classify_text('nice 👍')), (False, 1, 'TEXT'))
+        self.assertEqual(tuple(classify_text('   ')), (False, 0, 'TEXT'))
+        self.assertEqual(tuple(classify_text(None)), (False, 0, 'TEXT'))
+
+    def test_classification_is_stored_on_save(self):
+        message = Message.objects.create(channel=self.channel, sender=self.user, content='🎉🎉🎉')
+        message.refresh_from_db()
+        self.assertEqual((message.message_type, message.emoji_count), ('EMOJI', 3))
+
+        message.content = 'party 🎉'
+        message.save(update_fields=['content'])
+        message.refresh_from_db()
+        self.assertEqual((message.message_type, message.emoji_count), ('TEXT', 1))
+
+        voice = Message.objects.create(
+            channel=self.channel, sender=self.user, content='👍', message_type=Message.MessageType.VOICE
+        )
+        self.assertEqual((voice.message_type, voice.emoji_count), ('VOICE', 1))
+
+    def test_message_list_reads_stored_count(self):
+        Message.objects.create(channel=self.channel, sender=self.user, content='😀😀😀😀')
+        self.client.force_login(self.user)
+        with mock.patch('apps.chat_channels.templatetags.chat_filters.classify_text') as classify:
+            response = self.client.get(reverse('chat_channels:channel_detail', args=[self.channel.pk]))
+            classify.assert_not_called()
+        self.assertContains(response, 'text-2xl leading-none')
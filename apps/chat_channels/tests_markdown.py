@@ -0,0 +1,99 @@
+from unittest import mock
+
+import bleach
+from django.test import SimpleTestCase, TestCase
+from django.contrib.auth import get_user_model
+from apps.organizations.models import Organization
+from apps.chat_channels import markdown_utils
+from apps.chat_channels.markdown_utils import (
+    ALLOWED_ATTRIBUTES, ALLOWED_TAGS, convert_markdown_to_html, has_markdown_formatting, render_markdown
+)
+from apps.chat_channels.models import Channel, Message
+
+User = get_user_model()
+
+SAMPLES = [
+    '**bold** and _italic_ and `code`',
+    '# Title\n- first\n- second\nafter the list',
+    '> quoted **text**',
+    'see https://example.com/?a=1&b=2 now',
+    '[site](https://example.com) [bad](javascript:alert(1)) [tab](java\tscript:alert(1))',
+    '```python\nx = "<b>"\n```\nafter',
+    '~~gone~~ <script>alert(1)</script> <img src=x onerror=alert(1)>',
+    '## H2\n### H3\n###### not a heading',
+    'it\'s "quoted" & __strong__',
+]
+
+
+class MarkdownRendererTest(SimpleTestCase):
+    def test_formatting(self):
+        self.assertEqual(
+            convert_markdown_to_html('**bold** and _italic_ and `code`'),
+            '<strong>bold</strong> and <em>italic</em> and <code>code</code>'
+        )
+        self.assertEqual(
+            convert_markdown_to_html('# Title\n- a\n- b\nafter'),
+            '<h1>Title</h1><br><ul><br><li>a</li><br><li>b</li><br></ul><br>after'
+        )
+        self.assertEqual(
+            convert_markdown_to_html('```py\nx = **1**\n```'),
+            '<pre><code class="language-py">x = **1**<br></code></pre>'
+        )
+        self.assertEqual(
+            convert_markdown_to_html('[a](https://x.io) [b](javascript:void)'),
+            '<a href="https://x.io" target="_blank" rel="noopener noreferrer">a</a> b'
+        )
+        self.assertTrue(has_markdown_formatting('> a quote'))
+        self.assertFalse(has_markdown_formatting('plain text'))
+
+    def test_output_is_already_sanitized(self):
+        for text in SAMPLES:
+            html = convert_markdown_to_html(text)
+            clean = bleach.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES, strip=True)
+            self.assertEqual(html, clean, text)
+
+    def test_repeated_renders_hit_the_cache(self):
+        texts = [f'{sample} #{i}' for i in range(3) for sample in SAMPLES]
+        render_markdown.cache_clear()
+        first = [render_markdown(text) for text in texts]
+        self.assertEqual(render_markdown.cache_info().misses, len(texts))
+
+        with mock.patch.object(markdown_utils, 'convert_markdown_to_html') as convert:
+            again = [render_markdown(text) for text in texts]
+        convert.assert_not_called()
+        self.assertEqual(again, first)
+        info = render_markdown.cache_info()
+        self.assertEqual((info.hits, info.misses), (len(texts), len(texts)))
+
+
+class MessageRenderTrackingTest(TestCase):
+    def setUp(self):
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='testuser', password='password', email='test@test.com',
+            email_verified=True, organization=self.org
+        )
+        self.channel = Channel.objects.create(name='general', organization=self.org)
+
+    def test_only_content_changes_rerender(self):
+        with mock.patch.object(markdown_utils, 'render_markdown', wraps=render_markdown) as render:
+            message = Message.objects.create(channel=self.channel, sender=self.user, content='**hi**')
+            self.assertEqual(render.call_count, 1)
+            self.assertEqual(message.formatted_content, '<strong>hi</strong>')
+
+            message.is_pinned = True
+            message.save()
+            message = Message.objects.get(pk=message.pk)
+            message.is_pinned = False
+            message.save(update_fields=['is_pinned'])
+            self.assertEqual(render.call_count, 1)
+
+            message.content = 'plain now'
+            message.save(update_fields=['content'])
+            self.assertEqual(render.call_count, 2)
+            message.refresh_from_db()
+            self.assertFalse(message.has_formatting)
+            self.assertIsNone(message.formatted_content)
+
+            message.soft_delete()
+            self.assertEqual(render.call_count, 2)
@@ -0,0 +1,119 @@
+import json
+
+import msgpack
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from apps.accounts.services import PresenceService
+from apps.organizations.models import Organization
+from apps.chat_channels import wire
+from apps.chat_channels.models import Channel
+from apps.chat_channels.multiplex import MultiplexConsumer, resolve_topic
+
+User = get_user_model()
+
+
+@override_settings(PRESENCE_BACKEND='memory', MULTIPLEX_MAX_TOPICS=3)
+class MultiplexConsumerTest(TestCase):
+    def setUp(self):
+        PresenceService.reset()
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='testuser', password='password', email='test@test.com',
+            email_verified=True, organization=self.org
+        )
+        self.channel = Channel.objects.create(
+            name='general', organization=self.org, channel_type=Channel.ChannelType.OFFICIAL
+        )
+        self.private = Channel.objects.create(
+            name='secret', organization=self.org, channel_type=Channel.ChannelType.PRIVATE
+        )
+
+    def tearDown(self):
+        PresenceService.reset()
+
+    async def _connect(self, path='/ws/stream/', user=None):
+        communicator = WebsocketCommunicator(MultiplexConsumer.as_asgi(), path)
+        communicator.scope['user'] = user or self.user
+        connected, _ = await communicator.connect()
+        return communicator, connected
+
+    async def _until(self, communicator, predicate):
+        while True:
+            frame = json.loads(await communicator.receive_from(timeout=2))
+            if predicate(frame):
+                return frame
+
+    async def _subscribe(self, communicator, topic):
+        await communicator.send_to(text_data=json.dumps({'type': 'subscribe', 'topic': topic}))
+        return await self._until(communicator, lambda f: f.get('topic') == topic and 'type' in f)
+
+    def test_topics(self):
+        self.assertEqual(resolve_topic(f'chat:{self.channel.pk}')[1], {'channel_id': str(self.channel.pk)})
+        self.assertEqual(resolve_topic('presence:org')[0].__name__, 'PresenceConsumer')
+        for topic in ('chat:nope', 'presence', 'call:', None):
+            self.assertIsNone(resolve_topic(topic))
+
+    async def test_requires_authentication(self):
+        _, connected = await self._connect(user=AnonymousUser())
+        self.assertFalse(connected)
+
+    async def test_topics_share_one_connection(self):
+        communicator, connected = await self._connect()
+        self.assertTrue(connected)
+        chat = f'chat:{self.channel.pk}'
+
+        self.assertEqual((await self._subscribe(communicator, chat))['type'], 'subscribed')
+        self.assertEqual((await self._subscribe(communicator, 'notifications'))['type'], 'subscribed')
+        self.assertEqual((await self._subscribe(communicator, f'chat:{self.private.pk}'))['reason'], 'denied')
+
+        # Client frames go to the topic's consumer, its frames come back enveloped
+        await communicator.send_to(text_data=json.dumps({
+            'topic': chat, 'data': {'type': 'chat_message', 'message': 'hi there'}
+        }))
+        frame = await self._until(communicator, lambda f: f.get('data', {}).get('type') == 'chat_message')
+        self.assertEqual((frame['topic'], frame['data']['message']), (chat, 'hi there'))
+
+        await get_channel_layer().group_send(f'notifications_{self.user.pk}', {
+            'type': 'send_notification', 'id': '1', 'title': 'Hello', 'content': 'x',
+            'notification_type': 'SYSTEM', 'link': '', 'created_at': 'Just now'
+        })
+        frame = await self._until(communicator, lambda f: f.get('topic') == 'notifications')
+        self.assertEqual(frame['data']['title'], 'Hello')
+
+        # Unsubscribing leaves the group
+        self.assertEqual((await self._subscribe(communicator, 'presence:org'))['type'], 'subscribed')
+        await communicator.send_to(text_data=json.dumps({'type': 'unsubscribe', 'topic': chat}))
+        await self._until(communicator, lambda f: f.get('type') == 'unsubscribed')
+        await get_channel_layer().group_send(f'chat_{self.channel.pk}', {
+            'type': 'message_pinned', 'message_id': 'm'
+        })
+        self.assertTrue(await communicator.receive_nothing(timeout=0.2))
+
+        await communicator.send_to(text_data=json.dumps({'topic': chat, 'data': {'type': 'typing'}}))
+        self.assertEqual((await self._until(communicator, lambda f: True))['type'], 'error')
+        await communicator.disconnect()
+
+    async def test_subscription_limit(self):
+        communicator, _ = await self._connect()
+        for topic in ('notifications', 'presence:org', f'chat:{self.channel.pk}'):
+            await self._subscribe(communicator, topic)
+        await communicator.send_to(text_data=json.dumps({'type': 'subscribe', 'topic': f'call:{self.channel.pk}'}))
+        frame = await self._until(communicator, lambda f: f.get('type') == 'error')
+        self.assertEqual(frame['message'], 'Too many subscriptions')
+        await communicator.disconnect()
+
+    @override_settings(WS_MSGPACK_ENABLED=True)
+    async def test_msgpack_envelope(self):
+        communicator, _ = await self._connect('/ws/stream/?protocol=msgpack')
+        self.assertEqual(json.loads(await communicator.receive_from())['type'], 'protocol')
+        await communicator.send_to(bytes_data=msgpack.packb({'type': 'subscribe', 'topic': 'presence:org'}))
+
+        frames = []
+        while len(frames) < 2:
+            frames.append(wire.CODECS['msgpack'].decode(None, (await communicator.receive_output(timeout=2))['bytes']))
+        self.assertEqual(frames[0], {'type': 'subscribed', 'topic': 'presence:org'})
+        self.assertEqual(frames[1], ['presence:org', {'type': 'presence', 'user_id': self.user.pk, 'status': 'ONLINE'}])
+        await communicator.disconnect()
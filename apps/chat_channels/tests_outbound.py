@@ -0,0 +1,134 @@
+import asyncio
+import json
+
+from channels.exceptions import StopConsumer
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from apps.chat_channels import broadcast
+from apps.chat_channels.outbound import (
+    OutboundMetrics, OutboundQueueMixin, SLOW_CONSUMER_CLOSE_CODE, WRITER_ERROR_CLOSE_CODE
+)
+from apps.chat_channels.wire import WireProtocolMixin
+
+User = get_user_model()
+
+
+class SlowClient(OutboundQueueMixin, WireProtocolMixin, AsyncWebsocketConsumer):
+    """A consumer whose socket only accepts writes once ``gate`` is open."""
+
+    chat_message = OutboundQueueMixin.queue_event
+    typing_state = OutboundQueueMixin.queue_event
+    message_reaction_delta = OutboundQueueMixin.queue_event
+
+    def __init__(self):
+        super().__init__()
+        self.gate = asyncio.Event()
+        self.sent = []
+        self.close_code = None
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        await self.gate.wait()
+        self.sent.append(json.loads(text_data))
+
+    async def close(self, code=None, reason=None):
+        self.close_code = code
+
+
+def chat(message_id):
+    return broadcast.encode({
+        'type': 'chat_message', 'message': 'hi', 'message_type': 'TEXT', 'emoji_count': 0,
+        'status': 'SENT', 'sender_id': 1, 'sender_name': 'A', 'sender_avatar': None,
+        'message_id': message_id, 'timestamp': 'now', 'voice_message_url': None,
+        'voice_duration': None, 'attachments': [], 'parent_message_id': None, 'parent_details': None,
+    })
+
+
+def reaction(message_id, emoji, count):
+    return {
+        'type': 'message_reaction_delta', 'message_id': message_id, 'emoji': emoji,
+        'delta': 1, 'user_id': count, 'count': count,
+    }
+
+
+@override_settings(WS_OUTBOUND_SHED_THRESHOLD=3, WS_OUTBOUND_MAX_QUEUE=5)
+class OutboundQueueTest(SimpleTestCase):
+    def setUp(self):
+        OutboundMetrics.reset()
+
+    async def _drain(self, client, count):
+        client.gate.set()
+        for _ in range(100):
+            if len(client.sent) >= count:
+                return
+            await asyncio.sleep(0)
+
+    async def test_slow_reader_gets_collapsed_and_shed_frames(self):
+        client = SlowClient()
+        await client.chat_message(chat('m1'))
+        await asyncio.sleep(0)  # m1 is now being written
+
+        await client.message_reaction_delta(reaction('m1', '👍', 1))
+        await client.message_reaction_delta(reaction('m1', '👍', 2))
+        await client.chat_message(chat('m2'))
+        await client.chat_message(chat('m3'))
+        await client.typing_state({'type': 'typing_state', 'typers': []})
+
+        await self._drain(client, 4)
+        self.assertEqual(
+            [(frame['type'], frame.get('message_id')) for frame in client.sent],
+            [('chat_message', 'm1'), ('reaction_delta', 'm1'), ('chat_message', 'm2'), ('chat_message', 'm3')]
+        )
+        self.assertEqual(client.sent[1]['count'], 2)
+        self.assertEqual(client.outbound_dropped, {'collapsed': 1, 'ephemeral': 1})
+        self.assertIsNone(client.close_code)
+
+    async def test_overflow_disconnects_with_resync(self):
+        client = SlowClient()
+        for index in range(8):
+            await client.chat_message(chat(f'm{index}'))
+            await asyncio.sleep(0)
+
+        await self._drain(client, 2)
+        self.assertEqual([frame['type'] for frame in client.sent], ['chat_message', 'resync'])
+        self.assertEqual(client.close_code, SLOW_CONSUMER_CLOSE_CODE)
+
+        with self.assertRaises(StopConsumer):
+            await client.websocket_disconnect({'type': 'websocket.disconnect', 'code': SLOW_CONSUMER_CLOSE_CODE})
+        # 5 queued + the frame that overflowed + one arriving while closing
+        self.assertEqual(OutboundMetrics.snapshot()['SlowClient'], {'ephemeral': 0, 'collapsed': 0, 'overflow': 7})
+
+    async def test_failed_write_closes_the_connection(self):
+        client = SlowClient()
+
+        async def broken_send(text_data=None, bytes_data=None, close=False):
+            raise ConnectionResetError('socket gone')
+
+        client.send = broken_send
+        await client.chat_message(chat('m1'))
+        await client.chat_message(chat('m2'))
+        for _ in range(10):
+            await asyncio.sleep(0)
+        self.assertEqual(client.close_code, WRITER_ERROR_CLOSE_CODE)
+        self.assertIsNone(client._outbound_writer)
+        self.assertEqual(client.outbound_dropped, {'overflow': 1})
+
+        # Nothing is queued for a socket that is going away
+        await client.chat_message(chat('m3'))
+        self.assertEqual(len(client._outbound), 0)
+        self.assertIsNone(client._outbound_writer)
+
+
+class RealtimeMetricsViewTest(TestCase):
+    def test_super_admin_only(self):
+        admin = User.objects.create_user(
+            username='root', password='password', email='root@test.com', email_verified=True,
+            role=User.Role.SUPER_ADMIN, is_staff=True
+        )
+        url = reverse('accounts:platform_realtime_metrics')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(admin)
+        OutboundMetrics.reset()
+        OutboundMetrics.record('SlowClient', {'overflow': 2})
+        self.assertEqual(self.client.get(url).json()['dropped_frames']['SlowClient']['overflow'], 2)
@@ -0,0 +1,104 @@
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from datetime import timedelta
+from apps.organizations.models import Organization
+from apps.chat_channels.models import Channel, Message
+from apps.chat_channels.pagination import get_message_window, encode_cursor
+
+User = get_user_model()
+
+
+class MessageWindowTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='password',
+            email='test@test.com',
+            email_verified=True,
+            organization=self.org
+        )
+        self.client.force_login(self.user)
+
+        self.channel = Channel.objects.create(
+            name='general',
+            organization=self.org,
+            channel_type=Channel.ChannelType.PRIVATE,
+            created_by=self.user
+        )
+        self.channel.members.add(self.user)
+
+        # 7 messages spread over two days, created in chronological order
+        base = timezone.now() - timedelta(days=2)
+        self.messages = []
+        for i in range(7):
+            msg = Message.objects.create(channel=self.channel, sender=self.user, content=f"msg {i}")
+            Message.all_objects.filter(pk=msg.pk).update(created_at=base + timedelta(hours=i * 6))
+            msg.refresh_from_db()
+            self.messages.append(msg)
+
+    def test_latest_window(self):
+        window = get_message_window(Message.objects.filter(channel=self.channel), limit=3)
+        self.assertEqual([m.content for m in window], ['msg 4', 'msg 5', 'msg 6'])
+        self.assertTrue(window.has_older)
+        self.assertFalse(window.has_newer)
+
+    def test_walk_back_through_history(self):
+        queryset = Message.objects.filter(channel=self.channel)
+        seen = []
+        window = get_message_window(queryset, limit=3)
+        seen = [m.content for m in window] + seen
+        while window.has_older:
+            window = get_message_window(queryset, before=window.older_cursor, limit=3)
+            seen = [m.content for m in window] + seen
+        self.assertEqual(seen, [f"msg {i}" for i in range(7)])
+
+    def test_newer_window(self):
+        window = get_message_window(
+            Message.objects.filter(channel=self.channel),
+            after=encode_cursor(self.messages[1]),
+            limit=2
+        )
+        self.assertEqual([m.content for m in window], ['msg 2', 'msg 3'])
+        self.assertTrue(window.has_newer)
+
+    def test_channel_detail_renders_only_latest_page(self):
+        from apps.chat_channels import views
+        original = views.MESSAGE_PAGE_SIZE
+        views.MESSAGE_PAGE_SIZE = 3
+        try:
+            response = self.client.get(reverse('chat_channels:channel_detail', kwargs={'pk': self.channel.pk}))
+        finally:
+            views.MESSAGE_PAGE_SIZE = original
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['chat_messages']), 3)
+        self.assertTrue(response.context['message_window'].has_older)
+        self.assertTrue(response.context['chat_messages'][0].show_date_separator)
+
+    def test_load_older_endpoint(self):
+        url = reverse('chat_channels:channel_messages_older', kwargs={'pk': self.channel.pk})
+        response = self.client.get(url, {'before': encode_cursor(self.messages[3]), 'limit': 10})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 3)
+        self.assertFalse(data['has_older'])
+        self.assertIn(f'id="message-{self.messages[0].pk}"', data['html'])
+        self.assertNotIn(f'id="message-{self.messages[3].pk}"', data['html'])
+
+    def test_invalid_cursor(self):
+        url = reverse('chat_channels:channel_messages_newer', kwargs={'pk': self.channel.pk})
+        response = self.client.get(url, {'after': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_non_member_denied(self):
+        other = User.objects.create_user(
+            username='other', password='password', email='o@test.com',
+            email_verified=True, organization=self.org
+        )
+        self.client.force_login(other)
+        url = reverse('chat_channels:channel_messages_older', kwargs={'pk': self.channel.pk})
+        response = self.client.get(url, {'before': encode_cursor(self.messages[3])})
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,103 @@
+import json
+
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from apps.accounts.services import PresenceService
+from apps.organizations.models import Organization
+from apps.chat_channels import reactions
+from apps.chat_channels.consumers import ChatConsumer
+from apps.chat_channels.models import Channel, Message, MessageReaction
+
+User = get_user_model()
+
+
+@override_settings(PRESENCE_BACKEND='memory')
+class ReactionTest(TestCase):
+    def setUp(self):
+        PresenceService.reset()
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='testuser', password='password', email='test@test.com', first_name='Ada',
+            email_verified=True, organization=self.org
+        )
+        self.other = User.objects.create_user(
+            username='other', password='password', email='other@test.com',
+            email_verified=True, organization=self.org
+        )
+        self.channel = Channel.objects.create(
+            name='general', organization=self.org, channel_type=Channel.ChannelType.TEAM
+        )
+        self.channel.members.add(self.user, self.other)
+        self.message = Message.objects.create(channel=self.channel, sender=self.user, content='Ship it')
+
+    def tearDown(self):
+        PresenceService.reset()
+
+    def test_toggle_keeps_counts(self):
+        delta = reactions.toggle_reaction(self.message.pk, self.user, '👍')
+        self.assertEqual(delta, {
+            'type': 'message_reaction_delta', 'message_id': str(self.message.pk), 'emoji': '👍',
+            'delta': 1, 'user_id': self.user.pk, 'count': 1,
+        })
+        self.assertEqual(reactions.toggle_reaction(self.message.pk, self.other, '👍')['count'], 2)
+        reactions.toggle_reaction(self.message.pk, self.other, '🎉')
+        self.assertEqual(reactions.toggle_reaction(self.message.pk, self.user, '👍')['delta'], -1)
+        reactions.toggle_reaction(self.message.pk, self.other, '🎉')
+
+        self.message.refresh_from_db()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.message.reaction_summary, {'👍': 1})
+        self.assertEqual(MessageReaction.objects.filter(message=self.message).count(), 1)
+
+        self.assertIsNone(reactions.toggle_reaction(self.message.pk, self.user, 'x' * 50))
+        other_channel = Channel.objects.create(name='random', organization=self.org)
+        self.assertIsNone(reactions.toggle_reaction(self.message.pk, self.user, '👍', channel_id=other_channel.pk))
+
+    def test_recount_repairs_drift(self):
+        MessageReaction.objects.create(message=self.message, user=self.other, emoji='👀')
+        self.assertEqual(reactions.recount(self.message), {'👀': 1})
+
+    def test_reactors_are_loaded_on_demand(self):
+        reactions.toggle_reaction(self.message.pk, self.user, '👍')
+        reactions.toggle_reaction(self.message.pk, self.other, '🎉')
+        url = reverse('chat_channels:message_reactors', args=[self.message.pk])
+
+        self.client.force_login(self.other)
+        data = self.client.get(url, {'emoji': '👍'}).json()
+        self.assertEqual(data['counts'], {'👍': 1, '🎉': 1})
+        self.assertEqual(data['reactors'], {'👍': [{'user_id': self.user.pk, 'username': 'Ada', 'avatar': None}]})
+
+        outsider = User.objects.create_user(
+            username='outsider', password='password', email='out@test.com',
+            email_verified=True, organization=self.org
+        )
+        self.client.force_login(outsider)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_http_toggle(self):
+        self.client.force_login(self.other)
+        url = reverse('chat_channels:message_react', args=[self.message.pk])
+        response = self.client.post(url, {'emoji': '🚀'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.json(), {'success': True, 'action': 'added', 'reaction_summary': {'🚀': 1}})
+        response = self.client.post(url, {'emoji': '🚀'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.json()['reaction_summary'], {})
+
+    async def test_socket_receives_deltas(self):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{self.channel.pk}/')
+        communicator.scope['user'] = self.user
+        communicator.scope['url_route'] = {'kwargs': {'channel_id': str(self.channel.pk)}}
+        self.assertTrue((await communicator.connect())[0])
+
+        for _ in range(2):
+            await communicator.send_to(text_data=json.dumps({
+                'type': 'message_reaction', 'message_id': str(self.message.pk), 'emoji': '🔥'
+            }))
+        frames = []
+        while len(frames) < 2:
+            frame = json.loads(await communicator.receive_from(timeout=2))
+            if frame['type'] == 'reaction_delta':
+                frames.append((frame['emoji'], frame['delta'], frame['count'], frame['user_id']))
+        self.assertEqual(frames, [('🔥', 1, 1, self.user.pk), ('🔥', -1, 0, self.user.pk)])
+        await communicator.disconnect()
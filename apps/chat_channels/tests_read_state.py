@@ -0,0 +1,111 @@
+import json
+
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from apps.accounts.services import PresenceService
+from apps.organizations.models import Organization
+from apps.chat_channels import read_state
+from apps.chat_channels.consumers import ChatConsumer
+from apps.chat_channels.models import Channel, ChannelReadState, Message
+
+User = get_user_model()
+
+
+class ReadStateFixtures:
+    def setUp(self):
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='reader', password='password', email='reader@test.com',
+            email_verified=True, organization=self.org
+        )
+        self.author = User.objects.create_user(
+            username='author', password='password', email='author@test.com',
+            email_verified=True, organization=self.org
+        )
+        self.channel = Channel.objects.create(
+            name='general', organization=self.org, channel_type=Channel.ChannelType.TEAM, created_by=self.author
+        )
+        self.channel.members.add(self.user, self.author)
+        Message.objects.create(channel=self.channel, sender=self.user, content='my own')
+        self.messages = [
+            Message.objects.create(channel=self.channel, sender=self.author, content=f'message {i}')
+            for i in range(5)
+        ]
+
+
+class ReadStateTest(ReadStateFixtures, TestCase):
+    def _mark(self, message):
+        return read_state.mark_read(self.user.pk, self.channel.pk, message.created_at, message.pk)
+
+    def test_watermark_only_moves_forward(self):
+        self.assertEqual(read_state.unread_count(self.user, self.channel.pk), 5)
+
+        self.assertTrue(self._mark(self.messages[2]))
+        self.assertEqual(read_state.unread_count(self.user, self.channel.pk), 2)
+
+        self.assertFalse(self._mark(self.messages[1]))
+        self.assertFalse(self._mark(self.messages[2]))
+        self.assertEqual(read_state.unread_count(self.user, self.channel.pk), 2)
+
+        # Channel counter, unread tail, forward-only UPDATE
+        with self.assertNumQueries(3):
+            self.assertTrue(self._mark(self.messages[4]))
+        self.assertEqual(read_state.unread_count(self.user, self.channel.pk), 0)
+        self.assertEqual(ChannelReadState.objects.filter(user=self.user).count(), 1)
+
+    def test_latest_message_ignores_other_channels(self):
+        other = Channel.objects.create(name='other', organization=self.org)
+        foreign = Message.objects.create(channel=other, sender=self.author, content='elsewhere')
+        ids = [self.messages[1].pk, self.messages[3].pk, foreign.pk]
+        self.assertEqual(
+            read_state.latest_message(self.channel.pk, ids),
+            (self.messages[3].created_at, self.messages[3].pk)
+        )
+
+
+@override_settings(PRESENCE_BACKEND='memory')
+class ReadReceiptConsumerTest(ReadStateFixtures, TestCase):
+    def tearDown(self):
+        PresenceService.reset()
+
+    async def _connect(self, user):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{self.channel.pk}/')
+        communicator.scope['user'] = user
+        communicator.scope['url_route'] = {'kwargs': {'channel_id': str(self.channel.pk)}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def _receive_receipt(self, communicator):
+        while True:
+            event = json.loads(await communicator.receive_from(timeout=2))
+            if event['type'] == 'read_receipt':
+                return event
+
+    @override_settings(READ_RECEIPT_DEBOUNCE=0.05)
+    async def test_reads_are_coalesced(self):
+        author = await self._connect(self.author)
+        reader = await self._connect(self.user)
+
+        for message in self.messages:
+            await reader.send_to(text_data=json.dumps({'type': 'read_up_to', 'message_id': str(message.pk)}))
+        await reader.send_to(text_data=json.dumps({'type': 'message_read', 'message_id': 'not-a-uuid'}))
+
+        receipt = await self._receive_receipt(author)
+        self.assertEqual(receipt['message_id'], str(self.messages[-1].pk))
+        self.assertEqual(receipt['user_id'], self.user.pk)
+        self.assertTrue(await author.receive_nothing(timeout=0.2))
+
+        await reader.disconnect()
+        await author.disconnect()
+
+    @override_settings(READ_RECEIPT_DEBOUNCE=60)
+    async def test_pending_reads_flush_on_disconnect(self):
+        reader = await self._connect(self.user)
+        await reader.send_to(text_data=json.dumps({'type': 'read_up_to', 'message_id': str(self.messages[1].pk)}))
+        await reader.receive_nothing(timeout=0.1)
+        await reader.disconnect()
+
+        state = await ChannelReadState.objects.aget(user=self.user, channel=self.channel)
+        self.assertEqual(state.last_read_message_id, self.messages[1].pk)
@@ -0,0 +1,126 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from apps.organizations.models import Organization
+from apps.chat_channels.models import Channel, Message, Attachment
+from apps.chat_channels.search import (
+    FTS_TABLE, PostgresMessageSearch, SQLiteMessageSearch, apply_message_search, get_search_backend,
+    parse_search_query
+)
+
+User = get_user_model()
+
+
+class MessageSearchTest(TestCase):
+    def setUp(self):
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='alice', password='password', email='alice@test.com',
+            email_verified=True, organization=self.org, first_name='Alice'
+        )
+        self.other = User.objects.create_user(
+            username='bob', password='password', email='bob@test.com',
+            email_verified=True, organization=self.org, first_name='Bob'
+        )
+        self.channel = Channel.objects.create(
+            name='general', channel_type=Channel.ChannelType.OFFICIAL, organization=self.org
+        )
+        self.private = Channel.objects.create(
+            name='secret', channel_type=Channel.ChannelType.PRIVATE, organization=self.org
+        )
+        self.private.members.add(self.other)
+
+    def _post(self, content, sender=None, channel=None):
+        return Message.objects.create(
+            channel=channel or self.channel, sender=sender or self.user, content=content
+        )
+
+    def _search(self, query, channel=None):
+        queryset = Message.objects.filter(channel=channel or self.channel)
+        return set(apply_message_search(queryset, query).values_list('pk', flat=True))
+
+    def test_uses_fts_index_on_sqlite(self):
+        self.assertIsInstance(get_search_backend(), SQLiteMessageSearch)
+
+    def test_match_and_prefix(self):
+        deploy = self._post('Deploying the release tonight')
+        other = self._post('Lunch at noon?')
+        self.assertEqual(self._search('deploy'), {deploy.pk})
+        self.assertEqual(self._search('RELEASE tonight'), {deploy.pk})
+        self.assertEqual(self._search('noon'), {other.pk})
+        # FTS syntax characters are treated as plain text
+        self.assertEqual(self._search('"noon?" -('), {other.pk})
+        self.assertEqual(self._search('bob'), set())
+        self.assertEqual(self._search('alice'), {deploy.pk, other.pk})
+
+    def test_backends_build_the_same_prefix_query(self):
+        cases = {
+            'conn': ('"conn"*', "'conn':*"),
+            'Release "tonight" -(': ('"Release"* "tonight"*', "'Release':* & 'tonight':*"),
+            "it's": ('"it"* "s"*', "'it':* & 's':*"),
+            '?! -': ('', ''),
+        }
+        for text, expected in cases.items():
+            self.assertEqual(
+                (SQLiteMessageSearch.match_expression(text), PostgresMessageSearch.match_expression(text)),
+                expected, text
+            )
+        self.assertFalse(PostgresMessageSearch().filter(Message.objects.all(), '?!').exists())
+
+        connectflow = self._post('Welcome to connectflow')
+        self.assertEqual(self._search('conn'), {connectflow.pk})
+
+    def test_edit_and_delete_update_index(self):
+        message = self._post('first draft')
+        message.content = 'final version'
+        message.save()
+        self.assertEqual(self._search('draft'), set())
+        self.assertEqual(self._search('final'), {message.pk})
+
+        message.is_deleted = True
+        message.save(update_fields=['is_deleted'])
+        self.assertEqual(self._search('final', channel=self.channel), set())
+
+        hard = self._post('temporary note')
+        hard_id = hard.pk
+        hard.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE} WHERE message_id = %s", [hard_id.hex])
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_from_and_has_filters(self):
+        link = self._post('docs at https://example.com', sender=self.other)
+        with_file = self._post('report attached')
+        Attachment.objects.create(message=with_file, file='messages/attachments/r', file_size=1)
+
+        self.assertEqual(parse_search_query('from:bob has:link docs'), ('docs', {'from_user': 'bob', 'has': 'link'}))
+        self.assertEqual(self._search('from:bob'), {link.pk})
+        self.assertEqual(self._search('has:link docs'), {link.pk})
+        self.assertEqual(self._search('has:file'), {with_file.pk})
+        self.assertEqual(self._search('from:alice docs'), set())
+
+    def test_cross_channel_search_respects_access(self):
+        visible = self._post('quarterly numbers')
+        self._post('quarterly secret plans', sender=self.other, channel=self.private)
+
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('chat_channels:message_search'), {'q': 'quarterly'})
+        self.assertEqual([r['id'] for r in response.json()['results']], [str(visible.pk)])
+
+        client.force_login(self.other)
+        response = client.get(reverse('chat_channels:message_search'), {'q': 'quarterly'})
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_rebuild_command(self):
+        message = self._post('backfilled content')
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        self.assertEqual(self._search('backfilled'), set())
+
+        call_command('rebuild_message_search', '--batch-size', '1', stdout=StringIO())
+        self.assertEqual(self._search('backfilled'), {message.pk})
@@ -0,0 +1,71 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from apps.organizations.models import Organization
+from apps.chat_channels.models import Channel, Message, MessageReaction, Attachment
+
+User = get_user_model()
+
+
+class MessageSerializerQueryTest(TestCase):
+    def setUp(self):
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='testuser', password='password', email='test@test.com',
+            email_verified=True, organization=self.org
+        )
+        self.other = User.objects.create_user(
+            username='other', password='password', email='other@test.com',
+            email_verified=True, organization=self.org
+        )
+        self.channel = Channel.objects.create(
+            name='general', organization=self.org, channel_type=Channel.ChannelType.TEAM, created_by=self.user
+        )
+        self.channel.members.add(self.user, self.other)
+        self.root = Message.objects.create(channel=self.channel, sender=self.other, content='root')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _add_messages(self, count):
+        for i in range(count):
+            message = Message.objects.create(channel=self.channel, sender=self.other, content=f'message {i}')
+            MessageReaction.objects.create(message=message, user=self.other, emoji='👍')
+            Attachment.objects.create(message=message, file=f'messages/attachments/{i}', file_size=1)
+            message.starred_by.add(self.other)
+            if i % 2:
+                message.starred_by.add(self.user)
+            # Replies are listed by MessageViewSet, with parent details
+            Message.objects.create(channel=self.channel, sender=self.user, content='reply', parent_message=message)
+
+    def _query_count(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()['results']
+
+    def test_channel_messages_query_count_is_constant(self):
+        url = reverse('channel-messages', args=[self.channel.pk])
+        self._add_messages(2)
+        small, _ = self._query_count(url)
+        self._add_messages(20)
+        large, data = self._query_count(url)
+        self.assertEqual(small, large)
+
+        starred = {item['content']: (item['star_count'], item['is_starred']) for item in data}
+        self.assertEqual(starred['message 1'], (2, True))
+        self.assertEqual(starred['message 0'], (1, False))
+        self.assertEqual(data[1]['reactions'][0]['username'], 'other')
+
+    def test_message_list_query_count_is_constant(self):
+        url = reverse('message-list')
+        self._add_messages(2)
+        small, _ = self._query_count(url)
+        self._add_messages(20)
+        large, data = self._query_count(url)
+        self.assertEqual(small, large)
+
+        reply = next(item for item in data if item['parent_details'])
+        self.assertEqual(reply['parent_details']['sender_name'], 'other')
@@ -0,0 +1,86 @@
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from apps.organizations.models import Organization
+from apps.chat_channels import read_state
+from apps.chat_channels.models import Channel, Message
+
+User = get_user_model()
+
+
+class SidebarTest(TestCase):
+    def setUp(self):
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='reader', password='password', email='reader@test.com',
+            email_verified=True, organization=self.org
+        )
+        self.author = User.objects.create_user(
+            username='author', password='password', email='author@test.com', first_name='Ada',
+            email_verified=True, organization=self.org
+        )
+        self.general = self._channel('general')
+        self.random = self._channel('random')
+        self.quiet = self._channel('quiet')
+        self.dm = self._channel('dm', channel_type=Channel.ChannelType.DIRECT)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def _channel(self, name, channel_type=Channel.ChannelType.TEAM):
+        channel = Channel.objects.create(name=name, organization=self.org, channel_type=channel_type)
+        channel.members.add(self.user, self.author)
+        return channel
+
+    def _post(self, channel, sender=None, content='hello'):
+        return Message.objects.create(channel=channel, sender=sender or self.author, content=content)
+
+    def test_last_message_follows_creates(self):
+        first = self._post(self.general)
+        second = self._post(self.general)
+        self.general.refresh_from_db()
+        self.assertEqual(self.general.message_count, 2)
+        self.assertEqual((self.general.last_message_at, self.general.last_message_id), (second.created_at, second.pk))
+
+        # A message committed late with an older timestamp does not move the pointer back
+        read_state.record_message(Message(channel=self.general, created_at=first.created_at))
+        self.general.refresh_from_db()
+        self.assertEqual(self.general.message_count, 3)
+        self.assertEqual(self.general.last_message_id, second.pk)
+
+    def test_unread_counts(self):
+        messages = [self._post(self.general) for _ in range(3)]
+        self.assertEqual(read_state.unread_count(self.user, self.general.pk), 3)
+        self.assertEqual(read_state.unread_count(self.author, self.general.pk), 0)
+
+        read_state.mark_read(self.user.pk, self.general.pk, messages[0].created_at, messages[0].pk)
+        self.assertEqual(read_state.unread_count(self.user, self.general.pk), 2)
+
+        # Posting marks everything before it read
+        self._post(self.general, sender=self.user)
+        self.assertEqual(read_state.unread_count(self.user, self.general.pk), 0)
+        self._post(self.general)
+        self.assertEqual(read_state.unread_count(self.user, self.general.pk), 1)
+
+    def test_sidebar_endpoint(self):
+        self._post(self.general)
+        self._post(self.random)
+        self._post(self.random)
+        self._post(self.dm)
+
+        response = self.client.get(reverse('chat_channels:channel_sidebar'))
+        results = response.json()['results']
+        self.assertEqual([r['name'] for r in results], ['Ada', 'random', 'general', 'quiet'])
+        self.assertEqual([r['unread_count'] for r in results], [1, 2, 1, 0])
+        self.assertIsNone(results[-1]['last_message_at'])
+
+    def test_sidebar_query_count_is_constant(self):
+        url = reverse('chat_channels:channel_sidebar')
+        self.client.get(url)
+        with self.assertNumQueries(5) as ctx:
+            self.client.get(url)
+
+        for i in range(5):
+            self._channel(f'extra-{i}')
+            self._post(self.dm)
+        with self.assertNumQueries(len(ctx.captured_queries)):
+            self.client.get(url)
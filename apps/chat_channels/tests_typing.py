@@ -0,0 +1,110 @@
+import json
+from unittest import mock
+
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from apps.accounts.services import PresenceService
+from apps.organizations.models import Organization
+from apps.chat_channels import typing_state
+from apps.chat_channels.consumers import ChatConsumer
+from apps.chat_channels.models import Channel
+from apps.chat_channels.typing_state import TypingTracker
+
+User = get_user_model()
+
+
+@override_settings(PRESENCE_BACKEND='memory', TYPING_TTL=6, TYPING_BROADCAST_INTERVAL=1.0)
+class TypingTrackerTest(TestCase):
+    channel_id = 'c0ffee'
+
+    def setUp(self):
+        PresenceService.reset()
+
+    def tearDown(self):
+        PresenceService.reset()
+
+    def test_redundant_frames_are_dropped(self):
+        self.assertTrue(TypingTracker.update(self.channel_id, 1, 'Ada', True))
+        self.assertFalse(TypingTracker.update(self.channel_id, 1, 'Ada', True))
+        self.assertTrue(TypingTracker.update(self.channel_id, 2, 'Bob', True))
+        self.assertTrue(TypingTracker.update(self.channel_id, 1, 'Ada', False))
+        self.assertFalse(TypingTracker.update(self.channel_id, 1, 'Ada', False))
+        self.assertFalse(TypingTracker.update(self.channel_id, 3, 'Cy', False))
+
+    def test_snapshot_reports_changes_once(self):
+        TypingTracker.update(self.channel_id, 2, 'Bob', True)
+        TypingTracker.update(self.channel_id, 1, 'Ada', True)
+        typers, changed = TypingTracker.snapshot(self.channel_id)
+        self.assertTrue(changed)
+        self.assertEqual(typers, [{'user_id': 1, 'name': 'Ada'}, {'user_id': 2, 'name': 'Bob'}])
+        self.assertFalse(TypingTracker.snapshot(self.channel_id)[1])
+
+    def test_typers_expire(self):
+        with mock.patch.object(typing_state.time, 'time', return_value=1000.0):
+            TypingTracker.update(self.channel_id, 1, 'Ada', True)
+            self.assertEqual(len(TypingTracker.snapshot(self.channel_id)[0]), 1)
+        with mock.patch.object(typing_state.time, 'time', return_value=1007.0):
+            self.assertEqual(TypingTracker.snapshot(self.channel_id), ([], True))
+
+    def test_one_broadcaster_per_channel(self):
+        self.assertTrue(TypingTracker.claim_broadcast(self.channel_id))
+        self.assertFalse(TypingTracker.claim_broadcast(self.channel_id))
+        self.assertFalse(TypingTracker.finish(self.channel_id))
+        self.assertTrue(TypingTracker.claim_broadcast(self.channel_id))
+
+        # A change made while the slot was held is picked up on release
+        TypingTracker.update(self.channel_id, 1, 'Ada', True)
+        self.assertTrue(TypingTracker.finish(self.channel_id))
+
+
+@override_settings(PRESENCE_BACKEND='memory', TYPING_BROADCAST_INTERVAL=0.1)
+class TypingConsumerTest(TestCase):
+    def setUp(self):
+        PresenceService.reset()
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.users = [
+            User.objects.create_user(
+                username=f'user{i}', password='password', email=f'user{i}@test.com', first_name=f'User{i}',
+                email_verified=True, organization=self.org
+            )
+            for i in range(3)
+        ]
+        self.channel = Channel.objects.create(
+            name='general', organization=self.org, channel_type=Channel.ChannelType.TEAM
+        )
+        self.channel.members.add(*self.users)
+
+    def tearDown(self):
+        PresenceService.reset()
+
+    async def _connect(self, user):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{self.channel.pk}/')
+        communicator.scope['user'] = user
+        communicator.scope['url_route'] = {'kwargs': {'channel_id': str(self.channel.pk)}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def _typing_frames(self, communicator, timeout=0.5):
+        frames = []
+        while not await communicator.receive_nothing(timeout=timeout):
+            event = json.loads(await communicator.receive_from())
+            if event['type'] == 'typing':
+                frames.append([t['name'] for t in event['typers']])
+        return frames
+
+    async def test_typing_frames_are_coalesced(self):
+        observer, first, second = [await self._connect(user) for user in self.users]
+        for _ in range(5):
+            await first.send_to(text_data=json.dumps({'type': 'typing', 'is_typing': True}))
+            await second.send_to(text_data=json.dumps({'type': 'typing', 'is_typing': True}))
+        self.assertEqual(await self._typing_frames(observer), [['User1', 'User2']])
+
+        await first.send_to(text_data=json.dumps({'type': 'typing', 'is_typing': False}))
+        await first.send_to(text_data=json.dumps({'type': 'typing', 'is_typing': False}))
+        await second.disconnect()
+        self.assertEqual(await self._typing_frames(observer), [[]])
+
+        await first.disconnect()
+        await observer.disconnect()
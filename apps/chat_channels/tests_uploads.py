@@ -0,0 +1,147 @@
+import json
+import threading
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from cloudinary import CloudinaryResource
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from apps.organizations.models import Organization
+from apps.chat_channels import uploads
+from apps.chat_channels.models import Attachment, Channel, Message
+
+User = get_user_model()
+
+
+class FakeStorage:
+    """Stands in for Cloudinary: records which threads stored what."""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.threads = set()
+        self.lock = threading.Lock()
+
+    def __call__(self, attachment):
+        with self.lock:
+            self.threads.add(threading.current_thread().name)
+        name = attachment.file.name
+        if name in self.fail:
+            raise RuntimeError(f'cloudinary rejected {name}')
+        public_id, _, extension = name.rpartition('.')
+        attachment.file = CloudinaryResource(
+            public_id=f'messages/attachments/{public_id}', format=extension,
+            resource_type='image' if extension == 'png' else 'raw', type='upload'
+        )
+
+
+class AttachmentUploadTest(TestCase):
+    def setUp(self):
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='testuser', password='password', email='test@test.com', first_name='Ada',
+            email_verified=True, organization=self.org
+        )
+        self.channel = Channel.objects.create(
+            name='general', organization=self.org, channel_type=Channel.ChannelType.TEAM
+        )
+        self.channel.members.add(self.user)
+        self.layer = get_channel_layer()
+        self.layer_channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(f'chat_{self.channel.pk}', self.layer_channel)
+
+    def tearDown(self):
+        async_to_sync(self.layer.flush)()
+
+    def _files(self, *names):
+        return [SimpleUploadedFile(name, b'data', content_type='image/png') for name in names]
+
+    def _frames(self, count):
+        receive = async_to_sync(self.layer.receive)
+        return [json.loads(receive(self.layer_channel)['frames']['json']) for _ in range(count)]
+
+    def test_files_are_stored_in_parallel_then_published_once(self):
+        storage = FakeStorage()
+        url = reverse('chat_channels:channel_detail', args=[self.channel.pk])
+        self.client.force_login(self.user)
+        with mock.patch.object(uploads, 'store', storage):
+            response = self.client.post(
+                url, {'content': 'Screenshots', 'attachments': self._files('a.png', 'b.pdf', 'c.png')},
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+            )
+        data = response.json()
+        self.assertEqual(data['status'], 'SENT')
+        self.assertEqual(sorted(att['name'] for att in data['attachments']), ['a', 'b', 'c'])
+        self.assertTrue(all(name.startswith('attachment-upload') for name in storage.threads))
+
+        message = Message.objects.get(pk=data['message_id'])
+        self.assertEqual((message.status, message.message_type), ('SENT', 'IMAGE'))
+        self.assertEqual(message.attachments.count(), 3)
+
+        frames = self._frames(4)
+        progress = [frame for frame in frames if frame['type'] == 'upload_progress']
+        self.assertEqual([frame['done'] for frame in progress], [1, 2, 3])
+        self.assertEqual({frame['state'] for frame in progress}, {'stored'})
+        self.assertEqual(frames[-1]['type'], 'chat_message')
+        self.assertEqual(len(frames[-1]['attachments']), 3)
+        self.assertTrue(frames[-1]['attachments'][0]['is_image'])
+
+    def test_failed_file_removes_the_message(self):
+        storage = FakeStorage(fail={'b.pdf'})
+        message = Message.objects.create(
+            channel=self.channel, sender=self.user, content='x', status=Message.MessageStatus.SENDING
+        )
+        with mock.patch.object(uploads, 'store', storage), \
+                mock.patch.object(uploads, 'discard') as discard, \
+                self.assertRaisesMessage(RuntimeError, 'cloudinary rejected b.pdf'):
+            uploads.upload_attachments(message, self._files('a.png', 'b.pdf'))
+        self.assertFalse(Message.all_objects.filter(pk=message.pk).exists())
+        self.assertFalse(Attachment.objects.exists())
+        # Whatever landed before the failure is removed from storage again
+        discard.assert_called_once()
+        # The message never counted toward unread counts or the sidebar
+        self.channel.refresh_from_db()
+        self.assertEqual((self.channel.message_count, self.channel.last_message_id), (0, None))
+        self.assertEqual(sorted(frame['state'] for frame in self._frames(2)), ['failed', 'stored'])
+
+    def test_pending_messages_stay_out_of_history(self):
+        Message.objects.create(channel=self.channel, sender=self.user, content='done')
+        Message.objects.create(
+            channel=self.channel, sender=self.user, content='uploading', status=Message.MessageStatus.SENDING
+        )
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('chat_channels:channel_detail', args=[self.channel.pk]))
+        self.assertEqual([m.content for m in response.context['chat_messages']], ['done'])
+
+        for url in (f'/api/v1/channels/{self.channel.pk}/messages/', f'/api/v1/messages/?channel={self.channel.pk}'):
+            self.assertEqual([m['content'] for m in self.client.get(url).json()['results']], ['done'], url)
+        self.assertEqual(self.channel.messages.count(), 1)
+        self.channel.refresh_from_db()
+        self.assertEqual(self.channel.message_count, 1)
+
+        # Counted once finalized
+        pending = Message.all_objects.get(content='uploading')
+        with mock.patch.object(uploads, 'store', FakeStorage()):
+            uploads.upload_attachments(pending, self._files('a.png'))
+        self.channel.refresh_from_db()
+        self.assertEqual((self.channel.message_count, self.channel.last_message_id), (2, pending.pk))
+
+    def test_known_content_is_not_uploaded_again(self):
+        storage = FakeStorage()
+        with mock.patch.object(uploads, 'store', storage):
+            first = Message.objects.create(
+                channel=self.channel, sender=self.user, content='x', status=Message.MessageStatus.SENDING
+            )
+            [stored] = uploads.upload_attachments(first, self._files('a.png'))
+            storage.threads.clear()
+            again = Message.objects.create(
+                channel=self.channel, sender=self.user, content='x', status=Message.MessageStatus.SENDING
+            )
+            [reused] = uploads.upload_attachments(again, self._files('copy.png'))
+        self.assertEqual(storage.threads, set())
+        self.assertEqual((str(reused.file), reused.blob_id), (str(stored.file), stored.blob_id))
+        # One stored file, charged once
+        self.org.refresh_from_db()
+        self.assertEqual(self.org.storage_used_bytes, 4)
@@ -0,0 +1,141 @@
+import json
+from unittest import mock
+
+import msgpack
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.contrib.auth import get_user_model
+from apps.accounts.consumers import PresenceConsumer
+from apps.accounts.services import PresenceService
+from apps.accounts.services import presence
+from apps.organizations.models import Organization
+from apps.chat_channels import wire
+from apps.chat_channels.consumers import ChatConsumer
+from apps.chat_channels.models import Channel
+
+User = get_user_model()
+
+
+def unpack(data):
+    return wire.CODECS['msgpack'].decode(None, data)
+
+
+@override_settings(WS_MSGPACK_ENABLED=True)
+class WireCodecTest(SimpleTestCase):
+    def test_negotiation(self):
+        cases = [
+            ({}, 'json', None),
+            ({'subprotocols': [wire.SUBPROTOCOL_JSON]}, 'json', wire.SUBPROTOCOL_JSON),
+            ({'subprotocols': [wire.SUBPROTOCOL_JSON, wire.SUBPROTOCOL_MSGPACK]}, 'msgpack', wire.SUBPROTOCOL_MSGPACK),
+            ({'query_string': b'protocol=msgpack'}, 'msgpack', None),
+            ({'query_string': b'protocol=xml'}, 'json', None),
+        ]
+        for scope, codec, subprotocol in cases:
+            negotiated, echo = wire.negotiate(scope)
+            self.assertEqual((negotiated.name, echo), (codec, subprotocol), scope)
+
+        with override_settings(WS_MSGPACK_ENABLED=False):
+            scope = {'subprotocols': [wire.SUBPROTOCOL_JSON, wire.SUBPROTOCOL_MSGPACK], 'query_string': b'protocol=msgpack'}
+            negotiated, echo = wire.negotiate(scope)
+            self.assertEqual((negotiated.name, echo), ('json', wire.SUBPROTOCOL_JSON))
+            self.assertEqual(set(wire.encode_all({'type': 'pong'})), {'json'})
+
+    def test_msgpack_round_trip_uses_field_codes(self):
+        content = {
+            'type': 'ice_candidate',
+            'candidate': {'candidate': 'candidate:1 1 UDP 2122252543 10.0.0.2 49203 typ host', 'sdpMid': '0', 't': 1},
+            'from_user_id': '12',
+        }
+        packed = wire.CODECS['msgpack'].encode(content)['bytes_data']
+        self.assertEqual(unpack(packed), content)
+        raw = msgpack.unpackb(packed, strict_map_key=False)
+        self.assertEqual(raw[wire.FIELD_CODES['type']], 'ice_candidate')
+        self.assertIn('sdpMid', raw[wire.FIELD_CODES['candidate']])
+        self.assertLess(len(packed), len(json.dumps(content)))
+
+    def test_malformed_frames(self):
+        codec = wire.CODECS['msgpack']
+        for text_data, bytes_data in (('{nope', None), (None, b'\xc1'), (None, None)):
+            with self.assertRaises(ValueError):
+                codec.decode(text_data, bytes_data)
+        # Either kind is accepted on any connection
+        self.assertEqual(codec.decode('{"type": "heartbeat"}', None), {'type': 'heartbeat'})
+
+
+@override_settings(PRESENCE_BACKEND='memory', WS_MSGPACK_ENABLED=True)
+class WireConsumerTest(TestCase):
+    def setUp(self):
+        PresenceService.reset()
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='testuser', password='password', email='test@test.com',
+            email_verified=True, organization=self.org
+        )
+        self.channel = Channel.objects.create(
+            name='general', organization=self.org, channel_type=Channel.ChannelType.OFFICIAL
+        )
+
+    def tearDown(self):
+        PresenceService.reset()
+
+    async def _connect(self, consumer, path, subprotocols=None, **scope):
+        communicator = WebsocketCommunicator(consumer.as_asgi(), path, subprotocols=subprotocols)
+        communicator.scope['user'] = self.user
+        communicator.scope.update(scope)
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator, subprotocol
+
+    async def test_presence_over_msgpack(self):
+        communicator, subprotocol = await self._connect(
+            PresenceConsumer, '/ws/presence/', subprotocols=[wire.SUBPROTOCOL_MSGPACK]
+        )
+        self.assertEqual(subprotocol, wire.SUBPROTOCOL_MSGPACK)
+        hello = json.loads(await communicator.receive_from())
+        self.assertEqual(hello['fields'][wire.FIELD_CODES['status']], 'status')
+
+        await communicator.send_to(bytes_data=msgpack.packb({wire.FIELD_CODES['type']: 'heartbeat'}))
+        frames = []
+        while not frames or frames[-1]['type'] != 'pong':
+            output = await communicator.receive_output(timeout=1)
+            frames.append(unpack(output['bytes']))
+        self.assertEqual(frames[0], {'type': 'presence', 'user_id': self.user.pk, 'status': 'ONLINE'})
+        await communicator.disconnect()
+
+    async def test_chat_broadcast_reaches_both_protocols(self):
+        route = {'url_route': {'kwargs': {'channel_id': str(self.channel.pk)}}}
+        path = f'/ws/chat/{self.channel.pk}/'
+        plain, _ = await self._connect(ChatConsumer, path, **route)
+        compact, _ = await self._connect(ChatConsumer, path + '?protocol=msgpack', **route)
+        self.assertEqual(json.loads(await compact.receive_from())['type'], 'protocol')
+
+        await plain.send_to(text_data=json.dumps({'type': 'chat_message', 'message': 'hello both'}))
+
+        async def next_chat_message(communicator):
+            while True:
+                output = await communicator.receive_output(timeout=2)
+                frame = json.loads(output['text']) if output.get('text') else unpack(output['bytes'])
+                if frame['type'] == 'chat_message':
+                    return frame, output
+
+        as_json, _ = await next_chat_message(plain)
+        as_msgpack, output = await next_chat_message(compact)
+        self.assertIsNotNone(output.get('bytes'))
+        self.assertEqual(as_msgpack, as_json)
+        self.assertEqual(as_json['message'], 'hello both')
+
+        await plain.disconnect()
+        await compact.disconnect()
+
+    async def test_chat_socket_heartbeat_keeps_presence(self):
+        route = {'url_route': {'kwargs': {'channel_id': str(self.channel.pk)}}}
+        with mock.patch.object(presence.time, 'time', return_value=1000.0):
+            communicator, _ = await self._connect(ChatConsumer, f'/ws/chat/{self.channel.pk}/', **route)
+        with mock.patch.object(presence.time, 'time', return_value=1080.0):
+            await communicator.send_to(text_data=json.dumps({'type': 'heartbeat'}))
+            while json.loads(await communicator.receive_from())['type'] != 'pong':
+                pass
+        # Past the TTL of the connect, but not of the heartbeat
+        with mock.patch.object(presence.time, 'time', return_value=1100.0):
+            self.assertEqual(PresenceService.get_status(self.user.id), 'ONLINE')
+        await communicator.disconnect()
@@ -0,0 +1,117 @@
+"""
+Typing indicators.
+
+Clients report ``typing`` start/stop frames; instead of relaying each one to
+the whole channel group, typers are tracked per channel with an expiry and
+the channel receives at most one aggregated "who is typing" frame per
+``TYPING_BROADCAST_INTERVAL``:
+- A start frame from someone already typing only refreshes their expiry, and
+  a stop frame from someone not typing is ignored; neither is broadcast
+- The first change in a quiet channel claims the channel's broadcast slot;
+  the claiming connection sends the current typer list once per interval
+  for as long as anyone is typing, so every change within an interval goes
+  out as one frame and typers whose client vanished without a stop frame
+  expire out of the list
+- A frame is only sent when the list differs from the last one sent
+
+State lives in the presence store (see ``apps.accounts.services.presence``),
+so it is shared across workers when presence is.
+"""
+
+import time
+
+from django.conf import settings
+
+from apps.accounts.services.presence import get_presence_store
+
+KEY_PREFIX = 'typing'
+
+
+def _typers_key(channel_id):
+    return f"{KEY_PREFIX}:{channel_id}"
+
+
+def _sent_key(channel_id):
+    return f"{KEY_PREFIX}:{channel_id}:sent"
+
+
+def _slot_key(channel_id):
+    return f"{KEY_PREFIX}:{channel_id}:slot"
+
+
+class TypingTracker:
+    """Per-channel typers with expiry and one broadcast slot per interval."""
+
+    @staticmethod
+    def ttl():
+        return getattr(settings, 'TYPING_TTL', 6)
+
+    @staticmethod
+    def interval():
+        return getattr(settings, 'TYPING_BROADCAST_INTERVAL', 1.0)
+
+    @staticmethod
+    def _live(typers, now):
+        return {user_id: entry for user_id, entry in typers.items() if entry[1] > now}
+
+    @classmethod
+    def update(cls, channel_id, user_id, name, is_typing):
+        """
+        Record a start/stop frame. Returns True if the set of typers changed
+        (and a broadcast is due), False for redundant frames.
+        """
+        store = get_presence_store()
+        now = time.time()
+        key = _typers_key(channel_id)
+        with store.lock(key):
+            typers = cls._live(store.get(key) or {}, now)
+            was_typing = user_id in typers
+            if is_typing:
+                typers[user_id] = (name, now + cls.ttl())
+            else:
+                typers.pop(user_id, None)
+            store.set(key, typers, cls.ttl() * 2)
+        return was_typing != bool(is_typing)
+
+    @classmethod
+    def claim_broadcast(cls, channel_id):
+        """True if the caller should start sending the channel's aggregated frames."""
+        return get_presence_store().add(_slot_key(channel_id), 1, cls.interval() * 3)
+
+    @classmethod
+    def snapshot(cls, channel_id):
+        """
+        Return ``(typers, changed)``: the current typers as
+        ``[{'user_id', 'name'}]`` sorted by user id, and whether they differ
+        from the last list sent (which this records as sent). Refreshes the
+        broadcast slot while anyone is typing.
+        """
+        store = get_presence_store()
+        key = _typers_key(channel_id)
+        with store.lock(key):
+            typers = cls._live(store.get(key) or {}, time.time())
+            ids = sorted(typers)
+            changed = ids != (store.get(_sent_key(channel_id)) or [])
+            if changed:
+                store.set(_sent_key(channel_id), ids, cls.ttl() * 2)
+            if typers:
+                store.set(_slot_key(channel_id), 1, cls.interval() * 3)
+        return [{'user_id': user_id, 'name': typers[user_id][0]} for user_id in ids], changed
+
+    @classmethod
+    def finish(cls, channel_id):
+        """
+        Release the broadcast slot once nobody is typing. Returns True if a
+        change slipped in meanwhile and the caller has re-claimed the slot.
+        """
+        store = get_presence_store()
+        key = _typers_key(channel_id)
+        store.delete(_slot_key(channel_id))
+        with store.lock(key):
+            pending = sorted(cls._live(store.get(key) or {}, time.time())) != (store.get(_sent_key(channel_id)) or [])
+        return pending and cls.claim_broadcast(channel_id)
+
+    @staticmethod
+    def payload(typers):
+        """Group event for ``ChatConsumer.typing_state``."""
+        return {'type': 'typing_state', 'typers': typers}
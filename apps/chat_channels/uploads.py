@@ -0,0 +1,197 @@
+"""
+Parallel attachment uploads for chat messages.
+
+Files posted with a message used to be stored one after another, each
+``Attachment.objects.create`` waiting on its own storage round trip, and the
+message was visible (without its files) from the moment it was saved.
+:func:`upload_attachments` instead:
+- Expects the message saved as ``SENDING``, which history does not list
+- Reuses the stored copy of any file whose content is already known
+  (``BlobService.claim``), so only new content is uploaded
+- Pushes the remaining files to storage concurrently on a bounded thread pool
+  (``ATTACHMENT_UPLOAD_WORKERS``); workers only talk to storage, never to
+  the database
+- Reports each file to the chat group as it lands or fails, as an
+  ``attachment_progress`` event that clients receive as::
+
+    {"type": "upload_progress", "message_id": ..., "user_id": 7, "index": 0,
+     "name": "a.png", "state": "stored", "done": 1, "total": 3}
+
+- Creates the attachment rows and marks the message ``SENT`` in one
+  transaction once every file is stored, only then counts it in the
+  channel's activity (unread counts, last message), and broadcasts
+  ``chat_message`` once, attachments included
+
+If any file fails, files not yet started are cancelled, stored ones are
+removed from storage (reused ones released), the message is deleted and the
+error re-raised.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+from apps.organizations.services import BlobService
+
+from . import broadcast
+
+logger = logging.getLogger(__name__)
+
+ATTACHMENT_MAX_SIZE = 100 * 1024 * 1024  # 100MB
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'ATTACHMENT_UPLOAD_WORKERS', 4),
+            thread_name_prefix='attachment-upload'
+        )
+    return _executor
+
+
+def store(attachment):
+    """Upload an unsaved attachment's file; the field swaps in the stored resource."""
+    attachment._meta.get_field('file').pre_save(attachment, True)
+
+
+def discard(attachment):
+    """Remove a stored file that will not get an attachment row."""
+    import cloudinary.uploader
+
+    if attachment.blob_id:
+        BlobService.release(attachment.blob_id)
+        return
+    try:
+        cloudinary.uploader.destroy(attachment.file.public_id)
+    except Exception as e:
+        logger.exception(f"Cloudinary deletion error: {e}")
+
+
+def attachment_payload(attachment):
+    return {
+        'id': str(attachment.pk),
+        'url': attachment.file.url,
+        'name': str(attachment.file).split('/')[-1],
+        'size': attachment.file_size,
+        'is_image': attachment.is_image,
+        'is_video': attachment.is_video,
+    }
+
+
+def message_event(message, attachments):
+    """The ``chat_message`` group event for a finalized message."""
+    sender = message.sender
+    parent = message.parent_message
+    return {
+        'type': 'chat_message',
+        'message': message.content,
+        'message_type': message.message_type,
+        'emoji_count': message.emoji_count,
+        'status': message.status,
+        'sender_id': sender.id,
+        'sender_name': sender.get_full_name(),
+        'sender_avatar': sender.avatar.url if sender.avatar else None,
+        'message_id': str(message.pk),
+        'timestamp': message.created_at.strftime('%b %d, %I:%M %p'),
+        'voice_message_url': message.voice_message.url if message.voice_message else None,
+        'voice_duration': message.voice_duration,
+        'attachments': [attachment_payload(attachment) for attachment in attachments],
+        'parent_message_id': str(parent.pk) if parent else None,
+        'parent_details': {
+            'id': str(parent.pk),
+            'sender_name': parent.sender.get_full_name() or parent.sender.username,
+            'content': parent.content[:100] if not parent.is_deleted else 'This message was deleted.'
+        } if parent else None,
+    }
+
+
+def _progress_event(message, files, index, state, done):
+    return {
+        'type': 'attachment_progress',
+        'message_id': str(message.pk),
+        'user_id': message.sender_id,
+        'index': index,
+        'name': files[index].name,
+        'state': state,
+        'done': done,
+        'total': len(files),
+    }
+
+
+def _group_send(message, event):
+    async_to_sync(get_channel_layer().group_send)(f'chat_{message.channel_id}', broadcast.encode(event))
+
+
+def upload_attachments(message, files):
+    """
+    Store ``files`` for a saved message, finalize it and broadcast it.
+
+    Returns the created attachments; with no files the message is only
+    finalized and broadcast.
+    """
+    from .models import Attachment, Message
+    from .read_state import record_message
+
+    pending = message.status == Message.MessageStatus.SENDING
+    for upload in files:
+        if upload.size > ATTACHMENT_MAX_SIZE:
+            message.delete(force=True)
+            raise ValueError(f"File {upload.name} is too large. Maximum size is 100MB.")
+
+    attachments = [Attachment(message=message, file=upload, file_size=upload.size) for upload in files]
+    # Hashing happens here: workers stay off the database
+    reused = [index for index, attachment in enumerate(attachments) if BlobService.claim(attachment)]
+    stored, error = [], None
+    for index in reused:
+        stored.append(attachments[index])
+        _group_send(message, _progress_event(message, files, index, 'stored', len(stored)))
+    futures = {
+        _get_executor().submit(store, attachment): index
+        for index, attachment in enumerate(attachments) if index not in reused
+    }
+    for future in as_completed(futures):
+        if future.cancelled():
+            continue
+        index = futures[future]
+        try:
+            future.result()
+        except Exception as e:
+            logger.error(f"Attachment upload failed for {files[index].name}: {e}", exc_info=True)
+            if error is None:
+                error = e
+                for pending in futures:
+                    pending.cancel()
+            state = 'failed'
+        else:
+            stored.append(attachments[index])
+            state = 'stored'
+        _group_send(message, _progress_event(message, files, index, state, len(stored)))
+
+    if error is not None:
+        for attachment in stored:
+            discard(attachment)
+        message.delete(force=True)
+        raise error
+
+    with transaction.atomic():
+        # Saved one by one so storage accounting and blob registration run
+        for attachment in attachments:
+            attachment.save(force_insert=True)
+        Message.all_objects.filter(pk=message.pk).update(status=Message.MessageStatus.SENT)
+    message.status = Message.MessageStatus.SENT
+    if pending:
+        # Skipped by record_channel_activity while the message was pending
+        try:
+            record_message(message)
+        except Exception as e:
+            logger.exception(f"Channel activity error: {e}")
+
+    _group_send(message, message_event(message, attachments))
+    return attachments
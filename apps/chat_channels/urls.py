@@ -9,6 +9,8 @@ urlpatterns = [
     path('create/', views.channel_create, name='channel_create'),
     path('project/<uuid:project_id>/create/', views.project_channel_create, name='project_channel_create'),
     path('direct/<int:user_id>/', views.start_direct_message, name='start_direct_message'),
+    path('search/messages/', views.message_search, name='message_search'),
+    path('sidebar/', views.channel_sidebar, name='channel_sidebar'),
     
     # JSON endpoints for forward modal
     path('json/forward/', channels_for_forward, name='channels_for_forward'),
@@ -17,6 +19,8 @@ urlpatterns = [
     path('<uuid:pk>/', views.channel_detail, name='channel_detail'),
     path('<uuid:pk>/edit/', views.channel_edit, name='channel_edit'),
     path('<uuid:pk>/delete/', views.channel_delete, name='channel_delete'),
+    path('<uuid:pk>/messages/older/', views.channel_messages_older, name='channel_messages_older'),
+    path('<uuid:pk>/messages/newer/', views.channel_messages_newer, name='channel_messages_newer'),
     
     # Breakout rooms
     path('<uuid:channel_id>/breakout/create/', views.breakout_create, name='breakout_create'),
@@ -26,6 +30,7 @@ urlpatterns = [
     path('message/<uuid:pk>/edit/', views.message_edit, name='message_edit'),
     path('message/<uuid:pk>/delete/', views.message_delete, name='message_delete'),
     path('message/<uuid:pk>/react/', views.message_react, name='message_react'),
+    path('message/<uuid:pk>/reactions/', views.message_reactors, name='message_reactors'),
     path('message/<uuid:pk>/thread/', views.message_thread, name='message_thread'),
     path('message/<uuid:pk>/reply/', views.message_reply, name='message_reply'),
     path('<uuid:pk>/pinned/', views.channel_pinned_messages, name='channel_pinned_messages'),
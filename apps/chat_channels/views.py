@@ -1,11 +1,59 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Count, Q
+from django.db.models import Count, F, Q
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
-from .models import Channel, Message, MessageReaction, Attachment
+from .models import Channel, Message
 from .forms import ChannelForm, MessageForm, BreakoutRoomForm
+from .access import can_view_channel, viewable_channels
+from .search import apply_message_search
+from .read_state import annotate_unread_counts
+from . import broadcast, reactions, uploads
+from .pagination import (
+    InvalidCursor, annotate_date_separators, clamp_page_size, decode_cursor,
+    get_message_window,
+)
+
+
+MESSAGE_PAGE_SIZE = 50
+
+
+def _channel_messages_query(channel, search_query=None):
+    """Build the (optionally searched) message queryset for a channel."""
+    messages_query = Message.objects.filter(
+        channel=channel
+    ).select_related('sender', 'parent_message').prefetch_related(
+        'attachments'
+    )
+    
+    if not search_query:
+        return messages_query
+    
+    return apply_message_search(messages_query, search_query)
+
+
+def _sidebar_channels(user):
+    """
+    The user's channels and DMs, most recently active first, annotated with
+    ``unread_count``. One query, plus one for the members of the DMs; no
+    message scans.
+    """
+    from django.db.models import prefetch_related_objects
+
+    channels = list(annotate_unread_counts(
+        Channel.objects.filter(
+            Q(is_archived=False) | Q(channel_type=Channel.ChannelType.DIRECT),
+            organization=user.organization,
+            members=user
+        ).distinct().order_by(F('last_message_at').desc(nulls_last=True), 'name'),
+        user
+    ))
+    prefetch_related_objects(
+        [c for c in channels if c.channel_type == Channel.ChannelType.DIRECT], 'members'
+    )
+    return channels
 
 
 @login_required
@@ -17,11 +65,14 @@ def channel_list(request):
         messages.warning(request, 'You are not assigned to any organization.')
         return redirect('accounts:dashboard')
     
-    # Get channels user can access
-    channels = Channel.objects.filter(
+    # Get channels user can access (resolved in SQL, member counts annotated
+    # instead of prefetching every member list)
+    channels = viewable_channels(user, Channel.objects.filter(
         organization=user.organization,
         is_archived=False
-    ).select_related('department', 'team', 'created_by').prefetch_related('members')
+    )).select_related('department', 'team', 'created_by').annotate(
+        num_members=Count('members', distinct=True)
+    )
     
     # Filter by type
     official_channels = channels.filter(channel_type=Channel.ChannelType.OFFICIAL)
@@ -29,7 +80,10 @@ def channel_list(request):
     team_channels = channels.filter(channel_type=Channel.ChannelType.TEAM)
     project_channels = channels.filter(channel_type=Channel.ChannelType.PROJECT)
     private_channels = channels.filter(channel_type=Channel.ChannelType.PRIVATE, members=user)
-    direct_messages = channels.filter(channel_type=Channel.ChannelType.DIRECT, members=user)
+    # DM tiles render the other participant, so only these need member rows
+    direct_messages = channels.filter(
+        channel_type=Channel.ChannelType.DIRECT, members=user
+    ).prefetch_related('members')
     
     context = {
         'official_channels': official_channels,
@@ -151,7 +205,7 @@ def project_channel_create(request, project_id):
     project = get_object_or_404(SharedProject, pk=project_id)
     
     # Check permission (must be project member and admin of their org)
-    if user not in project.members.all() or not user.is_admin:
+    if not project.members.filter(pk=user.pk).exists() or not user.is_admin:
         messages.error(request, 'You do not have permission to create channels for this project.')
         return redirect('organizations:shared_project_detail', pk=project_id)
     
@@ -223,108 +277,11 @@ def channel_detail(request, pk):
         messages.error(request, 'You do not have permission to view this channel.')
         return redirect('chat_channels:channel_list')
     
-    # Get messages (WhatsApp style: all messages in one stream)
-    messages_query = Message.objects.filter(
-        channel=channel
-    ).select_related('sender', 'parent_message').prefetch_related(
-        'reactions',
-        'attachments'
-    )
-    
-    # Handle search
+    # Get messages (WhatsApp style: one stream, windowed by (created_at, id))
     search_query = request.GET.get('q')
-    search_filters = {}
-    
-    if search_query:
-        # Parse advanced search filters
-        import re
-        
-        # Extract special filters
-        from_user = re.search(r'from:(\S+)', search_query)
-        has_filter = re.search(r'has:(file|link|attachment|image|video)', search_query)
-        
-        # Remove filters from query to get clean search text
-        clean_query = search_query
-        if from_user:
-            search_filters['from_user'] = from_user.group(1)
-            clean_query = clean_query.replace(from_user.group(0), '').strip()
-        if has_filter:
-            search_filters['has'] = has_filter.group(1)
-            clean_query = clean_query.replace(has_filter.group(0), '').strip()
-        
-        # Apply filters
-        if clean_query:
-            # Try PostgreSQL full-text search first
-            try:
-                from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
-                
-                # Create search vector for message content and sender name
-                search_vector = SearchVector('content', weight='A') + \
-                               SearchVector('sender__first_name', weight='B') + \
-                               SearchVector('sender__last_name', weight='B') + \
-                               SearchVector('sender__username', weight='C')
-                
-                search_query_obj = SearchQuery(clean_query)
-                
-                messages_query = messages_query.annotate(
-                    search=search_vector,
-                    rank=SearchRank(search_vector, search_query_obj)
-                ).filter(search=search_query_obj).order_by('-rank', '-created_at')
-                
-            except Exception as e:
-                # Fallback to basic search (SQLite or if PostgreSQL search fails)
-                messages_query = messages_query.filter(
-                    Q(content__icontains=clean_query) |
-                    Q(sender__first_name__icontains=clean_query) |
-                    Q(sender__last_name__icontains=clean_query) |
-                    Q(sender__username__icontains=clean_query)
-                )
-        
-        # Apply from:user filter
-        if 'from_user' in search_filters:
-            from_username = search_filters['from_user']
-            messages_query = messages_query.filter(
-                Q(sender__username__iexact=from_username) |
-                Q(sender__first_name__icontains=from_username) |
-                Q(sender__last_name__icontains=from_username)
-            )
-        
-        # Apply has:type filter
-        if 'has' in search_filters:
-            has_type = search_filters['has']
-            if has_type in ['file', 'attachment']:
-                messages_query = messages_query.filter(attachments__isnull=False).distinct()
-            elif has_type == 'link':
-                # Messages containing URLs
-                messages_query = messages_query.filter(
-                    Q(content__icontains='http://') |
-                    Q(content__icontains='https://')
-                )
-            elif has_type == 'image':
-                messages_query = messages_query.filter(
-                    message_type='IMAGE'
-                ).distinct()
-            elif has_type == 'video':
-                messages_query = messages_query.filter(
-                    message_type='VIDEO'
-                ).distinct()
-    
-    channel_messages = messages_query.order_by('created_at')
-    
-    # Add date separators info to messages
-    messages_with_dates = []
-    prev_date = None
-    for msg in channel_messages:
-        msg_date = msg.created_at.date()
-        if prev_date is None or msg_date != prev_date:
-            msg.show_date_separator = True
-            msg.date_label = msg.created_at
-        else:
-            msg.show_date_separator = False
-        prev_date = msg_date
-        messages_with_dates.append(msg)
-    
-    channel_messages = messages_with_dates
+    messages_query = _channel_messages_query(channel, search_query)
+    message_window = get_message_window(messages_query, limit=MESSAGE_PAGE_SIZE)
+    channel_messages = annotate_date_separators(message_window.messages)
     
     # Get active breakout rooms for this channel
     breakout_rooms = Channel.objects.filter(
@@ -334,25 +291,13 @@ def channel_detail(request, pk):
     )
     
     # Get sidebar conversation list
-    user_channels_query = Channel.objects.filter(
-        organization=user.organization,
-        is_archived=False,
-        members=user
-    ).exclude(channel_type=Channel.ChannelType.DIRECT).distinct()
+    sidebar = _sidebar_channels(user)
+    user_channels = [c for c in sidebar if c.channel_type != Channel.ChannelType.DIRECT]
+    direct_messages = [c for c in sidebar if c.channel_type == Channel.ChannelType.DIRECT]
 
     # If the current channel is not a DM and not in user_channels (e.g. admin viewing it), add it to the list
-    if channel.channel_type != Channel.ChannelType.DIRECT and channel not in user_channels_query:
-        # Convert to list to allow appending
-        user_channels = list(user_channels_query)
+    if channel.channel_type != Channel.ChannelType.DIRECT and channel.pk not in {c.pk for c in user_channels}:
         user_channels.append(channel)
-    else:
-        user_channels = user_channels_query
-
-    direct_messages = Channel.objects.filter(
-        organization=user.organization,
-        channel_type=Channel.ChannelType.DIRECT,
-        members=user
-    ).distinct()
     
     # Handle message posting
     if request.method == 'POST':
@@ -378,8 +323,6 @@ def channel_detail(request, pk):
             message.channel = channel
             message.sender = request.user
             
-            content = message.content.strip()
-            
             # Identify message type
             if request.FILES.get('voice_message'):
                 message.message_type = 'VOICE'
@@ -392,60 +335,19 @@ def channel_detail(request, pk):
                 else:
                     message.message_type = 'FILE'
             else:
-                # Check for Emoji-only
-                import re
-                emoji_pattern = re.compile(
-                    "["
-                    "\U0001F600-\U0001F64F"  # emoticons
-                    "\U0001F300-\U0001F5FF"  # symbols & pictographs
-                    "\U0001F680-\U0001F6FF"  # transport & map symbols
-                    "\U0001F1E0-\U0001F1FF"  # flags (iOS)
-                    "\U00002702-\U000027B0"  # dingbats
-                    "\U000024C2-\U0001F251"
-                    "\U0001F900-\U0001F9FF"  # supplemental symbols
-                    "\U0001FA00-\U0001FA6F"  # extended symbols
-                    "\U00002600-\U000026FF"  # miscellaneous symbols
-                    "\U00002700-\U000027BF"  # dingbats
-                    "\U0001F191-\U0001F19A"  # enclosed characters
-                    "]+", 
-                    flags=re.UNICODE
-                )
-                text_without_emoji = emoji_pattern.sub('', content).strip()
-                has_emojis = bool(emoji_pattern.search(content))
-                
-                if has_emojis and not text_without_emoji:
-                    message.message_type = 'EMOJI'
-                else:
-                    message.message_type = 'TEXT'
+                # Message.save() turns emoji-only TEXT into EMOJI
+                message.message_type = 'TEXT'
             
+            # Pending until every attachment is stored (see uploads.py)
+            attachment_files = request.FILES.getlist('attachments')
+            if attachment_files:
+                message.status = Message.MessageStatus.SENDING
             message.save()
             
-            processed_attachments = []
             try:
-                # Handle multiple attachments
-                attachments = request.FILES.getlist('attachments')
-                for attachment_file in attachments:
-                    try:
-                        # Check file size (max 100MB)
-                        max_size = 100 * 1024 * 1024  # 100MB
-                        if attachment_file.size > max_size:
-                            raise ValueError(f"File {attachment_file.name} is too large. Maximum size is 100MB.")
-                        
-                        att = Attachment.objects.create(message=message, file=attachment_file)
-                        processed_attachments.append({
-                            'url': att.file.url, 
-                            'name': str(att.file).split('/')[-1],
-                            'is_image': att.is_image,
-                            'is_video': att.is_video
-                        })
-                    except Exception as att_error:
-                        import logging
-                        logger = logging.getLogger(__name__)
-                        logger.error(f"Individual attachment upload failed for {attachment_file.name}: {str(att_error)}", exc_info=True)
-                        raise  # Re-raise to be caught by outer try-except
-                        
+                attachments = uploads.upload_attachments(message, attachment_files)
             except Exception as e:
-                # Log the error for debugging
+                # upload_attachments has already deleted the message
                 import logging
                 logger = logging.getLogger(__name__)
                 logger.error(f"Attachment upload failed: {str(e)}", exc_info=True)
@@ -458,12 +360,6 @@ def channel_detail(request, pk):
                     error_message = str(e)
                 else:
                     error_message = "Server error. Please check your storage quota and try again."
-                
-                # If attachment upload fails, permanently delete the orphan message
-                try:
-                    message.delete(force=True)
-                except:
-                    pass  # Message might already be deleted
                     
                 if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                     return JsonResponse({
@@ -474,17 +370,17 @@ def channel_detail(request, pk):
                 return redirect('chat_channels:channel_detail', pk=pk)
             
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                # Already broadcast to the channel, the client needs no follow-up frame
                 return JsonResponse({
                     'success': True,
                     'message_id': str(message.id),
                     'message_type': message.message_type,
+                    'status': message.status,
                     'content': message.content,
                     'sender_avatar': request.user.avatar.url if request.user.avatar else None,
                     'voice_message_url': message.voice_message.url if message.voice_message else None,
                     'timestamp': message.created_at.strftime('%b %d, %I:%M %p'),
-                    'attachments': [
-                        {'name': att.file.name, 'url': att.file.url} for att in message.attachments.all()
-                    ]
+                    'attachments': [uploads.attachment_payload(att) for att in attachments]
                 })
             
             return redirect('chat_channels:channel_detail', pk=pk)
@@ -501,19 +397,105 @@ def channel_detail(request, pk):
     context = {
         'channel': channel,
         'chat_messages': channel_messages,
+        'message_window': message_window,
         'breakout_rooms': breakout_rooms,
         'user_channels': user_channels,
         'direct_messages': direct_messages,
         'form': form,
         'search_query': search_query,
         'can_edit': user.is_admin or channel.created_by == user,
-        'is_member': user in channel.members.all(),
-        'can_post': channel.can_user_post(user) if hasattr(channel, 'can_user_post') else user in channel.members.all(),
+        'is_member': channel.members.filter(pk=user.pk).exists(),
+        'can_post': channel.can_user_post(user),
         'pinned_messages': pinned_messages
     }
     return render(request, 'chat_channels/channel_detail.html', context)
 
 
+def _message_page_response(request, channel, window, joins_next_day=False):
+    """Render a window of messages as an HTML fragment for the history loaders."""
+    from django.template.loader import render_to_string
+    
+    html = render_to_string(
+        'chat_channels/partials/message_list.html',
+        {'chat_messages': window.messages, 'channel': channel},
+        request=request
+    )
+    return JsonResponse({
+        'html': html,
+        'count': len(window),
+        'has_older': window.has_older,
+        'has_newer': window.has_newer,
+        'older_cursor': window.older_cursor,
+        'newer_cursor': window.newer_cursor,
+        'joins_next_day': joins_next_day,
+        'voice_messages': [
+            {
+                'id': str(msg.pk),
+                'url': msg.voice_message.url,
+                'is_me': msg.sender_id == request.user.id
+            } for msg in window.messages if msg.voice_message
+        ]
+    })
+
+
+def _get_viewable_channel_or_error(request, pk):
+    channel = get_object_or_404(Channel, pk=pk, organization=request.user.organization)
+    if not channel.can_user_view(request.user):
+        return None, JsonResponse({'error': 'Access denied'}, status=403)
+    return channel, None
+
+
+@login_required
+def channel_messages_older(request, pk):
+    """Return the page of messages immediately older than ``?before=<cursor>``."""
+    channel, error = _get_viewable_channel_or_error(request, pk)
+    if error:
+        return error
+    
+    cursor = request.GET.get('before')
+    if not cursor:
+        return JsonResponse({'error': 'before cursor required'}, status=400)
+    
+    try:
+        boundary_date = decode_cursor(cursor)[0].date()
+        window = get_message_window(
+            _channel_messages_query(channel, request.GET.get('q')),
+            before=cursor,
+            limit=clamp_page_size(request.GET.get('limit'), MESSAGE_PAGE_SIZE)
+        )
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    
+    annotate_date_separators(window.messages)
+    joins_next_day = bool(window.messages) and window.messages[-1].created_at.date() == boundary_date
+    return _message_page_response(request, channel, window, joins_next_day)
+
+
+@login_required
+def channel_messages_newer(request, pk):
+    """Return the page of messages immediately newer than ``?after=<cursor>``."""
+    channel, error = _get_viewable_channel_or_error(request, pk)
+    if error:
+        return error
+    
+    cursor = request.GET.get('after')
+    if not cursor:
+        return JsonResponse({'error': 'after cursor required'}, status=400)
+    
+    try:
+        boundary_date = decode_cursor(cursor)[0].date()
+        window = get_message_window(
+            _channel_messages_query(channel, request.GET.get('q')),
+            after=cursor,
+            limit=clamp_page_size(request.GET.get('limit'), MESSAGE_PAGE_SIZE)
+        )
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    
+    annotate_date_separators(window.messages, previous_date=boundary_date)
+    return _message_page_response(request, channel, window)
+
+
 @login_required
 def channel_edit(request, pk):
     """Edit a channel."""
@@ -626,12 +608,12 @@ def message_delete(request, pk):
         channel_layer = get_channel_layer()
         async_to_sync(channel_layer.group_send)(
             f'chat_{channel_id}',
-            {
+            broadcast.encode({
                 'type': 'message_deleted',
                 'message_id': str(pk),
                 'deleted_at': message.deleted_at.isoformat() if message.deleted_at else None,
                 'deleted_by': user.id
-            }
+            })
         )
         
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -647,34 +629,46 @@ def message_delete(request, pk):
 @login_required
 @require_POST
 def message_react(request, pk):
-    """Add or remove a reaction to a message."""
+    """Add or remove a reaction to a message and broadcast the delta."""
     user = request.user
-    message = get_object_or_404(Message, pk=pk)
+    message = get_object_or_404(Message.objects.only('id', 'channel_id'), pk=pk)
     emoji = request.POST.get('emoji', '👍')
     
-    # Check if reaction already exists
-    reaction, created = MessageReaction.objects.get_or_create(
-        message=message,
-        user=user,
-        emoji=emoji
-    )
+    delta = reactions.toggle_reaction(message.pk, user, emoji)
+    if delta is None:
+        return JsonResponse({'error': 'Invalid reaction'}, status=400)
     
-    if not created:
-        # Remove reaction if it already exists
-        reaction.delete()
-        action = 'removed'
-    else:
-        action = 'added'
+    from channels.layers import get_channel_layer
+    from asgiref.sync import async_to_sync
+    async_to_sync(get_channel_layer().group_send)(f'chat_{message.channel_id}', broadcast.encode(delta))
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         # Return JSON for AJAX requests
+        message.refresh_from_db(fields=['reaction_counts'])
         return JsonResponse({
             'success': True,
-            'action': action,
+            'action': 'added' if delta['delta'] > 0 else 'removed',
             'reaction_summary': message.reaction_summary
         })
     
-    return redirect('chat_channels:channel_detail', pk=message.channel.pk)
+    return redirect('chat_channels:channel_detail', pk=message.channel_id)
+
+
+@login_required
+def message_reactors(request, pk):
+    """
+    Who reacted to a message, loaded on demand (e.g. when hovering a reaction).
+    ``?emoji=`` narrows to one emoji; at most ``REACTORS_PAGE_SIZE`` users are returned.
+    """
+    message = get_object_or_404(Message.objects.only('id', 'channel_id', 'reaction_counts'), pk=pk)
+    if not can_view_channel(request.user, message.channel_id):
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    emoji = request.GET.get('emoji')
+    return JsonResponse({
+        'counts': message.reaction_summary,
+        'reactors': reactions.reactors(message, emoji=emoji, limit=reactions.REACTORS_PAGE_SIZE),
+    })
 
 
 @login_required
@@ -775,6 +769,56 @@ def channel_pinned_messages(request, pk):
     })
 
 
+@login_required
+def message_search(request):
+    """Search messages across every channel the user can view."""
+    search_query = request.GET.get('q', '').strip()
+    if not search_query:
+        return JsonResponse({'results': []})
+
+    messages_query = apply_message_search(
+        Message.objects.filter(
+            channel__in=viewable_channels(request.user),
+            is_deleted=False
+        ).select_related('sender', 'channel'),
+        search_query
+    ).order_by('-created_at')[:25]
+
+    return JsonResponse({
+        'results': [{
+            'id': str(msg.id),
+            'channel_id': str(msg.channel_id),
+            'channel_name': msg.channel.name,
+            'url': f"{reverse('chat_channels:channel_detail', args=[msg.channel_id])}#message-{msg.id}",
+            'content': msg.content[:200],
+            'sender_name': msg.sender.get_full_name() if msg.sender else '',
+            'timestamp': msg.created_at.strftime('%b %d, %I:%M %p'),
+        } for msg in messages_query]
+    })
+
+
+
+@login_required
+def channel_sidebar(request):
+    """Sidebar conversation list with unread badges, most recently active first."""
+    user = request.user
+    results = []
+    for channel in _sidebar_channels(user):
+        name = channel.name
+        if channel.channel_type == Channel.ChannelType.DIRECT:
+            name = ', '.join(m.get_full_name() or m.username for m in channel.members.all() if m.pk != user.pk) or name
+        results.append({
+            'id': str(channel.pk),
+            'name': name,
+            'channel_type': channel.channel_type,
+            'is_private': channel.is_private,
+            'url': reverse('chat_channels:channel_detail', args=[channel.pk]),
+            'last_message_at': channel.last_message_at.isoformat() if channel.last_message_at else None,
+            'last_message_id': str(channel.last_message_id) if channel.last_message_id else None,
+            'unread_count': channel.unread_count,
+        })
+    return JsonResponse({'results': results})
+
 
 @login_required
 @require_POST
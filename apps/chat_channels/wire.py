@@ -0,0 +1,178 @@
+"""
+WebSocket wire protocol negotiation.
+
+Every realtime consumer (chat, notifications, presence, call signaling)
+speaks JSON text frames by default. A client can instead ask for msgpack
+binary frames, either with the ``connectflow.msgpack`` subprotocol (the
+second argument to ``new WebSocket(url, protocols)``) or with
+``?protocol=msgpack`` in the URL. The msgpack codec also replaces the
+verbose field names with small integer codes, which cannot collide with
+any string key a payload carries (e.g. SDP or ICE candidate dicts).
+
+A msgpack connection first receives one JSON text frame,
+``{"type": "protocol", "protocol": "msgpack", "fields": [...]}``, where
+``fields[code]`` is the field name for each integer key, so clients never
+hard-code the table. Clients may send either JSON text or msgpack binary
+frames (with or without codes) on any connection.
+
+msgpack is only offered with ``WS_MSGPACK_ENABLED``; otherwise every
+connection speaks JSON and group events carry only the JSON form, so nothing
+pays for a serialization no client asked for.
+
+``FIELDS`` is append-only: a code is a position in it.
+"""
+
+import json
+from urllib.parse import parse_qs
+
+import msgpack
+from django.conf import settings
+
+SUBPROTOCOL_JSON = 'connectflow.json'
+SUBPROTOCOL_MSGPACK = 'connectflow.msgpack'
+
+FIELDS = (
+    'type', 'message_id', 'message', 'message_type', 'emoji_count', 'status',
+    'sender_id', 'sender_name', 'sender_avatar', 'timestamp',
+    'voice_message_url', 'voice_duration', 'attachments', 'is_pinned',
+    'is_starred', 'parent_details', 'parent_message_id', 'typers', 'is_typing',
+    'user_id', 'name', 'deleted_at', 'deleted_by', 'read_up_to', 'reactions',
+    'emoji', 'id', 'title', 'content', 'notification_type', 'link',
+    'created_at', 'username', 'full_name', 'offer', 'answer', 'candidate',
+    'from_user_id', 'to_user_id', 'enabled', 'is_sharing', 'url', 'size',
+    'target_channel', 'topic', 'data', 'reason', 'delta', 'count',
+    'index', 'state', 'done', 'total',
+)
+FIELD_CODES = {name: code for code, name in enumerate(FIELDS)}
+
+
+def _compact(value):
+    if isinstance(value, dict):
+        return {FIELD_CODES.get(key, key): _compact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_compact(item) for item in value]
+    return value
+
+
+def _expand(value):
+    if isinstance(value, dict):
+        return {
+            (FIELDS[key] if isinstance(key, int) and 0 <= key < len(FIELDS) else key): _expand(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_expand(item) for item in value]
+    return value
+
+
+def _decode_text_or_bytes(text_data, bytes_data):
+    """Decode a client frame of either kind; raises ValueError if malformed."""
+    if bytes_data is not None:
+        try:
+            return _expand(msgpack.unpackb(bytes_data, strict_map_key=False))
+        except TypeError as e:  # e.g. an unhashable map key
+            raise ValueError(str(e))
+    if text_data is None:
+        raise ValueError('Empty frame')
+    return json.loads(text_data)
+
+
+class JSONCodec:
+    name = 'json'
+    subprotocol = SUBPROTOCOL_JSON
+
+    def encode(self, content):
+        """``send()`` kwargs for a frame."""
+        return {'text_data': json.dumps(content)}
+
+    def encode_json(self, text):
+        """``send()`` kwargs for a frame already serialized as JSON text."""
+        return {'text_data': text}
+
+    decode = staticmethod(_decode_text_or_bytes)
+
+
+class MsgpackCodec(JSONCodec):
+    name = 'msgpack'
+    subprotocol = SUBPROTOCOL_MSGPACK
+
+    def encode(self, content):
+        return {'bytes_data': msgpack.packb(_compact(content))}
+
+    def encode_json(self, text):
+        return self.encode(json.loads(text))
+
+
+CODECS = {codec.name: codec for codec in (JSONCodec(), MsgpackCodec())}
+
+
+def msgpack_enabled():
+    return getattr(settings, 'WS_MSGPACK_ENABLED', False)
+
+
+def encode_all(content):
+    """
+    Serialize a frame once per enabled codec, as ``{codec name: data}``, for
+    group events that many consumers forward (see ``WireProtocolMixin.send_encoded``).
+    """
+    frames = {JSONCodec.name: json.dumps(content)}
+    if msgpack_enabled():
+        frames[MsgpackCodec.name] = msgpack.packb(_compact(content))
+    return frames
+
+
+def negotiate(scope):
+    """
+    Return ``(codec, subprotocol)`` for a connection: the codec to speak and
+    the subprotocol to echo in the handshake (None if the client offered none).
+    """
+    if 'wire_codec' in scope:
+        # A topic inside a multiplexed connection (see multiplex.py)
+        return CODECS[scope['wire_codec']], None
+    offered = scope.get('subprotocols') or []
+    query = parse_qs(scope.get('query_string', b'').decode())
+    if msgpack_enabled() and SUBPROTOCOL_MSGPACK in offered:
+        return CODECS['msgpack'], SUBPROTOCOL_MSGPACK
+    if msgpack_enabled() and query.get('protocol', [None])[0] == MsgpackCodec.name:
+        return CODECS['msgpack'], SUBPROTOCOL_JSON if SUBPROTOCOL_JSON in offered else None
+    return CODECS['json'], SUBPROTOCOL_JSON if SUBPROTOCOL_JSON in offered else None
+
+
+def handshake():
+    """The text frame a msgpack connection receives first."""
+    return json.dumps({'type': 'protocol', 'protocol': MsgpackCodec.name, 'fields': list(FIELDS)})
+
+
+class WireProtocolMixin:
+    """
+    Negotiated framing for an ``AsyncWebsocketConsumer``: use
+    ``send_message``/``send_encoded`` instead of ``send(text_data=json.dumps(...))``
+    and ``decode_frame`` in ``receive``.
+    """
+
+    codec = CODECS['json']
+
+    async def accept(self, subprotocol=None, headers=None):
+        self.codec, echo = negotiate(self.scope)
+        await super().accept(subprotocol=subprotocol or echo, headers=headers)
+        if self.codec.name != JSONCodec.name and 'wire_codec' not in self.scope:
+            await self.send(text_data=handshake())
+
+    async def send_message(self, content):
+        await self.send(**self.codec.encode(content))
+
+    async def send_encoded(self, frames):
+        """
+        Send a frame pre-serialized by :func:`encode_all`, falling back to
+        converting the JSON text if this codec's form is missing.
+        """
+        data = frames.get(self.codec.name)
+        if data is None:
+            await self.send(**self.codec.encode_json(frames[JSONCodec.name]))
+        elif self.codec.name == JSONCodec.name:
+            await self.send(text_data=data)
+        else:
+            await self.send(bytes_data=data)
+
+    def decode_frame(self, text_data=None, bytes_data=None):
+        return self.codec.decode(text_data, bytes_data)
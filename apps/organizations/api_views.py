@@ -1,5 +1,6 @@
-from rest_framework import viewsets, permissions
-from rest_framework.decorators import action
+from django.urls import reverse
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from .models import Organization, Department, Team, SharedProject
 from .serializers import OrganizationSerializer, DepartmentSerializer, TeamSerializer, SharedProjectSerializer
@@ -51,3 +52,137 @@ class SharedProjectViewSet(viewsets.ModelViewSet):
             'task_count': project.tasks.count(),
         }
         return Response(data)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def api_upload_ticket(request):
+    """
+    Signed direct upload ticket
+    POST /api/v1/uploads/tickets/
+    Body: {"target": "attachment|project_file|document_version", "parent_id": "...",
+           "name": "...", "size": 123, "content_type": "..."}
+    Returns: {"token": "...", "upload": {"method", "url", "fields"|"headers"}, "expires_in": 3600}
+    """
+    from .services import DirectUploadService, UploadRejected
+
+    data = request.data
+    try:
+        ticket = DirectUploadService.issue(
+            request.user, data.get('target'), data.get('parent_id'), data.get('name'), data.get('size'),
+            content_type=data.get('content_type'), change_log=data.get('change_log', '')
+        )
+    except UploadRejected as e:
+        return Response({'error': str(e)}, status=e.status)
+    return Response(ticket)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def api_upload_commit(request):
+    """
+    Create the row for a finished direct upload
+    POST /api/v1/uploads/commit/
+    Body: {"token": "...", "receipt": {...Cloudinary upload response...}}
+    Returns: {"id": "...", "size": 123}
+    """
+    from .services import DirectUploadService, UploadRejected
+
+    try:
+        instance = DirectUploadService.commit(
+            request.user, request.data.get('token') or '', request.data.get('receipt')
+        )
+    except UploadRejected as e:
+        return Response({'error': str(e)}, status=e.status)
+    return Response({'id': str(instance.pk), 'size': instance.file_size}, status=status.HTTP_201_CREATED)
+
+
+@api_view(['PUT'])
+@permission_classes([permissions.IsAuthenticated])
+def api_direct_upload_local(request, token):
+    """
+    Body of a direct upload for DIRECT_UPLOAD_BACKEND = 'local'
+    PUT /api/v1/uploads/local/<token>/ with the raw file as the request body
+    """
+    from .services import DirectUploadService, UploadRejected
+
+    try:
+        size = DirectUploadService.receive(request.user, token, request.stream)
+    except UploadRejected as e:
+        return Response({'error': str(e)}, status=e.status)
+    return Response({'size': size})
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def api_chunked_upload_start(request):
+    """
+    Start a chunked, resumable upload
+    POST /api/v1/uploads/chunked/
+    Body: the upload ticket fields, plus an optional "checksum": "sha256 <base64>" of the whole file
+    Returns: {"upload_id": "...", "offset": 0, "size": 123, "max_chunk": 8388608}
+    """
+    from .services import ChunkedUploadService, UploadRejected
+
+    data = request.data
+    try:
+        upload = ChunkedUploadService.start(
+            request.user, data.get('target'), data.get('parent_id'), data.get('name'), data.get('size'),
+            content_type=data.get('content_type'), change_log=data.get('change_log', ''),
+            checksum=data.get('checksum')
+        )
+    except UploadRejected as e:
+        return Response({'error': str(e)}, status=e.status)
+    response = Response(upload, status=status.HTTP_201_CREATED)
+    response['Location'] = reverse('api_chunked_upload', args=[upload['upload_id']])
+    return response
+
+
+@api_view(['GET', 'HEAD', 'PATCH', 'DELETE'])
+@permission_classes([permissions.IsAuthenticated])
+def api_chunked_upload(request, upload_id):
+    """
+    GET/HEAD: current Upload-Offset (resume point)
+    PATCH: append the body at the Upload-Offset header, verified against Upload-Checksum
+    DELETE: abandon the upload
+    """
+    from .services import ChunkedUploadService, UploadRejected
+
+    try:
+        if request.method == 'DELETE':
+            ChunkedUploadService.abort(request.user, upload_id)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        if request.method == 'PATCH':
+            offset = ChunkedUploadService.append(
+                request.user, upload_id,
+                request.headers.get('Upload-Offset'), request.stream,
+                request.headers.get('Content-Length') or 0,
+                checksum=request.headers.get('Upload-Checksum')
+            )
+            response = Response(status=status.HTTP_204_NO_CONTENT)
+        else:
+            offset, size = ChunkedUploadService.offset(request.user, upload_id)
+            response = Response({'offset': offset, 'size': size})
+            response['Upload-Length'] = size
+    except UploadRejected as e:
+        return Response({'error': str(e)}, status=e.status)
+    response['Upload-Offset'] = offset
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def api_chunked_upload_finalize(request, upload_id):
+    """
+    Create the row for a completed chunked upload
+    POST /api/v1/uploads/chunked/<upload_id>/finalize/
+    Returns: {"id": "...", "size": 123}
+    """
+    from .services import ChunkedUploadService, UploadRejected
+
+    try:
+        instance = ChunkedUploadService.finalize(request.user, upload_id)
+    except UploadRejected as e:
+        return Response({'error': str(e)}, status=e.status)
+    return Response({'id': str(instance.pk), 'size': instance.file_size}, status=status.HTTP_201_CREATED)
@@ -328,31 +328,16 @@ class DepartmentForm(forms.ModelForm):
                 department.head.save()
                 
                 # Notify the user of their promotion
-                from apps.accounts.models import Notification
-                from asgiref.sync import async_to_sync
-                from channels.layers import get_channel_layer
+                from apps.accounts.services import NotificationFanoutService
                 from django.urls import reverse
                 
-                channel_layer = get_channel_layer()
-                notification = Notification.notify(
-                    recipient=department.head,
+                NotificationFanoutService.notify_users(
+                    [department.head],
                     title="Role Promotion",
                     content=f"You have been promoted to Department Head for {department.name}.",
                     notification_type='MEMBERSHIP',
                     link=reverse('organizations:department_list')
                 )
-                
-                async_to_sync(channel_layer.group_send)(
-                    f"notifications_{department.head.id}",
-                    {
-                        'type': 'send_notification',
-                        'id': str(notification.id),
-                        'title': notification.title,
-                        'content': notification.content,
-                        'notification_type': notification.notification_type,
-                        'link': notification.link,
-                    }
-                )
         
         if commit:
             department.save()
@@ -435,31 +420,16 @@ class TeamForm(forms.ModelForm):
                 team.manager.save()
                 
                 # Notify the user of their promotion
-                from apps.accounts.models import Notification
-                from asgiref.sync import async_to_sync
-                from channels.layers import get_channel_layer
+                from apps.accounts.services import NotificationFanoutService
                 from django.urls import reverse
                 
-                channel_layer = get_channel_layer()
-                notification = Notification.notify(
-                    recipient=team.manager,
+                NotificationFanoutService.notify_users(
+                    [team.manager],
                     title="Role Promotion",
                     content=f"You have been promoted to Team Manager for {team.name}.",
                     notification_type='MEMBERSHIP',
                     link=reverse('organizations:overview')
                 )
-                
-                async_to_sync(channel_layer.group_send)(
-                    f"notifications_{team.manager.id}",
-                    {
-                        'type': 'send_notification',
-                        'id': str(notification.id),
-                        'title': notification.title,
-                        'content': notification.content,
-                        'notification_type': notification.notification_type,
-                        'link': notification.link,
-                    }
-                )
         
         if commit:
             team.save()
@@ -0,0 +1,30 @@
+"""
+Management command to drop abandoned chunked uploads and uncommitted direct uploads.
+
+Usage:
+    python manage.py clear_stale_uploads [--max-age <seconds>]
+"""
+
+from django.core.management.base import BaseCommand
+from apps.organizations.services import ChunkedUploadService, DirectUploadService
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete chunked uploads that were never finalized and release their reserved storage, '
+        'and remove files uploaded for direct upload tickets that were never committed'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age',
+            type=int,
+            help='Clear uploads started more than this many seconds ago '
+                 '(default: CHUNKED_UPLOAD_MAX_AGE and DIRECT_UPLOAD_TICKET_MAX_AGE)'
+        )
+
+    def handle(self, *args, **options):
+        cleared = ChunkedUploadService.clear_stale(options.get('max_age'))
+        self.stdout.write(self.style.SUCCESS(f'Cleared {cleared} stale upload(s)'))
+        uncommitted = DirectUploadService.clear_stale(options.get('max_age'))
+        self.stdout.write(self.style.SUCCESS(f'Cleared {uncommitted} uncommitted direct upload(s)'))
@@ -0,0 +1,64 @@
+"""
+Management command to rebuild organization storage counters.
+
+Usage:
+    python manage.py reconcile_storage_usage [--org <org_id>] [--backfill-sizes] [--dry-run]
+"""
+
+from django.core.management.base import BaseCommand
+from apps.organizations.models import Organization
+from apps.organizations.services import StorageUsageService
+
+
+class Command(BaseCommand):
+    help = 'Recompute Organization.storage_used_bytes from stored file sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--org',
+            type=str,
+            help='Only reconcile this organization UUID'
+        )
+        parser.add_argument(
+            '--backfill-sizes',
+            action='store_true',
+            help='First look up sizes for files uploaded before sizes were recorded (one storage API call per file)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report differences without writing them'
+        )
+
+    def handle(self, *args, **options):
+        org_id = options.get('org')
+        organizations = None
+        if org_id:
+            if not Organization.objects.filter(id=org_id).exists():
+                self.stdout.write(self.style.ERROR(f'Organization {org_id} not found'))
+                return
+            organizations = [org_id]
+
+        if options.get('backfill_sizes'):
+            updated = StorageUsageService.backfill_sizes()
+            self.stdout.write(f'Backfilled sizes for {updated} file(s)')
+
+        if options.get('dry_run'):
+            totals = StorageUsageService.totals()
+            queryset = Organization.objects.all()
+            if organizations:
+                queryset = queryset.filter(id__in=organizations)
+            for org in queryset:
+                expected = totals.get(org.id, 0)
+                if expected != org.storage_used_bytes:
+                    self.stdout.write(f'  - {org.name}: {org.storage_used_bytes} -> {expected} bytes')
+            return
+
+        changed = StorageUsageService.reconcile(organizations)
+        names = dict(Organization.objects.filter(id__in=changed.keys()).values_list('id', 'name'))
+        for org_id, (old, new) in changed.items():
+            self.stdout.write(f'  ✓ {names.get(org_id, org_id)}: {old} -> {new} bytes')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\nCompleted: {len(changed)} organization(s) updated'
+        ))
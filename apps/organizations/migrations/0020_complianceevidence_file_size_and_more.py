@@ -0,0 +1,28 @@
+# Generated by Django 5.2.9 on 2026-10-17 01:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0019_alter_projectfile_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='complianceevidence',
+            name='file_size',
+            field=models.BigIntegerField(default=0, help_text='Size in bytes'),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='storage_used_bytes',
+            field=models.BigIntegerField(default=0, help_text='Bytes used by uploaded files (maintained by signals, see reconcile_storage_usage)'),
+        ),
+        migrations.AddField(
+            model_name='projectfile',
+            name='file_size',
+            field=models.BigIntegerField(default=0, help_text='Size in bytes'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.9 on 2026-10-17 03:07
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0020_complianceevidence_file_size_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileBlob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('sha256', models.CharField(blank=True, help_text='Hex digest of the content; empty when it was stored without passing through the server', max_length=64, null=True)),
+                ('backend', models.CharField(choices=[('cloudinary', 'Cloudinary field'), ('storage', 'Default storage')], max_length=20)),
+                ('stored_name', models.CharField(help_text='Value of the file field referencing it', max_length=255)),
+                ('size', models.BigIntegerField(default=0, help_text='Size in bytes')),
+                ('ref_count', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'File Blob',
+                'verbose_name_plural': 'File Blobs',
+                'db_table': 'file_blobs',
+                'constraints': [models.UniqueConstraint(fields=('sha256', 'backend'), name='unique_file_blob_content')],
+            },
+        ),
+        migrations.AddField(
+            model_name='projectfile',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='organizations.fileblob'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.9 on 2026-10-17 03:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0021_fileblob_projectfile_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingDirectUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Storage key the ticket uploads to', max_length=255, unique=True)),
+                ('backend', models.CharField(max_length=20)),
+                ('resource_type', models.CharField(default='auto', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Pending Direct Upload',
+                'verbose_name_plural': 'Pending Direct Uploads',
+                'db_table': 'pending_direct_uploads',
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.9 on 2026-10-17 03:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+# model -> lookup path to the owning organization id, as in StorageUsageService
+BLOB_TRACKED_MODELS = [
+    ('chat_channels', 'Attachment', 'message__channel__organization_id'),
+    ('organizations', 'ProjectFile', 'project__host_organization_id'),
+    ('tools_documents', 'DocumentVersion', 'document__organization_id'),
+]
+
+
+def charge_blobs_to_organizations(apps, schema_editor):
+    """Give each blob the organization of a row referencing it and move the per-row charges onto it."""
+    FileBlob = apps.get_model('organizations', 'FileBlob')
+    Organization = apps.get_model('organizations', 'Organization')
+
+    owners, deltas = {}, {}
+    for app_label, model_name, org_path in BLOB_TRACKED_MODELS:
+        model = apps.get_model(app_label, model_name)
+        rows = model.objects.filter(blob__isnull=False).values_list('blob_id', org_path, 'file_size')
+        for blob_id, org_id, file_size in rows.iterator():
+            if org_id:
+                owners.setdefault(blob_id, org_id)
+                deltas[org_id] = deltas.get(org_id, 0) - file_size
+    for blob in FileBlob.objects.filter(pk__in=owners).iterator():
+        blob.organization_id = owners[blob.pk]
+        blob.save(update_fields=['organization'])
+        deltas[blob.organization_id] = deltas.get(blob.organization_id, 0) + blob.size
+    for org_id, delta in deltas.items():
+        if delta:
+            Organization.objects.filter(pk=org_id).update(
+                storage_used_bytes=Greatest(F('storage_used_bytes') + delta, 0)
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0022_pendingdirectupload'),
+        ('chat_channels', '0027_attachment_blob'),
+        ('tools_documents', '0002_documentversion_blob'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='fileblob',
+            name='unique_file_blob_content',
+        ),
+        migrations.AddField(
+            model_name='fileblob',
+            name='organization',
+            field=models.ForeignKey(blank=True, help_text='Organization charged for the stored file; uploads only share content within it', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='organizations.organization'),
+        ),
+        migrations.AddConstraint(
+            model_name='fileblob',
+            constraint=models.UniqueConstraint(fields=('organization', 'sha256', 'backend'), name='unique_file_blob_content'),
+        ),
+        migrations.RunPython(charge_blobs_to_organizations, migrations.RunPython.noop),
+    ]
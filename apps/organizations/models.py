@@ -170,6 +170,11 @@ class Organization(models.Model):
         default=True,
         help_text=_("Is this organization active?")
     )
+
+    storage_used_bytes = models.BigIntegerField(
+        default=0,
+        help_text=_("Bytes used by uploaded files (maintained by signals, see reconcile_storage_usage)")
+    )
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -207,40 +212,20 @@ class Organization(models.Model):
         return getattr(plan, feature_name, False)
     
     def get_storage_usage(self):
-        """Calculate total storage used by all projects hosted by this organization in MB."""
-        total_bytes = 0
-        try:
-            # Optimize: use select_related or prefetch_related if called in a loop, 
-            # but here we iterate over hosted projects.
-            for project in self.hosted_projects.all():
-                # Standard Project Files
-                for project_file in project.files.all():
-                    try:
-                        if project_file.file:
-                            # CloudinaryResource uses .bytes
-                            if hasattr(project_file.file, 'bytes'):
-                                total_bytes += project_file.file.bytes
-                            elif hasattr(project_file.file, 'size'):
-                                total_bytes += project_file.file.size
-                    except Exception:
-                        continue
-                
-                # Compliance Evidence Files
-                for requirement in project.compliance_requirements.all():
-                    for evidence in requirement.evidence.all():
-                        try:
-                            if evidence.document:
-                                if hasattr(evidence.document, 'bytes'):
-                                    total_bytes += evidence.document.bytes
-                                elif hasattr(evidence.document, 'size'):
-                                    total_bytes += evidence.document.size
-                        except Exception:
-                            continue
-        except Exception:
-            # Final fallback to ensure no 500 error
-            return 0
-            
-        return round(total_bytes / (1024 * 1024), 2)
+        """Return storage used by this organization's uploads in MB."""
+        return round(self.storage_used_bytes / (1024 * 1024), 2)
+
+    def get_storage_remaining(self):
+        """Return remaining storage in MB under the current plan."""
+        return round(self.get_plan().max_storage_mb - self.get_storage_usage(), 2)
+
+    def has_storage_for(self, size_bytes):
+        """Check whether an upload of ``size_bytes`` fits within the plan quota."""
+        plan = self.get_plan()
+        if plan.max_storage_mb == -1:
+            return True
+        max_bytes = plan.max_storage_mb * 1024 * 1024
+        return self.storage_used_bytes + size_bytes <= max_bytes
     
     def get_storage_usage_percentage(self):
         """Return percentage of storage used."""
@@ -488,6 +473,8 @@ class ProjectFile(models.Model):
         resource_type='auto',
         help_text=_("Shared file")
     )
+    file_size = models.BigIntegerField(default=0, help_text=_("Size in bytes"))
+    blob = models.ForeignKey('FileBlob', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -676,6 +663,7 @@ class ComplianceEvidence(models.Model):
         null=True,
         blank=True
     )
+    file_size = models.BigIntegerField(default=0, help_text=_("Size in bytes"))
     uploaded_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True)
     upload_date = models.DateTimeField(auto_now_add=True)
     validity_period = models.DateField(help_text=_("When this evidence expires"))
@@ -691,6 +679,65 @@ class ComplianceEvidence(models.Model):
         verbose_name_plural = _('Compliance Evidences')
 
 
+class PendingDirectUpload(models.Model):
+    """
+    A direct upload ticket not committed yet, so objects uploaded for tickets
+    that never are can be swept (see services/direct_uploads.py).
+    """
+    key = models.CharField(max_length=255, unique=True, help_text=_("Storage key the ticket uploads to"))
+    backend = models.CharField(max_length=20)
+    resource_type = models.CharField(max_length=20, default='auto')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        db_table = 'pending_direct_uploads'
+        verbose_name = _('Pending Direct Upload')
+        verbose_name_plural = _('Pending Direct Uploads')
+
+    def __str__(self):
+        return self.key
+
+
+class FileBlob(models.Model):
+    """
+    One stored file, shared by every row whose content it is.
+    See services/blobs.py.
+    """
+    class Backend(models.TextChoices):
+        CLOUDINARY = 'cloudinary', _('Cloudinary field')
+        STORAGE = 'storage', _('Default storage')
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        help_text=_("Organization charged for the stored file; uploads only share content within it")
+    )
+    sha256 = models.CharField(
+        max_length=64, null=True, blank=True,
+        help_text=_("Hex digest of the content; empty when it was stored without passing through the server")
+    )
+    backend = models.CharField(max_length=20, choices=Backend.choices)
+    stored_name = models.CharField(max_length=255, help_text=_("Value of the file field referencing it"))
+    size = models.BigIntegerField(default=0, help_text=_("Size in bytes"))
+    ref_count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'file_blobs'
+        verbose_name = _('File Blob')
+        verbose_name_plural = _('File Blobs')
+        constraints = [
+            models.UniqueConstraint(fields=['organization', 'sha256', 'backend'], name='unique_file_blob_content'),
+        ]
+
+    def __str__(self):
+        return f"{self.stored_name} ({self.ref_count} references)"
+
+
 from django.db.models.signals import m2m_changed, post_delete, pre_save
 from django.dispatch import receiver
 from django.urls import reverse
@@ -729,7 +776,8 @@ def delete_org_logo_from_cloudinary(sender, instance, **kwargs):
 
 @receiver(post_delete, sender=ProjectFile)
 def delete_project_file_from_cloudinary(sender, instance, **kwargs):
-    if instance.file:
+    # Files with a blob go when its last reference does (release_file_blob)
+    if instance.file and not instance.blob_id:
         try:
             cloudinary.uploader.destroy(instance.file.public_id, resource_type="auto")
         except Exception as e:
@@ -740,77 +788,133 @@ def delete_project_file_from_cloudinary(sender, instance, **kwargs):
 
 @receiver(m2m_changed, sender=Team.members.through)
 def notify_members_added_to_team(sender, instance, action, pk_set, **kwargs):
-    if action == "post_add":
-        from apps.accounts.models import Notification, User
-        from asgiref.sync import async_to_sync
-        from channels.layers import get_channel_layer
-        
-        channel_layer = get_channel_layer()
+    if action == "post_add" and pk_set and not kwargs.get('reverse'):
+        from apps.accounts.services import NotificationFanoutService
         
-        for user_id in pk_set:
-            try:
-                user = User.objects.get(pk=user_id)
-                # Team managers often add users, but we'll use instance manager if set
-                sender_user = instance.manager
-                
-                notification = Notification.notify(
-                    recipient=user,
-                    sender=sender_user,
-                    title=f"Joined Team: {instance.name}",
-                    content=f"You have been added to the team {instance.name}.",
-                    notification_type='MEMBERSHIP',
-                    link=reverse('organizations:overview') # Link to org overview where teams are listed
-                )
-                
-                # Broadcast via WebSocket
-                async_to_sync(channel_layer.group_send)(
-                    f"notifications_{user.id}",
-                    {
-                        'type': 'send_notification',
-                        'id': str(notification.id),
-                        'title': notification.title,
-                        'content': notification.content,
-                        'notification_type': notification.notification_type,
-                        'link': notification.link,
-                    }
-                )
-            except Exception as e:
-                print(f"Error sending notification: {e}")
+        try:
+            # Team managers often add users, but we'll use instance manager if set
+            NotificationFanoutService.notify_users(
+                pk_set,
+                sender=instance.manager,
+                title=f"Joined Team: {instance.name}",
+                content=f"You have been added to the team {instance.name}.",
+                notification_type='MEMBERSHIP',
+                link=reverse('organizations:overview') # Link to org overview where teams are listed
+            )
+        except Exception as e:
+            print(f"Error sending notification: {e}")
 
 @receiver(m2m_changed, sender=SharedProject.members.through)
 def notify_members_added_to_project(sender, instance, action, pk_set, **kwargs):
-    if action == "post_add":
-        from apps.accounts.models import Notification, User
-        from asgiref.sync import async_to_sync
-        from channels.layers import get_channel_layer
+    if action == "post_add" and pk_set and not kwargs.get('reverse'):
+        from apps.accounts.services import NotificationFanoutService
         
-        channel_layer = get_channel_layer()
-        
-        for user_id in pk_set:
-            try:
-                user = User.objects.get(pk=user_id)
-                # We don't have a clear "creator" but we can use project name
-                link = reverse('organizations:shared_project_detail', kwargs={'pk': instance.pk})
-                notification = Notification.notify(
-                    recipient=user,
-                    sender=instance.created_by if hasattr(instance, 'created_by') else None,
-                    title=f"Joined Project: {instance.name}",
-                    content=f"You have been added to the shared project {instance.name}.",
-                    notification_type='PROJECT',
-                    link=link
-                )
-                
-                # Broadcast via WebSocket
-                async_to_sync(channel_layer.group_send)(
-                    f"notifications_{user.id}",
-                    {
-                        'type': 'send_notification',
-                        'id': str(notification.id),
-                        'title': notification.title,
-                        'content': notification.content,
-                        'notification_type': notification.notification_type,
-                        'link': notification.link,
-                    }
-                )
-            except Exception as e:
-                print(f"Error sending notification: {e}")
+        try:
+            NotificationFanoutService.notify_users(
+                pk_set,
+                sender=instance.created_by,
+                title=f"Joined Project: {instance.name}",
+                content=f"You have been added to the shared project {instance.name}.",
+                notification_type='PROJECT',
+                link=reverse('organizations:shared_project_detail', kwargs={'pk': instance.pk})
+            )
+        except Exception as e:
+            print(f"Error sending notification: {e}")
+
+
+# Storage accounting (see services/storage_usage.py)
+from django.db.models.signals import post_save, pre_delete
+
+STORAGE_TRACKED_SENDERS = [
+    'organizations.ProjectFile',
+    'organizations.ComplianceEvidence',
+    'chat_channels.Attachment',
+    'tools_documents.DocumentVersion',
+]
+
+def _storage_receiver(signal):
+    def decorator(func):
+        for model_label in STORAGE_TRACKED_SENDERS:
+            signal.connect(func, sender=model_label, dispatch_uid=f"{func.__name__}:{model_label}")
+        return func
+    return decorator
+
+@_storage_receiver(pre_save)
+def record_file_size(sender, instance, **kwargs):
+    from .services import StorageUsageService
+    file_field, _ = StorageUsageService.spec_for(sender)
+    value = getattr(instance, file_field)
+    instance._storage_previous_size = 0
+    if instance._state.adding:
+        if not instance.file_size:
+            instance.file_size = StorageUsageService.size_of(value)
+    elif StorageUsageService.is_new_upload(value):
+        # File replaced on an existing row: account for the difference
+        instance._storage_previous_size = sender._default_manager.filter(
+            pk=instance.pk
+        ).values_list('file_size', flat=True).first() or 0
+        instance.file_size = StorageUsageService.size_of(value)
+    else:
+        instance._storage_previous_size = instance.file_size
+
+@_storage_receiver(post_save)
+def add_file_size_to_organization(sender, instance, **kwargs):
+    from .services import BlobService, StorageUsageService
+    if sender._meta.label in BlobService.TRACKED_MODELS:
+        # Charged when the blob holding the file is created (see services/blobs.py)
+        return
+    delta = instance.file_size - getattr(instance, '_storage_previous_size', 0)
+    if delta:
+        try:
+            StorageUsageService.adjust(StorageUsageService.organization_id_for(instance), delta)
+        except Exception as e:
+            print(f"Storage accounting error: {e}")
+
+@_storage_receiver(pre_delete)
+def remember_file_organization(sender, instance, **kwargs):
+    # Resolve before the cascade removes the parent rows
+    from .services import StorageUsageService
+    try:
+        instance._storage_organization_id = StorageUsageService.organization_id_for(instance)
+    except Exception as e:
+        print(f"Storage accounting error: {e}")
+
+@_storage_receiver(post_delete)
+def subtract_file_size_from_organization(sender, instance, **kwargs):
+    from .services import StorageUsageService
+    org_id = getattr(instance, '_storage_organization_id', None)
+    # Rows with a blob give back nothing: the blob is credited when it is released
+    if org_id and instance.file_size and not getattr(instance, 'blob_id', None):
+        StorageUsageService.adjust(org_id, -instance.file_size)
+
+
+# Shared, reference-counted files (see services/blobs.py). Connected after the
+# storage receivers so sizes are taken from the upload before it is swapped out.
+BLOB_TRACKED_SENDERS = [
+    'organizations.ProjectFile',
+    'chat_channels.Attachment',
+    'tools_documents.DocumentVersion',
+]
+
+def _blob_receiver(signal):
+    def decorator(func):
+        for model_label in BLOB_TRACKED_SENDERS:
+            signal.connect(func, sender=model_label, dispatch_uid=f"{func.__name__}:{model_label}")
+        return func
+    return decorator
+
+@_blob_receiver(pre_save)
+def claim_file_blob(sender, instance, **kwargs):
+    from .services import BlobService
+    BlobService.before_save(instance)
+
+@_blob_receiver(post_save)
+def register_file_blob(sender, instance, created, **kwargs):
+    from .services import BlobService
+    BlobService.after_save(instance, created)
+
+@_blob_receiver(post_delete)
+def release_file_blob(sender, instance, **kwargs):
+    from .services import BlobService
+    if instance.blob_id:
+        BlobService.release(instance.blob_id)
@@ -0,0 +1,8 @@
+"""Service layer for organizations."""
+
+from .blobs import BlobService
+from .chunked_uploads import ChunkedUploadService
+from .direct_uploads import DirectUploadService, UploadRejected
+from .storage_usage import StorageUsageService
+
+__all__ = ['BlobService', 'ChunkedUploadService', 'DirectUploadService', 'StorageUsageService', 'UploadRejected']
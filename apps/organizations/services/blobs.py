@@ -0,0 +1,229 @@
+"""
+Content-addressed file storage.
+
+Forwarding a message, adding its attachments to a project or uploading a
+file someone already shared all used to store another copy of the same
+bytes. Every stored file of an ``Attachment``, ``ProjectFile`` or
+``DocumentVersion`` now belongs to a ``FileBlob`` that the rows reference
+through their ``blob`` foreign key:
+- A new upload is hashed (SHA-256) before it is sent to storage. If a blob
+  of the row's organization has that digest, the row takes over its stored
+  name and the upload is skipped: the insert is metadata only. Content is
+  never matched across organizations, so how fast an upload completes tells
+  nothing about what others stored
+- Rows made from another row's file (``forward``, ``add_to_files``) share its
+  blob (:meth:`BlobService.share`)
+- ``ref_count`` is the number of rows referencing a blob; deleting a row
+  releases its reference and the stored file is only removed with the last
+
+All of this runs from model signals, so every code path that saves these
+rows takes part. Files stored without passing through the server (direct
+Cloudinary uploads) cannot be hashed here; their blobs have no digest, still
+count references, but never match a new upload. Rows stored before blobs
+existed get one when they are first shared.
+
+Organizations are charged (``storage_used_bytes``) per blob: its size is
+added when it is created and given back when it is released, however many
+rows reference it. Rows stored before blobs existed are charged on their own
+until they are shared or their file is replaced.
+"""
+
+import hashlib
+import re
+
+from cloudinary.models import CLOUDINARY_FIELD_DB_RE, CloudinaryField
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .storage_usage import StorageUsageService
+
+
+class BlobService:
+    """Hash, share and reference-count stored files."""
+
+    # model label -> file field
+    TRACKED_MODELS = {
+        'chat_channels.Attachment': 'file',
+        'organizations.ProjectFile': 'file',
+        'tools_documents.DocumentVersion': 'file',
+    }
+
+    @classmethod
+    def field_for(cls, model):
+        return model._meta.get_field(cls.TRACKED_MODELS[model._meta.label])
+
+    @staticmethod
+    def backend_for(field):
+        from apps.organizations.models import FileBlob
+        if isinstance(field, CloudinaryField):
+            return FileBlob.Backend.CLOUDINARY
+        return FileBlob.Backend.STORAGE
+
+    @staticmethod
+    def digest(value):
+        """SHA-256 hex digest of an unsaved file, read in chunks."""
+        sha256 = hashlib.sha256()
+        for chunk in value.chunks():
+            sha256.update(chunk)
+        value.seek(0)
+        return sha256.hexdigest()
+
+    @staticmethod
+    def stored_name(field, value):
+        if isinstance(field, CloudinaryField):
+            return field.get_prep_value(value) or ''
+        return getattr(value, 'name', value) or ''
+
+    @staticmethod
+    def stored_value(field, name):
+        return field.to_python(name) if isinstance(field, CloudinaryField) else name
+
+    @staticmethod
+    def organization_id_for(instance):
+        """Owning organization of a row, saved or not, through its parents."""
+        _, org_path = StorageUsageService.spec_for(type(instance))
+        value = instance
+        for name in org_path.split('__'):
+            value = getattr(value, name, None)
+            if value is None:
+                return None
+        return value
+
+    @classmethod
+    def claim(cls, instance):
+        """
+        Point a row holding a new upload at the stored copy of the same content.
+
+        Returns True when one exists: the row now references it (and holds a
+        reference on it) and saving it uploads nothing.
+        """
+        from apps.organizations.models import FileBlob
+
+        field = cls.field_for(type(instance))
+        value = getattr(instance, field.attname)
+        instance._blob_checked = True
+        instance._blob_digest = None
+        if not StorageUsageService.is_new_upload(value):
+            return False
+        if not instance.file_size:
+            instance.file_size = StorageUsageService.size_of(value)
+        instance._blob_digest = cls.digest(value)
+
+        organization_id = cls.organization_id_for(instance)
+        if organization_id is None:
+            return False
+        blob = FileBlob.objects.filter(
+            organization_id=organization_id, sha256=instance._blob_digest, backend=cls.backend_for(field)
+        ).first()
+        if blob is None or not cls.acquire(blob.pk):
+            return False
+        setattr(instance, field.attname, cls.stored_value(field, blob.stored_name))
+        instance.blob = blob
+        return True
+
+    @classmethod
+    def share(cls, instance):
+        """The blob of a saved row, for new rows reusing its file; rows from before blobs get one here."""
+        if instance.blob_id is None:
+            field = cls.field_for(type(instance))
+            # The row was charged on its own; that charge is the blob's from now on
+            blob = cls._create(
+                None, cls.organization_id_for(instance), cls.backend_for(field),
+                cls.stored_name(field, getattr(instance, field.attname)), instance.file_size, charge=False
+            )
+            type(instance)._default_manager.filter(pk=instance.pk).update(blob=blob)
+            instance.blob = blob
+        return instance.blob
+
+    @staticmethod
+    def acquire(blob_id):
+        """Add a reference; False when the blob has been released for good meanwhile."""
+        from apps.organizations.models import FileBlob
+        return FileBlob.objects.filter(pk=blob_id, ref_count__gt=0).update(ref_count=F('ref_count') + 1) == 1
+
+    @classmethod
+    def release(cls, blob_id):
+        """Drop a reference, removing the stored file with the last one. Returns True if it was removed."""
+        from apps.organizations.models import FileBlob
+
+        with transaction.atomic():
+            blob = FileBlob.objects.select_for_update().filter(pk=blob_id).first()
+            if blob is None:
+                return False
+            if blob.ref_count > 1:
+                FileBlob.objects.filter(pk=blob_id).update(ref_count=F('ref_count') - 1)
+                return False
+            blob.delete()
+            StorageUsageService.adjust(blob.organization_id, -blob.size)
+        cls.destroy(blob)
+        return True
+
+    @staticmethod
+    def destroy(blob):
+        from apps.organizations.models import FileBlob
+
+        try:
+            if blob.backend == FileBlob.Backend.CLOUDINARY:
+                import cloudinary.uploader
+                match = re.match(CLOUDINARY_FIELD_DB_RE, blob.stored_name)
+                cloudinary.uploader.destroy(
+                    match.group('public_id'), resource_type=match.group('resource_type') or 'image'
+                )
+            else:
+                from django.core.files.storage import default_storage
+                default_storage.delete(blob.stored_name)
+        except Exception as e:
+            print(f"Blob deletion error: {e}")
+
+    @classmethod
+    def before_save(cls, instance):
+        """pre_save: dedupe a new upload, or take a reference on a blob the new row shares."""
+        if getattr(instance, '_blob_checked', False):
+            return
+        field = cls.field_for(type(instance))
+        if StorageUsageService.is_new_upload(getattr(instance, field.attname)):
+            # The new file replaces whatever the row referenced so far
+            instance._blob_previous = None if instance._state.adding else instance.blob_id
+            if not instance._state.adding and instance.blob_id is None:
+                # Stored before blobs: the row's own charge goes with its old file
+                instance._blob_uncharged = getattr(instance, '_storage_previous_size', 0)
+            instance.blob = None
+            cls.claim(instance)
+        elif instance._state.adding and instance.blob_id and not cls.acquire(instance.blob_id):
+            instance.blob = None
+
+    @classmethod
+    def after_save(cls, instance, created):
+        """post_save: give a freshly stored file its blob and let go of a replaced one."""
+        previous = getattr(instance, '_blob_previous', None)
+        field = cls.field_for(type(instance))
+        value = getattr(instance, field.attname)
+        if instance.blob_id is None and value and (created or getattr(instance, '_blob_checked', False)):
+            blob = cls._create(
+                getattr(instance, '_blob_digest', None), cls.organization_id_for(instance), cls.backend_for(field),
+                cls.stored_name(field, value), instance.file_size
+            )
+            type(instance)._default_manager.filter(pk=instance.pk).update(blob=blob)
+            instance.blob = blob
+        uncharged = instance.__dict__.pop('_blob_uncharged', 0)
+        if uncharged:
+            StorageUsageService.adjust(cls.organization_id_for(instance), -uncharged)
+        for attribute in ('_blob_checked', '_blob_digest', '_blob_previous'):
+            instance.__dict__.pop(attribute, None)
+        if previous and previous != instance.blob_id:
+            cls.release(previous)
+
+    @staticmethod
+    def _create(digest, organization_id, backend, stored_name, size, charge=True):
+        from apps.organizations.models import FileBlob
+
+        fields = {'organization_id': organization_id, 'backend': backend, 'stored_name': stored_name, 'size': size}
+        try:
+            with transaction.atomic():
+                blob = FileBlob.objects.create(sha256=digest, **fields)
+        except IntegrityError:
+            # Identical content was registered by a concurrent upload; this copy is counted on its own
+            blob = FileBlob.objects.create(sha256=None, **fields)
+        if charge:
+            StorageUsageService.adjust(organization_id, size)
+        return blob
@@ -0,0 +1,256 @@
+"""
+Chunked, resumable uploads.
+
+For clients that cannot (or should not) hold a whole file in one request,
+e.g. phones on flaky links. The protocol follows tus
+(https://tus.io/protocols/resumable-upload):
+
+1. ``POST /api/v1/uploads/chunked/`` with the same fields as a direct upload
+   ticket (``target``, ``parent_id``, ``name``, ``size``, ``content_type``
+   and optionally ``checksum``, ``"sha256 <base64 digest>"`` of the whole
+   file). Access and quota are checked as for tickets; the answer carries
+   the ``upload_id``.
+2. ``PATCH /api/v1/uploads/chunked/<upload_id>/`` with the next bytes as the
+   body, the ``Upload-Offset`` they start at and an ``Upload-Checksum:
+   sha256 <base64 digest>`` of the chunk. A chunk that does not start at the
+   current offset is refused with 409, one whose digest does not match with
+   460, and neither is kept. ``HEAD`` (or ``GET``) returns the current
+   ``Upload-Offset`` so a client can resume after a dropped connection.
+3. ``POST /api/v1/uploads/chunked/<upload_id>/finalize/`` once every byte
+   has arrived. The spooled file goes through the usual creation path for
+   the target (``Attachment``/``ProjectFile``/``DocumentVersion`` with an
+   uploaded file), so storage and accounting behave exactly as for a form
+   upload. ``DELETE`` abandons the upload.
+
+Chunks are streamed to a file under ``CHUNKED_UPLOAD_ROOT``, never held in
+memory, next to a JSON file describing the upload; the offset is the size of
+the spooled file. Each chunk is counted toward the organization's
+``storage_used_bytes`` as it arrives (and refused if it would exceed the
+quota); the reservation is released when the row is created, or when the
+upload is abandoned or cleared as stale (``manage.py clear_stale_uploads``).
+All requests for one upload must reach hosts sharing ``CHUNKED_UPLOAD_ROOT``.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import UploadedFile
+
+from .direct_uploads import CHUNK_SIZE, DirectUploadService, UploadRejected
+from .storage_usage import StorageUsageService
+
+CHECKSUM_MISMATCH = 460
+
+
+def _root():
+    root = getattr(settings, 'CHUNKED_UPLOAD_ROOT', None) or os.path.join(
+        tempfile.gettempdir(), 'connectflow-uploads'
+    )
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def _paths(upload_id):
+    try:
+        upload_id = uuid.UUID(str(upload_id)).hex
+    except ValueError:
+        raise UploadRejected('Upload not found', status=404)
+    base = os.path.join(_root(), upload_id)
+    return f"{base}.json", f"{base}.part"
+
+
+def parse_checksum(header):
+    """``"sha256 <base64>"`` -> raw digest, or None when absent."""
+    if not header:
+        return None
+    algorithm, _, value = header.strip().partition(' ')
+    if algorithm.lower() != 'sha256':
+        raise UploadRejected('Only sha256 checksums are supported')
+    try:
+        return base64.b64decode(value.strip(), validate=True)
+    except ValueError:
+        raise UploadRejected('Malformed checksum')
+
+
+class ChunkedUploadService:
+    """Spool, verify and finalize uploads sent in pieces."""
+
+    @staticmethod
+    def max_chunk():
+        return getattr(settings, 'CHUNKED_UPLOAD_MAX_CHUNK', 8 * 1024 * 1024)
+
+    @classmethod
+    def start(cls, user, target, parent_id, name, size, content_type='application/octet-stream',
+              change_log='', checksum=None):
+        """Register an upload; returns ``{'upload_id', 'offset', 'size', 'max_chunk'}``."""
+        ticket = DirectUploadService.prepare(user, target, parent_id, name, size, content_type, change_log)
+        parse_checksum(checksum)
+        upload_id = uuid.uuid4().hex
+        meta_path, part_path = _paths(upload_id)
+        open(part_path, 'wb').close()
+        with open(meta_path, 'w') as meta:
+            json.dump({**ticket, 'checksum': checksum, 'started_at': time.time()}, meta)
+        return {'upload_id': upload_id, 'offset': 0, 'size': ticket['size'], 'max_chunk': cls.max_chunk()}
+
+    @classmethod
+    def load(cls, user, upload_id):
+        meta_path, part_path = _paths(upload_id)
+        try:
+            with open(meta_path) as meta:
+                ticket = json.load(meta)
+        except FileNotFoundError:
+            raise UploadRejected('Upload not found', status=404)
+        if ticket['user'] != user.pk:
+            raise UploadRejected('Upload not found', status=404)
+        return ticket, part_path
+
+    @classmethod
+    def offset(cls, user, upload_id):
+        ticket, part_path = cls.load(user, upload_id)
+        return os.path.getsize(part_path), ticket['size']
+
+    @classmethod
+    def append(cls, user, upload_id, offset, stream, length, checksum=None):
+        """
+        Write one chunk at ``offset``; returns the new offset.
+
+        The chunk is hashed while it is written and cut off again if the
+        digest does not match ``checksum``.
+        """
+        ticket, part_path = cls.load(user, upload_id)
+        expected = parse_checksum(checksum)
+        try:
+            offset, length = int(offset), int(length)
+        except (TypeError, ValueError):
+            raise UploadRejected('Upload-Offset and Content-Length are required')
+        if length <= 0 or length > cls.max_chunk():
+            raise UploadRejected(f'Chunks must be between 1 and {cls.max_chunk()} bytes', status=413)
+
+        with cls._locked(upload_id):
+            current = os.path.getsize(part_path)
+            if offset != current:
+                raise UploadRejected(f'Upload is at offset {current}', status=409)
+            if current + length > ticket['size']:
+                raise UploadRejected('Chunk runs past the declared size', status=413)
+            organization = cls._organization(ticket)
+            if organization and not organization.has_storage_for(length):
+                raise UploadRejected('Storage limit reached', status=413)
+
+            digest = hashlib.sha256()
+            written = 0
+            with open(part_path, 'r+b') as part:
+                part.seek(current)
+                while written < length:
+                    data = stream.read(min(CHUNK_SIZE, length - written))
+                    if not data:
+                        break
+                    part.write(data)
+                    digest.update(data)
+                    written += len(data)
+                if written != length or (expected is not None and digest.digest() != expected):
+                    part.truncate(current)
+                    if written != length:
+                        raise UploadRejected('Chunk is shorter than its Content-Length')
+                    raise UploadRejected('Checksum mismatch', status=CHECKSUM_MISMATCH)
+
+            if organization:
+                StorageUsageService.adjust(organization.pk, written)
+            return current + written
+
+    @classmethod
+    def finalize(cls, user, upload_id):
+        """Create the target row from the complete spooled file and clean up."""
+        ticket, part_path = cls.load(user, upload_id)
+        with cls._locked(upload_id):
+            size = os.path.getsize(part_path)
+            if size != ticket['size']:
+                raise UploadRejected(f'Upload is incomplete ({size} of {ticket["size"]} bytes)', status=409)
+            expected = parse_checksum(ticket.get('checksum'))
+            if expected is not None and cls._file_digest(part_path) != expected:
+                raise UploadRejected('Checksum mismatch', status=CHECKSUM_MISMATCH)
+
+            # The accounting of the row's blob takes over from the reservation
+            StorageUsageService.adjust(ticket['organization'], -size)
+            try:
+                with open(part_path, 'rb') as part:
+                    upload = UploadedFile(part, name=ticket['name'], content_type=ticket['content_type'], size=size)
+                    instance = DirectUploadService.create(user, ticket, upload)
+            except Exception:
+                StorageUsageService.adjust(ticket['organization'], size)
+                raise
+            cls._remove(upload_id)
+        return instance
+
+    @classmethod
+    def abort(cls, user, upload_id):
+        ticket, part_path = cls.load(user, upload_id)
+        with cls._locked(upload_id):
+            StorageUsageService.adjust(ticket['organization'], -os.path.getsize(part_path))
+            cls._remove(upload_id)
+
+    @classmethod
+    def clear_stale(cls, max_age=None):
+        """Drop uploads started more than ``max_age`` seconds ago; returns how many."""
+        if max_age is None:
+            max_age = getattr(settings, 'CHUNKED_UPLOAD_MAX_AGE', 60 * 60 * 24)
+        cutoff = time.time() - max_age
+        cleared = 0
+        for entry in os.listdir(_root()):
+            if not entry.endswith('.json'):
+                continue
+            upload_id = entry[:-len('.json')]
+            meta_path, part_path = _paths(upload_id)
+            try:
+                with open(meta_path) as meta:
+                    ticket = json.load(meta)
+            except (OSError, ValueError):
+                continue
+            if ticket.get('started_at', 0) >= cutoff:
+                continue
+            if os.path.exists(part_path):
+                StorageUsageService.adjust(ticket['organization'], -os.path.getsize(part_path))
+            cls._remove(upload_id)
+            cleared += 1
+        return cleared
+
+    @staticmethod
+    @contextmanager
+    def _locked(upload_id):
+        lock = f"chunked_upload:lock:{upload_id}"
+        if not cache.add(lock, True, 60):
+            raise UploadRejected('Upload is busy', status=409)
+        try:
+            yield
+        finally:
+            cache.delete(lock)
+
+    @staticmethod
+    def _organization(ticket):
+        from apps.organizations.models import Organization
+        if not ticket.get('organization'):
+            return None
+        return Organization.objects.filter(pk=ticket['organization']).first()
+
+    @staticmethod
+    def _file_digest(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as part:
+            for data in iter(lambda: part.read(CHUNK_SIZE), b''):
+                digest.update(data)
+        return digest.digest()
+
+    @staticmethod
+    def _remove(upload_id):
+        for path in _paths(upload_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
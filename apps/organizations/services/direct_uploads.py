@@ -0,0 +1,425 @@
+"""
+Direct-to-storage uploads.
+
+Posting a file through Django buffers or spools the whole body in a worker
+before it is sent on to storage. With upload tickets the client sends the
+bytes straight to the storage backend and Django only handles two small
+JSON calls:
+
+1. ``POST /api/v1/uploads/tickets/`` with ``target`` (``attachment``,
+   ``project_file`` or ``document_version``), ``parent_id`` (the message,
+   project or document), ``name``, ``size`` and ``content_type``. Access and
+   the organization's storage quota are checked here; the response carries
+   a signed ``token`` and the ``upload`` request to make (method, URL and
+   form fields or headers).
+2. ``POST /api/v1/uploads/commit/`` with the ``token`` and, for Cloudinary,
+   the ``receipt`` (the JSON Cloudinary answered the upload with). The
+   stored object is verified (its size asked from the storage backend, never
+   taken from the client), the quota checked again and the
+   ``Attachment``/``ProjectFile``/``DocumentVersion`` row is created; a
+   token commits once, and once committed its upload parameters can no
+   longer replace the stored object. A rejected commit removes the uploaded
+   object.
+
+Issued tickets are recorded as ``PendingDirectUpload`` rows until they are
+committed; ``manage.py clear_stale_uploads`` removes the objects of tickets
+that expired uncommitted.
+
+``DIRECT_UPLOAD_BACKEND = 'cloudinary'`` signs Cloudinary upload parameters
+(a multipart POST; Cloudinary has no signed PUT). ``'local'`` is a stand-in
+for tests and development: the client PUTs the raw body to
+``/api/v1/uploads/local/<token>/``, which streams it to
+``DIRECT_UPLOAD_LOCAL_ROOT`` without buffering it in memory.
+"""
+
+import os
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+SALT = 'connectflow.direct-upload'
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadRejected(Exception):
+    """The ticket or commit cannot be honoured; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# Targets: where a committed upload lands
+
+class AttachmentTarget:
+    """A file on a message the requesting user sent."""
+
+    folder = 'messages/attachments'
+
+    def resolve(self, user, parent_id):
+        from apps.chat_channels.models import Message
+        message = Message.objects.filter(
+            pk=parent_id, sender=user, channel__organization_id=user.organization_id
+        ).select_related('channel__organization').first()
+        if message is None:
+            raise UploadRejected('Message not found', status=404)
+        return message
+
+    def organization(self, message):
+        return message.channel.organization
+
+    def storage_name(self, message, name):
+        return f"{self.folder}/{uuid.uuid4().hex}"
+
+    def create(self, message, user, stored, ticket):
+        from apps.chat_channels.models import Attachment
+        return Attachment.objects.create(message=message, file=stored, file_size=ticket['size'])
+
+
+class ProjectFileTarget:
+    """A file shared in a project the requesting user's organization takes part in."""
+
+    folder = 'projects/files'
+
+    def resolve(self, user, parent_id):
+        from django.db.models import Q
+        from apps.organizations.models import SharedProject
+        project = SharedProject.objects.filter(
+            Q(host_organization_id=user.organization_id) | Q(guest_organizations=user.organization_id),
+            pk=parent_id
+        ).select_related('host_organization').first()
+        if project is None:
+            raise UploadRejected('Project not found', status=404)
+        return project
+
+    def organization(self, project):
+        return project.host_organization
+
+    def storage_name(self, project, name):
+        return f"{self.folder}/{uuid.uuid4().hex}"
+
+    def create(self, project, user, stored, ticket):
+        from apps.organizations.models import ProjectFile
+        return ProjectFile.objects.create(
+            project=project, uploader=user, file=stored, file_size=ticket['size'], name=ticket['name']
+        )
+
+
+class DocumentVersionTarget:
+    """A new version of a document in the requesting user's organization."""
+
+    field = 'file'
+    resource_type = 'raw'
+
+    def resolve(self, user, parent_id):
+        from apps.tools.documents.models import Document
+        document = Document.objects.filter(
+            pk=parent_id, organization_id=user.organization_id
+        ).select_related('organization').first()
+        if document is None:
+            raise UploadRejected('Document not found', status=404)
+        return document
+
+    def organization(self, document):
+        return document.organization
+
+    def storage_name(self, document, name):
+        from apps.tools.documents.models import DocumentVersion
+        field = DocumentVersion._meta.get_field(self.field)
+        name = field.generate_filename(DocumentVersion(document=document), f"{uuid.uuid4().hex}/{name}")
+        # The Cloudinary media storage keeps its files under a prefix (MEDIA_URL)
+        prepend_prefix = getattr(field.storage, '_prepend_prefix', None)
+        return prepend_prefix(name) if prepend_prefix else name
+
+    def create(self, document, user, stored, ticket):
+        from django.db.models import Max
+        from apps.tools.documents.models import Document, DocumentVersion
+        with transaction.atomic():
+            document = Document.objects.select_for_update().get(pk=document.pk)
+            latest = document.versions.aggregate(n=Max('version_number'))['n'] or 0
+            version = DocumentVersion.objects.create(
+                document=document,
+                version_number=latest + 1,
+                # A FileField stores the storage name, not a Cloudinary resource
+                file=getattr(stored, 'public_id', stored),
+                file_name=ticket['name'],
+                file_size=ticket['size'],
+                file_type=ticket['content_type'],
+                change_log=ticket.get('change_log') or ('Initial upload' if not latest else ''),
+                created_by=user
+            )
+            document.current_version = version
+            document.save(update_fields=['current_version'])
+        return version
+
+
+TARGETS = {
+    'attachment': AttachmentTarget(),
+    'project_file': ProjectFileTarget(),
+    'document_version': DocumentVersionTarget(),
+}
+
+
+# Backends: how the bytes reach storage
+
+class CloudinaryDirectUpload:
+    """Signed Cloudinary upload parameters; the client POSTs the file to Cloudinary."""
+
+    name = 'cloudinary'
+
+    def ticket(self, token, ticket):
+        import cloudinary
+        from cloudinary.utils import api_sign_request, cleanup_params
+
+        config = cloudinary.config()
+        # No overwrite: the signed parameters outlive the commit and must not replace a charged file
+        params = cleanup_params({
+            'public_id': ticket['key'], 'timestamp': int(time.time()), 'overwrite': False, 'invalidate': True,
+        })
+        signature = api_sign_request(params, config.api_secret)
+        return {
+            'method': 'POST',
+            'url': f"https://api.cloudinary.com/v1_1/{config.cloud_name}/{ticket['resource_type']}/upload",
+            'fields': {**params, 'api_key': config.api_key, 'signature': signature},
+        }
+
+    def confirm(self, ticket, receipt):
+        import cloudinary.api
+        from cloudinary import CloudinaryResource
+        from cloudinary.utils import verify_api_response_signature
+
+        receipt = receipt or {}
+        public_id, version = receipt.get('public_id'), receipt.get('version')
+        if public_id != ticket['key'] or not verify_api_response_signature(
+            public_id, version, receipt.get('signature')
+        ):
+            raise UploadRejected('Upload receipt does not match the ticket')
+        # Only public_id and version are signed: the size comes from Cloudinary itself
+        try:
+            resource = cloudinary.api.resource(
+                public_id, resource_type=receipt.get('resource_type', 'raw'), type=receipt.get('type', 'upload')
+            )
+        except Exception as e:
+            print(f"Cloudinary lookup error: {e}")
+            raise UploadRejected('File has not been uploaded')
+        if int(resource.get('bytes') or 0) != ticket['size']:
+            raise UploadRejected('Uploaded size does not match the ticket')
+        return CloudinaryResource(
+            public_id=public_id, version=resource.get('version', version), format=resource.get('format'),
+            type=resource.get('type', 'upload'), resource_type=resource.get('resource_type', 'raw'),
+            metadata={'bytes': resource['bytes']}
+        )
+
+    def discard(self, key, resource_type='auto'):
+        """Remove whatever was uploaded to ``key``; ``auto`` uploads may have landed as any type."""
+        import cloudinary.uploader
+
+        types = [resource_type] if resource_type in ('image', 'video', 'raw') else ['image', 'video', 'raw']
+        for candidate in types:
+            try:
+                cloudinary.uploader.destroy(key, resource_type=candidate, invalidate=True)
+            except Exception as e:
+                print(f"Cloudinary deletion error: {e}")
+
+
+class LocalDirectUpload:
+    """Files under ``DIRECT_UPLOAD_LOCAL_ROOT``, PUT through :func:`receive`."""
+
+    name = 'local'
+
+    def storage(self):
+        return FileSystemStorage(location=getattr(
+            settings, 'DIRECT_UPLOAD_LOCAL_ROOT', os.path.join(settings.MEDIA_ROOT, 'direct_uploads')
+        ))
+
+    def ticket(self, token, ticket):
+        return {
+            'method': 'PUT',
+            'url': reverse('api_direct_upload_local', args=[token]),
+            'headers': {'Content-Type': ticket['content_type']},
+        }
+
+    def receive(self, ticket, stream):
+        """Stream the request body to disk, refusing more bytes than the ticket declared."""
+        path = self.storage().path(ticket['key'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        written = 0
+        with open(path, 'wb') as destination:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > ticket['size']:
+                    break
+                destination.write(chunk)
+        if written != ticket['size']:
+            os.remove(path)
+            raise UploadRejected('Uploaded size does not match the ticket')
+        return written
+
+    def confirm(self, ticket, receipt):
+        storage = self.storage()
+        if not storage.exists(ticket['key']) or storage.size(ticket['key']) != ticket['size']:
+            raise UploadRejected('File has not been uploaded')
+        return ticket['key']
+
+    def discard(self, key, resource_type='auto'):
+        self.storage().delete(key)
+
+
+def get_backend(name=None):
+    if (name or getattr(settings, 'DIRECT_UPLOAD_BACKEND', 'cloudinary')) == 'local':
+        return LocalDirectUpload()
+    return CloudinaryDirectUpload()
+
+
+class DirectUploadService:
+    """Issue and commit upload tickets."""
+
+    @staticmethod
+    def max_age():
+        return getattr(settings, 'DIRECT_UPLOAD_TICKET_MAX_AGE', 3600)
+
+    @staticmethod
+    def _resolve(spec, user, parent_id):
+        try:
+            return spec.resolve(user, parent_id)
+        except (ValueError, ValidationError):
+            raise UploadRejected('Invalid parent id')
+
+    @classmethod
+    def prepare(cls, user, target, parent_id, name, size, content_type='application/octet-stream',
+                change_log=''):
+        """Check access and quota and describe the upload (the ticket), whatever carries the bytes."""
+        spec = TARGETS.get(target)
+        if spec is None:
+            raise UploadRejected('Unknown upload target')
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            raise UploadRejected('File size is required')
+        name = get_valid_filename(os.path.basename(name or '')) if name else ''
+        if not name or size <= 0:
+            raise UploadRejected('File name and size are required')
+
+        parent = cls._resolve(spec, user, parent_id)
+        organization = spec.organization(parent)
+        if organization and not organization.has_storage_for(size):
+            raise UploadRejected(
+                f"File would exceed storage limit. You have {organization.get_storage_remaining()} MB remaining.",
+                status=413
+            )
+
+        return {
+            'user': user.pk,
+            'organization': str(organization.pk) if organization else None,
+            'target': target,
+            'parent': str(parent.pk),
+            'key': spec.storage_name(parent, name),
+            'name': name,
+            'size': size,
+            'content_type': content_type or 'application/octet-stream',
+            'resource_type': getattr(spec, 'resource_type', 'auto'),
+            'change_log': change_log,
+        }
+
+    @classmethod
+    def issue(cls, user, target, parent_id, name, size, content_type='application/octet-stream',
+              change_log=''):
+        """Check access and quota, then return ``{'token', 'upload', 'expires_in'}``."""
+        from apps.organizations.models import PendingDirectUpload
+
+        ticket = cls.prepare(user, target, parent_id, name, size, content_type, change_log)
+        backend = get_backend()
+        PendingDirectUpload.objects.create(key=ticket['key'], backend=backend.name, resource_type=ticket['resource_type'])
+        token = signing.dumps(ticket, salt=SALT)
+        return {'token': token, 'upload': backend.ticket(token, ticket), 'expires_in': cls.max_age()}
+
+    @classmethod
+    def load(cls, user, token):
+        try:
+            ticket = signing.loads(token, salt=SALT, max_age=cls.max_age())
+        except signing.BadSignature:
+            raise UploadRejected('Invalid or expired upload ticket', status=403)
+        if ticket['user'] != user.pk:
+            raise UploadRejected('Invalid or expired upload ticket', status=403)
+        return ticket
+
+    @classmethod
+    def receive(cls, user, token, stream):
+        """Accept the body of a local-backend PUT."""
+        from apps.organizations.models import PendingDirectUpload
+
+        backend = get_backend()
+        if not isinstance(backend, LocalDirectUpload):
+            raise UploadRejected('Uploads go directly to storage', status=404)
+        ticket = cls.load(user, token)
+        # A committed (or swept) ticket must not overwrite the file it stored
+        if not PendingDirectUpload.objects.filter(key=ticket['key']).exists():
+            raise UploadRejected('Upload already committed', status=409)
+        return backend.receive(ticket, stream)
+
+    @classmethod
+    def commit(cls, user, token, receipt=None):
+        """Verify the stored object and create the row it belongs to."""
+        from apps.organizations.models import Organization, PendingDirectUpload
+
+        ticket = cls.load(user, token)
+        backend = get_backend()
+        # Taking the pending row makes the commit single-use
+        pending = PendingDirectUpload.objects.filter(key=ticket['key']).first()
+        if pending is None or not PendingDirectUpload.objects.filter(pk=pending.pk).delete()[0]:
+            raise UploadRejected('Upload already committed', status=409)
+
+        try:
+            stored = backend.confirm(ticket, receipt)
+            # Tickets issued while under quota may be committed after it filled up
+            organization = Organization.objects.filter(pk=ticket['organization']).first()
+            if organization and not organization.has_storage_for(ticket['size']):
+                raise UploadRejected(
+                    f"File would exceed storage limit. You have {organization.get_storage_remaining()} MB remaining.",
+                    status=413
+                )
+        except UploadRejected:
+            resource_type = receipt.get('resource_type') if isinstance(receipt, dict) else None
+            backend.discard(ticket['key'], resource_type or pending.resource_type)
+            raise
+
+        try:
+            return cls.create(user, ticket, stored)
+        except Exception:
+            # Not committed after all: retry, or let the sweep remove the object
+            PendingDirectUpload.objects.create(key=pending.key, backend=pending.backend, resource_type=pending.resource_type)
+            raise
+
+    @classmethod
+    def clear_stale(cls, max_age=None):
+        """Remove objects uploaded for tickets issued more than ``max_age`` seconds ago and never committed."""
+        from apps.organizations.models import PendingDirectUpload
+
+        if max_age is None:
+            max_age = cls.max_age()
+        cleared = 0
+        cutoff = timezone.now() - timedelta(seconds=max_age)
+        for pending in PendingDirectUpload.objects.filter(created_at__lte=cutoff).iterator():
+            # Claimed like a commit, so a commit racing the sweep keeps its object
+            if PendingDirectUpload.objects.filter(pk=pending.pk).delete()[0]:
+                get_backend(pending.backend).discard(pending.key, pending.resource_type)
+                cleared += 1
+        return cleared
+
+    @classmethod
+    def create(cls, user, ticket, stored):
+        """Create the target row for ``stored`` (a storage name, Cloudinary resource or uploaded file)."""
+        spec = TARGETS[ticket['target']]
+        return spec.create(cls._resolve(spec, user, ticket['parent']), user, stored, ticket)
@@ -0,0 +1,155 @@
+"""
+Per-organization storage accounting.
+
+``Organization.storage_used_bytes`` is a running total kept in step by
+signals on every model that stores an uploaded file, so quota checks read a
+single column instead of walking (and remotely sizing) every file. Each
+tracked row remembers its own ``file_size`` so deletes subtract exactly what
+was added, and ``reconcile`` can rebuild all totals with a few aggregate
+queries (``manage.py reconcile_storage_usage``). Files shared through a
+``FileBlob`` are charged once per blob rather than per row (see blobs.py).
+"""
+
+import logging
+
+from cloudinary import CloudinaryResource
+from django.apps import apps
+from django.core.files.uploadedfile import UploadedFile
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
+
+logger = logging.getLogger(__name__)
+
+
+class StorageUsageService:
+    """Maintain and rebuild organization storage counters."""
+
+    # model label -> (file field, lookup path to the owning organization id)
+    TRACKED_MODELS = {
+        'organizations.ProjectFile': ('file', 'project__host_organization_id'),
+        'organizations.ComplianceEvidence': ('document', 'requirement__project__host_organization_id'),
+        'chat_channels.Attachment': ('file', 'message__channel__organization_id'),
+        'tools_documents.DocumentVersion': ('file', 'document__organization_id'),
+    }
+
+    @classmethod
+    def tracked_models(cls):
+        for label, (file_field, org_path) in cls.TRACKED_MODELS.items():
+            yield apps.get_model(label), file_field, org_path
+
+    @classmethod
+    def spec_for(cls, model):
+        return cls.TRACKED_MODELS[model._meta.label]
+
+    @staticmethod
+    def size_of(value):
+        """Best-effort local size of a file field value in bytes (no remote calls)."""
+        if not value:
+            return 0
+        if isinstance(value, CloudinaryResource):
+            return int((value.metadata or {}).get('bytes') or 0)
+        try:
+            return int(value.size or 0)
+        except Exception:
+            return 0
+
+    @staticmethod
+    def is_new_upload(value):
+        """True when the field holds a file that has not been stored yet."""
+        if isinstance(value, UploadedFile):
+            return True
+        return getattr(value, '_committed', True) is False
+
+    @classmethod
+    def organization_id_for(cls, instance):
+        _, org_path = cls.spec_for(type(instance))
+        return type(instance)._default_manager.filter(pk=instance.pk).values_list(
+            org_path, flat=True
+        ).first()
+
+    @staticmethod
+    def adjust(organization_id, delta):
+        """Atomically add ``delta`` bytes to an organization's counter."""
+        if not organization_id or not delta:
+            return
+        from apps.organizations.models import Organization
+        Organization.objects.filter(pk=organization_id).update(
+            storage_used_bytes=Greatest(F('storage_used_bytes') + delta, 0)
+        )
+
+    @classmethod
+    def totals(cls):
+        """Return ``{organization_id: bytes}`` computed from stored file sizes."""
+        from apps.organizations.models import FileBlob
+        from .blobs import BlobService
+
+        totals = {}
+
+        def add(org_id, total):
+            if org_id:
+                totals[org_id] = totals.get(org_id, 0) + (total or 0)
+
+        for model, _, org_path in cls.tracked_models():
+            rows = model._default_manager.all()
+            if model._meta.label in BlobService.TRACKED_MODELS:
+                rows = rows.filter(blob__isnull=True)
+            for row in rows.values(org_path).annotate(total=Sum('file_size')):
+                add(row[org_path], row['total'])
+        for row in FileBlob.objects.values('organization_id').annotate(total=Sum('size')):
+            add(row['organization_id'], row['total'])
+        return totals
+
+    @classmethod
+    def reconcile(cls, organizations=None):
+        """
+        Recompute counters from the per-file sizes.
+
+        Returns ``{organization_id: (old_bytes, new_bytes)}`` for organizations
+        whose counter changed.
+        """
+        from apps.organizations.models import Organization
+
+        totals = cls.totals()
+        queryset = Organization.objects.all()
+        if organizations is not None:
+            queryset = queryset.filter(pk__in=[getattr(o, 'pk', o) for o in organizations])
+
+        changed = {}
+        for org_id, current in queryset.values_list('id', 'storage_used_bytes'):
+            expected = totals.get(org_id, 0)
+            if expected != current:
+                Organization.objects.filter(pk=org_id).update(storage_used_bytes=expected)
+                changed[org_id] = (current, expected)
+        return changed
+
+    @staticmethod
+    def remote_size(value):
+        """Ask Cloudinary for a resource's size. One API call; used by backfills only."""
+        if isinstance(value, CloudinaryResource) and value.public_id:
+            import cloudinary.api
+            resource = cloudinary.api.resource(
+                value.public_id,
+                resource_type=value.resource_type or 'image',
+                type=value.type or 'upload'
+            )
+            return int(resource.get('bytes') or 0)
+        return StorageUsageService.size_of(value)
+
+    @classmethod
+    def backfill_sizes(cls):
+        """Fill ``file_size`` for rows stored before sizes were tracked."""
+        updated = 0
+        for model, file_field, _ in cls.tracked_models():
+            for instance in model._default_manager.filter(file_size=0).iterator():
+                value = getattr(instance, file_field)
+                if not value:
+                    continue
+                try:
+                    size = cls.remote_size(value)
+                except Exception as e:
+                    logger.warning("Could not size %s %s: %s", model.__name__, instance.pk, e)
+                    continue
+                if size:
+                    model._default_manager.filter(pk=instance.pk).update(file_size=size)
+                    updated += 1
+        return updated
@@ -0,0 +1,166 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from cloudinary import CloudinaryResource
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.chat_channels.models import Attachment, Channel, Message
+from apps.organizations.models import FileBlob, Organization, ProjectFile, SharedProject
+from apps.tools.documents.models import Document, DocumentVersion
+
+User = get_user_model()
+
+
+class FakeCloudinary:
+    """Counts uploads and deletions instead of talking to Cloudinary."""
+
+    def __init__(self):
+        self.uploads = 0
+        self.destroyed = []
+
+    def upload_resource(self, file, **options):
+        self.uploads += 1
+        return CloudinaryResource(
+            public_id=f"{options.get('folder')}/upload{self.uploads}", format='png',
+            resource_type='image', type='upload', version=1, metadata={'bytes': file.size}
+        )
+
+    def destroy(self, public_id, **options):
+        self.destroyed.append(public_id)
+
+
+class FileBlobTest(TestCase):
+    def setUp(self):
+        self.cloudinary = FakeCloudinary()
+        for patcher in (
+            mock.patch('cloudinary.models.uploader.upload_resource', self.cloudinary.upload_resource),
+            mock.patch('cloudinary.uploader.destroy', self.cloudinary.destroy),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='testuser', password='password', email='test@test.com',
+            email_verified=True, organization=self.org
+        )
+        self.project = SharedProject.objects.create(
+            name='Test Project', host_organization=self.org, created_by=self.user
+        )
+        self.channel = Channel.objects.create(
+            name='general', organization=self.org, channel_type=Channel.ChannelType.TEAM,
+            shared_project=self.project
+        )
+        self.channel.members.add(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _attach(self, body=b'png bytes'):
+        message = Message.objects.create(channel=self.channel, sender=self.user, content='see attached')
+        attachment = Attachment.objects.create(
+            message=message, file=SimpleUploadedFile('chart.png', body, content_type='image/png')
+        )
+        return message, attachment
+
+    def _usage(self):
+        self.org.refresh_from_db()
+        return self.org.storage_used_bytes
+
+    def test_identical_uploads_share_one_stored_file(self):
+        _, first = self._attach()
+        message, second = self._attach()
+        self.assertEqual(self.cloudinary.uploads, 1)
+        self.assertEqual(second.blob_id, first.blob_id)
+        self.assertEqual(str(second.file), str(first.file))
+        self.assertEqual(FileBlob.objects.get().ref_count, 2)
+        # The organization is charged once for the stored file
+        self.assertEqual(self._usage(), 9)
+
+        _, other = self._attach(b'other bytes')
+        self.assertEqual(self.cloudinary.uploads, 2)
+        self.assertNotEqual(other.blob_id, first.blob_id)
+
+        message.delete()
+        self.assertEqual(self.cloudinary.destroyed, [])
+        self.assertEqual(self._usage(), 20)
+        first.message.delete()
+        self.assertEqual(self.cloudinary.destroyed, [first.file.public_id])
+        self.assertFalse(FileBlob.objects.filter(pk=first.blob_id).exists())
+        self.assertEqual(self._usage(), 11)
+
+    def test_content_is_not_shared_across_organizations(self):
+        _, first = self._attach()
+        other_org = Organization.objects.create(name='Other Org', code='OTHER')
+        other_user = User.objects.create_user(
+            username='otheruser', password='password', email='other@test.com',
+            email_verified=True, organization=other_org
+        )
+        channel = Channel.objects.create(name='general', organization=other_org)
+        message = Message.objects.create(channel=channel, sender=other_user, content='see attached')
+        other = Attachment.objects.create(
+            message=message, file=SimpleUploadedFile('chart.png', b'png bytes', content_type='image/png')
+        )
+        self.assertEqual(self.cloudinary.uploads, 2)
+        self.assertNotEqual(other.blob_id, first.blob_id)
+        self.assertEqual(
+            dict(FileBlob.objects.values_list('organization_id', 'ref_count')), {self.org.pk: 1, other_org.pk: 1}
+        )
+        other_org.refresh_from_db()
+        self.assertEqual((self._usage(), other_org.storage_used_bytes), (9, 9))
+
+    def test_forward_and_add_to_files_share_the_blob(self):
+        message, attachment = self._attach()
+        # A row stored before blobs existed is adopted when first shared
+        FileBlob.objects.all().delete()
+        attachment.refresh_from_db()
+        self.assertIsNone(attachment.blob_id)
+
+        response = self.client.post(
+            f'/api/v1/messages/{message.pk}/forward/', {'target_channel_id': str(self.channel.pk)}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.client.post(f'/api/v1/messages/{message.pk}/add_to_files/').status_code, 200)
+
+        attachment.refresh_from_db()
+        forwarded = Attachment.objects.get(message_id=response.json()['id'])
+        project_file = ProjectFile.objects.get(project=self.project)
+        self.assertEqual(forwarded.blob_id, attachment.blob_id)
+        self.assertEqual(project_file.blob_id, attachment.blob_id)
+        self.assertEqual(FileBlob.objects.get().ref_count, 3)
+        self.assertEqual(self.cloudinary.uploads, 1)
+
+        message.delete()
+        forwarded.message.delete()
+        self.assertEqual(self.cloudinary.destroyed, [])
+        project_file.delete()
+        self.assertEqual(self.cloudinary.destroyed, [attachment.file.public_id])
+
+    def test_document_versions_are_deduplicated_in_storage(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        with override_settings(STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': media}},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        }):
+            document = Document.objects.create(organization=self.org, title='Policy', created_by=self.user)
+            versions = [
+                DocumentVersion.objects.create(
+                    document=document, version_number=number, file=ContentFile(b'%PDF policy', name='policy.pdf'),
+                    file_type='application/pdf', created_by=self.user
+                )
+                for number in (1, 2)
+            ]
+            path = versions[0].file.path
+            self.assertEqual(versions[1].file.name, versions[0].file.name)
+            self.assertEqual(FileBlob.objects.get().size, 11)
+
+            versions[0].delete()
+            self.assertTrue(os.path.exists(path))
+            versions[1].delete()
+            self.assertFalse(os.path.exists(path))
+            self.assertFalse(FileBlob.objects.exists())
@@ -0,0 +1,130 @@
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.organizations.models import Organization
+from apps.tools.documents.models import Document
+
+User = get_user_model()
+
+BODY = b'%PDF-1.7 ' + b'quarterly numbers ' * 40
+
+
+def checksum(data):
+    return 'sha256 ' + base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+class ChunkedUploadTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.spool = tempfile.mkdtemp()
+        self.media = tempfile.mkdtemp()
+        self.overrides = override_settings(
+            CHUNKED_UPLOAD_ROOT=self.spool,
+            STORAGES={
+                'default': {
+                    'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                    'OPTIONS': {'location': self.media},
+                },
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+            }
+        )
+        self.overrides.enable()
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='testuser', password='password', email='test@test.com',
+            email_verified=True, organization=self.org
+        )
+        self.document = Document.objects.create(organization=self.org, title='Policy', created_by=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        self.overrides.disable()
+        shutil.rmtree(self.spool, ignore_errors=True)
+        shutil.rmtree(self.media, ignore_errors=True)
+
+    def _usage(self):
+        self.org.refresh_from_db()
+        return self.org.storage_used_bytes
+
+    def _start(self, body=BODY, **extra):
+        response = self.client.post('/api/v1/uploads/chunked/', {
+            'target': 'document_version', 'parent_id': str(self.document.pk), 'name': 'report.pdf',
+            'size': len(body), 'content_type': 'application/pdf', 'checksum': checksum(body), **extra
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response['Location']
+
+    def _patch(self, url, offset, chunk, digest=None):
+        return self.client.generic(
+            'PATCH', url, chunk, content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset), HTTP_UPLOAD_CHECKSUM=digest or checksum(chunk)
+        )
+
+    def test_resumable_upload_creates_a_document_version(self):
+        url = self._start()
+        first, rest = BODY[:300], BODY[300:]
+        self.assertEqual(self._patch(url, 0, first)['Upload-Offset'], '300')
+        # Chunks count toward the quota as they arrive
+        self.assertEqual(self._usage(), 300)
+
+        # A retry of a chunk that already landed is refused; the client asks where to resume
+        self.assertEqual(self._patch(url, 0, first).status_code, 409)
+        self.assertEqual(self.client.head(url)['Upload-Offset'], '300')
+        self.assertEqual(self.client.post(f'{url}finalize/').status_code, 409)
+
+        self.assertEqual(self._patch(url, 300, rest).status_code, 204)
+        response = self.client.post(f'{url}finalize/')
+        self.assertEqual(response.status_code, 201)
+
+        self.document.refresh_from_db()
+        version = self.document.current_version
+        self.assertEqual(str(version.pk), response.json()['id'])
+        self.assertEqual((version.file_name, version.file_size, version.version_number), ('report.pdf', len(BODY), 1))
+        with version.file.open('rb') as stored:
+            self.assertEqual(stored.read(), BODY)
+        # The reservation became the row's own accounting, counted once
+        self.assertEqual(self._usage(), len(BODY))
+        self.assertEqual(os.listdir(self.spool), [])
+
+    def test_corrupt_chunks_are_not_kept(self):
+        url = self._start()
+        response = self._patch(url, 0, BODY[:100], digest=checksum(b'something else'))
+        self.assertEqual(response.status_code, 460)
+        self.assertEqual(self.client.get(url).json(), {'offset': 0, 'size': len(BODY)})
+        self.assertEqual(self._usage(), 0)
+
+        other = User.objects.create_user(
+            username='other', password='password', email='other@test.com',
+            email_verified=True, organization=self.org
+        )
+        client = APIClient()
+        client.force_authenticate(other)
+        self.assertEqual(client.get(url).status_code, 404)
+
+    def test_quota_and_cleanup(self):
+        url = self._start()
+        self._patch(url, 0, BODY[:100])
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self._usage(), 0)
+
+        url = self._start()
+        self._patch(url, 0, BODY[:100])
+        call_command('clear_stale_uploads', '--max-age', '0', stdout=StringIO())
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self._usage(), 0)
+
+        url = self._start()
+        full = self.org.get_plan().max_storage_mb * 1024 * 1024
+        Organization.objects.filter(pk=self.org.pk).update(storage_used_bytes=full)
+        self.assertEqual(self._patch(url, 0, BODY[:100]).status_code, 413)
@@ -0,0 +1,187 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from cloudinary.utils import api_sign_request
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core import signing
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.chat_channels.models import Attachment, Channel, Message
+from apps.organizations.models import Organization, PendingDirectUpload, SharedProject, ProjectFile
+from apps.organizations.services.direct_uploads import SALT
+from apps.tools.documents.models import Document
+
+User = get_user_model()
+
+
+class DirectUploadTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.root = tempfile.mkdtemp()
+        self.local_backend = override_settings(DIRECT_UPLOAD_BACKEND='local', DIRECT_UPLOAD_LOCAL_ROOT=self.root)
+        self.local_backend.enable()
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='testuser', password='password', email='test@test.com',
+            email_verified=True, organization=self.org
+        )
+        self.project = SharedProject.objects.create(
+            name='Test Project', host_organization=self.org, created_by=self.user
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        self.local_backend.disable()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _ticket(self, target, parent_id, body, **extra):
+        return self.client.post('/api/v1/uploads/tickets/', {
+            'target': target, 'parent_id': str(parent_id), 'name': 'report.pdf',
+            'size': len(body), 'content_type': 'application/pdf', **extra
+        }, format='json')
+
+    def _upload(self, target, parent_id, body=b'%PDF-1.7 quarterly numbers'):
+        ticket = self._ticket(target, parent_id, body).json()
+        self.assertEqual(ticket['upload']['method'], 'PUT')
+        response = self.client.put(ticket['upload']['url'], body, content_type='application/pdf')
+        self.assertEqual(response.json(), {'size': len(body)})
+        return ticket['token']
+
+    def _stored(self):
+        return sum(len(files) for _, _, files in os.walk(self.root))
+
+    def _commit(self, token, **extra):
+        return self.client.post('/api/v1/uploads/commit/', {'token': token, **extra}, format='json')
+
+    def test_project_file_round_trip(self):
+        token = self._upload('project_file', self.project.pk)
+        response = self._commit(token)
+        self.assertEqual(response.status_code, 201)
+
+        project_file = ProjectFile.objects.get(pk=response.json()['id'])
+        self.assertEqual((project_file.name, project_file.file_size), ('report.pdf', 26))
+        self.assertTrue(str(project_file.file).startswith('projects/files/'))
+        self.org.refresh_from_db()
+        self.assertEqual(self.org.storage_used_bytes, 26)
+
+        # A ticket commits once, and cannot replace the committed file
+        self.assertEqual(self._commit(token).status_code, 409)
+        ticket = signing.loads(token, salt=SALT)
+        response = self.client.put(
+            reverse('api_direct_upload_local', args=[token]), b'%PDF-1.7 other numbers!!!', content_type='application/pdf'
+        )
+        self.assertEqual(response.status_code, 409)
+        with open(os.path.join(self.root, ticket['key']), 'rb') as stored:
+            self.assertEqual(stored.read(), b'%PDF-1.7 quarterly numbers')
+
+    def test_document_versions_and_quota(self):
+        document = Document.objects.create(organization=self.org, title='Policy', created_by=self.user)
+        first = self._commit(self._upload('document_version', document.pk)).json()['id']
+        second = self._commit(self._upload('document_version', document.pk, b'v2')).json()['id']
+        document.refresh_from_db()
+        self.assertEqual(str(document.current_version_id), second)
+        self.assertEqual(
+            list(document.versions.values_list('version_number', 'file_size', 'file_type')),
+            [(2, 2, 'application/pdf'), (1, 26, 'application/pdf')]
+        )
+        self.assertNotEqual(first, second)
+
+        # A ticket issued under quota is checked again when it is committed
+        token = self._upload('document_version', document.pk, b'v3')
+        Organization.objects.filter(pk=self.org.pk).update(storage_used_bytes=self.org.get_plan().max_storage_mb * 1024 * 1024)
+        self.assertEqual(self._ticket('document_version', document.pk, b'x').status_code, 413)
+        self.assertEqual(self._stored(), 3)
+        self.assertEqual(self._commit(token).status_code, 413)
+        self.assertEqual(document.versions.count(), 2)
+        self.assertEqual(self._stored(), 2)
+
+    def test_uncommitted_uploads_are_swept(self):
+        token = self._upload('project_file', self.project.pk)
+        committed = self._upload('project_file', self.project.pk, b'%PDF-1.7 annual numbers')
+        self.assertEqual(self._commit(committed).status_code, 201)
+
+        call_command('clear_stale_uploads', max_age=0, stdout=open(os.devnull, 'w'))
+        self.assertFalse(PendingDirectUpload.objects.exists())
+        self.assertEqual(self._stored(), 1)
+        self.assertEqual(self._commit(token).status_code, 409)
+
+    def test_rejections(self):
+        ticket = self._ticket('project_file', self.project.pk, b'12345').json()
+        # More (or fewer) bytes than declared
+        self.assertEqual(self.client.put(ticket['upload']['url'], b'123456', content_type='application/pdf').status_code, 400)
+        self.assertEqual(self._commit(ticket['token']).status_code, 400)
+
+        other = User.objects.create_user(
+            username='other', password='password', email='other@test.com',
+            email_verified=True, organization=self.org
+        )
+        client = APIClient()
+        client.force_authenticate(other)
+        self.assertEqual(client.post('/api/v1/uploads/commit/', {'token': ticket['token']}, format='json').status_code, 403)
+
+        # Attachments only go on the uploader's own messages
+        channel = Channel.objects.create(name='general', organization=self.org)
+        message = Message.objects.create(channel=channel, sender=other, content='hi')
+        self.assertEqual(self._ticket('attachment', message.pk, b'1').status_code, 404)
+        self.assertEqual(self._ticket('attachment', 'not-a-uuid', b'1').status_code, 400)
+        self.assertEqual(self._ticket('avatar', message.pk, b'1').status_code, 400)
+
+    @override_settings(DIRECT_UPLOAD_BACKEND='cloudinary')
+    def test_cloudinary_receipt_is_verified(self):
+        import cloudinary
+
+        channel = Channel.objects.create(name='general', organization=self.org)
+        message = Message.objects.create(channel=channel, sender=self.user, content='see attached')
+        ticket = self._ticket('attachment', message.pk, b'12345').json()
+        fields = ticket['upload']['fields']
+        self.assertEqual(ticket['upload']['method'], 'POST')
+        self.assertEqual((fields['overwrite'], fields['invalidate']), ('0', '1'))
+        self.assertEqual(fields['signature'], api_sign_request(
+            {key: fields[key] for key in ('public_id', 'timestamp', 'overwrite', 'invalidate')},
+            cloudinary.config().api_secret
+        ))
+
+        receipt = {
+            'public_id': fields['public_id'], 'version': 1700000000, 'format': 'png',
+            'resource_type': 'image', 'type': 'upload', 'bytes': 5,
+        }
+        receipt['signature'] = api_sign_request(
+            {'public_id': receipt['public_id'], 'version': receipt['version']}, cloudinary.config().api_secret
+        )
+        # A rejected commit removes the uploaded object and ends the ticket
+        forged = {**receipt, 'public_id': 'messages/attachments/elsewhere'}
+        with mock.patch('cloudinary.uploader.destroy') as destroy:
+            self.assertEqual(self._commit(ticket['token'], receipt=forged).status_code, 400)
+        destroy.assert_called_once_with(fields['public_id'], resource_type='image', invalidate=True)
+        self.assertEqual(self._commit(ticket['token'], receipt=receipt).status_code, 409)
+
+        def sign(ticket):
+            public_id = ticket['upload']['fields']['public_id']
+            return {**receipt, 'public_id': public_id, 'signature': api_sign_request(
+                {'public_id': public_id, 'version': receipt['version']}, cloudinary.config().api_secret
+            )}
+
+        # The receipt's bytes are not signed: the stored size is asked from Cloudinary
+        stored = {'version': 1700000000, 'format': 'png', 'resource_type': 'image', 'type': 'upload', 'bytes': 50000}
+        ticket = self._ticket('attachment', message.pk, b'12345').json()
+        with mock.patch('cloudinary.api.resource', return_value=stored) as resource, \
+                mock.patch('cloudinary.uploader.destroy') as destroy:
+            self.assertEqual(self._commit(ticket['token'], receipt=sign(ticket)).status_code, 400)
+        resource.assert_called_once_with(ticket['upload']['fields']['public_id'], resource_type='image', type='upload')
+        self.assertEqual(destroy.call_count, 1)
+
+        ticket = self._ticket('attachment', message.pk, b'12345').json()
+        with mock.patch('cloudinary.api.resource', return_value={**stored, 'bytes': 5}):
+            response = self._commit(ticket['token'], receipt=sign(ticket))
+        self.assertEqual(response.status_code, 201)
+        attachment = Attachment.objects.get(pk=response.json()['id'])
+        self.assertEqual(attachment.message, message)
+        self.assertTrue(attachment.is_image)
+        self.assertEqual(attachment.file_size, 5)
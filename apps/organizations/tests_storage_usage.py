@@ -0,0 +1,98 @@
+from datetime import date
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from apps.organizations.models import (
+    Organization, SharedProject, ProjectFile, ComplianceRequirement, ComplianceEvidence
+)
+from apps.organizations.services import StorageUsageService
+from apps.chat_channels.models import Channel, Message, Attachment
+from apps.tools.documents.models import Document, DocumentVersion
+
+User = get_user_model()
+
+
+class StorageUsageTest(TestCase):
+    def setUp(self):
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='testuser', password='password', email='test@test.com',
+            email_verified=True, organization=self.org
+        )
+        self.project = SharedProject.objects.create(
+            name='Test Project', host_organization=self.org, created_by=self.user
+        )
+        self.project.members.add(self.user)
+
+    def _usage(self):
+        self.org.refresh_from_db()
+        return self.org.storage_used_bytes
+
+    def _create_all(self):
+        ProjectFile.objects.create(
+            project=self.project, uploader=self.user, file='projects/files/a', file_size=1000, name='a'
+        )
+        requirement = ComplianceRequirement.objects.create(
+            project=self.project, regulation='GDPR', requirement_id='1', requirement_text='Keep records'
+        )
+        ComplianceEvidence.objects.create(
+            requirement=requirement, evidence_type='Report', document='compliance_evidence/b',
+            file_size=500, validity_period=date(2030, 1, 1)
+        )
+        channel = Channel.objects.create(name='general', organization=self.org, created_by=self.user)
+        message = Message.objects.create(channel=channel, sender=self.user, content='see file')
+        Attachment.objects.create(message=message, file='messages/attachments/c', file_size=250)
+        document = Document.objects.create(organization=self.org, title='Policy', created_by=self.user)
+        DocumentVersion.objects.create(
+            document=document, file='documents/d.pdf', file_name='d.pdf', file_size=100, file_type='pdf'
+        )
+
+    def test_counter_follows_creates_and_deletes(self):
+        self._create_all()
+        self.assertEqual(self._usage(), 1850)
+
+        ProjectFile.objects.get(name='a').delete()
+        self.assertEqual(self._usage(), 850)
+
+        # Cascades (project -> requirement -> evidence) are accounted too
+        self.project.delete()
+        self.assertEqual(self._usage(), 350)
+
+    def test_reconcile_command(self):
+        self._create_all()
+        Organization.objects.filter(pk=self.org.pk).update(storage_used_bytes=7)
+
+        out = StringIO()
+        call_command('reconcile_storage_usage', '--dry-run', stdout=out)
+        self.assertEqual(self._usage(), 7)
+        self.assertIn('7 -> 1850', out.getvalue())
+
+        call_command('reconcile_storage_usage', stdout=StringIO())
+        self.assertEqual(self._usage(), 1850)
+
+    def test_quota_check_is_constant_time(self):
+        Organization.objects.filter(pk=self.org.pk).update(storage_used_bytes=50 * 1024 * 1024 - 10)
+        self.org.refresh_from_db()
+        with self.assertNumQueries(0):
+            self.assertTrue(self.org.has_storage_for(10))
+            self.assertFalse(self.org.has_storage_for(11))
+
+    def test_upload_rejected_when_over_quota(self):
+        Organization.objects.filter(pk=self.org.pk).update(storage_used_bytes=50 * 1024 * 1024)
+        client = Client()
+        client.force_login(self.user)
+        response = client.post(
+            reverse('organizations:project_files', kwargs={'pk': self.project.pk}),
+            {'name': 'big', 'file': SimpleUploadedFile('big.txt', b'x' * 2048)}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(ProjectFile.objects.exists())
+
+    def test_size_of_uploaded_file(self):
+        upload = SimpleUploadedFile('doc.txt', b'x' * 42)
+        self.assertEqual(StorageUsageService.size_of(upload), 42)
+        self.assertTrue(StorageUsageService.is_new_upload(upload))
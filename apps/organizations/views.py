@@ -16,6 +16,7 @@ from .forms import (
     ProjectFileForm, ProjectMeetingForm, ProjectTaskForm, ProjectMilestoneForm, OrganizationForm,
     ProjectRiskForm, AuditTrailForm, ControlTestForm, ComplianceEvidenceForm, ComplianceRequirementForm
 )
+from apps.accounts.services import NotificationFanoutService
 
 
 def get_user_project_or_404(user, pk):
@@ -198,14 +199,11 @@ def add_compliance_evidence(request, pk, req_pk):
     
     # Check Storage Limit
     org = project.host_organization
-    current_usage_mb = org.get_storage_usage()
-    max_storage_mb = org.get_plan().max_storage_mb
     
     uploaded_file = request.FILES.get('document')
     if uploaded_file:
-        file_size_mb = uploaded_file.size / (1024 * 1024)
-        if (current_usage_mb + file_size_mb) > max_storage_mb:
-            messages.error(request, f"Upload failed: File would exceed storage limit. You have {round(max_storage_mb - current_usage_mb, 2)} MB remaining.")
+        if not org.has_storage_for(uploaded_file.size):
+            messages.error(request, f"Upload failed: File would exceed storage limit. You have {org.get_storage_remaining()} MB remaining.")
             return redirect('organizations:project_risk_dashboard', pk=pk)
 
     form = ComplianceEvidenceForm(request.POST, request.FILES)
@@ -266,32 +264,15 @@ def project_milestones(request, pk):
             milestone.save()
             
             # Notify members
-            from apps.accounts.models import Notification
-            from asgiref.sync import async_to_sync
-            from channels.layers import get_channel_layer
-            channel_layer = get_channel_layer()
-            
-            for member in project.members.all():
-                if member == request.user: continue
-                notification = Notification.notify(
-                    recipient=member,
-                    sender=request.user,
-                    title=f"New Milestone: {milestone.title}",
-                    content=f"A new milestone has been set for {project.name}: {milestone.title}",
-                    notification_type='PROJECT',
-                    link=reverse('organizations:shared_project_detail', kwargs={'pk': project.pk})
-                )
-                async_to_sync(channel_layer.group_send)(
-                    f"notifications_{member.id}",
-                    {
-                        'type': 'send_notification',
-                        'id': str(notification.id),
-                        'title': notification.title,
-                        'content': notification.content,
-                        'notification_type': notification.notification_type,
-                        'link': notification.link,
-                    }
-                )
+            NotificationFanoutService.notify_users(
+                project.members.all(),
+                exclude=request.user,
+                sender=request.user,
+                title=f"New Milestone: {milestone.title}",
+                content=f"A new milestone has been set for {project.name}: {milestone.title}",
+                notification_type='PROJECT',
+                link=reverse('organizations:shared_project_detail', kwargs={'pk': project.pk})
+            )
             
             messages.success(request, 'Milestone added.')
             return redirect('organizations:project_milestones', pk=pk)
@@ -317,38 +298,18 @@ def toggle_milestone(request, pk):
     milestone.completed_at = timezone.now() if milestone.is_completed else None
     milestone.save()
 
-    from apps.accounts.models import Notification
-    from asgiref.sync import async_to_sync
-    from channels.layers import get_channel_layer
-    channel_layer = get_channel_layer()
-    
     title = f"Milestone Achieved: {milestone.title}" if milestone.is_completed else f"Milestone Re-opened: {milestone.title}"
     status_text = "completed" if milestone.is_completed else "re-opened"
     
-    for member in milestone.project.members.all():
-        if member == request.user:
-            continue
-            
-        notification = Notification.notify(
-            recipient=member,
-            sender=request.user,
-            title=title,
-            content=f"{request.user.get_full_name()} {status_text} a milestone in {milestone.project.name}.",
-            notification_type='PROJECT',
-            link=reverse('organizations:shared_project_detail', kwargs={'pk': milestone.project.pk})
-        )
-        
-        async_to_sync(channel_layer.group_send)(
-            f"notifications_{member.id}",
-            {
-                'type': 'send_notification',
-                'id': str(notification.id),
-                'title': notification.title,
-                'content': notification.content,
-                'notification_type': notification.notification_type,
-                'link': notification.link,
-            }
-        )
+    NotificationFanoutService.notify_users(
+        milestone.project.members.all(),
+        exclude=request.user,
+        sender=request.user,
+        title=title,
+        content=f"{request.user.get_full_name()} {status_text} a milestone in {milestone.project.name}.",
+        notification_type='PROJECT',
+        link=reverse('organizations:shared_project_detail', kwargs={'pk': milestone.project.pk})
+    )
     
     return JsonResponse({
         'success': True, 
@@ -364,15 +325,13 @@ def project_files(request, pk):
     if request.method == 'POST':
         # Check Organization Storage Limit
         org = project.host_organization
-        current_usage_mb = org.get_storage_usage()
-        max_storage_mb = org.get_plan().max_storage_mb
         
         # Get incoming file size
         uploaded_file = request.FILES.get('file')
         if uploaded_file:
             file_size_mb = uploaded_file.size / (1024 * 1024)
-            if (current_usage_mb + file_size_mb) > max_storage_mb:
-                messages.error(request, f"Upload failed: This file ({round(file_size_mb, 2)} MB) would exceed your remaining storage space. You have {round(max_storage_mb - current_usage_mb, 2)} MB left.")
+            if not org.has_storage_for(uploaded_file.size):
+                messages.error(request, f"Upload failed: This file ({round(file_size_mb, 2)} MB) would exceed your remaining storage space. You have {org.get_storage_remaining()} MB left.")
                 return redirect('organizations:project_files', pk=pk)
 
         form = ProjectFileForm(request.POST, request.FILES)
@@ -384,33 +343,15 @@ def project_files(request, pk):
             project_file.save()
 
             # Notification logic
-            from apps.accounts.models import Notification
-            from asgiref.sync import async_to_sync
-            from channels.layers import get_channel_layer
-            channel_layer = get_channel_layer()
-            
-            for member in project.members.all():
-                if member == request.user:
-                    continue
-                notification = Notification.notify(
-                    recipient=member,
-                    sender=request.user,
-                    title=f"New File in {project.name}",
-                    content=f"{request.user.get_full_name()} uploaded {project_file.name}",
-                    notification_type='PROJECT',
-                    link=reverse('organizations:project_files', kwargs={'pk': project.pk})
-                )
-                async_to_sync(channel_layer.group_send)(
-                    f"notifications_{member.id}",
-                    {
-                        'type': 'send_notification',
-                        'id': str(notification.id),
-                        'title': notification.title,
-                        'content': notification.content,
-                        'notification_type': notification.notification_type,
-                        'link': notification.link,
-                    }
-                )
+            NotificationFanoutService.notify_users(
+                project.members.all(),
+                exclude=request.user,
+                sender=request.user,
+                title=f"New File in {project.name}",
+                content=f"{request.user.get_full_name()} uploaded {project_file.name}",
+                notification_type='PROJECT',
+                link=reverse('organizations:project_files', kwargs={'pk': project.pk})
+            )
 
             messages.success(request, 'File uploaded successfully.')
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -472,33 +413,15 @@ def project_meetings(request, pk):
             meeting.save()
 
             # Notification logic
-            from apps.accounts.models import Notification
-            from asgiref.sync import async_to_sync
-            from channels.layers import get_channel_layer
-            channel_layer = get_channel_layer()
-            
-            for member in project.members.all():
-                if member == request.user:
-                    continue
-                notification = Notification.notify(
-                    recipient=member,
-                    sender=request.user,
-                    title=f"Meeting Scheduled: {meeting.title}",
-                    content=f"New meeting for project {project.name} on {meeting.start_time.strftime('%Y-%m-%d %H:%M')}",
-                    notification_type='PROJECT',
-                    link=reverse('organizations:project_meetings', kwargs={'pk': project.pk})
-                )
-                async_to_sync(channel_layer.group_send)(
-                    f"notifications_{member.id}",
-                    {
-                        'type': 'send_notification',
-                        'id': str(notification.id),
-                        'title': notification.title,
-                        'content': notification.content,
-                        'notification_type': notification.notification_type,
-                        'link': notification.link,
-                    }
-                )
+            NotificationFanoutService.notify_users(
+                project.members.all(),
+                exclude=request.user,
+                sender=request.user,
+                title=f"Meeting Scheduled: {meeting.title}",
+                content=f"New meeting for project {project.name} on {meeting.start_time.strftime('%Y-%m-%d %H:%M')}",
+                notification_type='PROJECT',
+                link=reverse('organizations:project_meetings', kwargs={'pk': project.pk})
+            )
 
             messages.success(request, 'Meeting scheduled.')
             return redirect('organizations:project_meetings', pk=pk)
@@ -536,32 +459,15 @@ def project_meeting_edit(request, project_pk, meeting_pk):
             meeting = form.save()
             
             # Notify members about update
-            from apps.accounts.models import Notification
-            from asgiref.sync import async_to_sync
-            from channels.layers import get_channel_layer
-            channel_layer = get_channel_layer()
-            
-            for member in project.members.all():
-                if member == request.user: continue
-                notification = Notification.notify(
-                    recipient=member,
-                    sender=request.user,
-                    title=f"Meeting Updated: {meeting.title}",
-                    content=f"Details for the meeting '{meeting.title}' have been updated.",
-                    notification_type='PROJECT',
-                    link=reverse('organizations:project_meetings', kwargs={'pk': project.pk})
-                )
-                async_to_sync(channel_layer.group_send)(
-                    f"notifications_{member.id}",
-                    {
-                        'type': 'send_notification',
-                        'id': str(notification.id),
-                        'title': notification.title,
-                        'content': notification.content,
-                        'notification_type': notification.notification_type,
-                        'link': notification.link,
-                    }
-                )
+            NotificationFanoutService.notify_users(
+                project.members.all(),
+                exclude=request.user,
+                sender=request.user,
+                title=f"Meeting Updated: {meeting.title}",
+                content=f"Details for the meeting '{meeting.title}' have been updated.",
+                notification_type='PROJECT',
+                link=reverse('organizations:project_meetings', kwargs={'pk': project.pk})
+            )
                 
             messages.success(request, 'Meeting updated.')
             return redirect('organizations:project_meetings', pk=project_pk)
@@ -598,32 +504,15 @@ def project_meeting_delete(request, project_pk, meeting_pk):
         meeting.delete()
         
         # Notify members about cancellation
-        from apps.accounts.models import Notification
-        from asgiref.sync import async_to_sync
-        from channels.layers import get_channel_layer
-        channel_layer = get_channel_layer()
-        
-        for member in project.members.all():
-            if member == request.user: continue
-            notification = Notification.notify(
-                recipient=member,
-                sender=request.user,
-                title=f"Meeting Cancelled: {meeting_title}",
-                content=f"The meeting '{meeting_title}' has been cancelled.",
-                notification_type='PROJECT',
-                link=reverse('organizations:project_meetings', kwargs={'pk': project.pk})
-            )
-            async_to_sync(channel_layer.group_send)(
-                f"notifications_{member.id}",
-                {
-                    'type': 'send_notification',
-                    'id': str(notification.id),
-                    'title': notification.title,
-                    'content': notification.content,
-                    'notification_type': notification.notification_type,
-                    'link': notification.link,
-                }
-            )
+        NotificationFanoutService.notify_users(
+            project.members.all(),
+            exclude=request.user,
+            sender=request.user,
+            title=f"Meeting Cancelled: {meeting_title}",
+            content=f"The meeting '{meeting_title}' has been cancelled.",
+            notification_type='PROJECT',
+            link=reverse('organizations:project_meetings', kwargs={'pk': project.pk})
+        )
 
         messages.success(request, 'Meeting cancelled.')
         return redirect('organizations:project_meetings', pk=project_pk)
@@ -648,30 +537,14 @@ def project_tasks(request, pk):
 
             # Notification logic (Notify assigned user)
             if task.assigned_to and task.assigned_to != request.user:
-                from apps.accounts.models import Notification
-                from asgiref.sync import async_to_sync
-                from channels.layers import get_channel_layer
-                channel_layer = get_channel_layer()
-                
-                notification = Notification.notify(
-                    recipient=task.assigned_to,
+                NotificationFanoutService.notify_users(
+                    [task.assigned_to],
                     sender=request.user,
                     title=f"New Task Assigned: {task.title}",
                     content=f"You have been assigned a task in {project.name}: {task.title}",
                     notification_type='PROJECT',
                     link=reverse('organizations:project_tasks', kwargs={'pk': project.pk})
                 )
-                async_to_sync(channel_layer.group_send)(
-                    f"notifications_{task.assigned_to.id}",
-                    {
-                        'type': 'send_notification',
-                        'id': str(notification.id),
-                        'title': notification.title,
-                        'content': notification.content,
-                        'notification_type': notification.notification_type,
-                        'link': notification.link,
-                    }
-                )
 
             messages.success(request, 'Task created.')
             return redirect('organizations:project_tasks', pk=pk)
@@ -1337,6 +1210,10 @@ def member_directory(request):
     
     # Ensure is_admin is accurately passed
     is_admin = user.role == user.Role.SUPER_ADMIN or user.is_staff or user.is_superuser
+
+    # Live presence (one cache read) rather than the periodically flushed column
+    from apps.accounts.services import PresenceService
+    members = PresenceService.apply_live_status(members, user.organization_id)
     
     return render(request, 'organizations/member_directory.html', {
         'members': members, 
@@ -0,0 +1,155 @@
+"""
+Document downloads.
+
+A version's file never changes, so a download is identified by the version
+id and size (the ETag) and its creation time (Last-Modified):
+- Conditional requests (``If-None-Match``/``If-Modified-Since``) are
+  answered with 304 before the file is touched
+- With ``DOCUMENT_DOWNLOAD_OFFLOAD = 'x-accel-redirect'`` (nginx) or
+  ``'x-sendfile'`` (Apache, lighttpd) the front proxy sends the bytes; the
+  former maps the storage name under ``DOCUMENT_DOWNLOAD_ACCEL_PREFIX``, the
+  latter needs a storage with local paths
+- Otherwise, when the storage can sign URLs (Cloudinary, or any storage whose
+  ``url()`` takes ``expire`` such as S3) and ``DOCUMENT_DOWNLOAD_REDIRECT``
+  is on, the client is redirected to a URL valid for
+  ``DOCUMENT_DOWNLOAD_URL_TTL`` seconds
+- Failing both, the file is streamed by Django with single byte-range
+  support (``Range``/``If-Range``), so media seeks and resumed downloads
+  only transfer what they ask for
+"""
+
+import re
+import time
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def version_etag(version):
+    return quote_etag(f"{version.pk}-{version.file_size}")
+
+
+def parse_range(header, size):
+    """``(start, end)`` inclusive for a single satisfiable byte range, ``None`` to send everything, ``False`` if unsatisfiable."""
+    match = RANGE_RE.match((header or '').strip())
+    if not match or size <= 0:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if not length:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+def signed_url(storage, name):
+    """A short-lived download URL for ``name``, or None when the storage cannot sign one."""
+    ttl = getattr(settings, 'DOCUMENT_DOWNLOAD_URL_TTL', 300)
+    prepend_prefix = getattr(storage, '_prepend_prefix', None)
+    if prepend_prefix is not None:
+        # Cloudinary media storage: a signed call to its download API
+        from cloudinary.utils import private_download_url
+        return private_download_url(
+            prepend_prefix(name), '', resource_type=storage._get_resource_type(name),
+            type='upload', attachment=True, expires_at=int(time.time()) + ttl
+        )
+    try:
+        return storage.url(name, expire=ttl)
+    except TypeError:
+        return None
+
+
+def _file_range(file, start, end):
+    try:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = file.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+def _offload(version, filename):
+    mode = getattr(settings, 'DOCUMENT_DOWNLOAD_OFFLOAD', '')
+    storage, name = version.file.storage, version.file.name
+    if mode == 'x-accel-redirect':
+        response = HttpResponse(content_type=version.file_type)
+        prefix = getattr(settings, 'DOCUMENT_DOWNLOAD_ACCEL_PREFIX', '/protected/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + name.lstrip('/')
+    elif mode == 'x-sendfile':
+        try:
+            path = storage.path(name)
+        except NotImplementedError:
+            return None
+        response = HttpResponse(content_type=version.file_type)
+        response['X-Sendfile'] = path
+    else:
+        return None
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def serve_version(request, version):
+    """The response for downloading ``version``: 304, offloaded, redirected or streamed."""
+    etag = version_etag(version)
+    last_modified = version.created_at.timestamp()
+    filename = version.file_name.replace('"', '')
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _offload(version, filename)
+    if response is None and getattr(settings, 'DOCUMENT_DOWNLOAD_REDIRECT', True):
+        url = signed_url(version.file.storage, version.file.name)
+        if url:
+            response = HttpResponseRedirect(url)
+    if response is None:
+        response = _stream(request, version, etag, filename)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Same URL, new content once a new version is uploaded: cache, but revalidate
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _stream(request, version, etag, filename):
+    size = version.file_size
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if request.headers.get('Range') and (not if_range or if_range == etag):
+        byte_range = parse_range(request.headers['Range'], size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        response = FileResponse(version.file.open('rb'), content_type=version.file_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _file_range(version.file.open('rb'), start, end), status=206, content_type=version.file_type
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.9 on 2026-10-17 03:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0021_fileblob_projectfile_blob'),
+        ('tools_documents', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentversion',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='organizations.fileblob'),
+        ),
+    ]
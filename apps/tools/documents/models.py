@@ -125,6 +125,13 @@ class DocumentVersion(models.Model):
     file_name = models.CharField(max_length=255)
     file_size = models.BigIntegerField()
     file_type = models.CharField(max_length=100)
+    blob = models.ForeignKey(
+        'organizations.FileBlob',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
     
     change_log = models.TextField(blank=True)
     
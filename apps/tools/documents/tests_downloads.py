@@ -0,0 +1,107 @@
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from apps.organizations.models import Organization
+from apps.tools.documents.downloads import parse_range
+from apps.tools.documents.models import Document, DocumentVersion
+
+User = get_user_model()
+
+BODY = b'0123456789' * 10
+
+
+class DocumentDownloadTest(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.overrides = override_settings(
+            DOCUMENT_DOWNLOAD_REDIRECT=False,
+            STORAGES={
+                'default': {
+                    'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                    'OPTIONS': {'location': self.media},
+                },
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+            }
+        )
+        self.overrides.enable()
+        self.org = Organization.objects.create(name='Test Org', code='TEST')
+        self.user = User.objects.create_user(
+            username='testuser', password='password', email='test@test.com',
+            email_verified=True, organization=self.org
+        )
+        self.document = Document.objects.create(organization=self.org, title='Policy', created_by=self.user)
+        self.version = DocumentVersion.objects.create(
+            document=self.document, version_number=1, file=ContentFile(BODY, name='policy.pdf'),
+            file_name='policy.pdf', file_size=len(BODY), file_type='application/pdf', created_by=self.user
+        )
+        self.document.current_version = self.version
+        self.document.save(update_fields=['current_version'])
+        self.url = f'/tools/documents/{self.document.pk}/download/'
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        self.overrides.disable()
+        shutil.rmtree(self.media, ignore_errors=True)
+
+    def test_full_and_partial_downloads(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), BODY)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('private', response['Cache-Control'])
+        etag = response['ETag']
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(BODY)}')
+        self.assertEqual(b''.join(response.streaming_content), BODY[10:20])
+
+        # Resuming against a stale copy gets the whole (new) file instead
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(BODY)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(BODY)}')
+
+    def test_conditional_get(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        # A new version changes the ETag
+        self.version.pk = None
+        self.version.version_number = 2
+        self.version.save()
+        self.document.current_version = self.version
+        self.document.save(update_fields=['current_version'])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_offload_and_redirect(self):
+        with override_settings(DOCUMENT_DOWNLOAD_OFFLOAD='x-accel-redirect', DOCUMENT_DOWNLOAD_ACCEL_PREFIX='/protected/'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected/{self.version.file.name}')
+        self.assertEqual(response.content, b'')
+
+        with override_settings(DOCUMENT_DOWNLOAD_OFFLOAD='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], self.version.file.path)
+
+        # Storages that cannot sign URLs fall back to streaming
+        with override_settings(DOCUMENT_DOWNLOAD_REDIRECT=True):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-', 10), (0, 9))
+        self.assertEqual(parse_range('bytes=-3', 10), (7, 9))
+        self.assertEqual(parse_range('bytes=5-100', 10), (5, 9))
+        self.assertIsNone(parse_range('bytes=0-1,4-5', 10))
+        self.assertFalse(parse_range('bytes=10-', 10))
@@ -1,9 +1,10 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse, FileResponse
+from django.http import HttpResponse
 from .models import Folder, Document, DocumentVersion
 from .forms import FolderForm, DocumentUploadForm, DocumentVersionForm
+from .downloads import serve_version
 import os
 
 @login_required
@@ -102,10 +103,8 @@ def document_download(request, pk):
         messages.error(request, "This document has no files.")
         return redirect('tools:documents:index')
         
-    version = document.current_version
-    response = FileResponse(version.file.open(), content_type=version.file_type)
-    response['Content-Disposition'] = f'attachment; filename="{version.file_name}"'
-    return response
+    # Conditional, range-capable, offloaded or redirected (see downloads.py)
+    return serve_version(request, document.current_version)
 
 @login_required
 def document_delete(request, pk):
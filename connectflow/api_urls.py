@@ -1,7 +1,11 @@
 from django.urls import path, include
 from rest_framework import routers
-from apps.accounts.api_views import UserViewSet, api_login, api_logout
-from apps.organizations.api_views import OrganizationViewSet, DepartmentViewSet, TeamViewSet, SharedProjectViewSet
+from apps.accounts.api_views import UserViewSet, api_login, api_logout, api_ws_token
+from apps.organizations.api_views import (
+    OrganizationViewSet, DepartmentViewSet, TeamViewSet, SharedProjectViewSet,
+    api_upload_ticket, api_upload_commit, api_direct_upload_local,
+    api_chunked_upload_start, api_chunked_upload, api_chunked_upload_finalize,
+)
 from apps.chat_channels.api_views import ChannelViewSet, MessageViewSet
 from apps.support.api_views import TicketViewSet, TicketMessageViewSet
 
@@ -19,5 +23,12 @@ router.register(r'ticket-messages', TicketMessageViewSet, basename='ticket-messa
 urlpatterns = [
     path('login/', api_login, name='api_login'),
     path('logout/', api_logout, name='api_logout'),
+    path('ws-token/', api_ws_token, name='api_ws_token'),
+    path('uploads/tickets/', api_upload_ticket, name='api_upload_ticket'),
+    path('uploads/commit/', api_upload_commit, name='api_upload_commit'),
+    path('uploads/local/<str:token>/', api_direct_upload_local, name='api_direct_upload_local'),
+    path('uploads/chunked/', api_chunked_upload_start, name='api_chunked_upload_start'),
+    path('uploads/chunked/<str:upload_id>/', api_chunked_upload, name='api_chunked_upload'),
+    path('uploads/chunked/<str:upload_id>/finalize/', api_chunked_upload_finalize, name='api_chunked_upload_finalize'),
     path('', include(router.urls)),
 ]
@@ -26,7 +26,7 @@ django_asgi_app = get_asgi_application()
 
 # NOW safe to import routing (which imports models)
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
+from apps.accounts.socket_auth import SocketAuthMiddlewareStack
 from apps.chat_channels.routing import websocket_urlpatterns as chat_urlpatterns
 from apps.accounts.routing import websocket_urlpatterns as notification_urlpatterns
 from apps.support.routing import websocket_urlpatterns as support_urlpatterns
@@ -34,7 +34,7 @@ from apps.calls.routing import websocket_urlpatterns as call_urlpatterns
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
-    "websocket": AuthMiddlewareStack(
+    "websocket": SocketAuthMiddlewareStack(
         URLRouter(
             chat_urlpatterns + notification_urlpatterns + support_urlpatterns + call_urlpatterns
         )
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 from decouple import config
 import cloudinary
 import cloudinary.uploader
@@ -32,10 +33,14 @@ DEBUG = config('DEBUG', default=False, cast=bool)
 
 ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='localhost,127.0.0.1', cast=lambda v: [s.strip() for s in v.split(',')])
 
-# Upload Limits (10MB)
-# File upload settings - Allow larger files (100MB max)
-DATA_UPLOAD_MAX_MEMORY_SIZE = 100 * 1024 * 1024  # 100MB
-FILE_UPLOAD_MAX_MEMORY_SIZE = 100 * 1024 * 1024  # 100MB
+# Upload Limits
+# Non-file request bodies (form fields, JSON) are read into worker memory, so
+# they are capped; files are not counted here, and the chunked and direct
+# upload endpoints stream their bodies.
+DATA_UPLOAD_MAX_MEMORY_SIZE = config('DATA_UPLOAD_MAX_MEMORY_SIZE', default=5 * 1024 * 1024, cast=int)
+# Larger files are spooled to a temp file rather than held in worker memory;
+# big uploads should use direct upload tickets (DIRECT_UPLOAD_BACKEND).
+FILE_UPLOAD_MAX_MEMORY_SIZE = config('FILE_UPLOAD_MAX_MEMORY_SIZE', default=5 * 1024 * 1024, cast=int)
 
 # Application definition
 
@@ -124,6 +129,88 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Notification fan-out: deliver large audiences on a background thread pool
+# after the request's transaction commits instead of inline.
+NOTIFICATION_FANOUT_BACKGROUND = config('NOTIFICATION_FANOUT_BACKGROUND', default=False, cast=bool)
+NOTIFICATION_FANOUT_WORKERS = config('NOTIFICATION_FANOUT_WORKERS', default=2, cast=int)
+
+# Unread notification counters: 'cache' uses CACHES['default'], 'redis' talks
+# to NOTIFICATION_COUNTER_REDIS_URL directly.
+NOTIFICATION_COUNTER_BACKEND = config('NOTIFICATION_COUNTER_BACKEND', default='cache')
+NOTIFICATION_COUNTER_REDIS_URL = config('NOTIFICATION_COUNTER_REDIS_URL', default='redis://localhost:6379/2')
+NOTIFICATION_COUNTER_TIMEOUT = config('NOTIFICATION_COUNTER_TIMEOUT', default=60 * 60 * 24, cast=int)
+
+# Seconds a user's cached set of viewable channel ids lives (membership
+# signals invalidate it earlier).
+CHANNEL_ACCESS_CACHE_TIMEOUT = config('CHANNEL_ACCESS_CACHE_TIMEOUT', default=300, cast=int)
+
+# Presence: 'cache' shares state through CACHES['default'] (Redis in
+# production), 'memory' keeps it in process. A connection counts as online for
+# PRESENCE_TTL seconds after its last heartbeat; statuses are written to the
+# database at most every PRESENCE_FLUSH_INTERVAL seconds.
+PRESENCE_BACKEND = config('PRESENCE_BACKEND', default='cache')
+PRESENCE_TTL = config('PRESENCE_TTL', default=90, cast=int)
+PRESENCE_FLUSH_INTERVAL = config('PRESENCE_FLUSH_INTERVAL', default=60, cast=int)
+
+# Distinct message texts whose rendered markdown is kept in process memory.
+MARKDOWN_RENDER_CACHE_SIZE = config('MARKDOWN_RENDER_CACHE_SIZE', default=1024, cast=int)
+
+# Seconds a chat connection collects "read up to" events before writing the
+# read watermark and broadcasting one receipt.
+READ_RECEIPT_DEBOUNCE = config('READ_RECEIPT_DEBOUNCE', default=1.0, cast=float)
+
+# Typing indicators: a typer is dropped TYPING_TTL seconds after their last
+# "typing" frame, and each channel gets at most one aggregated "who is typing"
+# frame per TYPING_BROADCAST_INTERVAL seconds.
+TYPING_TTL = config('TYPING_TTL', default=6, cast=int)
+TYPING_BROADCAST_INTERVAL = config('TYPING_BROADCAST_INTERVAL', default=1.0, cast=float)
+
+# Topics (chat channels, calls, notifications, presence) one multiplexed
+# /ws/stream/ connection may subscribe to at once.
+MULTIPLEX_MAX_TOPICS = config('MULTIPLEX_MAX_TOPICS', default=50, cast=int)
+
+# WebSocket authentication: resolved users are cached for WS_USER_CACHE_TIMEOUT
+# seconds (saves drop them earlier) and connection tokens from /api/v1/ws-token/
+# are accepted for WS_TOKEN_MAX_AGE seconds.
+WS_USER_CACHE_TIMEOUT = config('WS_USER_CACHE_TIMEOUT', default=60, cast=int)
+WS_TOKEN_MAX_AGE = config('WS_TOKEN_MAX_AGE', default=300, cast=int)
+
+# Per-connection outbound queue: past WS_OUTBOUND_SHED_THRESHOLD queued frames
+# typing/presence frames are dropped, past WS_OUTBOUND_MAX_QUEUE the client is
+# told to resync and disconnected.
+WS_OUTBOUND_SHED_THRESHOLD = config('WS_OUTBOUND_SHED_THRESHOLD', default=100, cast=int)
+WS_OUTBOUND_MAX_QUEUE = config('WS_OUTBOUND_MAX_QUEUE', default=500, cast=int)
+
+# Offer msgpack WebSocket frames (see apps/chat_channels/wire.py). Off unless a
+# client uses them: every group event is then also encoded as msgpack.
+WS_MSGPACK_ENABLED = config('WS_MSGPACK_ENABLED', default=False, cast=bool)
+
+# Threads storing a message's attachments concurrently (shared by all requests).
+ATTACHMENT_UPLOAD_WORKERS = config('ATTACHMENT_UPLOAD_WORKERS', default=4, cast=int)
+
+# Direct uploads: 'cloudinary' signs uploads straight to Cloudinary, 'local'
+# accepts PUTs into DIRECT_UPLOAD_LOCAL_ROOT (tests, development). Tickets
+# expire after DIRECT_UPLOAD_TICKET_MAX_AGE seconds.
+DIRECT_UPLOAD_BACKEND = config('DIRECT_UPLOAD_BACKEND', default='cloudinary')
+DIRECT_UPLOAD_LOCAL_ROOT = config('DIRECT_UPLOAD_LOCAL_ROOT', default=str(BASE_DIR / 'media' / 'direct_uploads'))
+DIRECT_UPLOAD_TICKET_MAX_AGE = config('DIRECT_UPLOAD_TICKET_MAX_AGE', default=3600, cast=int)
+
+# Chunked uploads are spooled under CHUNKED_UPLOAD_ROOT (shared by every web
+# host), at most CHUNKED_UPLOAD_MAX_CHUNK bytes per request; `manage.py
+# clear_stale_uploads` drops those older than CHUNKED_UPLOAD_MAX_AGE seconds.
+CHUNKED_UPLOAD_ROOT = config('CHUNKED_UPLOAD_ROOT', default=os.path.join(tempfile.gettempdir(), 'connectflow-uploads'))
+CHUNKED_UPLOAD_MAX_CHUNK = config('CHUNKED_UPLOAD_MAX_CHUNK', default=8 * 1024 * 1024, cast=int)
+CHUNKED_UPLOAD_MAX_AGE = config('CHUNKED_UPLOAD_MAX_AGE', default=60 * 60 * 24, cast=int)
+
+# Document downloads: 'x-accel-redirect' (nginx, files mapped under
+# DOCUMENT_DOWNLOAD_ACCEL_PREFIX) or 'x-sendfile' hands the transfer to the
+# front proxy; otherwise storages that can sign URLs get a redirect valid for
+# DOCUMENT_DOWNLOAD_URL_TTL seconds, and the rest are streamed with Range support.
+DOCUMENT_DOWNLOAD_OFFLOAD = config('DOCUMENT_DOWNLOAD_OFFLOAD', default='')
+DOCUMENT_DOWNLOAD_ACCEL_PREFIX = config('DOCUMENT_DOWNLOAD_ACCEL_PREFIX', default='/protected/')
+DOCUMENT_DOWNLOAD_REDIRECT = config('DOCUMENT_DOWNLOAD_REDIRECT', default=True, cast=bool)
+DOCUMENT_DOWNLOAD_URL_TTL = config('DOCUMENT_DOWNLOAD_URL_TTL', default=300, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators